@@ -0,0 +1,71 @@
+import pytest
+
+
+class FakeRedis:
+    """
+    In-memory stand-in for the Redis client: string values with their TTLs,
+    and pipelines that count round trips. Commands on a key listed in
+    `errors` raise that error.
+    """
+
+    def __init__(self):
+        self.values, self.ttls, self.errors = {}, {}, {}
+        self.round_trips = 0
+
+    def _check(self, key):
+        if key in self.errors:
+            raise self.errors[key]
+
+    def get(self, key):
+        self._check(key)
+        return self.values.get(key)
+
+    def set(self, key, value, ex=None):
+        self._check(key)
+        self.values[key], self.ttls[key] = value, ex
+        return True
+
+    def setex(self, key, ttl, value):
+        return self.set(key, value, ex=ttl)
+
+    def getex(self, key, ex=None):
+        self._check(key)
+        if key in self.values:
+            self.ttls[key] = ex
+        return self.values.get(key)
+
+    def delete(self, *keys):
+        removed = 0
+        for key in keys:
+            self.ttls.pop(key, None)
+            removed += self.values.pop(key, None) is not None
+        return removed
+
+    def pipeline(self, transaction=True):
+        return FakePipeline(self)
+
+
+class FakePipeline:
+    def __init__(self, redis):
+        self.redis, self.calls = redis, []
+
+    def __getattr__(self, name):
+        return lambda *args, **kwargs: self.calls.append(lambda: getattr(self.redis, name)(*args, **kwargs))
+
+    def execute(self, raise_on_error=True):
+        self.redis.round_trips += 1
+        replies = []
+        for call in self.calls:
+            try:
+                replies.append(call())
+            except Exception as e:
+                if raise_on_error:
+                    raise
+                replies.append(e)
+        self.calls = []
+        return replies
+
+
+@pytest.fixture
+def fake_redis():
+    return FakeRedis()
@@ -12,6 +12,15 @@ class Settings:
     
     # Redis & Vector DB
     REDIS_URL = os.getenv("REDIS_URL")
+    # Used when REDIS_URL is not set
+    REDIS_HOST = os.getenv("REDIS_HOST", "localhost")
+    REDIS_PORT = int(os.getenv("REDIS_PORT", 6379))
+    REDIS_DB = int(os.getenv("REDIS_DB", 0))
+    # Shared connection pools (shared/storage/redis_client.py): size cap per process and per pool,
+    # socket timeouts, and how often idle connections are PINGed before reuse
+    REDIS_MAX_CONNECTIONS = int(os.getenv("REDIS_MAX_CONNECTIONS", 32))
+    REDIS_SOCKET_TIMEOUT = float(os.getenv("REDIS_SOCKET_TIMEOUT", 5))
+    REDIS_HEALTH_CHECK_INTERVAL = int(os.getenv("REDIS_HEALTH_CHECK_INTERVAL", 30))
     VECTOR_DB_URL = os.getenv("WEAVIATE_URL")
 
     # Auth
@@ -23,4 +32,106 @@ class Settings:
     BLOCKCHAIN_RPC_URL = os.getenv("BLOCKCHAIN_RPC_URL")
     BLOCKCHAIN_PRIVATE_KEY = os.getenv("BLOCKCHAIN_PRIVATE_KEY")
 
+    # Xiara product index
+    XIARA_INDEX_WATCH = os.getenv("XIARA_INDEX_WATCH", "false").lower() == "true"
+    XIARA_INDEX_WATCH_INTERVAL = float(os.getenv("XIARA_INDEX_WATCH_INTERVAL", 5))
+    XIARA_INGEST_BATCH_SIZE = int(os.getenv("XIARA_INGEST_BATCH_SIZE", 1000))
+    # Open the saved index and docstore memory-mapped (shared page cache across workers)
+    XIARA_INDEX_MMAP = os.getenv("XIARA_INDEX_MMAP", "true").lower() == "true"
+
+    # Xiara ANN index: flat (exact) | hnsw | ivfpq
+    XIARA_INDEX_TYPE = os.getenv("XIARA_INDEX_TYPE", "flat")
+    XIARA_INDEX_TRAIN_SAMPLE = int(os.getenv("XIARA_INDEX_TRAIN_SAMPLE", 50000))
+    XIARA_HNSW_M = int(os.getenv("XIARA_HNSW_M", 32))
+    XIARA_HNSW_EF_CONSTRUCTION = int(os.getenv("XIARA_HNSW_EF_CONSTRUCTION", 200))
+    XIARA_HNSW_EF_SEARCH = int(os.getenv("XIARA_HNSW_EF_SEARCH", 64))
+    # HNSW can't remove vectors: deleted rows are skipped by searches until they
+    # exceed this fraction of the index, then it is rebuilt from cached embeddings
+    XIARA_HNSW_MAX_DELETED_FRACTION = float(os.getenv("XIARA_HNSW_MAX_DELETED_FRACTION", 0.2))
+    XIARA_IVF_NLIST = int(os.getenv("XIARA_IVF_NLIST", 0))  # 0 = derive from the training sample size
+    XIARA_IVF_NPROBE = int(os.getenv("XIARA_IVF_NPROBE", 16))
+    XIARA_PQ_M = int(os.getenv("XIARA_PQ_M", 48))
+    XIARA_PQ_NBITS = int(os.getenv("XIARA_PQ_NBITS", 8))
+    # Filtered candidate sets up to this size are ranked exactly instead of via the ANN index
+    XIARA_PREFILTER_EXACT_MAX = int(os.getenv("XIARA_PREFILTER_EXACT_MAX", 4096))
+    XIARA_RETRIEVER_K = int(os.getenv("XIARA_RETRIEVER_K", 4))
+
+    # Multi-product requests: "merged" = one LLM call for all products, "concurrent" = one call
+    # per product, XIARA_GENERATION_CONCURRENCY at a time (in-process llama.cpp runs one at a time)
+    XIARA_MULTI_PRODUCT_MODE = os.getenv("XIARA_MULTI_PRODUCT_MODE", "merged")
+    XIARA_GENERATION_CONCURRENCY = int(os.getenv("XIARA_GENERATION_CONCURRENCY", 1))
+
+    # Xiara LLM executor: worker threads for LLM-bound request work and how many requests may
+    # wait behind them before new ones get a 429 (keep 1 worker for in-process llama.cpp;
+    # with the inference service, match its slots so it can batch concurrent prompts)
+    XIARA_LLM_WORKERS = int(os.getenv("XIARA_LLM_WORKERS", 1))
+    XIARA_LLM_QUEUE_SIZE = int(os.getenv("XIARA_LLM_QUEUE_SIZE", 16))
+    # Local inference service (python -m xiara.core.inference_server): when the socket is set,
+    # workers use it instead of loading the model themselves. 0 threads/slots = from core count
+    XIARA_LLM_SOCKET = os.getenv("XIARA_LLM_SOCKET")
+    XIARA_LLM_THREADS = int(os.getenv("XIARA_LLM_THREADS", 0))
+    XIARA_LLM_SLOTS = int(os.getenv("XIARA_LLM_SLOTS", 0))
+    # KV-cache reuse: memory for cached prompt prefixes / per-session snapshots (0 = off), and how
+    # many the inference service keeps. In-process LlamaCpp uses it as its prompt-state cache size
+    XIARA_KV_CACHE_MB = int(os.getenv("XIARA_KV_CACHE_MB", 256))
+    XIARA_KV_CACHE_ENTRIES = int(os.getenv("XIARA_KV_CACHE_ENTRIES", 32))
+    # Warm-up retries a failed LLM/index load this many times, waiting DELAY seconds first and
+    # doubling it each time; after that /ready reports "failed" instead of "warming_up"
+    XIARA_WARMUP_RETRIES = int(os.getenv("XIARA_WARMUP_RETRIES", 5))
+    XIARA_WARMUP_RETRY_DELAY = float(os.getenv("XIARA_WARMUP_RETRY_DELAY", 5))
+
+    # Xiara conversation memory: token budget for the history in prompts; the newest messages stay
+    # verbatim, older ones are folded into a running summary in the background
+    XIARA_MEMORY_MAX_TOKENS = int(os.getenv("XIARA_MEMORY_MAX_TOKENS", 768))
+    XIARA_MEMORY_RECENT_MESSAGES = int(os.getenv("XIARA_MEMORY_RECENT_MESSAGES", 4))
+    # Answer prompts (n_ctx is 2048, leave room for the answer): token budget filled with the system
+    # prompt and question, then trimmed retrieved products, then history; product descriptions are
+    # clipped to this many characters
+    XIARA_PROMPT_MAX_TOKENS = int(os.getenv("XIARA_PROMPT_MAX_TOKENS", 1280))
+    XIARA_PROMPT_DESCRIPTION_CHARS = int(os.getenv("XIARA_PROMPT_DESCRIPTION_CHARS", 200))
+    # Retrieval-only answers: lookups of these intents ("price": "how much is X", "list": "show me X
+    # under ₦5,000") are answered from a template over the retrieved products, without generation,
+    # when the products match. Comma-separated; empty disables the fast path
+    XIARA_FAST_PATH_INTENTS = os.getenv("XIARA_FAST_PATH_INTENTS", "price,list")
+    # Per-user session state (memory, last query, clarifications, negotiations): "memory" keeps an
+    # in-process LRU per kind of state, "redis" shares it across workers and nodes. Sessions expire
+    # after XIARA_SESSION_TTL idle seconds
+    XIARA_SESSION_STORE = os.getenv("XIARA_SESSION_STORE", "memory").lower()
+    XIARA_SESSION_TTL = int(os.getenv("XIARA_SESSION_TTL", 1800))
+    XIARA_SESSION_MAX_ENTRIES = int(os.getenv("XIARA_SESSION_MAX_ENTRIES", 10000))
+    XIARA_SESSION_MAX_MB = int(os.getenv("XIARA_SESSION_MAX_MB", 64))
+
+    # Keyword vocabularies for the rule-based ambiguity and negotiation checks (JSON, see
+    # xiara/core/vocabularies.json for the format); default: the bundled file
+    XIARA_VOCABULARY_PATH = os.getenv("XIARA_VOCABULARY_PATH")
+
+    # Ambiguity classifier: a linear model over the shared MiniLM embeddings, trained with
+    # xiara/tools/train_ambiguity_classifier.py (default: xiara/core/ambiguity_model.npz; without
+    # one, borderline queries all go to the LLM). The LLM is only asked when the calibrated
+    # probability falls strictly inside BAND_LOW..BAND_HIGH; verdicts are cached per normalized query
+    XIARA_AMBIGUITY_MODEL_PATH = os.getenv("XIARA_AMBIGUITY_MODEL_PATH")
+    XIARA_AMBIGUITY_BAND_LOW = float(os.getenv("XIARA_AMBIGUITY_BAND_LOW", 0.35))
+    XIARA_AMBIGUITY_BAND_HIGH = float(os.getenv("XIARA_AMBIGUITY_BAND_HIGH", 0.65))
+    XIARA_AMBIGUITY_CACHE_SIZE = int(os.getenv("XIARA_AMBIGUITY_CACHE_SIZE", 4096))
+    XIARA_AMBIGUITY_CACHE_TTL = int(os.getenv("XIARA_AMBIGUITY_CACHE_TTL", 86400))
+
+    # Xiara embedding cache
+    XIARA_EMBEDDING_CACHE_DIR = os.getenv("XIARA_EMBEDDING_CACHE_DIR")  # default: xiara/core/embedding_cache
+    XIARA_QUERY_CACHE_SIZE = int(os.getenv("XIARA_QUERY_CACHE_SIZE", 1024))
+    # The document vector store is compacted to the indexed texts after an index build or sync once
+    # it holds more than this fraction of extra vectors (edited/deleted products) on top of them
+    XIARA_EMBEDDING_CACHE_MAX_STALE = float(os.getenv("XIARA_EMBEDDING_CACHE_MAX_STALE", 0.5))
+    XIARA_EMBED_MAX_BATCH = int(os.getenv("XIARA_EMBED_MAX_BATCH", 64))
+    XIARA_EMBED_BATCH_WAIT_MS = float(os.getenv("XIARA_EMBED_BATCH_WAIT_MS", 5))
+
+    # Xiara response cache: in-process LRU + TTL, optionally backed by Redis
+    XIARA_RESPONSE_CACHE_SIZE = int(os.getenv("XIARA_RESPONSE_CACHE_SIZE", 1024))
+    XIARA_RESPONSE_CACHE_TTL = int(os.getenv("XIARA_RESPONSE_CACHE_TTL", 600))
+    XIARA_RESPONSE_CACHE_REDIS = os.getenv("XIARA_RESPONSE_CACHE_REDIS", "false").lower() == "true"
+    # Semantic cache: near-duplicate queries (cosine >= threshold, same profile) reuse an answer.
+    # Off by default — tune the threshold against the audit counters at /xiara/debug/semantic-cache first
+    XIARA_SEMANTIC_CACHE = os.getenv("XIARA_SEMANTIC_CACHE", "false").lower() == "true"
+    XIARA_SEMANTIC_CACHE_THRESHOLD = float(os.getenv("XIARA_SEMANTIC_CACHE_THRESHOLD", 0.9))
+    XIARA_SEMANTIC_CACHE_SIZE = int(os.getenv("XIARA_SEMANTIC_CACHE_SIZE", 2048))
+
 settings = Settings()
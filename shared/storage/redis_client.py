@@ -1,14 +1,174 @@
 # shared/storage/redis_client.py
+"""
+Shared Redis access for every service.
+
+One connection pool per process for blocking callers and one for asyncio
+callers, both configured from settings (REDIS_URL, or REDIS_HOST/PORT/DB)
+with a size cap, socket timeouts and periodic health checks on idle
+connections. Modules take their clients from here instead of building
+their own, so connections are reused across helpers.
+
+RedisBatch queues commands from several helpers and sends them in one
+pipeline: per-request state (profile, last query, ...) is read or written
+in a single round trip instead of one per key.
+"""
+import time
+from typing import Any, Callable, List, Optional
+
 import redis
-import os
-
-REDIS_HOST = os.getenv("REDIS_HOST", "localhost")
-REDIS_PORT = int(os.getenv("REDIS_PORT", 6379))
-REDIS_DB = int(os.getenv("REDIS_DB", 0))
-
-redis_client = redis.StrictRedis(
-    host=REDIS_HOST,
-    port=REDIS_PORT,
-    db=REDIS_DB,
-    decode_responses=True
-)
+import redis.asyncio
+
+from shared.config.settings import settings
+
+_pool: Optional[redis.ConnectionPool] = None
+_async_pool: Optional[redis.asyncio.ConnectionPool] = None
+_bytes_pool: Optional[redis.ConnectionPool] = None
+
+
+def redis_url() -> str:
+    if settings.REDIS_URL:
+        return settings.REDIS_URL
+    return f"redis://{settings.REDIS_HOST}:{settings.REDIS_PORT}/{settings.REDIS_DB}"
+
+
+def _pool_options() -> dict:
+    return {
+        "max_connections": settings.REDIS_MAX_CONNECTIONS,
+        "socket_timeout": settings.REDIS_SOCKET_TIMEOUT,
+        "socket_connect_timeout": settings.REDIS_SOCKET_TIMEOUT,
+        "health_check_interval": settings.REDIS_HEALTH_CHECK_INTERVAL,
+        "decode_responses": True,
+    }
+
+
+def get_redis() -> redis.Redis:
+    """Client on the shared blocking connection pool (no connection is made until first use)."""
+    global _pool
+    if _pool is None:
+        _pool = redis.ConnectionPool.from_url(redis_url(), **_pool_options())
+    return redis.Redis(connection_pool=_pool)
+
+
+def get_bytes_redis() -> redis.Redis:
+    """Client replying with raw bytes, for libraries that decode replies themselves (its own shared pool)."""
+    global _bytes_pool
+    if _bytes_pool is None:
+        _bytes_pool = redis.ConnectionPool.from_url(redis_url(), **{**_pool_options(), "decode_responses": False})
+    return redis.Redis(connection_pool=_bytes_pool)
+
+
+def get_async_redis() -> redis.asyncio.Redis:
+    """Client on the shared asyncio connection pool."""
+    global _async_pool
+    if _async_pool is None:
+        _async_pool = redis.asyncio.ConnectionPool.from_url(redis_url(), **_pool_options())
+    return redis.asyncio.Redis(connection_pool=_async_pool)
+
+
+def health() -> dict:
+    """PING round trip and pool usage, for readiness/debug endpoints."""
+    start = time.perf_counter()
+    try:
+        ok = bool(get_redis().ping())
+        error = None
+    except redis.RedisError as e:
+        ok, error = False, str(e)
+    result = {"ok": ok, "latency_ms": round((time.perf_counter() - start) * 1000, 2)}
+    if error:
+        result["error"] = error
+    if _pool is not None:
+        result["connections"] = {
+            "in_use": len(_pool._in_use_connections),
+            "idle": len(_pool._available_connections),
+            "max": _pool.max_connections,
+        }
+    return result
+
+
+class Pending:
+    """Result of a batched command, available once the batch has run."""
+
+    __slots__ = ("value",)
+
+    def __init__(self, value: Any = None):
+        self.value = value
+
+
+def _reply(reply):
+    if isinstance(reply, Exception):
+        raise reply
+    return reply
+
+
+class RedisBatch:
+    """
+    Commands from several helpers sent in one non-transactional pipeline.
+
+        batch = RedisBatch()
+        profile = batch.add(lambda pipe: pipe.get(key), parse=load_profile)
+        await batch.aexecute()
+        profile.value
+
+    `queue` adds `commands` commands to the pipeline (one by default); `parse`
+    turns the reply (or the exception it raised; a list of them for several
+    commands) into the value. Helpers that have nothing to send (state kept
+    in process) return `Pending(value)` directly.
+    """
+
+    def __init__(self, client: Optional[redis.Redis] = None,
+                 async_client: Optional[redis.asyncio.Redis] = None):
+        self._client = client
+        self._async_client = async_client
+        self._ops: List[tuple] = []
+
+    def add(self, queue: Callable[[Any], Any], parse: Callable[[Any], Any] = _reply, commands: int = 1) -> Pending:
+        pending = Pending()
+        self._ops.append((queue, parse, pending, commands))
+        return pending
+
+    def __len__(self) -> int:
+        return len(self._ops)
+
+    def _resolve(self, ops, replies):
+        i = 0
+        for _, parse, pending, commands in ops:
+            pending.value = parse(replies[i] if commands == 1 else replies[i:i + commands])
+            i += commands
+
+    def execute(self):
+        ops, self._ops = self._ops, []
+        if not ops:
+            return
+        pipe = (self._client or get_redis()).pipeline(transaction=False)
+        for queue, *_ in ops:
+            queue(pipe)
+        self._resolve(ops, pipe.execute(raise_on_error=False))
+
+    async def aexecute(self):
+        ops, self._ops = self._ops, []
+        if not ops:
+            return
+        async with (self._async_client or get_async_redis()).pipeline(transaction=False) as pipe:
+            for queue, *_ in ops:
+                queue(pipe)
+            replies = await pipe.execute(raise_on_error=False)
+        self._resolve(ops, replies)
+
+
+def mget(keys: List[str]) -> List[Optional[str]]:
+    """Several keys in one round trip."""
+    return get_redis().mget(keys) if keys else []
+
+
+def mset(mapping: dict, ex: Optional[int] = None):
+    """Several keys (with an optional TTL each) in one round trip."""
+    if not mapping:
+        return
+    pipe = get_redis().pipeline(transaction=False)
+    for key, value in mapping.items():
+        pipe.set(key, value, ex=ex)
+    pipe.execute()
+
+
+# Backwards-compatible module-level client, on the shared pool
+redis_client = get_redis()
@@ -3,3 +3,19 @@ from shared.config.settings import settings
 def test_settings_load():
     """Ensure shared settings loads ENVIRONMENT."""
     assert settings.ENVIRONMENT is not None
+
+
+def test_redis_batch_sends_queued_commands_in_one_round_trip(fake_redis):
+    from shared.storage.redis_client import Pending, RedisBatch
+
+    client = fake_redis
+    client.set("a", "1")
+    client.errors["b"] = ValueError("boom")
+    batch = RedisBatch(client)
+    a = batch.add(lambda pipe: pipe.get("a"), parse=int)
+    b = batch.add(lambda pipe: pipe.get("b"), parse=lambda reply: "failed" if isinstance(reply, Exception) else reply)
+    local = Pending("in process")
+    batch.execute()
+    assert client.round_trips == 1 and (a.value, b.value, local.value) == (1, "failed", "in process")
+    batch.execute()  # nothing queued: no round trip
+    assert client.round_trips == 1
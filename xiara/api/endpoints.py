@@ -1,10 +1,18 @@
 from fastapi import APIRouter
 from pydantic import BaseModel
 from shared.logging.logger import logger
-from xiara.core.prompt_chain import handle_product_query 
+from xiara.core.prompt_chain import ahandle_product_query, answer_prompts, lookups
 from fastapi import APIRouter
 from xiara.core.memory_config import memory  # Make sure memory is imported
 from xiara.core.memory_manager import get_memory  # Import get_memory
+from xiara.core.response_cache import response_cache
+from xiara.core.semantic_cache import semantic_cache
+from xiara.core.ambiguity_classifier import ambiguity_gate
+from xiara.core.request_pipeline import pipeline_stats
+from xiara.core.query_rewriter import question_rewriter
+from xiara.core.llm_executor import llm_executor
+from xiara.core.session_store import stores as session_stores
+from shared.storage import redis_client
 
 router = APIRouter()
 
@@ -17,9 +25,9 @@ class QueryRequest(BaseModel):
     prompt: str
 
 @router.post("/query")
-def query(request: QueryRequest):
+async def query(request: QueryRequest):
     logger.info("Query from user %s: %s", request.userId, request.prompt)
-    response_text = handle_product_query(request.prompt, user_id=request.userId)
+    response_text = await ahandle_product_query(request.prompt, user_id=request.userId)
     return {
         "agent": "Xiara",
         "reply": response_text,
@@ -42,5 +50,61 @@ def get_user_chat_history(user_id: str):
             content = getattr(msg, "content", "")
             history_data.append({"index": idx, "role": role, "content": content})
     
-    return {"user_id": user_id, "chat_history": history_data}
-    
\ No newline at end of file
+    return {"user_id": user_id, "summary": memory.current_summary(), "chat_history": history_data}
+
+
+@router.get("/debug/cache")
+def get_cache_stats():
+    """Response cache hit rate and size."""
+    return response_cache.stats()
+
+
+@router.get("/debug/semantic-cache")
+def get_semantic_cache_stats():
+    """Semantic cache counters and the most recent near-duplicate matches, for auditing."""
+    return {**semantic_cache.stats(), "recent_hits": list(semantic_cache.audit)[-50:]}
+
+
+class FalsePositiveReport(BaseModel):
+    query: str
+
+
+@router.post("/debug/semantic-cache/false-positive")
+def report_semantic_false_positive(report: FalsePositiveReport):
+    """Flag a wrong near-duplicate answer; the matched entry is dropped."""
+    return {"reported": semantic_cache.report_false_positive(report.query)}
+
+
+@router.get("/debug/ambiguity")
+def get_ambiguity_stats():
+    """Ambiguity classifier: verdicts from the model, LLM fallbacks and cache hits."""
+    return ambiguity_gate.stats()
+
+
+@router.get("/debug/pipeline")
+def get_pipeline_stats():
+    """Per-stage request timings, question paths, answer prompt sizes and fast-path lookups."""
+    return {
+        "stages": pipeline_stats.stats(),
+        "questions": question_rewriter.stats(),
+        "prompts": answer_prompts.stats(),
+        "fast_path": lookups.stats(),
+    }
+
+
+@router.get("/debug/llm")
+def get_llm_queue_stats():
+    """LLM executor load: running and queued requests, rejections, average service time."""
+    return llm_executor.stats()
+
+
+@router.get("/debug/sessions")
+def get_session_store_stats():
+    """Per-user state: entries, bytes held, evictions and expirations per kind of state."""
+    return {namespace: store.stats() for namespace, store in session_stores.items()}
+
+
+@router.get("/debug/redis")
+def get_redis_health():
+    """Redis PING latency and shared connection pool usage."""
+    return redis_client.health()
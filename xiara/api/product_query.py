@@ -1,16 +1,29 @@
 from typing import Optional
 from fastapi import APIRouter
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
-from xiara.core.prompt_chain import handle_product_query
-from xiara.core.ambiguity_detector import AmbiguityDetector
+from xiara.api.sse import sse_event, stream_answer, stream_error
+from xiara.core.prompt_chain import ahandle_product_query, ambiguity_detector, astream_product_query, precheck_ambiguity
 from xiara.core.negotiation_handler import NegotiationHandler
+from xiara.core.request_pipeline import RequestContext
+from xiara.core.warmup import ServiceNotReady
+from xiara.core.llm_executor import Overloaded
+from xiara.core.session_store import session_store
 from shared.logging.logger import logger
 
 router = APIRouter()
-ambiguity_detector = AmbiguityDetector()
 negotiation_handler = NegotiationHandler()
 
-clarification_attempts = {}
+clarification_attempts = session_store("clarification_attempts")
+
+ERROR_RESPONSE = {
+    "agent": "Xiara",
+    "response": "Sorry, I encountered an error trying to respond to your request.",
+    "needs_clarification": False,
+    "is_negotiating": False,
+    "context": None
+}
 
 class ProductContext(BaseModel):
     product_id: Optional[str] = None
@@ -22,66 +35,94 @@ class ProductQueryRequest(BaseModel):
     prompt: str
     context: Optional[ProductContext] = None
 
+async def negotiate_or_clarify(request: ProductQueryRequest, ctx: Optional[RequestContext] = None) -> Optional[dict]:
+    """
+    Price negotiation and clarification turns, answered without the RAG pipeline.
+    Returns the response for those, or None when the prompt should be answered;
+    the ambiguity verdict is kept on `ctx` so the answer stage doesn't check again.
+    A verdict only the LLM can give is left to the answer's executor slot, and
+    the caller passes it to `clarify` afterwards.
+    """
+    ctx = ctx or RequestContext(request.prompt, request.userId)
+    # If context has product info, check for negotiation
+    if request.context and request.context.product_id and request.context.price:
+        with ctx.stage("negotiation"):
+            is_negotiating, intent = negotiation_handler.detect_negotiation_intent(request.prompt)
+        if is_negotiating:
+            response = await negotiation_handler.agenerate_response(
+                user_id=request.userId,
+                product_id=request.context.product_id,
+                original_price=request.context.price,
+                intent=intent
+            )
+            return {
+                "agent": "Xiara",
+                "response": response,
+                "needs_clarification": False,
+                "is_negotiating": True,
+                "context": request.context
+            }
+
+    # Ambiguity detection, without the LLM
+    await precheck_ambiguity(ctx)
+    return await clarify(request, ctx)
+
+async def clarify(request: ProductQueryRequest, ctx: RequestContext) -> Optional[dict]:
+    """The clarification response for an ambiguous verdict on `ctx`; None when clear or not checked yet."""
+    if ctx.ambiguity is None:
+        return None
+    attempts = await clarification_attempts.aget(request.userId, 0)
+    is_ambiguous, ambiguity_type = ctx.ambiguity
+
+    if is_ambiguous:
+        if attempts < 2:
+            clarification = ambiguity_detector.generate_clarification(
+                ambiguity_type,
+                attempt=attempts
+            )
+            await clarification_attempts.aset(request.userId, attempts + 1)
+            return {
+                "agent": "Xiara",
+                "response": clarification,
+                "needs_clarification": True,
+                "is_negotiating": False,
+                "context": request.context
+            }
+        else:
+            await clarification_attempts.adelete(request.userId)
+            return {
+                "agent": "Xiara",
+                "response": ambiguity_detector.get_fallback_response(),
+                "needs_clarification": True,
+                "is_negotiating": False,
+                "context": request.context
+            }
+
+    # Clear input - reset attempts and process normally
+    if attempts:
+        await clarification_attempts.adelete(request.userId)
+    return None
+
 @router.post("/chat", tags=["Xiara"])
-def product_chat(request: ProductQueryRequest):
+async def product_chat(request: ProductQueryRequest):
     """
     Handle product chat requests with ambiguity detection and price negotiation.
     """
     logger.info(f"Xiara received product chat from {request.userId}: {request.prompt}")
 
+    ctx = RequestContext(request.prompt, request.userId)
     try:
-        # If context has product info, check for negotiation
-        if request.context and request.context.product_id and request.context.price:
-            is_negotiating, intent = negotiation_handler.detect_negotiation_intent(request.prompt)
-            if is_negotiating:
-                response = negotiation_handler.generate_response(
-                    user_id=request.userId,
-                    product_id=request.context.product_id,
-                    original_price=request.context.price,
-                    intent=intent
-                )
-                return {
-                    "agent": "Xiara",
-                    "response": response,
-                    "needs_clarification": False,
-                    "is_negotiating": True,
-                    "context": request.context
-                }
-
-        # Ambiguity detection
-        attempts = clarification_attempts.get(request.userId, 0)
-        is_ambiguous, ambiguity_type = ambiguity_detector.is_ambiguous(
-            request.prompt,
-            user_id=request.userId
-        )
-
-        if is_ambiguous:
-            if attempts < 2:
-                clarification = ambiguity_detector.generate_clarification(
-                    ambiguity_type,
-                    attempt=attempts
-                )
-                clarification_attempts[request.userId] = attempts + 1
-                return {
-                    "agent": "Xiara",
-                    "response": clarification,
-                    "needs_clarification": True,
-                    "is_negotiating": False,
-                    "context": request.context
-                }
-            else:
-                clarification_attempts[request.userId] = 0
-                return {
-                    "agent": "Xiara",
-                    "response": ambiguity_detector.get_fallback_response(),
-                    "needs_clarification": True,
-                    "is_negotiating": False,
-                    "context": request.context
-                }
-
-        # Clear input - reset attempts and process normally
-        clarification_attempts[request.userId] = 0
-        answer = handle_product_query(request.prompt, user_id=request.userId)
+        early_response = await negotiate_or_clarify(request, ctx)
+        if early_response is not None:
+            return early_response
+
+        checked = ctx.ambiguity is not None
+        answer = await ahandle_product_query(request.prompt, user_id=request.userId, ctx=ctx)
+        # The LLM made the ambiguity check in the answer's executor slot
+        early_response = None if checked else await clarify(request, ctx)
+        if early_response is not None:
+            return early_response
+        logger.debug("Xiara stage timings for %s: %s", request.userId, ctx.timings_ms())
 
         # Try to extract product context from the answer (simple pattern matching)
         new_context = extract_product_context(answer)
@@ -95,15 +136,47 @@ def product_chat(request: ProductQueryRequest):
             "context": context
         }
 
+    except (ServiceNotReady, Overloaded):
+        raise
     except Exception as e:
         logger.error(f"Xiara failed to respond: {e}")
-        return {
-            "agent": "Xiara",
-            "response": "Sorry, I encountered an error trying to respond to your request.",
-            "needs_clarification": False,
-            "is_negotiating": False,
-            "context": None
-        }
+        return dict(ERROR_RESPONSE)
+
+@router.post("/chat/stream", tags=["Xiara"])
+async def product_chat_stream(request: ProductQueryRequest):
+    """
+    Like /chat, but streams the answer as Server-Sent Events: "token" events
+    while it is generated, then a "done" event with the full response, related
+    products and product context. Negotiation and clarification turns are sent
+    as a single "done" event.
+    """
+    logger.info(f"Xiara received streaming product chat from {request.userId}: {request.prompt}")
+
+    ctx = RequestContext(request.prompt, request.userId)
+    try:
+        early_response = await negotiate_or_clarify(request, ctx)
+        if early_response is None:
+            checked = ctx.ambiguity is not None
+            turn = await astream_product_query(request.prompt, user_id=request.userId, ctx=ctx)
+            # The LLM made the ambiguity check in the turn's executor slot
+            early_response = None if checked else await clarify(request, ctx)
+        if early_response is not None:
+            return StreamingResponse(
+                iter([sse_event("done", jsonable_encoder(early_response))]),
+                media_type="text/event-stream",
+            )
+    except (ServiceNotReady, Overloaded):
+        raise
+    except Exception as e:
+        logger.error(f"Xiara failed to respond: {e}")
+        return stream_error()
+
+    def done_fields(turn):
+        new_context = extract_product_context(turn.final_text())
+        context = ProductContext(**new_context) if new_context else request.context
+        return {"is_negotiating": False, "context": jsonable_encoder(context)}
+
+    return stream_answer(turn, done_fields)
 
 def extract_product_context(text: str) -> Optional[dict]:
     """
@@ -132,7 +205,6 @@ def extract_product_context(text: str) -> Optional[dict]:
 @router.delete("/reset/{user_id}", tags=["Xiara"])
 def reset_conversation(user_id: str):
     """Reset both clarification and negotiation state for a user."""
-    if user_id in clarification_attempts:
-        del clarification_attempts[user_id]
+    clarification_attempts.delete(user_id)
     negotiation_handler.reset_negotiation(user_id)
     return {"status": "success"}
\ No newline at end of file
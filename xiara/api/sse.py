@@ -0,0 +1,46 @@
+import json
+from typing import Callable, Optional
+
+from fastapi.responses import StreamingResponse
+from starlette.background import BackgroundTask
+
+from shared.logging.logger import logger
+from xiara.core.prompt_chain import StreamedAnswer
+
+ERROR_MESSAGE = "Sorry, I encountered an error trying to respond to your request."
+
+
+def sse_event(event: str, data: dict) -> str:
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+def stream_error() -> StreamingResponse:
+    """A stream that failed before its first token: a single "error" event, like a failure mid-stream."""
+    return StreamingResponse(iter([sse_event("error", {"agent": "Xiara", "detail": ERROR_MESSAGE})]),
+                             media_type="text/event-stream")
+
+
+def stream_answer(turn: StreamedAnswer, done_fields: Optional[Callable[[StreamedAnswer], dict]] = None):
+    """
+    Server-Sent Events response for a streamed answer: one "token" event per
+    generated chunk, then a "done" event with the full answer and the related
+    products. Memory and profile writes run after the response has been sent.
+    """
+    async def body():
+        try:
+            async for chunk in turn.events():
+                yield sse_event("token", {"text": chunk})
+        except Exception as e:
+            logger.error(f"Xiara failed to stream a response: {e}")
+            yield sse_event("error", {"agent": "Xiara", "detail": ERROR_MESSAGE})
+            return
+        extra = done_fields(turn) if done_fields else {}
+        yield sse_event("done", {"agent": "Xiara", "response": turn.final_text(), "products": turn.products,
+                                 "needs_clarification": turn.clarification, **extra})
+
+    return StreamingResponse(
+        body(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+        background=BackgroundTask(turn.save),
+    )
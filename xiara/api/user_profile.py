@@ -1,7 +1,7 @@
 from fastapi import APIRouter, HTTPException
 from pydantic import BaseModel
 from typing import List, Optional
-from xiara.core.user_profile_manager import get_user_profile, save_user_profile
+from xiara.core.user_profile_manager import UserProfile, aget_user_profile, aupdate_user_profile
 
 router = APIRouter(tags=["User Profile"])
 
@@ -23,30 +23,30 @@ class UserProfileRequest(BaseModel):
 
 
 @router.get("/user/{user_id}")
-def get_profile(user_id: str):
+async def get_profile(user_id: str):
     """Fetch a user's saved profile."""
-    profile = get_user_profile(user_id)
+    profile = await aget_user_profile(user_id)
     if not profile:
         raise HTTPException(status_code=404, detail="User profile not found")
     return dict(profile)
 
 @router.post("/user/{user_id}")
-def update_profile(user_id: str, request: UserProfileRequest):
+async def update_profile(user_id: str, request: UserProfileRequest):
     """Update or create a user's profile."""
-    profile = get_user_profile(user_id)
-    if not profile:
-        from xiara.core.user_profile_manager import UserProfile
-        profile = UserProfile(user_id=user_id)
-
-    # Apply updates if provided
-    if request.liked_categories is not None:
-        profile.liked_categories = request.liked_categories
-    if request.disliked_categories is not None:
-        profile.disliked_categories = request.disliked_categories
-    if request.preferred_price_range is not None:
-        profile.preferred_price_range = request.preferred_price_range
-    if request.purchase_intent is not None:
-        profile.purchase_intent = request.purchase_intent
-
-    save_user_profile(profile)
+    # Also migrates a legacy profile, so the field update below lands on the full hash
+    profile = await aget_user_profile(user_id) or UserProfile(user_id=user_id)
+
+    # Apply updates if provided; only these fields are written, history is left as it is
+    updates = {
+        name: value
+        for name, value in (
+            ("liked_categories", request.liked_categories),
+            ("disliked_categories", request.disliked_categories),
+            ("preferred_price_range", request.preferred_price_range),
+            ("purchase_intent", request.purchase_intent),
+        )
+        if value is not None
+    }
+    await aupdate_user_profile(user_id, **updates)
+    profile = profile.copy(update=updates)
     return {"message": "Profile updated successfully", "profile": dict(profile)}
@@ -0,0 +1,242 @@
+# xiara/core/ambiguity_classifier.py
+"""
+Embedding-based ambiguity classifier.
+
+Queries that name a product but no attribute ("recommend some shoes")
+used to go to the LLM with a YES/NO prompt on every request. Instead, a
+logistic regression over the shared MiniLM query embedding (the one
+retrieval computes anyway, cached by the embedding registry) gives the
+probability that the query is ambiguous: a dot product and a sigmoid,
+well under a millisecond. The model is trained offline from labeled queries
+(xiara/tools/train_ambiguity_classifier.py) and its scores calibrated
+(Platt scaling on a held-out split), then saved as plain arrays in an
+.npz file that is loaded once per process.
+
+AmbiguityGate makes the decision: confident scores are used as they are,
+only queries whose probability falls inside the uncertainty band
+(XIARA_AMBIGUITY_BAND_LOW..HIGH) are asked to the LLM, and every verdict
+is cached per normalized query. No model ships with the repo: until one is
+trained, or when it was trained on another embedding model, every query in
+that path is asked to the LLM, as before (still cached).
+"""
+
+import os
+import threading
+import time
+from typing import Callable, List, Optional, Sequence
+
+import numpy as np
+
+from shared.config.settings import settings
+from xiara.core.response_cache import TTLCache, normalize_query
+
+DEFAULT_MODEL_PATH = os.path.join(os.path.dirname(__file__), "ambiguity_model.npz")
+DEFAULT_TRAINING_PATH = os.path.join(os.path.dirname(__file__), "ambiguity_queries.jsonl")
+
+
+def _sigmoid(x):
+    return 1.0 / (1.0 + np.exp(-x))
+
+
+def fit_logistic(x: np.ndarray, y: np.ndarray, l2: float = 1.0, iterations: int = 50) -> np.ndarray:
+    """
+    L2-regularized logistic regression by Newton's method. Returns the
+    weights with the bias last (the bias is not regularized).
+    """
+    x1 = np.hstack([x, np.ones((len(x), 1))])
+    penalty = np.full(x1.shape[1], l2)
+    penalty[-1] = 0.0
+    w = np.zeros(x1.shape[1])
+    for _ in range(iterations):
+        p = _sigmoid(x1 @ w)
+        gradient = x1.T @ (p - y) + penalty * w
+        hessian = (x1.T * (p * (1 - p))) @ x1 + np.diag(penalty + 1e-9)
+        step = np.linalg.solve(hessian, gradient)
+        w -= step
+        if np.abs(step).max() < 1e-8:
+            break
+    return w
+
+
+class AmbiguityClassifier:
+    """Calibrated linear model: P(ambiguous) = sigmoid(scale * (w·x + b) + offset)."""
+
+    def __init__(self, weights: Sequence[float], bias: float, scale: float = 1.0, offset: float = 0.0,
+                 embedding_model: str = ""):
+        self.weights = np.asarray(weights, dtype=np.float32)
+        self.bias = float(bias)
+        self.scale = float(scale)
+        self.offset = float(offset)
+        self.embedding_model = embedding_model
+
+    def logit(self, vector) -> float:
+        return float(np.dot(self.weights, np.asarray(vector, dtype=np.float32))) + self.bias
+
+    def predict_proba(self, vector) -> float:
+        """Calibrated probability that the embedded query is ambiguous."""
+        return float(_sigmoid(self.scale * self.logit(vector) + self.offset))
+
+    @classmethod
+    def fit(cls, vectors, labels, l2: float = 1.0, calibration_fraction: float = 0.25,
+            seed: int = 0, embedding_model: str = "") -> "AmbiguityClassifier":
+        """
+        Train on `vectors` (one embedding per query) and `labels` (1 =
+        ambiguous). A held-out `calibration_fraction` of the queries fits
+        the Platt scaling; with too few of them (or a single class) the raw
+        scores are kept.
+        """
+        x = np.asarray(vectors, dtype=np.float64)
+        y = np.asarray(labels, dtype=np.float64)
+        order = np.random.default_rng(seed).permutation(len(x))
+        held_out = order[:int(len(x) * calibration_fraction)]
+        train = order[len(held_out):]
+        if len(held_out) < 10 or len(set(y[held_out])) < 2:
+            held_out, train = order[:0], order
+
+        w = fit_logistic(x[train], y[train], l2)
+        classifier = cls(w[:-1], w[-1], embedding_model=embedding_model)
+        if len(held_out):
+            logits = np.array([[classifier.logit(v)] for v in x[held_out]])
+            scale, offset = fit_logistic(logits, y[held_out], l2=1e-3)
+            classifier.scale, classifier.offset = float(scale), float(offset)
+        return classifier
+
+    def save(self, path: str):
+        np.savez(path, weights=self.weights, bias=self.bias, scale=self.scale, offset=self.offset,
+                 embedding_model=self.embedding_model)
+
+    @classmethod
+    def load(cls, path: str) -> "AmbiguityClassifier":
+        with np.load(path) as data:
+            return cls(data["weights"], data["bias"], data["scale"], data["offset"], str(data["embedding_model"]))
+
+
+_classifier: Optional[AmbiguityClassifier] = None
+_classifier_loaded = False
+_classifier_lock = threading.Lock()
+
+
+def get_classifier() -> Optional[AmbiguityClassifier]:
+    """
+    The configured model, loaded on first use; None when no model has been
+    trained, or it was trained on other embeddings than the shared model's.
+    """
+    global _classifier, _classifier_loaded
+    if not _classifier_loaded:
+        with _classifier_lock:
+            if not _classifier_loaded:
+                from xiara.core.model_registry import DEFAULT_EMBEDDING_MODEL
+
+                path = settings.XIARA_AMBIGUITY_MODEL_PATH or DEFAULT_MODEL_PATH
+                if os.path.exists(path):
+                    classifier = AmbiguityClassifier.load(path)
+                    if classifier.embedding_model == DEFAULT_EMBEDDING_MODEL:
+                        _classifier = classifier
+                    else:
+                        print(f"⚠️ Ambiguity classifier at {path} was trained on "
+                              f"{classifier.embedding_model or 'unknown'} embeddings, not {DEFAULT_EMBEDDING_MODEL}; "
+                              f"borderline queries go to the LLM")
+                else:
+                    print(f"⚠️ No ambiguity classifier at {path}; borderline queries go to the LLM")
+                _classifier_loaded = True
+    return _classifier
+
+
+def _embed_query(query: str) -> List[float]:
+    from xiara.core.model_registry import get_embeddings
+
+    return get_embeddings().embed_query(query)
+
+
+class AmbiguityGate:
+    """
+    Classifier first, the LLM only inside the uncertainty band, verdicts
+    cached per normalized query.
+    """
+
+    def __init__(self, classifier: Callable[[], Optional[AmbiguityClassifier]] = get_classifier,
+                 embed: Callable[[str], List[float]] = _embed_query,
+                 low: Optional[float] = None, high: Optional[float] = None,
+                 cache_size: Optional[int] = None, ttl: Optional[float] = None):
+        self._classifier = classifier
+        self._embed = embed
+        self.low = settings.XIARA_AMBIGUITY_BAND_LOW if low is None else low
+        self.high = settings.XIARA_AMBIGUITY_BAND_HIGH if high is None else high
+        self._verdicts = TTLCache(
+            settings.XIARA_AMBIGUITY_CACHE_SIZE if cache_size is None else cache_size,
+            settings.XIARA_AMBIGUITY_CACHE_TTL if ttl is None else ttl,
+        )
+        self._lock = threading.Lock()
+        self.cache_hits = 0
+        self.model_decisions = 0
+        self.llm_fallbacks = 0
+        self.unanswered = 0
+        self.scored = 0
+        self._model_seconds = 0.0
+
+    def check(self, query: str, llm_check: Callable[[str], Optional[bool]],
+              embed: Optional[Callable[[str], List[float]]] = None, key: Optional[str] = None) -> bool:
+        """
+        Whether `query` is ambiguous. `llm_check` is only called for
+        uncertain (or unscored) queries; a None from it (LLM unavailable)
+        counts as not ambiguous and is not cached. `embed` overrides how the
+        query is embedded (e.g. with a vector the request already has), and
+        `key` is the query's normalize_query form when already known.
+        """
+        key = key or normalize_query(query)
+        verdict = self._verdicts.get(key)
+        if verdict is not None:
+            with self._lock:
+                self.cache_hits += 1
+            return verdict
+
+        probability = self.probability(query, embed)
+        if probability is not None and not self.low < probability < self.high:
+            verdict = probability >= self.high
+            with self._lock:
+                self.model_decisions += 1
+        else:
+            verdict = llm_check(query)
+            with self._lock:
+                self.llm_fallbacks += 1
+                if verdict is None:
+                    self.unanswered += 1
+            if verdict is None:
+                return False
+        self._verdicts.set(key, verdict)
+        return verdict
+
+    def probability(self, query: str, embed: Optional[Callable[[str], List[float]]] = None) -> Optional[float]:
+        """Calibrated P(ambiguous), or None without a model (or if the query can't be embedded)."""
+        classifier = self._classifier()
+        if classifier is None:
+            return None
+        try:
+            vector = (embed or self._embed)(query)
+        except Exception as e:
+            print(f"⚠️ Ambiguity classifier skipped, embedding failed: {e}")
+            return None
+        start = time.perf_counter()
+        probability = classifier.predict_proba(vector)
+        with self._lock:
+            self.scored += 1
+            self._model_seconds += time.perf_counter() - start
+        return probability
+
+    def stats(self) -> dict:
+        loaded = self._classifier() is not None
+        with self._lock:
+            decided = self.model_decisions + self.llm_fallbacks
+            return {
+                "model_loaded": loaded,
+                "band": [self.low, self.high],
+                "cache_hits": self.cache_hits,
+                "model_decisions": self.model_decisions,
+                "llm_fallbacks": self.llm_fallbacks,
+                "llm_unanswered": self.unanswered,
+                "llm_fallback_rate": round(self.llm_fallbacks / decided, 4) if decided else 0.0,
+                "avg_model_us": round(self._model_seconds / self.scored * 1e6, 2) if self.scored else 0.0,
+            }
+
+
+ambiguity_gate = AmbiguityGate()
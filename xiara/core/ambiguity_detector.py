@@ -1,33 +1,43 @@
 import re
-from typing import Optional, Tuple, Dict, List
+from typing import Callable, Optional, Set, Tuple, Dict, List
+from xiara.core.ambiguity_classifier import ambiguity_gate
+from xiara.core.keyword_matcher import KeywordIndex, vocabulary
 from xiara.core.memory_manager import get_memory
-from xiara.core.llm_config import llm
+from xiara.core.session_store import session_store
+from xiara.core.llm_config import get_llm
+from xiara.core.warmup import llm_available
 
-class AmbiguityDetector:
-    def __init__(self):
-        # Common generic terms that usually mean "needs clarification"
-        self.GENERIC_TERMS = {
-            "something", "anything", "cheap", "affordable", "some", "recommend some",
-            "nice one", "good one", "suggest some", "give me something"
-        }
+# Per session: (messages already scanned, whether a human one named a product, start of the last one)
+_product_intent = session_store("product_intent", local=True)
 
-        # Words that often indicate a product request
-        self.PRODUCT_HINTS = {
-            "watch", "boots", "phone", "bag", "shoes", "laptop", "tv", "television",
-            "earphones", "headphones", "jacket", "shirt", "dress", "fridge", "refrigerator",
-            # Add beauty/personal care products
-            "cream", "lotion", "moisturizer", "soap", "shampoo", "deodorant",
-            # Add common brands
-            "nivea", "samsung", "apple", "nike", "adidas","apple","dell","hp","lenovo"
 
-        }
+class _LLMNeeded(Exception):
+    """Only the LLM can decide, and the caller asked not to call it yet."""
 
-        # Attributes / descriptors that reduce ambiguity
-        self.DESCRIPTORS = {
-            "waterproof", "wireless", "durable", "lightweight", "compact", "leather",
-            "wooden", "budget", "under", "brand", "luxury", "smart", "digital", 
-            "moisturizing", "hydrating", "anti-aging",
-        }
+
+def _defer_llm(query: str) -> Optional[bool]:
+    raise _LLMNeeded
+
+class AmbiguityDetector:
+    def __init__(self, vocabularies: Optional[Dict[str, List[str]]] = None):
+        # Term lists live in xiara/core/vocabularies.json ("ambiguity" group):
+        # generic terms usually mean "needs clarification", product hints indicate a product
+        # request, descriptors (attributes) reduce ambiguity
+        vocab = vocabularies or vocabulary("ambiguity")
+        self.GENERIC_TERMS = set(vocab["generic_terms"])
+        self.PRODUCT_HINTS = set(vocab["product_hints"])
+        self.BRANDS = set(vocab["brands"])
+        self.DESCRIPTORS = set(vocab["descriptors"])
+
+        # Every vocabulary in one index: a single pass over the query finds them all
+        self.keywords = KeywordIndex({
+            "generic": self.GENERIC_TERMS,
+            "product": self.PRODUCT_HINTS,
+            "brand": self.BRANDS,
+            "descriptor": self.DESCRIPTORS,
+            "price": vocab["price_terms"],
+            "quality": vocab["quality_terms"],
+        })
 
         # Clarification templates for different types of ambiguity
         self.clarification_templates = {
@@ -48,69 +58,108 @@ class AmbiguityDetector:
             ]
         }
 
-    def is_ambiguous(self, query: str, user_id: Optional[str] = None) -> Tuple[bool, Optional[str]]:
+    def assess(self, ctx, llm: bool = True) -> Optional[Tuple[bool, Optional[str]]]:
+        """
+        is_ambiguous for a request context: checked once per request (later
+        calls return the stored verdict), reusing its keyword hits and its
+        query embedding. With `llm=False` a query only the LLM can decide is
+        left unchecked (None), so the LLM call can run in the request's
+        executor slot.
         """
-        Detects if query is ambiguous using hybrid approach (rules → LLM → memory context).
+        if ctx.ambiguity is None:
+            with ctx.stage("ambiguity"):
+                if ctx.hits is None:
+                    ctx.hits = self.keywords.labels(ctx.lower)
+                try:
+                    ctx.ambiguity = self.is_ambiguous(ctx.query, ctx.user_id, hits=ctx.hits,
+                                                      embed=lambda _: ctx.embedding(), key=ctx.normalized,
+                                                      llm_check=None if llm else _defer_llm)
+                except _LLMNeeded:
+                    return None
+        return ctx.ambiguity
+
+    def is_ambiguous(self, query: str, user_id: Optional[str] = None, hits: Optional[Set[str]] = None,
+                     embed: Optional[Callable[[str], List[float]]] = None,
+                     key: Optional[str] = None,
+                     llm_check: Optional[Callable[[str], Optional[bool]]] = None) -> Tuple[bool, Optional[str]]:
+        """
+        Detects if query is ambiguous using hybrid approach (rules → classifier/LLM → memory context).
         Returns tuple of (is_ambiguous, ambiguity_type)
         """
         query_lower = query.strip().lower()
+        if hits is None:
+            hits = self.keywords.labels(query_lower)
 
         # If query contains both a brand and a product type, it's specific enough
-        words = set(query_lower.split())
-        has_brand = any(brand in words for brand in {"nivea", "samsung", "apple", "nike", "adidas", "dell", "hp", "lenovo"})
-        has_product = any(prod in words for prod in self.PRODUCT_HINTS)
-        
-        if has_brand and has_product:
+        if "product" in hits and "brand" in hits:
             return False, None
 
         # Check session memory for product intent
-        if user_id:
-            memory = get_memory(session_id=user_id)
-            if hasattr(memory, "chat_memory") and memory.chat_memory.messages:
-                for msg in reversed(memory.chat_memory.messages):
-                    if msg.type == "human":
-                        content_str = str(msg.content)
-                        if any(prod in content_str.lower() for prod in self.PRODUCT_HINTS):
-                            return False, None
+        if user_id and self.session_has_product_intent(user_id):
+            return False, None
 
         # Price-related ambiguity
-        if any(term in query_lower for term in ["cheap", "affordable", "budget", "cost", "price"]):
+        if "price" in hits:
             return True, 'price'
 
         # Quality-related ambiguity
-        if any(term in query_lower for term in ["best", "good", "quality", "top"]):
+        if "quality" in hits:
             return True, 'quality'
 
         # Generic ambiguity
-        if any(term in query_lower for term in self.GENERIC_TERMS):
+        if "generic" in hits:
             return True, 'generic'
 
         # Clear query with product + descriptor
-        if any(prod in query_lower for prod in self.PRODUCT_HINTS) and \
-           any(desc in query_lower for desc in self.DESCRIPTORS):
+        if "product" in hits and "descriptor" in hits:
             return False, None
 
-        # Product without descriptor - check with LLM
-        if any(prod in query_lower for prod in self.PRODUCT_HINTS):
-            is_ambiguous = self.llm_check(query_lower)
+        # Product without descriptor - embedding classifier, LLM only when it is unsure
+        if "product" in hits:
+            is_ambiguous = ambiguity_gate.check(query_lower, llm_check or self.llm_check, embed, key)
             return is_ambiguous, 'generic' if is_ambiguous else None
 
         # No product hints - ambiguous
         return True, 'generic'
 
-    def llm_check(self, query: str) -> bool:
-        """LLM-based ambiguity detection for borderline cases."""
+    def session_has_product_intent(self, user_id: str) -> bool:
+        """
+        Whether an earlier message of the session named a product. Cached per
+        session: each call only scans the messages added since the last one
+        (everything again if the history was cleared or summarized meanwhile).
+        """
+        memory = get_memory(session_id=user_id)
+        if not hasattr(memory, "chat_memory"):
+            return False
+        messages = memory.chat_memory.messages
+        scanned, found, last = _product_intent.get(user_id) or (0, False, None)
+        if scanned > len(messages) or (scanned and str(messages[scanned - 1].content)[:64] != last):
+            scanned, found = 0, False
+        if not found:
+            found = any(
+                msg.type == "human" and "product" in self.keywords.labels(str(msg.content))
+                for msg in messages[scanned:]
+            )
+        _product_intent[user_id] = (len(messages), found, str(messages[-1].content)[:64] if messages else None)
+        return found
+
+    def llm_check(self, query: str) -> Optional[bool]:
+        """LLM-based ambiguity detection for borderline cases (None when the LLM can't answer)."""
+        if not llm_available():
+            # Still warming up — don't block the request on the model load
+            return None
         try:
             prompt = (
                 f"Is the following shopping-related query ambiguous (multiple possible interpretations)? "
                 f"Answer only 'YES' or 'NO'. Query: '{query}'"
             )
-            response = llm.invoke(prompt)
-            answer = response.content.strip().upper()
+            response = get_llm().invoke(prompt)
+            # LlamaCpp returns a plain string, chat models a message
+            answer = str(getattr(response, "content", response)).strip().upper()
             return answer.startswith("Y")
         except Exception:
-            # If LLM fails, assume not ambiguous to avoid over-blocking
-            return False
+            # If LLM fails, callers assume not ambiguous to avoid over-blocking
+            return None
 
     def generate_clarification(self, ambiguity_type: str, attempt: int = 0) -> str:
         """
@@ -0,0 +1,216 @@
+# xiara/core/ann_index.py
+"""
+Approximate nearest-neighbour FAISS indexes for the product vectorstore.
+
+XIARA_INDEX_TYPE selects the index:
+- "flat":  exact search (IndexFlatL2), LangChain's default
+- "hnsw":  graph index (IndexHNSWFlat), no training
+- "ivfpq": inverted lists + product quantization (IndexIVFPQ), trained on a
+           sample of catalog vectors, compact and fast at large scale
+All use L2 distance, like LangChain's default FAISS vectorstore. Additions
+and deletions are applied in place. FAISS ids are row positions (LangChain
+and the docstore rely on it), so a removal shifts the later rows down: flat
+indexes do that themselves, IVF lists are renumbered after remove_ids. HNSW
+can't remove vectors; its deleted rows are kept and excluded from searches
+until they pass XIARA_HNSW_MAX_DELETED_FRACTION, then the index is rebuilt
+from the embedding cache. Saved indexes are opened memory-mapped so worker
+processes share the vectors through the OS page cache.
+"""
+
+import math
+import os
+import random
+from typing import Iterable, List, Optional
+
+import numpy as np
+
+from shared.config.settings import settings
+
+INDEX_TYPES = ("flat", "hnsw", "ivfpq")
+
+
+def _faiss():
+    import faiss
+
+    return faiss
+
+
+def index_type() -> str:
+    kind = settings.XIARA_INDEX_TYPE.lower()
+    if kind not in INDEX_TYPES:
+        raise ValueError(f"Unknown XIARA_INDEX_TYPE {kind!r}; expected one of {INDEX_TYPES}")
+    return kind
+
+
+def ivf_nlist(n_train: int) -> int:
+    """Number of IVF lists: configured, or ~4*sqrt(n) capped so each list gets 39+ training points."""
+    if settings.XIARA_IVF_NLIST > 0:
+        return settings.XIARA_IVF_NLIST
+    return max(1, min(int(4 * math.sqrt(n_train)), n_train // 39))
+
+
+def needs_training(kind: str) -> bool:
+    return kind == "ivfpq"
+
+
+def build_index(kind: str, dim: int, train_vectors: Optional[np.ndarray] = None):
+    """
+    Create an empty FAISS index of the given kind, trained if required.
+    Returns None for "flat" and when there are too few vectors to train,
+    in which case callers fall back to the exact index.
+    """
+    faiss = _faiss()
+    if kind == "hnsw":
+        index = faiss.IndexHNSWFlat(dim, settings.XIARA_HNSW_M)
+        index.hnsw.efConstruction = settings.XIARA_HNSW_EF_CONSTRUCTION
+        configure_search(index)
+        return index
+
+    if kind == "ivfpq":
+        if train_vectors is None:
+            return None
+        pq_m, nbits = settings.XIARA_PQ_M, settings.XIARA_PQ_NBITS
+        if dim % pq_m != 0:
+            raise ValueError(f"XIARA_PQ_M={pq_m} must divide the embedding dimension {dim}")
+        if len(train_vectors) < max(2 ** nbits, 39):
+            print(f"Only {len(train_vectors)} vectors to train IVF-PQ — using the exact index instead.")
+            return None
+        quantizer = faiss.IndexFlatL2(dim)
+        index = faiss.IndexIVFPQ(quantizer, dim, ivf_nlist(len(train_vectors)), pq_m, nbits)
+        index.train(np.ascontiguousarray(train_vectors, dtype=np.float32))
+        configure_search(index)
+        return index
+
+    return None
+
+
+def configure_search(index):
+    """Apply search-time parameters (efSearch / nprobe) from settings."""
+    faiss = _faiss()
+    index = faiss.downcast_index(index)
+    if isinstance(index, faiss.IndexHNSW):
+        index.hnsw.efSearch = settings.XIARA_HNSW_EF_SEARCH
+    elif isinstance(index, faiss.IndexIVF):
+        index.nprobe = settings.XIARA_IVF_NPROBE
+
+
+def search_parameters(index, selector):
+    """Per-query search parameters restricting results to `selector`, keeping configured efSearch/nprobe."""
+    faiss = _faiss()
+    inner = faiss.downcast_index(index)
+    if isinstance(inner, faiss.IndexHNSW):
+        return faiss.SearchParametersHNSW(sel=selector, efSearch=inner.hnsw.efSearch)
+    if isinstance(inner, faiss.IndexIVF):
+        return faiss.SearchParametersIVF(sel=selector, nprobe=inner.nprobe)
+    return faiss.SearchParameters(sel=selector)
+
+
+def read_index(path: str, mmap: bool = True):
+    """
+    Load a saved index. With mmap the vectors (flat codes, HNSW storage or
+    IVF lists) stay in the file and are paged in on demand; such an index
+    is read-only, so reopen it with mmap=False before adding or removing.
+    """
+    faiss = _faiss()
+    if not mmap:
+        index = faiss.read_index(path)
+    else:
+        flags = faiss.IO_FLAG_MMAP | faiss.IO_FLAG_READ_ONLY
+        try:
+            index = faiss.read_index(path, flags | getattr(faiss, "IO_FLAG_MMAP_IFC", 0))
+        except RuntimeError:
+            # IVF lists can't be read with both mmap flags
+            index = faiss.read_index(path, flags)
+    configure_search(index)
+    return index
+
+
+def write_index(index, path: str):
+    """Write an index atomically, so processes mapping the old file keep a consistent view."""
+    tmp_path = f"{path}.tmp"
+    _faiss().write_index(index, tmp_path)
+    os.replace(tmp_path, path)
+
+
+def removal_mode(index) -> Optional[str]:
+    """
+    How rows are deleted from this index in place: "remove" (flat and IVF
+    indexes drop them, see remove_rows), "mark" (HNSW keeps them, searches
+    exclude them) or None when the index has to be rebuilt.
+    """
+    faiss = _faiss()
+    inner = faiss.downcast_index(index)
+    if isinstance(inner, (faiss.IndexFlat, faiss.IndexIVF)):
+        return "remove"
+    if isinstance(inner, faiss.IndexHNSW):
+        return "mark"
+    return None
+
+
+def remove_rows(index, rows: np.ndarray):
+    """
+    Remove rows from a flat or IVF index (a private copy, not a mapped one);
+    later rows move down to keep ids equal to row positions. Flat remove_ids compacts by itself. IVF leaves
+    the ids in its lists as they were (an IndexIDMap2 wrapper doesn't help,
+    the lists still hold the old labels), so they are renumbered here.
+    """
+    faiss = _faiss()
+    rows = np.unique(np.asarray(rows, dtype=np.int64))
+    inner = faiss.downcast_index(index)
+    total = inner.ntotal
+    inner.remove_ids(faiss.IDSelectorBatch(rows))
+    if not isinstance(inner, faiss.IndexIVF):
+        return
+    kept = np.setdiff1d(np.arange(total, dtype=np.int64), rows)
+    lists = inner.invlists
+    for list_no in range(inner.nlist):
+        size = lists.list_size(list_no)
+        if size:
+            ids = faiss.rev_swig_ptr(lists.get_ids(list_no), size)
+            ids[:] = np.searchsorted(kept, ids)
+    if inner.direct_map.type != faiss.DirectMap.NoMap:
+        inner.make_direct_map(True)
+
+
+def excluding(index, rows: np.ndarray):
+    """Search parameters that skip the given rows (deleted HNSW rows), or None if there are none."""
+    if rows is None or not len(rows):
+        return None
+    faiss = _faiss()
+    return search_parameters(index, faiss.IDSelectorNot(faiss.IDSelectorBatch(rows)))
+
+
+def reservoir_sample(items: Iterable, k: int, seed: int = 0) -> List:
+    """Uniform sample of k items from a stream of unknown length."""
+    rng = random.Random(seed)
+    sample = []
+    for i, item in enumerate(items):
+        if i < k:
+            sample.append(item)
+        else:
+            j = rng.randint(0, i)
+            if j < k:
+                sample[j] = item
+    return sample
+
+
+def create_vectorstore(embedding_model, sample_texts: List[str], kind: Optional[str] = None):
+    """
+    Empty LangChain FAISS vectorstore backed by a configured ANN index.
+    `sample_texts` is the training sample; it is embedded through the (cached)
+    embedding model, so the vectors are reused when the catalog is added.
+    Returns None when the exact index should be used.
+    """
+    kind = kind or index_type()
+    if kind == "flat" or not sample_texts:
+        return None
+    from langchain_community.docstore.in_memory import InMemoryDocstore
+    from langchain_community.vectorstores import FAISS
+
+    # Untrained indexes only need the dimension, so embed a single text
+    texts = sample_texts if needs_training(kind) else sample_texts[:1]
+    vectors = np.asarray(embedding_model.embed_documents(texts), dtype=np.float32)
+    index = build_index(kind, vectors.shape[1], vectors if needs_training(kind) else None)
+    if index is None:
+        return None
+    return FAISS(embedding_model, index, InMemoryDocstore(), {})
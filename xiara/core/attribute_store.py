@@ -0,0 +1,353 @@
+# xiara/core/attribute_store.py
+"""
+Columnar store of structured product attributes for pre-filtered retrieval.
+
+Each indexed product row keeps its price, brand and category in NumPy
+columns alongside its content-addressed row key (see index_manifest). A
+sorted price index answers range queries with two binary searches and
+packed per-value bitmaps answer brand/category membership, so a parsed
+constraint like "nivea lotion under ₦5,000" becomes an exact candidate id
+set before any vector search happens.
+"""
+
+import json
+import os
+import re
+from dataclasses import dataclass, field
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+import numpy as np
+
+ATTRIBUTES_FILE = "attributes.npz"
+VOCAB_FILE = "attributes_vocab.json"
+
+PRICE_FIELDS = {"price", "amount", "cost", "unit_price", "selling_price"}
+BRAND_FIELDS = {"brand", "manufacturer", "make"}
+CATEGORY_FIELDS = {"category", "department", "product_type"}
+NAME_FIELDS = {"product_name", "name", "title", "product name"}
+
+# Currency markers of prices and budgets, by ISO code. Amounts in different currencies aren't compared
+CURRENCY_MARKERS = {"₦": "NGN", "ngn": "NGN", "naira": "NGN", "$": "USD", "usd": "USD", "dollar": "USD",
+                    "dollars": "USD", "£": "GBP", "gbp": "GBP", "€": "EUR", "eur": "EUR"}
+_CURRENCY = re.compile(r"[₦$£€]|\b(?:ngn|naira|usd|dollars?|gbp|eur)\b", re.I)
+
+# Used to infer a brand from the product name when the data has no brand column
+KNOWN_BRANDS = {
+    "nivea", "samsung", "apple", "nike", "adidas", "dell", "hp", "lenovo",
+    "puma", "reebok", "sony", "lg", "tecno", "infinix", "xiaomi", "oraimo",
+}
+
+
+def parse_price(value) -> Optional[float]:
+    """Parse "₦20,000", "$79", "20k" or a number into a float price."""
+    if value is None:
+        return None
+    if isinstance(value, (int, float)):
+        return None if value != value else float(value)
+    text = str(value).strip().lower()
+    match = re.search(r"(\d[\d,]*(?:\.\d+)?)\s*(k)?\b", text)
+    if not match:
+        return None
+    amount = float(match.group(1).replace(",", ""))
+    return amount * 1000 if match.group(2) else amount
+
+
+def parse_currency(value) -> Optional[str]:
+    """ISO code of the currency a price is written in ("₦20,000" -> "NGN"), None when it has no marker."""
+    if value is None or isinstance(value, (int, float)):
+        return None
+    match = _CURRENCY.search(str(value))
+    return CURRENCY_MARKERS[match.group(0).lower()] if match else None
+
+
+def _normalize(value) -> Optional[str]:
+    if value is None:
+        return None
+    text = str(value).strip().lower()
+    return text if text and text not in {"nan", "none", "null"} else None
+
+
+def attribute_columns(columns: Iterable) -> List:
+    """The columns of a table that carry structured attributes."""
+    wanted = PRICE_FIELDS | BRAND_FIELDS | CATEGORY_FIELDS | NAME_FIELDS
+    return [c for c in columns if str(c).strip().lower() in wanted]
+
+
+def extract_attributes(fields: Dict[str, object]) -> Dict[str, object]:
+    """Pick price/brand/category/name out of a product's raw fields, by column name."""
+    attrs: Dict[str, object] = {}
+    for key, value in fields.items():
+        name = str(key).strip().lower()
+        if name in PRICE_FIELDS and "price" not in attrs:
+            price = parse_price(value)
+            if price is not None:
+                attrs["price"] = price
+                currency = parse_currency(value)
+                if currency:
+                    attrs["currency"] = currency
+        elif name in BRAND_FIELDS and _normalize(value):
+            attrs["brand"] = _normalize(value)
+        elif name in CATEGORY_FIELDS and _normalize(value):
+            attrs["category"] = _normalize(value)
+        elif name in NAME_FIELDS and _normalize(value):
+            attrs["name"] = str(value).strip()
+
+    if "brand" not in attrs and "name" in attrs:
+        words = set(re.findall(r"[a-z0-9]+", attrs["name"].lower()))
+        brands = words & KNOWN_BRANDS
+        if len(brands) == 1:
+            attrs["brand"] = brands.pop()
+    return attrs
+
+
+@dataclass
+class Constraints:
+    """Structured filters parsed from a query and/or a user profile."""
+    min_price: Optional[float] = None
+    max_price: Optional[float] = None
+    brands: Set[str] = field(default_factory=set)
+    categories: Set[str] = field(default_factory=set)
+    exclude_categories: Set[str] = field(default_factory=set)
+    currency: Optional[str] = None  # of the price bounds; None when unmarked
+
+    def is_empty(self) -> bool:
+        return (self.min_price is None and self.max_price is None and not self.brands
+                and not self.categories and not self.exclude_categories)
+
+    def merged(self, other: Optional["Constraints"]) -> "Constraints":
+        """Combine with another set; this one's price bounds and brands win."""
+        if other is None:
+            return self
+        return Constraints(
+            min_price=self.min_price if self.min_price is not None else other.min_price,
+            max_price=self.max_price if self.max_price is not None else other.max_price,
+            brands=self.brands or other.brands,
+            categories=self.categories or other.categories,
+            exclude_categories=self.exclude_categories | other.exclude_categories,
+            currency=self.currency or other.currency,
+        )
+
+
+_BUDGET_MAX = re.compile(r"\b(?:under|below|less than|cheaper than|max(?:imum)?|up to|within)\s*[₦$£€]?\s*(\d[\d,]*(?:\.\d+)?\s*k?)\b", re.I)
+_BUDGET_MIN = re.compile(r"\b(?:over|above|more than|at least|from)\s*[₦$£€]?\s*(\d[\d,]*(?:\.\d+)?\s*k?)\b", re.I)
+_BUDGET_RANGE = re.compile(r"\bbetween\s*[₦$£€]?\s*(\d[\d,]*\s*k?)\s*(?:and|-|to)\s*[₦$£€]?\s*(\d[\d,]*\s*k?)\b", re.I)
+_PRICE_RANGE = re.compile(r"[₦$£€]?\s*(\d[\d,]*\s*k?)\s*(?:-|to)\s*[₦$£€]?\s*(\d[\d,]*\s*k?)")
+# A currency written after the amount: "under 5,000 naira"
+_CURRENCY_AFTER = re.compile(r"\s*(?:ngn|naira|usd|dollars?|gbp|eur)\b", re.I)
+
+
+def parse_budget(text: str) -> Tuple[Optional[float], Optional[float]]:
+    """(min, max) price asked for in free text: "under ₦5,000", "between 10k and 20k", ..."""
+    lowered = text.lower()
+    match = _BUDGET_RANGE.search(lowered)
+    if match:
+        return parse_price(match.group(1)), parse_price(match.group(2))
+    high, low = _BUDGET_MAX.search(lowered), _BUDGET_MIN.search(lowered)
+    return (parse_price(low.group(1)) if low else None), (parse_price(high.group(1)) if high else None)
+
+
+def budget_currency(text: str) -> Optional[str]:
+    """ISO code of the currency a budget is written in ("under ₦5,000" -> "NGN"), None when unmarked."""
+    lowered = text.lower()
+    for pattern in (_BUDGET_RANGE, _BUDGET_MAX, _BUDGET_MIN):
+        match = pattern.search(lowered)
+        if match:
+            after = _CURRENCY_AFTER.match(lowered, match.end())
+            return parse_currency(match.group(0) + (after.group(0) if after else ""))
+    return None
+
+
+def parse_price_range(text: Optional[str]):
+    """Parse a profile price range like "₦20000 - ₦50000" into (min, max)."""
+    if not text:
+        return None, None
+    match = _PRICE_RANGE.search(text)
+    if match:
+        return parse_price(match.group(1)), parse_price(match.group(2))
+    return None, parse_price(text)
+
+
+class AttributeStore:
+    def __init__(self):
+        self.row_keys: List[str] = []
+        self.chunk_counts = np.zeros(0, dtype=np.int32)
+        self.prices = np.zeros(0, dtype=np.float64)
+        self.brands = np.zeros(0, dtype=np.int32)
+        self.categories = np.zeros(0, dtype=np.int32)
+        self.currencies = np.zeros(0, dtype=np.int32)
+        self.brand_vocab: Dict[str, int] = {}
+        self.category_vocab: Dict[str, int] = {}
+        self.currency_vocab: Dict[str, int] = {}
+        self._pending: List[tuple] = []
+        self._removed: Set[str] = set()
+        self._reindex()
+
+    # ---------- building ----------
+
+    def add(self, key: str, metadata: Dict[str, object], chunk_count: int):
+        """Queue a row; call finalize() once a batch of changes is complete."""
+        self._pending.append((key, metadata, chunk_count))
+
+    def remove(self, keys: Iterable[str]):
+        self._removed.update(keys)
+
+    @staticmethod
+    def _code(vocab: Dict[str, int], value) -> int:
+        value = _normalize(value)
+        if value is None:
+            return -1
+        return vocab.setdefault(value, len(vocab))
+
+    def finalize(self):
+        """Apply queued additions/removals and rebuild the price index and bitmaps."""
+        if not self._pending and not self._removed:
+            return
+        keep = np.array([k not in self._removed for k in self.row_keys], dtype=bool)
+        new = [p for p in self._pending if p[0] not in self._removed]
+        self.row_keys = [k for k, alive in zip(self.row_keys, keep) if alive] + [p[0] for p in new]
+        self.chunk_counts = np.concatenate([self.chunk_counts[keep], np.array([p[2] for p in new], dtype=np.int32)])
+        new_prices = [p[1].get("price") for p in new]
+        self.prices = np.concatenate([
+            self.prices[keep], np.array([np.nan if v is None else v for v in new_prices], dtype=np.float64)
+        ])
+        self.brands = np.concatenate([
+            self.brands[keep], np.array([self._code(self.brand_vocab, p[1].get("brand")) for p in new], dtype=np.int32)
+        ])
+        self.categories = np.concatenate([
+            self.categories[keep],
+            np.array([self._code(self.category_vocab, p[1].get("category")) for p in new], dtype=np.int32),
+        ])
+        self.currencies = np.concatenate([
+            self.currencies[keep],
+            np.array([self._code(self.currency_vocab, p[1].get("currency")) for p in new], dtype=np.int32),
+        ])
+        self._pending, self._removed = [], set()
+        self._reindex()
+
+    def _reindex(self):
+        known = np.flatnonzero(~np.isnan(self.prices))
+        order = known[np.argsort(self.prices[known], kind="stable")]
+        self._price_order = order
+        self._sorted_prices = self.prices[order]
+        self._brand_bitmaps = self._bitmaps(self.brands, len(self.brand_vocab))
+        self._category_bitmaps = self._bitmaps(self.categories, len(self.category_vocab))
+
+    def _bitmaps(self, codes: np.ndarray, size: int) -> Dict[int, np.ndarray]:
+        return {code: np.packbits(codes == code) for code in range(size) if (codes == code).any()}
+
+    def __len__(self) -> int:
+        return len(self.row_keys)
+
+    def replace_with(self, other: "AttributeStore"):
+        """Take over another store's rows in place, so holders of this store see them."""
+        self.__dict__.update(vars(other))
+
+    # ---------- persistence ----------
+
+    def save(self, index_path: str):
+        os.makedirs(index_path, exist_ok=True)
+        tmp = os.path.join(index_path, f"tmp_{ATTRIBUTES_FILE}")
+        np.savez(tmp, row_keys=np.array(self.row_keys, dtype=object).astype(str),
+                 chunk_counts=self.chunk_counts, prices=self.prices,
+                 brands=self.brands, categories=self.categories, currencies=self.currencies)
+        os.replace(tmp, os.path.join(index_path, ATTRIBUTES_FILE))
+        with open(os.path.join(index_path, VOCAB_FILE), "w", encoding="utf-8") as f:
+            json.dump({"brands": self.brand_vocab, "categories": self.category_vocab,
+                       "currencies": self.currency_vocab}, f)
+
+    @classmethod
+    def load(cls, index_path: str) -> Optional["AttributeStore"]:
+        path = os.path.join(index_path, ATTRIBUTES_FILE)
+        vocab_path = os.path.join(index_path, VOCAB_FILE)
+        if not (os.path.exists(path) and os.path.exists(vocab_path)):
+            return None
+        store = cls()
+        with np.load(path) as data:
+            store.row_keys = data["row_keys"].tolist()
+            store.chunk_counts = data["chunk_counts"]
+            store.prices = data["prices"]
+            store.brands = data["brands"]
+            store.categories = data["categories"]
+            # Stores saved before currencies were tracked: every price unmarked
+            store.currencies = data["currencies"] if "currencies" in data.files else \
+                np.full(len(store.row_keys), -1, dtype=np.int32)
+        with open(vocab_path, "r", encoding="utf-8") as f:
+            vocab = json.load(f)
+        store.brand_vocab, store.category_vocab = vocab["brands"], vocab["categories"]
+        store.currency_vocab = vocab.get("currencies", {})
+        store._reindex()
+        return store
+
+    # ---------- querying ----------
+
+    def parse_query(self, text: str, budget: Optional[Tuple[Optional[float], Optional[float]]] = None) -> Constraints:
+        """Extract a budget (unless already parsed) and any known brand/category names from free text."""
+        constraints = Constraints()
+        lowered = text.lower()
+        constraints.min_price, constraints.max_price = budget if budget is not None else parse_budget(lowered)
+        constraints.currency = budget_currency(lowered)
+
+        words = set(re.findall(r"[a-z0-9&'-]+", lowered))
+        singular = {w[:-1] for w in words if w.endswith("s")}
+        constraints.brands = {b for b in self.brand_vocab if b in words}
+        constraints.categories = {c for c in self.category_vocab if c in words or c in singular or
+                                  (" " in c and c in lowered)}
+        return constraints
+
+    def _mask(self, bitmaps: Dict[int, np.ndarray], vocab: Dict[str, int], values: Set[str]) -> Optional[np.ndarray]:
+        codes = [vocab[v] for v in values if v in vocab and vocab[v] in bitmaps]
+        if not codes:
+            return None
+        mask = np.zeros_like(next(iter(bitmaps.values())))
+        for code in codes:
+            mask |= bitmaps[code]
+        return mask
+
+    def candidate_rows(self, constraints: Constraints) -> Optional[np.ndarray]:
+        """
+        Row positions matching all constraints, or None if nothing constrains
+        the search. Constraints on a column with no known values are ignored.
+        A budget in one currency only selects among prices in that currency
+        (or unmarked ones), and is ignored when no price is comparable.
+        """
+        n = len(self.row_keys)
+        if constraints.is_empty() or n == 0:
+            return None
+        mask = None
+
+        if (constraints.min_price is not None or constraints.max_price is not None) and len(self._price_order):
+            lo = 0 if constraints.min_price is None else np.searchsorted(self._sorted_prices, constraints.min_price, "left")
+            hi = len(self._sorted_prices) if constraints.max_price is None else \
+                np.searchsorted(self._sorted_prices, constraints.max_price, "right")
+            selected = np.zeros(n, dtype=bool)
+            selected[self._price_order[lo:hi]] = True
+            comparable = self._comparable_prices(constraints.currency)
+            if comparable is None:
+                mask = np.packbits(selected)
+            elif comparable[self._price_order].any():
+                mask = np.packbits(selected & comparable)
+
+        for bitmaps, vocab, values in ((self._brand_bitmaps, self.brand_vocab, constraints.brands),
+                                       (self._category_bitmaps, self.category_vocab, constraints.categories)):
+            part = self._mask(bitmaps, vocab, values) if values else None
+            if part is not None:
+                mask = part if mask is None else mask & part
+
+        excluded = self._mask(self._category_bitmaps, self.category_vocab, constraints.exclude_categories)
+        if excluded is not None:
+            mask = (np.packbits(np.ones(n, dtype=bool)) if mask is None else mask) & ~excluded
+
+        if mask is None:
+            return None
+        return np.flatnonzero(np.unpackbits(mask, count=n))
+
+    def _comparable_prices(self, currency: Optional[str]) -> Optional[np.ndarray]:
+        """Rows whose price can be compared with an amount in `currency` (None: all of them)."""
+        if currency is None:
+            return None
+        code = self.currency_vocab.get(_normalize(currency), -2)
+        return (self.currencies == code) | (self.currencies == -1)
+
+    def docstore_ids(self, rows: np.ndarray) -> List[str]:
+        """Docstore ids ("<row key>:<chunk no>") of every chunk of the given rows."""
+        return [f"{self.row_keys[r]}:{i}" for r in rows for i in range(int(self.chunk_counts[r]))]
@@ -0,0 +1,246 @@
+# xiara/core/compact_docstore.py
+"""
+Pickle-free, memory-mapped docstore for the product FAISS index.
+
+LangChain's FAISS.save_local pickles every Document, so each worker process
+unpickles its own copy of the catalog. Here the docstore is written as flat
+files next to index.faiss and opened with mmap, so all workers share the
+OS page cache and a document is only decoded when it is returned:
+
+- docstore.blob          JSON records ({"page_content", "metadata"}) back to back
+- docstore_offsets.npy   int64 offsets into the blob, n + 1 entries, FAISS row order
+- docstore_ids.npy       fixed-width docstore ids, FAISS row order
+- docstore_order.npy     argsort of the ids, for vectorized id -> row lookups
+
+Documents added or deleted after loading live in a small in-memory overlay
+until the next save. Rows deleted from an HNSW index stay in it (see
+ann_index), so they are saved as empty records with an empty id.
+
+The four files are replaced one at a time, so a reader opening them while
+they are written could pair new offsets with an old blob. Callers hold a
+lock across writes and opens (vectorstore_loader.locked_index, checked
+there); once open, a docstore keeps reading the files it mapped.
+"""
+
+import json
+import mmap
+import os
+from collections.abc import Mapping
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+from langchain_community.docstore.base import AddableMixin, Docstore
+from langchain_core.documents import Document
+
+BLOB_FILE = "docstore.blob"
+OFFSETS_FILE = "docstore_offsets.npy"
+IDS_FILE = "docstore_ids.npy"
+ORDER_FILE = "docstore_order.npy"
+DOCSTORE_FILES = (BLOB_FILE, OFFSETS_FILE, IDS_FILE, ORDER_FILE)
+
+# Docstore id of a FAISS row whose vector is still in the index but deleted
+DELETED_ROW = ""
+
+
+class IdIndex:
+    """Docstore ids in FAISS row order, with binary-search lookups over the mmapped arrays."""
+
+    def __init__(self, ids: np.ndarray, order: np.ndarray):
+        self.ids = ids
+        self.order = order
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def id_at(self, row: int) -> str:
+        return self.ids[row].decode("utf-8")
+
+    def find_many(self, doc_ids: List[str]) -> np.ndarray:
+        """Rows of the given ids, -1 where an id is not stored."""
+        if not doc_ids or len(self.ids) == 0:
+            return np.full(len(doc_ids), -1, dtype=np.int64)
+        width = self.ids.dtype.itemsize
+        encoded = [d.encode("utf-8") for d in doc_ids]
+        keys = np.array(encoded, dtype=self.ids.dtype)
+        pos = np.searchsorted(self.ids, keys, sorter=self.order)
+        rows = self.order[np.minimum(pos, len(self.order) - 1)]
+        found = (pos < len(self.order)) & (self.ids[rows] == keys)
+        found &= np.array([len(e) <= width for e in encoded], dtype=bool)  # longer ids were truncated
+        return np.where(found, rows, -1).astype(np.int64)
+
+    def find(self, doc_id: str) -> int:
+        return int(self.find_many([doc_id])[0])
+
+
+class BlobArray:
+    """Variable-length records in one mmapped blob, addressed by an offsets array."""
+
+    def __init__(self, blob_path: str, offsets: np.ndarray):
+        self.offsets = offsets
+        self._file = open(blob_path, "rb")
+        size = os.fstat(self._file.fileno()).st_size
+        self._blob = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ) if size else b""
+
+    def __len__(self) -> int:
+        return len(self.offsets) - 1
+
+    def __getitem__(self, row: int) -> bytes:
+        return self._blob[int(self.offsets[row]):int(self.offsets[row + 1])]
+
+    def close(self):
+        """Unmap the blob; no record can be read afterwards."""
+        if isinstance(self._blob, mmap.mmap):
+            self._blob.close()
+        self._file.close()
+
+
+class CompactDocstore(Docstore, AddableMixin):
+    """Docstore over the mmapped files, decoding Documents on access."""
+
+    def __init__(self, ids: Optional[IdIndex] = None, records: Optional[BlobArray] = None):
+        self._ids = ids
+        self._records = records
+        self._added: Dict[str, Document] = {}
+        self._deleted = set()
+
+    def close(self):
+        """Release the mapped files of a docstore that has been replaced."""
+        if self._records is not None:
+            self._records.close()
+
+    def _base_row(self, doc_id: str) -> int:
+        if self._ids is None or doc_id == DELETED_ROW or doc_id in self._deleted:
+            return -1
+        return self._ids.find(doc_id)
+
+    def _decode(self, row: int) -> Document:
+        record = json.loads(self._records[row])
+        return Document(page_content=record["page_content"], metadata=record["metadata"])
+
+    def search(self, search: str):
+        if search in self._added:
+            return self._added[search]
+        row = self._base_row(search)
+        if row < 0:
+            return f"ID {search} not found."
+        return self._decode(row)
+
+    def add(self, texts: Dict[str, Document]) -> None:
+        overlapping = {doc_id for doc_id in texts if doc_id in self._added or self._base_row(doc_id) >= 0}
+        if overlapping:
+            raise ValueError(f"Tried to add ids that already exist: {overlapping}")
+        self._added.update(texts)
+
+    def delete(self, ids: List) -> None:
+        missing = []
+        for doc_id in ids:
+            if self._added.pop(doc_id, None) is not None:
+                continue
+            if self._base_row(doc_id) >= 0:
+                self._deleted.add(doc_id)
+            else:
+                missing.append(doc_id)
+        if missing:
+            raise ValueError(f"Tried to delete ids that does not exist: {missing}")
+
+
+class RowIdMap(Mapping):
+    """
+    FAISS row -> docstore id mapping (LangChain's index_to_docstore_id)
+    read from the mmapped ids; rows appended after loading are kept in memory.
+    """
+
+    def __init__(self, ids: IdIndex):
+        self._ids = ids
+        self._extra: Dict[int, str] = {}
+
+    def __getitem__(self, row: int) -> str:
+        if row in self._extra:
+            return self._extra[row]
+        if 0 <= row < len(self._ids):
+            return self._ids.id_at(row)
+        raise KeyError(row)
+
+    def __setitem__(self, row: int, doc_id: str):
+        self._extra[row] = doc_id
+
+    def update(self, other=(), **kwargs):
+        self._extra.update(other, **kwargs)
+
+    def __len__(self) -> int:
+        return len(self._ids) + sum(1 for row in self._extra if row >= len(self._ids))
+
+    def __iter__(self):
+        yield from range(len(self._ids))
+        yield from sorted(row for row in self._extra if row >= len(self._ids))
+
+    def rows_for(self, doc_ids: List[str]) -> np.ndarray:
+        """FAISS rows of the given docstore ids (missing ids are skipped)."""
+        rows = self._ids.find_many(doc_ids)
+        if self._extra:
+            reverse = {doc_id: row for row, doc_id in self._extra.items()}
+            rows = np.array([reverse.get(d, r) for d, r in zip(doc_ids, rows)], dtype=np.int64)
+        return rows[rows >= 0]
+
+    def deleted_rows(self) -> np.ndarray:
+        """Rows kept in the index but deleted (HNSW), sorted."""
+        rows = set(np.flatnonzero(self._ids.ids == DELETED_ROW.encode("utf-8")).tolist())
+        for row, doc_id in self._extra.items():
+            if doc_id == DELETED_ROW:
+                rows.add(row)
+            else:
+                rows.discard(row)
+        return np.array(sorted(rows), dtype=np.int64)
+
+
+def write_docstore(path: str, docstore, index_to_docstore_id: Mapping) -> int:
+    """
+    Write the documents of a vectorstore, in FAISS row order, as the flat
+    docstore files. Works from any LangChain docstore. Returns the row count.
+    """
+    os.makedirs(path, exist_ok=True)
+    ids: List[bytes] = []
+    offsets = [0]
+    blob_tmp = os.path.join(path, f"tmp_{BLOB_FILE}")
+    with open(blob_tmp, "wb") as blob:
+        for row in range(len(index_to_docstore_id)):
+            doc_id = index_to_docstore_id[row]
+            if doc_id == DELETED_ROW:
+                record = b""
+            else:
+                doc = docstore.search(doc_id)
+                if not isinstance(doc, Document):
+                    raise ValueError(f"Could not find document for id {doc_id}, got {doc}")
+                record = json.dumps({"page_content": doc.page_content, "metadata": doc.metadata},
+                                    ensure_ascii=False).encode("utf-8")
+            blob.write(record)
+            offsets.append(offsets[-1] + len(record))
+            ids.append(doc_id.encode("utf-8"))
+
+    id_array = np.array(ids, dtype=f"S{max((len(i) for i in ids), default=1)}")
+    arrays = {
+        OFFSETS_FILE: np.array(offsets, dtype=np.int64),
+        IDS_FILE: id_array,
+        ORDER_FILE: np.argsort(id_array, kind="stable").astype(np.int64),
+    }
+    for name, array in arrays.items():
+        tmp = os.path.join(path, f"tmp_{name}")
+        with open(tmp, "wb") as f:
+            np.save(f, array)
+        os.replace(tmp, os.path.join(path, name))
+    os.replace(blob_tmp, os.path.join(path, BLOB_FILE))
+    return len(ids)
+
+
+def load_docstore(path: str) -> Optional[Tuple[CompactDocstore, RowIdMap]]:
+    """Open the flat docstore files with mmap, or None if they are missing."""
+    if not all(os.path.exists(os.path.join(path, name)) for name in DOCSTORE_FILES):
+        return None
+    offsets = np.load(os.path.join(path, OFFSETS_FILE), mmap_mode="r")
+    ids = IdIndex(np.load(os.path.join(path, IDS_FILE), mmap_mode="r"),
+                  np.load(os.path.join(path, ORDER_FILE), mmap_mode="r"))
+    if len(offsets) != len(ids) + 1:
+        return None
+    records = BlobArray(os.path.join(path, BLOB_FILE), offsets)
+    return CompactDocstore(ids, records), RowIdMap(ids)
+
@@ -0,0 +1,292 @@
+# xiara/core/embedding_cache.py
+"""
+Embedding cache for Xiara.
+
+Wraps a LangChain embeddings model so that:
+- document vectors are persisted in an append-only, memory-mapped store on
+  disk, keyed by the SHA-1 of the text, and reused across rebuilds;
+- query vectors are kept in a bounded in-process LRU.
+Only texts that have never been seen reach the underlying model.
+
+Vectors of edited or deleted products stay in the store until the index
+loader compacts it against the indexed texts (XIARA_EMBEDDING_CACHE_MAX_STALE).
+"""
+
+import contextlib
+import hashlib
+import json
+import os
+import re
+import threading
+from collections import OrderedDict
+from typing import Dict, Iterable, List, Optional
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+from shared.config.settings import settings
+
+try:  # POSIX only — serializes appends from several worker processes
+    import fcntl
+except ImportError:  # pragma: no cover - Windows dev machines
+    fcntl = None
+
+DEFAULT_CACHE_DIR = os.path.join(os.path.dirname(__file__), "embedding_cache")
+
+
+def text_key(text: str) -> str:
+    return hashlib.sha1(text.encode("utf-8")).hexdigest()
+
+
+class VectorStoreFile:
+    """
+    Append-only store of float32 vectors on disk.
+    `keys.txt` holds one text hash per line; row i of `vectors.f32` is its vector.
+    Reads go through np.memmap so the OS page cache is shared between workers.
+
+    `compact()` rewrites the store as a new generation (`keys.<n>.txt`,
+    `vectors.<n>.f32`) and then points `meta.json` at it, so other processes
+    never read a half-written file: they switch over on their next refresh.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.meta_path = os.path.join(path, "meta.json")
+        self.lock_path = os.path.join(path, ".lock")
+        self.dim: Optional[int] = None
+        self.generation = 0
+        self.keys_path, self.vectors_path = self._files(0)
+        self.rows: Dict[str, int] = {}
+        self._row_count = 0
+        self._keys_offset = 0
+        self._mmap = None
+        self._lock = threading.Lock()
+        os.makedirs(path, exist_ok=True)
+        self._refresh()
+
+    def _files(self, generation: int) -> tuple:
+        suffix = f".{generation}" if generation else ""
+        return os.path.join(self.path, f"keys{suffix}.txt"), os.path.join(self.path, f"vectors{suffix}.f32")
+
+    def _read_meta(self) -> dict:
+        if not os.path.exists(self.meta_path):
+            return {}
+        with open(self.meta_path, "r", encoding="utf-8") as f:
+            return json.load(f)
+
+    def _write_meta(self, generation: int):
+        tmp = f"{self.meta_path}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump({"dim": self.dim, "generation": generation}, f)
+        os.replace(tmp, self.meta_path)
+
+    def _vector_rows_on_disk(self) -> int:
+        if self.dim is None or not os.path.exists(self.vectors_path):
+            return 0
+        return os.path.getsize(self.vectors_path) // (self.dim * 4)
+
+    def _refresh(self):
+        """Pick up keys appended since the last read, or a compacted generation (possibly by another process)."""
+        meta = self._read_meta()
+        self.dim = meta.get("dim", self.dim)
+        generation = meta.get("generation", 0)
+        if generation != self.generation:
+            self.generation, self.rows, self._row_count, self._keys_offset, self._mmap = generation, {}, 0, 0, None
+            self.keys_path, self.vectors_path = self._files(generation)
+        try:
+            if not os.path.exists(self.keys_path):
+                return
+            complete_rows = self._vector_rows_on_disk()
+            rows, row_count, offset = {}, self._row_count, self._keys_offset
+            with open(self.keys_path, "r", encoding="utf-8") as f:
+                f.seek(offset)
+                for line in iter(f.readline, ""):
+                    if not line.endswith("\n") or row_count >= complete_rows:
+                        break
+                    rows.setdefault(line.strip(), row_count)
+                    row_count += 1
+                    offset = f.tell()
+            if row_count != self._row_count:
+                # Mapped now, so the mapping always matches `rows` even if the files are replaced later
+                self._mmap = np.memmap(self.vectors_path, dtype=np.float32, mode="r", shape=(row_count, self.dim))
+                for key, row in rows.items():
+                    self.rows.setdefault(key, row)
+                self._row_count, self._keys_offset = row_count, offset
+        except FileNotFoundError:
+            # Compacted by another process between reading meta.json and the files
+            if self._read_meta().get("generation", 0) != self.generation:
+                self._refresh()
+
+    def get_many(self, keys: List[str]) -> List[Optional[List[float]]]:
+        with self._lock:
+            if any(key not in self.rows for key in keys):
+                self._refresh()
+            if not self.rows:
+                return [None] * len(keys)
+            vectors = self._mmap
+            return [vectors[self.rows[k]].tolist() if k in self.rows else None for k in keys]
+
+    @contextlib.contextmanager
+    def _exclusive(self):
+        """This store, locked against other threads and processes."""
+        with self._lock, open(self.lock_path, "a") as lock_file:
+            if fcntl:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                if fcntl:
+                    fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def put_many(self, keys: List[str], vectors: List[List[float]]):
+        if not keys:
+            return
+        array = np.asarray(vectors, dtype=np.float32)
+        with self._exclusive():
+            self._refresh()
+            if self.dim is None:
+                self.dim = int(array.shape[1])
+                self._write_meta(self.generation)
+            fresh = [i for i, key in enumerate(keys) if key not in self.rows]
+            fresh = list({keys[i]: i for i in fresh}.values())
+            if not fresh:
+                return
+            # Vectors first, then keys: a crash leaves at worst unreferenced bytes
+            with open(self.vectors_path, "ab") as f:
+                f.seek(0, os.SEEK_END)
+                f.truncate(self._row_count * self.dim * 4)
+                f.write(array[fresh].tobytes())
+            with open(self.keys_path, "a", encoding="utf-8") as f:
+                f.write("".join(f"{keys[i]}\n" for i in fresh))
+            self._refresh()
+
+    def compact(self, live_keys: Iterable[str]) -> int:
+        """Rewrite the store with only the vectors of `live_keys`. Returns how many were dropped."""
+        with self._exclusive():
+            self._refresh()
+            keep = [key for key in dict.fromkeys(live_keys) if key in self.rows]
+            dropped = len(self.rows) - len(keep)
+            if not dropped:
+                return 0
+            old_files = (self.keys_path, self.vectors_path)
+            keys_path, vectors_path = self._files(self.generation + 1)
+            with open(vectors_path, "wb") as f:
+                if keep:
+                    f.write(np.ascontiguousarray(self._mmap[[self.rows[key] for key in keep]]).tobytes())
+            with open(keys_path, "w", encoding="utf-8") as f:
+                f.write("".join(f"{key}\n" for key in keep))
+            self._write_meta(self.generation + 1)
+            for old in old_files:
+                # Processes still mapping the old vectors keep reading them until they refresh
+                with contextlib.suppress(OSError):
+                    os.remove(old)
+            self._refresh()
+            return dropped
+
+    def __len__(self) -> int:
+        return len(self.rows)
+
+
+class QueryLRU:
+    """Bounded, thread-safe LRU of query text hash -> vector."""
+
+    def __init__(self, maxsize: int):
+        self.maxsize = maxsize
+        self._data: "OrderedDict[str, List[float]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[List[float]]:
+        with self._lock:
+            vector = self._data.get(key)
+            if vector is not None:
+                self._data.move_to_end(key)
+            return vector
+
+    def put(self, key: str, vector: List[float]):
+        if self.maxsize <= 0:
+            return
+        with self._lock:
+            self._data[key] = vector
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+
+class CachedEmbeddings(Embeddings):
+    """LangChain Embeddings that only call the wrapped model on cache misses."""
+
+    def __init__(self, model: Embeddings, cache_dir: str, query_cache_size: int = 1024):
+        self.model = model
+        self.documents = VectorStoreFile(cache_dir)
+        self.queries = QueryLRU(query_cache_size)
+        self._counts = {"document_hits": 0, "document_misses": 0, "query_hits": 0, "query_misses": 0}
+        self._counts_lock = threading.Lock()
+
+    def _count(self, name: str, n: int = 1):
+        with self._counts_lock:
+            self._counts[name] += n
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        keys = [text_key(t) for t in texts]
+        vectors = self.documents.get_many(keys)
+        missing = [i for i, v in enumerate(vectors) if v is None]
+        self._count("document_hits", len(texts) - len(missing))
+        self._count("document_misses", len(missing))
+
+        if missing:
+            # Duplicate texts in one batch are embedded once
+            unique = list({keys[i]: i for i in missing}.values())
+            fresh = self.model.embed_documents([texts[i] for i in unique])
+            by_key = {keys[i]: vec for i, vec in zip(unique, fresh)}
+            self.documents.put_many(list(by_key), list(by_key.values()))
+            for i in missing:
+                vectors[i] = by_key[keys[i]]
+        return vectors
+
+    def embed_query(self, text: str) -> List[float]:
+        key = text_key(text)
+        vector = self.queries.get(key)
+        if vector is not None:
+            self._count("query_hits")
+            return vector
+        self._count("query_misses")
+        vector = self.model.embed_query(text)
+        self.queries.put(key, vector)
+        return vector
+
+    def embed_queries(self, texts: List[str]) -> List[List[float]]:
+        """Embed several queries, computing all LRU misses in one model call."""
+        keys = [text_key(t) for t in texts]
+        vectors = [self.queries.get(key) for key in keys]
+        missing = [i for i, v in enumerate(vectors) if v is None]
+        self._count("query_hits", len(texts) - len(missing))
+        self._count("query_misses", len(missing))
+        if missing:
+            unique = list({keys[i]: i for i in missing}.values())
+            fresh = self.model.embed_documents([texts[i] for i in unique])
+            by_key = {keys[i]: vec for i, vec in zip(unique, fresh)}
+            for key, vector in by_key.items():
+                self.queries.put(key, vector)
+            for i in missing:
+                vectors[i] = by_key[keys[i]]
+        return vectors
+
+    def stats(self) -> dict:
+        with self._counts_lock:
+            counts = dict(self._counts)
+        counts["documents_stored"] = len(self.documents)
+        counts["queries_cached"] = len(self.queries)
+        return counts
+
+
+def cache_dir_for(model_name: str) -> str:
+    slug = re.sub(r"[^a-zA-Z0-9_.-]", "_", model_name)
+    return os.path.join(settings.XIARA_EMBEDDING_CACHE_DIR or DEFAULT_CACHE_DIR, slug)
+
+
+def cached_embeddings(model: Embeddings, model_name: str) -> CachedEmbeddings:
+    """Wrap an embeddings model with the configured document store and query LRU."""
+    return CachedEmbeddings(model, cache_dir_for(model_name), settings.XIARA_QUERY_CACHE_SIZE)
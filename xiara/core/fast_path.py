@@ -0,0 +1,202 @@
+# xiara/core/fast_path.py
+"""
+Retrieval-only answers for simple catalog lookups.
+
+"how much is the Samsung A15" or "show me nivea lotion under ₦5,000" are
+answered by the retrieved products themselves; a llama.cpp generation adds
+seconds and nothing the product rows don't already say. After retrieval,
+a lookup whose intent is enabled in XIARA_FAST_PATH_INTENTS is answered
+from a template filled with the matching products' structured fields:
+
+* price: "how much is X", "price of X", "what does X cost"
+* list: "show me X", "do you have X", "any X under ₦5,000"
+
+Anything that asks for judgement ("which is better", "recommend", "compare")
+is left to the LLM, and so is a lookup whose retrieved products don't
+actually match: every word of the subject must appear in a product, and
+listed products must be within the asked budget. A budget is only
+compared with prices in its own currency: "under ₦5,000" against a "$15"
+product goes to the LLM. Every decision is counted, so
+/xiara/debug/pipeline shows the share of retrieval turns the fast path
+takes off the LLM.
+"""
+
+import re
+import threading
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from xiara.core.attribute_store import (
+    NAME_FIELDS, PRICE_FIELDS, budget_currency, parse_budget, parse_currency, parse_price,
+)
+from xiara.core.prompt_assembler import product_fields
+from xiara.core.query_rewriter import BUDGET, FILLER
+
+INTENTS = {
+    "price": re.compile(r"\b(?:how much|price of|prices? for|cost of|what does .+ cost)\b", re.IGNORECASE),
+    "list": re.compile(
+        r"^\s*(?:please\s+)?(?:show me|list|find me|find|do you (?:have|sell|stock)|have you got|got any|any)\b",
+        re.IGNORECASE),
+}
+
+# Questions that need the model's judgement or explanation, whatever their phrasing
+NEEDS_GENERATION = re.compile(
+    r"\b(?:compare|comparison|vs|versus|differences?|better|best|recommend\w*|suggest\w*|should|which|why|"
+    r"worth|reviews?|good for|explain|how to|how do|how does|features?|specs?|warranty)\b",
+    re.IGNORECASE,
+)
+
+# Words of a lookup that don't name what is looked up
+_INTENT_WORDS = re.compile(
+    r"\b(?:how much|price of|prices? for|cost of|prices?|cost|costs|what|does|do|is|are|the|a|an|of|for|me|"
+    r"find|list|sell|stock|got|you|your|have|some|in stock|available|in|with|on|and|or|to|one|ones)\b",
+    re.IGNORECASE,
+)
+
+MAX_LISTED = 3
+
+
+def lookup_intent(query: str) -> Optional[str]:
+    """"price", "list" or None when the query isn't a plain lookup."""
+    if NEEDS_GENERATION.search(query):
+        return None
+    for intent, pattern in INTENTS.items():
+        if pattern.search(query):
+            return intent
+    return None
+
+
+def _words(text: str) -> List[str]:
+    # Singular forms, so "lotions" matches "Lotion"
+    return [w[:-1] if len(w) > 3 and w.endswith("s") and not w.endswith("ss") else w
+            for w in re.findall(r"[a-z0-9]+", text.lower())]
+
+
+def subject_terms(question: str) -> List[str]:
+    """The words naming what is looked up: the question without intent words, filler and budget."""
+    text = BUDGET.sub(" ", question)
+    text = _INTENT_WORDS.sub(" ", FILLER.sub(" ", text))
+    return list(dict.fromkeys(_words(text)))
+
+
+def _field(doc, names) -> Optional[str]:
+    for key, value in product_fields(doc.page_content):
+        if key.lower().replace("_", " ") in names or key.lower() in names:
+            if value and value.lower() not in ("none", "null", "nan"):
+                return value
+    return None
+
+
+def product_name(doc) -> str:
+    name = (doc.metadata or {}).get("name") or _field(doc, NAME_FIELDS)
+    return str(name).strip() if name else " ".join(doc.page_content.split())[:60]
+
+
+def product_price(doc) -> Tuple[Optional[float], Optional[str], Optional[str]]:
+    """(price, price as the catalog writes it, currency) — "$79" stays "$79"."""
+    shown = _field(doc, PRICE_FIELDS)
+    price = (doc.metadata or {}).get("price")
+    if price is None and shown:
+        price = parse_price(shown)
+    if shown is None and price is not None:
+        shown = f"{price:,.0f}" if float(price).is_integer() else f"{price:,.2f}"
+    return price, shown, (doc.metadata or {}).get("currency") or parse_currency(shown)
+
+
+def _verb(name: str) -> str:
+    """ "is" or "are" for a product name: "The SoundBeat Headphones are ..." """
+    last = name.split()[-1].lower() if name.split() else ""
+    return "are" if last.endswith("s") and not last.endswith(("ss", "us", "is")) and len(last) > 3 else "is"
+
+
+def _matches(doc, terms: Sequence[str]) -> bool:
+    words = set(_words(doc.page_content + " " + " ".join(str(v) for v in (doc.metadata or {}).values())))
+    return all(term in words for term in terms)
+
+
+def _within(price: Optional[float], budget: Tuple[Optional[float], Optional[float]]) -> bool:
+    low, high = budget
+    if low is None and high is None:
+        return True
+    if price is None:
+        return False
+    return (low is None or price >= low) and (high is None or price <= high)
+
+
+class FastPath:
+    """Answers enabled lookup intents from retrieved products, and counts how often it could."""
+
+    def __init__(self, intents: Sequence[str] = ()):
+        self.intents = {intent for intent in intents if intent in INTENTS}
+        self._lock = threading.Lock()
+        self.considered = 0
+        self.served: Dict[str, int] = {intent: 0 for intent in INTENTS}
+        self.fallbacks: Dict[str, int] = {"not_lookup": 0, "disabled": 0, "currency": 0, "no_match": 0}
+
+    def _record(self, served: Optional[str] = None, fallback: Optional[str] = None):
+        with self._lock:
+            self.considered += 1
+            if served:
+                self.served[served] += 1
+            else:
+                self.fallbacks[fallback] += 1
+
+    def answer(self, query: str, question: str, documents: Sequence,
+               budget: Optional[Tuple[Optional[float], Optional[float]]] = None) -> Optional[str]:
+        """
+        The templated answer to `query` (the user's message) from the
+        `documents` retrieved for `question`, or None to generate one.
+        `budget` is parse_budget(question) when the caller already has it.
+        """
+        intent = lookup_intent(query)
+        if intent is None or NEEDS_GENERATION.search(question):
+            self._record(fallback="not_lookup")
+            return None
+        if intent not in self.intents:
+            self._record(fallback="disabled")
+            return None
+
+        terms = subject_terms(question)
+        budget = budget if budget is not None else parse_budget(question)
+        currency = budget_currency(question) if budget != (None, None) else None
+        found, seen = [], set()
+        for doc in documents:
+            name = product_name(doc)
+            if name.lower() in seen or not terms or not _matches(doc, terms):
+                continue
+            price, shown, price_currency = product_price(doc)
+            if currency is not None and price_currency != currency:
+                # The budget can't be checked against this price without the LLM
+                self._record(fallback="currency")
+                return None
+            if not _within(price, budget) or (intent == "price" and shown is None):
+                continue
+            seen.add(name.lower())
+            found.append((name, shown))
+        if not found:
+            self._record(fallback="no_match")
+            return None
+
+        self._record(served=intent)
+        if intent == "price" and len(found) == 1:
+            return f"The {found[0][0]} {_verb(found[0][0])} {found[0][1]}."
+        lines = [f"- {name}" + (f": {shown}" if shown else "") for name, shown in found[:MAX_LISTED]]
+        lead = "Here are the prices I found:" if intent == "price" else "Here's what I found:"
+        return lead + "\n" + "\n".join(lines)
+
+    def stats(self) -> dict:
+        with self._lock:
+            served = sum(self.served.values())
+            return {
+                "enabled": sorted(self.intents),
+                "considered": self.considered,
+                "served": dict(self.served),
+                "fallbacks": dict(self.fallbacks),
+                "offload_rate": round(served / self.considered, 4) if self.considered else 0.0,
+            }
+
+
+def fast_path() -> FastPath:
+    """A fast path with the intents enabled in settings."""
+    from shared.config.settings import settings
+
+    return FastPath([intent.strip().lower() for intent in settings.XIARA_FAST_PATH_INTENTS.split(",") if intent.strip()])
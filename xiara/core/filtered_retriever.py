@@ -0,0 +1,177 @@
+# xiara/core/filtered_retriever.py
+"""
+Retriever that narrows the candidate set with structured product attributes
+before vector search.
+
+Budget, brand and category constraints parsed from the question (and,
+softly, from the user's profile) select rows in the AttributeStore; only
+those rows' chunks are scored. Small candidate sets are ranked exactly,
+larger ones go through the ANN index with an id selector.
+"""
+
+from typing import Any, List, Optional
+
+import numpy as np
+from langchain_core.callbacks import CallbackManagerForRetrieverRun
+from langchain_core.documents import Document
+from langchain_core.retrievers import BaseRetriever
+
+from shared.config.settings import settings
+from xiara.core.ann_index import excluding, search_parameters
+from xiara.core.attribute_store import AttributeStore, Constraints
+from xiara.core.index_access import index_access
+
+_reverse_ids = {"cached": (None, 0, {})}
+# Search parameters skipping the deleted HNSW rows, rebuilt when the deleted rows change
+_exclusion = {"cached": (None, None)}
+
+
+def faiss_ids_for(vectorstore, docstore_ids: List[str]) -> np.ndarray:
+    """Map docstore ids to FAISS row ids (reverse map cached until the index changes)."""
+    mapping = vectorstore.index_to_docstore_id
+    if hasattr(mapping, "rows_for"):
+        # Mapped docstore: binary search over the shared id file, no per-worker dict
+        return mapping.rows_for(docstore_ids)
+    cached, size, reverse = _reverse_ids["cached"]
+    # A strong reference: an id() could be reused by a later mapping
+    if cached is not mapping or size != len(mapping):
+        reverse = {doc_id: i for i, doc_id in mapping.items()}
+        _reverse_ids["cached"] = (mapping, len(mapping), reverse)
+    return np.array([reverse[d] for d in docstore_ids if d in reverse], dtype=np.int64)
+
+
+def _excluding_deleted(vectorstore):
+    rows = getattr(vectorstore, "deleted_rows", None)
+    cached_rows, params = _exclusion["cached"]
+    if cached_rows is not rows:
+        params = excluding(vectorstore.index, rows)
+        _exclusion["cached"] = (rows, params)
+    return params
+
+
+def embed_queries(embeddings, queries: List[str]) -> np.ndarray:
+    """Embed queries in one call where the model supports it (CachedEmbeddings does)."""
+    batch = getattr(embeddings, "embed_queries", None)
+    vectors = batch(queries) if batch else [embeddings.embed_query(q) for q in queries]
+    return np.asarray(vectors, dtype=np.float32)
+
+
+def _query_matrix(vectorstore, queries: List[str]) -> np.ndarray:
+    import faiss
+
+    vectors = embed_queries(vectorstore.embedding_function, queries)
+    if getattr(vectorstore, "_normalize_L2", False):
+        faiss.normalize_L2(vectors)
+    return vectors
+
+
+def _documents(vectorstore, faiss_ids) -> List[Document]:
+    docs = []
+    for i in faiss_ids:
+        if i == -1:
+            continue
+        doc = vectorstore.docstore.search(vectorstore.index_to_docstore_id[int(i)])
+        if isinstance(doc, Document):
+            docs.append(doc)
+    return docs
+
+
+def search_subset(vectorstore, query: str, faiss_ids: np.ndarray, k: int,
+                  vector: Optional[np.ndarray] = None) -> List[Document]:
+    """Top-k documents for a query among the given FAISS ids only."""
+    import faiss
+
+    if vector is None:
+        vector = _query_matrix(vectorstore, [query])
+    index = vectorstore.index
+
+    picked = None
+    if len(faiss_ids) <= settings.XIARA_PREFILTER_EXACT_MAX:
+        try:
+            candidates = index.reconstruct_batch(faiss_ids)
+            distances = ((candidates - vector) ** 2).sum(axis=1)
+            picked = faiss_ids[np.argsort(distances, kind="stable")[:k]].tolist()
+        except RuntimeError:
+            picked = None  # index can't reconstruct (e.g. IVF-PQ without a direct map)
+    if picked is None:
+        params = search_parameters(index, faiss.IDSelectorBatch(faiss_ids))
+        _, found = index.search(vector, k, params=params)
+        picked = found[0].tolist()
+    return _documents(vectorstore, picked)
+
+
+def candidate_rows(store: Optional[AttributeStore], query: str,
+                   profile: Optional[Constraints], k: int, ctx=None) -> Optional[np.ndarray]:
+    """
+    Attribute-store rows allowed by constraints parsed from the query, or
+    None for an unconstrained search. Profile constraints are applied only
+    while they still leave k candidates. `ctx` (a RequestContext) supplies
+    the budget when it has already been parsed.
+    """
+    if store is None or len(store) == 0:
+        return None
+    query_constraints = store.parse_query(query, ctx.budget_for(query) if ctx is not None else None)
+    rows = None
+    for constraints in (query_constraints.merged(profile), query_constraints):
+        rows = store.candidate_rows(constraints)
+        if rows is None or len(rows) >= k:
+            break
+    return rows
+
+
+def filtered_search(vectorstore, store: Optional[AttributeStore], query: str,
+                    profile: Optional[Constraints] = None, k: int = 4, ctx=None) -> List[Document]:
+    """Vector search restricted by constraints parsed from the query."""
+    return filtered_search_many(vectorstore, store, [query], profile, k, ctx)[0]
+
+
+def filtered_search_many(vectorstore, store: Optional[AttributeStore], queries: List[str],
+                         profile: Optional[Constraints] = None, k: int = 4, ctx=None) -> List[List[Document]]:
+    """
+    filtered_search for several queries: they are embedded in one batch and
+    all unconstrained ones are answered by a single multi-vector FAISS search.
+    The search runs under index_access, so index updates never show half-applied.
+    """
+    if not queries:
+        return []
+    vectors = _query_matrix(vectorstore, queries)
+    results: List[List[Document]] = [[] for _ in queries]
+    unconstrained = []
+    with index_access.read():
+        for i, query in enumerate(queries):
+            rows = candidate_rows(store, query, profile, k, ctx)
+            if rows is None:
+                unconstrained.append(i)
+                continue
+            faiss_ids = faiss_ids_for(vectorstore, store.docstore_ids(rows))
+            if len(faiss_ids):
+                results[i] = search_subset(vectorstore, query, faiss_ids, k, vector=vectors[i:i + 1])
+        if unconstrained:
+            _, found = vectorstore.index.search(vectors[unconstrained], k, params=_excluding_deleted(vectorstore))
+            for i, row in zip(unconstrained, found):
+                results[i] = _documents(vectorstore, row)
+    return results
+
+
+class FilteredRetriever(BaseRetriever):
+    vectorstore: Any
+    store: Any = None
+    profile: Any = None
+    k: int = 4
+    ctx: Any = None
+
+    def _get_relevant_documents(self, query: str, *, run_manager: CallbackManagerForRetrieverRun) -> List[Document]:
+        return filtered_search(self.vectorstore, self.store, query, self.profile, self.k, self.ctx)
+
+    def retrieve_many(self, queries: List[str]) -> List[List[Document]]:
+        """Documents for several queries with one embedding batch and one FAISS search."""
+        return filtered_search_many(self.vectorstore, self.store, queries, self.profile, self.k, self.ctx)
+
+    def with_profile(self, profile: Optional[Constraints], k: Optional[int] = None,
+                     ctx=None) -> "FilteredRetriever":
+        """
+        A per-request copy carrying the user's profile constraints (and
+        optionally its own depth and the request's context).
+        """
+        return FilteredRetriever(vectorstore=self.vectorstore, store=self.store, profile=profile, k=k or self.k,
+                                 ctx=ctx)
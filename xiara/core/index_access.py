@@ -0,0 +1,57 @@
+# xiara/core/index_access.py
+"""
+Read/write lock between product index searches and index updates.
+
+Request threads search the FAISS index, its docstore and the
+AttributeStore together; the index watcher adds and deletes rows in all
+three and swaps freshly loaded ones in. Searches hold `index_access`
+shared, so they run concurrently with each other, and updates hold it
+exclusively, only around the in-memory mutations (embedding new rows and
+writing files happen outside it). A waiting update blocks new searches,
+so a steady stream of requests can't starve the watcher.
+"""
+
+import threading
+from contextlib import contextmanager
+
+
+class ReadWriteLock:
+    def __init__(self):
+        self._cond = threading.Condition(threading.Lock())
+        self._readers = 0
+        self._writer = False
+        self._writers_waiting = 0
+
+    @contextmanager
+    def read(self):
+        with self._cond:
+            while self._writer or self._writers_waiting:
+                self._cond.wait()
+            self._readers += 1
+        try:
+            yield
+        finally:
+            with self._cond:
+                self._readers -= 1
+                if not self._readers:
+                    self._cond.notify_all()
+
+    @contextmanager
+    def write(self):
+        with self._cond:
+            self._writers_waiting += 1
+            try:
+                while self._writer or self._readers:
+                    self._cond.wait()
+            finally:
+                self._writers_waiting -= 1
+            self._writer = True
+        try:
+            yield
+        finally:
+            with self._cond:
+                self._writer = False
+                self._cond.notify_all()
+
+
+index_access = ReadWriteLock()
@@ -0,0 +1,135 @@
+# xiara/core/index_manifest.py
+"""
+Content-addressed manifest for the product FAISS index.
+
+Tracks, per data file, a stat fingerprint, a content hash and the hash of
+every product row mapped to the FAISS docstore ids of its chunks. The
+vectorstore loader diffs the data directory against it so only added,
+changed or deleted rows are embedded and applied to the index.
+"""
+
+import hashlib
+import json
+import os
+from typing import Dict, Iterable, List, Optional
+
+MANIFEST_FILE = "manifest.json"
+MANIFEST_VERSION = 1
+
+
+def file_fingerprint(path: str) -> List[float]:
+    """Cheap change check: [size, mtime] of a file."""
+    stat = os.stat(path)
+    return [stat.st_size, stat.st_mtime]
+
+
+def file_digest(path: str) -> str:
+    """SHA-256 of a file's bytes, read in blocks."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def row_keys(source: str, contents: Iterable[str], seen: Optional[Dict[str, int]] = None) -> List[str]:
+    """
+    Content-addressed keys for the rows of one file.
+    Identical rows within the same file get an occurrence suffix so each
+    one keeps its own entry. Pass the same `seen` dict across calls to key
+    a file batch by batch.
+    """
+    keys = []
+    seen = {} if seen is None else seen
+    for content in contents:
+        key = hashlib.sha1(f"{source}\0{content}".encode("utf-8")).hexdigest()
+        count = seen.get(key, 0)
+        seen[key] = count + 1
+        keys.append(key if count == 0 else f"{key}#{count}")
+    return keys
+
+
+class IndexManifest:
+    def __init__(self, files: Optional[Dict[str, dict]] = None, index_type: str = "flat"):
+        self.files: Dict[str, dict] = files or {}
+        self.index_type = index_type
+
+    @classmethod
+    def load(cls, index_path: str) -> Optional["IndexManifest"]:
+        """Load the manifest stored next to an index, or None if missing/unreadable."""
+        path = os.path.join(index_path, MANIFEST_FILE)
+        if not os.path.exists(path):
+            return None
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if data.get("version") != MANIFEST_VERSION:
+            return None
+        return cls(data.get("files", {}), data.get("index_type", "flat"))
+
+    def save(self, index_path: str):
+        """Write the manifest atomically next to the index."""
+        os.makedirs(index_path, exist_ok=True)
+        path = os.path.join(index_path, MANIFEST_FILE)
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"version": MANIFEST_VERSION, "index_type": self.index_type, "files": self.files}, f)
+        os.replace(tmp_path, path)
+
+    def is_unchanged(self, name: str, fingerprint: List[float]) -> bool:
+        entry = self.files.get(name)
+        return entry is not None and entry.get("stat") == fingerprint
+
+    def has_digest(self, name: str, digest: str) -> bool:
+        entry = self.files.get(name)
+        return entry is not None and entry.get("sha256") == digest
+
+    def touch(self, name: str, fingerprint: List[float]):
+        """Record a new stat fingerprint for a file whose content is unchanged."""
+        self.files[name]["stat"] = fingerprint
+
+    def unindexed_keys(self, name: str, keys: Iterable[str]) -> List[str]:
+        """Row keys of a file that have no entry in the index yet."""
+        old_rows = self.files.get(name, {}).get("rows", {})
+        return [key for key in keys if key not in old_rows]
+
+    def stale_ids(self, name: str, current_keys: Iterable[str]) -> List[str]:
+        """Docstore ids of indexed rows that are no longer in the file."""
+        old_rows = self.files.get(name, {}).get("rows", {})
+        current = set(current_keys)
+        return [i for key, ids in old_rows.items() if key not in current for i in ids]
+
+    def set_file(self, name: str, fingerprint: List[float], digest: str,
+                 rows: Dict[str, List[str]]):
+        """Replace a file's entry, keeping ids of rows that were already indexed."""
+        old_rows = self.files.get(name, {}).get("rows", {})
+        merged = {key: rows.get(key) or old_rows.get(key, []) for key in rows}
+        self.files[name] = {"stat": fingerprint, "sha256": digest, "rows": merged}
+
+    def add_rows(self, name: str, rows: Dict[str, List[str]]):
+        """
+        Record rows indexed from a file that could not be read to the end.
+        Its other indexed rows are kept (a short read is not a deletion) and
+        its fingerprint cleared, so the next sync reads the file again.
+        """
+        entry = self.files.setdefault(name, {})
+        old_rows = entry.get("rows", {})
+        entry["rows"] = {**old_rows, **{key: ids for key, ids in rows.items() if ids or key not in old_rows}}
+        entry["stat"] = entry["sha256"] = None
+
+    def drop_file(self, name: str) -> List[str]:
+        """Forget a deleted file and return the docstore ids that belonged to it."""
+        entry = self.files.pop(name, {})
+        return [i for ids in entry.get("rows", {}).values() for i in ids]
+
+    def catalog_version(self) -> str:
+        """
+        Content hash of the indexed catalog (file digests + index type). The
+        same data gives the same version on every worker and pod.
+        """
+        digest = hashlib.sha1(self.index_type.encode("utf-8"))
+        for name in sorted(self.files):
+            digest.update(f"\0{name}\0{self.files[name].get('sha256')}".encode("utf-8"))
+        return digest.hexdigest()[:16]
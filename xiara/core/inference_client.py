@@ -0,0 +1,159 @@
+# xiara/core/inference_client.py
+"""
+Thin client for the local inference service (xiara.core.inference_server).
+
+Each calling thread keeps its own connection to the Unix socket, so the
+LLM executor's workers submit prompts concurrently and the service batches
+them. InferenceServiceLLM wraps the client as a LangChain LLM, a drop-in
+replacement for the in-process LlamaCpp returned by get_llm().
+"""
+
+import json
+import socket
+import threading
+from typing import Any, Iterator, List, Optional
+
+from langchain_core.language_models.llms import LLM
+from langchain_core.outputs import GenerationChunk
+from pydantic import PrivateAttr
+
+from xiara.core.llm_config import llm_session
+
+
+class InferenceServiceError(RuntimeError):
+    """The inference service rejected a request or could not be reached."""
+
+
+class InferenceClient:
+    def __init__(self, socket_path: str, timeout: float = 120.0):
+        self.socket_path = socket_path
+        self.timeout = timeout
+        self._local = threading.local()
+
+    def _connection(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            sock.settimeout(self.timeout)
+            sock.connect(self.socket_path)
+            conn = (sock, sock.makefile("rb"))
+            self._local.conn = conn
+        return conn
+
+    def _close(self):
+        conn = getattr(self._local, "conn", None)
+        self._local.conn = None
+        if conn is not None:
+            conn[1].close()
+            conn[0].close()
+
+    def _request(self, message: dict) -> dict:
+        """Send a request and return the first reply line."""
+        payload = json.dumps(message).encode("utf-8") + b"\n"
+        # A kept-alive connection may have been closed by a service restart: reconnect once
+        for attempt in (1, 2):
+            try:
+                sock, reader = self._connection()
+                sock.sendall(payload)
+                return self._read()
+            except OSError as e:
+                self._close()
+                if attempt == 2 or isinstance(e, socket.timeout):
+                    raise InferenceServiceError(f"Inference service unavailable at {self.socket_path}: {e}") from e
+
+    def _read(self) -> dict:
+        line = self._local.conn[1].readline()
+        if not line:
+            raise ConnectionError("connection closed by the inference service")
+        reply = json.loads(line)
+        if "error" in reply:
+            raise InferenceServiceError(reply["error"])
+        return reply
+
+    def generate(self, prompt: str, max_tokens: int = 256, temperature: float = 0.7, top_p: float = 0.95,
+                 stop: Optional[List[str]] = None, session: Optional[str] = None) -> str:
+        return self._request({"op": "generate", "prompt": prompt, "max_tokens": max_tokens,
+                              "temperature": temperature, "top_p": top_p, "stop": stop or [],
+                              "session": session})["text"]
+
+    def stream(self, prompt: str, max_tokens: int = 256, temperature: float = 0.7, top_p: float = 0.95,
+               stop: Optional[List[str]] = None, session: Optional[str] = None) -> Iterator[str]:
+        """Yield text as the service decodes it."""
+        reply = self._request({"op": "generate", "stream": True, "prompt": prompt, "max_tokens": max_tokens,
+                               "temperature": temperature, "top_p": top_p, "stop": stop or [],
+                               "session": session})
+        done = False
+        try:
+            while "token" in reply:
+                yield reply["token"]
+                reply = self._read()
+            done = True
+        except OSError as e:
+            raise InferenceServiceError(f"Inference service stream interrupted: {e}") from e
+        finally:
+            if not done:
+                # Unread reply lines would corrupt the next request on this connection
+                self._close()
+
+    def cache_prefix(self, prompt: str):
+        """Have the service evaluate `prompt` once and keep its KV state for every request starting with it."""
+        self._request({"op": "cache_prefix", "prompt": prompt})
+
+    def count_tokens(self, text: str) -> int:
+        return self._request({"op": "tokenize", "prompt": text})["tokens"]
+
+    def health(self) -> dict:
+        return self._request({"op": "health"})
+
+
+class InferenceServiceLLM(LLM):
+    """LangChain LLM backed by the local inference service."""
+
+    socket_path: str
+    max_tokens: int = 256
+    temperature: float = 0.7
+    top_p: float = 0.95
+    timeout: float = 120.0
+    _client: Any = PrivateAttr(default=None)
+
+    @property
+    def client(self) -> InferenceClient:
+        if self._client is None:
+            self._client = InferenceClient(self.socket_path, self.timeout)
+        return self._client
+
+    def cache_prefix(self, prompt: str):
+        self.client.cache_prefix(prompt)
+
+    def get_num_tokens(self, text: str) -> int:
+        # With the served model's tokenizer, not LangChain's default GPT-2 one
+        return self.client.count_tokens(text)
+
+    @property
+    def _llm_type(self) -> str:
+        return "xiara_inference_service"
+
+    def _call(self, prompt: str, stop: Optional[List[str]] = None, run_manager=None, **kwargs: Any) -> str:
+        return self.client.generate(
+            prompt,
+            max_tokens=kwargs.get("max_tokens", self.max_tokens),
+            temperature=kwargs.get("temperature", self.temperature),
+            top_p=kwargs.get("top_p", self.top_p),
+            stop=stop,
+            session=llm_session.get(),
+        )
+
+    def _stream(self, prompt: str, stop: Optional[List[str]] = None, run_manager=None,
+                **kwargs: Any) -> Iterator[GenerationChunk]:
+        for text in self.client.stream(
+            prompt,
+            max_tokens=kwargs.get("max_tokens", self.max_tokens),
+            temperature=kwargs.get("temperature", self.temperature),
+            top_p=kwargs.get("top_p", self.top_p),
+            stop=stop,
+            session=llm_session.get(),
+        ):
+            chunk = GenerationChunk(text=text)
+            if run_manager is not None:
+                run_manager.on_llm_new_token(text, chunk=chunk)
+            yield chunk
@@ -0,0 +1,528 @@
+# xiara/core/inference_server.py
+"""
+Local LLM inference service for Xiara.
+
+One process loads the GGUF model once and serves every Xiara worker over a
+Unix socket, instead of each uvicorn worker holding its own LlamaCpp copy
+and answering one request at a time. Concurrent prompts are decoded
+together: each request gets a llama.cpp sequence ("slot") in one shared
+context, and every scheduler step packs one new token per generating slot,
+plus chunks of newly admitted prompts, into a single llama_decode call
+(continuous batching). Finished sequences free their slot and KV cache
+immediately, so waiting requests join the next step rather than the next
+batch.
+
+KV state is reused across requests (xiara.core.prefix_cache): prompts
+start from the longest cached token prefix, from pinned static prefixes
+(op "cache_prefix") or from the last turn of the same "session".
+
+Protocol: newline-delimited JSON over the socket, one reply line per
+request line.
+
+    {"op": "generate", "prompt": "...", "max_tokens": 256, "temperature": 0.7,
+     "top_p": 0.95, "stop": ["\\nUser:"]}   ->  {"text": "..."} | {"error": "..."}
+    {"op": "cache_prefix", "prompt": "..."} ->  {"text": ""}   (pins its KV state)
+    {"op": "tokenize", "prompt": "..."}     ->  {"tokens": 42}
+    {"op": "health"}                        ->  {"status": "ok", "slots": 4, ...}
+
+With "stream": true, a generate request is answered with one
+{"token": "..."} line per decoded piece of text, then the usual
+{"text": "..."} line (with "done": true).
+
+Usage:
+    python -m xiara.core.inference_server [--socket /tmp/xiara-llm.sock] [--model $MODEL_PATH]
+                                          [--threads N] [--slots N] [--ctx 2048]
+                                          [--kv-cache-mb 256] [--kv-cache-entries 32]
+"""
+
+import argparse
+import asyncio
+import ctypes
+import json
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from dataclasses import dataclass, field
+from typing import Callable, List, Optional, Tuple
+
+import numpy as np
+
+from shared.config.settings import settings
+from shared.logging.logger import logger
+from xiara.core.prefix_cache import PrefixCache, template_key
+
+MAX_SLOTS = 8
+# llama.cpp limit on sequence ids in one context (slots + cached snapshots)
+MAX_SEQUENCES = 64
+
+
+def available_cores() -> int:
+    try:
+        return len(os.sched_getaffinity(0))
+    except AttributeError:
+        return os.cpu_count() or 1
+
+
+def plan_resources(cores: int, threads: int = 0, slots: int = 0) -> Tuple[int, int]:
+    """
+    Decode threads and parallel slots for a machine with `cores` CPUs (0 = auto).
+
+    One batched decode uses every thread for the whole batch, so threads
+    cover the cores, minus one for the socket server on larger machines.
+    Slots grow with the cores that feed them: more sequences per step
+    raises throughput until the step itself becomes compute-bound.
+    """
+    cores = max(1, cores)
+    if threads <= 0:
+        threads = cores - 1 if cores > 2 else cores
+    if slots <= 0:
+        slots = min(MAX_SLOTS, max(1, cores // 2))
+    return threads, slots
+
+
+@dataclass
+class Request:
+    prompt: str
+    max_tokens: int = 256
+    temperature: float = 0.7
+    top_p: float = 0.95
+    stop: List[str] = field(default_factory=list)
+    future: Future = field(default_factory=Future)
+    submitted_at: float = field(default_factory=time.monotonic)
+    on_token: Optional[Callable[[str], None]] = None  # called on the scheduler thread
+    cancelled: bool = False
+    session: Optional[str] = None  # keep this prompt's KV state for the session's next turn
+    pinned: bool = False  # keep this prompt's KV state until restart (static prefixes)
+
+
+@dataclass
+class Slot:
+    seq_id: int
+    request: Optional[Request] = None
+    tokens: List[int] = field(default_factory=list)  # prompt + generated tokens
+    pending: List[int] = field(default_factory=list)  # prompt tokens not yet decoded
+    n_past: int = 0
+    last_token: Optional[int] = None
+    output: bytearray = field(default_factory=bytearray)
+    generated: int = 0
+    emitted: int = 0  # characters already passed to on_token
+
+    @property
+    def busy(self) -> bool:
+        return self.request is not None
+
+    def text(self) -> str:
+        return self.output.decode("utf-8", errors="ignore")
+
+
+def sample(logits: np.ndarray, temperature: float, top_p: float, rng: np.random.Generator) -> int:
+    """Temperature + nucleus sampling (greedy at temperature 0)."""
+    if temperature <= 0:
+        return int(np.argmax(logits))
+    scaled = logits.astype(np.float64) / temperature
+    probs = np.exp(scaled - scaled.max())
+    probs /= probs.sum()
+    if top_p < 1.0:
+        order = np.argsort(probs)[::-1]
+        keep = order[: int(np.searchsorted(np.cumsum(probs[order]), top_p)) + 1]
+        return int(rng.choice(keep, p=probs[keep] / probs[keep].sum()))
+    return int(rng.choice(len(probs), p=probs))
+
+
+class LlamaBackend:
+    """
+    Thin wrapper over the llama.cpp C API (llama-cpp-python low-level bindings):
+    one context shared by `slots` sequences of `ctx_per_slot` tokens each, plus
+    up to `cache_entries` cached sequences holding at most `cache_mb` of KV state.
+    """
+
+    def __init__(self, model_path: str, threads: int, slots: int, ctx_per_slot: int = 2048,
+                 batch_size: int = 512, cache_mb: int = 0, cache_entries: int = 0):
+        import llama_cpp
+
+        self._llama = llama_cpp
+        llama_cpp.llama_backend_init()
+        self.model = llama_cpp.llama_load_model_from_file(model_path.encode("utf-8"),
+                                                          llama_cpp.llama_model_default_params())
+        if not self.model:
+            raise RuntimeError(f"Could not load model from {model_path}")
+        # f16 K and V per layer; an upper bound for grouped-query attention models
+        self.kv_bytes_per_token = 2 * 2 * llama_cpp.llama_n_layer(self.model) * llama_cpp.llama_n_embd(self.model)
+        cache_entries = min(cache_entries, MAX_SEQUENCES - slots) if cache_mb > 0 else 0
+        self.cache_tokens = cache_mb * 2 ** 20 // self.kv_bytes_per_token if cache_entries > 0 else 0
+        self.cache_seq_ids = list(range(slots, slots + cache_entries))
+        params = llama_cpp.llama_context_default_params()
+        params.n_ctx = ctx_per_slot * slots + self.cache_tokens
+        params.n_batch = batch_size
+        params.n_seq_max = slots + cache_entries
+        params.n_threads = threads
+        params.n_threads_batch = threads
+        self.ctx = llama_cpp.llama_new_context_with_model(self.model, params)
+        if not self.ctx:
+            raise RuntimeError("Could not create llama.cpp context")
+        self.batch_size = batch_size
+        self.ctx_per_slot = ctx_per_slot
+        self.n_vocab = llama_cpp.llama_n_vocab(self.model)
+        self._batch = llama_cpp.llama_batch_init(batch_size, 0, slots)
+
+    def tokenize(self, text: str) -> List[int]:
+        data = text.encode("utf-8")
+        buf = (self._llama.llama_token * (len(data) + 8))()
+        n = self._llama.llama_tokenize(self.model, data, len(data), buf, len(buf), True, False)
+        if n < 0:
+            raise ValueError("Prompt could not be tokenized")
+        return list(buf[:n])
+
+    def piece(self, token: int) -> bytes:
+        buf = (ctypes.c_char * 64)()
+        n = self._llama.llama_token_to_piece(self.model, token, buf, len(buf), 0, False)
+        return bytes(buf[:max(0, n)])
+
+    def is_end(self, token: int) -> bool:
+        return bool(self._llama.llama_token_is_eog(self.model, token))
+
+    def decode(self, entries: List[Tuple[int, int, int, bool]]) -> List[np.ndarray]:
+        """
+        Decode (token, position, seq_id, want_logits) entries in one llama_decode
+        call; returns the logits of the entries that asked for them, in order.
+        """
+        batch = self._batch
+        for i, (token, pos, seq_id, want_logits) in enumerate(entries):
+            batch.token[i] = token
+            batch.pos[i] = pos
+            batch.n_seq_id[i] = 1
+            batch.seq_id[i][0] = seq_id
+            batch.logits[i] = want_logits
+        batch.n_tokens = len(entries)
+        status = self._llama.llama_decode(self.ctx, batch)
+        if status != 0:
+            raise RuntimeError(f"llama_decode failed ({status})")
+        logits = []
+        for i, entry in enumerate(entries):
+            if entry[3]:
+                row = self._llama.llama_get_logits_ith(self.ctx, i)
+                logits.append(np.ctypeslib.as_array(row, shape=(self.n_vocab,)).copy())
+        return logits
+
+    def release(self, seq_id: int):
+        self._llama.llama_kv_cache_seq_rm(self.ctx, seq_id, -1, -1)
+
+    def copy(self, src: int, dst: int, n_tokens: int):
+        """Give `dst` the KV state of positions [0, n_tokens) of `src` (cells are shared, not recomputed)."""
+        self._llama.llama_kv_cache_seq_cp(self.ctx, src, dst, 0, n_tokens)
+
+    def close(self):
+        self._llama.llama_batch_free(self._batch)
+        self._llama.llama_free(self.ctx)
+        self._llama.llama_free_model(self.model)
+
+
+class BatchScheduler:
+    """Continuous-batching loop over a backend's slots, run on its own thread."""
+
+    def __init__(self, backend, slots: int, seed: Optional[int] = None, cache: Optional[PrefixCache] = None):
+        self.backend = backend
+        self.slots = [Slot(seq_id=i) for i in range(slots)]
+        self.cache = cache
+        self._queue: "queue.Queue[Optional[Request]]" = queue.Queue()
+        self._rng = np.random.default_rng(seed)
+        self._thread: Optional[threading.Thread] = None
+        self._stopping = False
+        self._stats = {"requests": 0, "completed": 0, "failed": 0, "steps": 0,
+                       "tokens_generated": 0, "prompt_tokens": 0, "prompt_tokens_reused": 0, "max_batch": 0}
+
+    def start(self):
+        self._thread = threading.Thread(target=self._loop, name="xiara-llm-scheduler", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stopping = True
+        self._queue.put(None)
+        if self._thread is not None:
+            self._thread.join()
+
+    def submit(self, request: Request) -> Future:
+        self._stats["requests"] += 1
+        self._queue.put(request)
+        return request.future
+
+    def _admit(self, request: Request, slot: Slot):
+        try:
+            tokens = self.backend.tokenize(request.prompt)
+            if len(tokens) >= self.backend.ctx_per_slot:
+                raise ValueError(f"Prompt of {len(tokens)} tokens exceeds the {self.backend.ctx_per_slot}-token context")
+        except Exception as e:
+            self._stats["failed"] += 1
+            request.future.set_exception(e)
+            return
+        slot.request, slot.tokens, slot.pending, slot.n_past = request, list(tokens), tokens, 0
+        slot.last_token, slot.output, slot.generated, slot.emitted = None, bytearray(), 0, 0
+        self._stats["prompt_tokens"] += len(tokens)
+        if self.cache is not None:
+            seq_id, reused = self.cache.lookup(tokens)
+            # The last prompt token is always evaluated: its logits start the answer
+            reused = min(reused, len(tokens) - 1)
+            if seq_id is not None and reused > 0:
+                self.backend.copy(seq_id, slot.seq_id, reused)
+                slot.n_past, slot.pending = reused, tokens[reused:]
+                self._stats["prompt_tokens_reused"] += reused
+
+    def _snapshot(self, slot: Slot):
+        """Keep a finished session turn or static prefix in the prefix cache."""
+        request = slot.request
+        if self.cache is None or not (request.session or request.pinned):
+            return
+        decoded = slot.tokens[:slot.n_past]
+        if request.session:
+            key = template_key(request.session, decoded)
+        else:
+            key = template_key("prefix", decoded, head=len(decoded))
+        seq_id, evicted = self.cache.store(key, decoded, pinned=request.pinned)
+        for stale in evicted:
+            self.backend.release(stale)
+        if seq_id is not None:
+            self.backend.release(seq_id)
+            self.backend.copy(slot.seq_id, seq_id, len(decoded))
+
+    def _finish(self, slot: Slot, error: Optional[Exception] = None):
+        request = slot.request
+        if error is None:
+            self._snapshot(slot)
+        self.backend.release(slot.seq_id)
+        slot.request, slot.pending = None, []
+        if error is not None:
+            self._stats["failed"] += 1
+            request.future.set_exception(error)
+            return
+        text = slot.text()
+        for stop in request.stop:
+            cut = text.find(stop)
+            if cut != -1:
+                text = text[:cut]
+        self._emit(slot, request, text)
+        self._stats["completed"] += 1
+        request.future.set_result(text)
+
+    @staticmethod
+    def _emit(slot: Slot, request: Request, text: str):
+        if request.on_token is not None and len(text) > slot.emitted:
+            request.on_token(text[slot.emitted:])
+            slot.emitted = len(text)
+
+    def _stream(self, slot: Slot):
+        """Pass new text to on_token, holding back what could still turn into a stop string."""
+        request = slot.request
+        if request.on_token is None:
+            return
+        text = slot.text()
+        hold = max((len(stop) for stop in request.stop), default=1) - 1
+        self._emit(slot, request, text[:len(text) - hold] if hold else text)
+
+    def _fill_slots(self, block: bool):
+        """Move queued requests into free slots; blocks for work only when idle."""
+        for slot in self.slots:
+            if slot.busy:
+                continue
+            try:
+                request = self._queue.get(block=block)
+            except queue.Empty:
+                return
+            block = False
+            if request is None:
+                return
+            if not request.future.set_running_or_notify_cancel():
+                continue
+            self._admit(request, slot)
+
+    def _plan(self) -> Tuple[List[Tuple[int, int, int, bool]], List[Slot]]:
+        """One step: a token per generating slot, then prompt chunks up to the batch size."""
+        entries, sampled = [], []
+        for slot in self.slots:
+            if slot.busy and not slot.pending and slot.last_token is not None:
+                entries.append((slot.last_token, slot.n_past, slot.seq_id, True))
+                slot.n_past += 1
+                sampled.append(slot)
+        room = self.backend.batch_size - len(entries)
+        for slot in self.slots:
+            if room <= 0:
+                break
+            if not (slot.busy and slot.pending):
+                continue
+            chunk, slot.pending = slot.pending[:room], slot.pending[room:]
+            for i, token in enumerate(chunk):
+                last = not slot.pending and i == len(chunk) - 1
+                entries.append((token, slot.n_past, slot.seq_id, last))
+                slot.n_past += 1
+            if not slot.pending:
+                sampled.append(slot)
+            room -= len(chunk)
+        # Both loops append in batch order, so `sampled` lines up with the returned logits
+        return entries, sampled
+
+    def step(self):
+        entries, sampled = self._plan()
+        if not entries:
+            return
+        try:
+            logits = self.backend.decode(entries)
+        except Exception as e:
+            for slot in self.slots:
+                if slot.busy:
+                    self._finish(slot, e)
+            return
+        self._stats["steps"] += 1
+        self._stats["max_batch"] = max(self._stats["max_batch"], len(entries))
+        for slot, row in zip(sampled, logits):
+            request = slot.request
+            if request.cancelled:
+                self._finish(slot, RuntimeError("Request cancelled"))
+                continue
+            if request.max_tokens <= 0:
+                self._finish(slot)  # prefill only (cache_prefix)
+                continue
+            token = sample(row, request.temperature, request.top_p, self._rng)
+            if self.backend.is_end(token):
+                self._finish(slot)
+                continue
+            slot.output += self.backend.piece(token)
+            slot.generated += 1
+            slot.last_token = token
+            slot.tokens.append(token)
+            self._stats["tokens_generated"] += 1
+            if (slot.generated >= request.max_tokens or slot.n_past >= self.backend.ctx_per_slot
+                    or any(stop in slot.text() for stop in request.stop)):
+                self._finish(slot)
+            else:
+                self._stream(slot)
+
+    def _loop(self):
+        while not self._stopping:
+            idle = not any(slot.busy for slot in self.slots)
+            self._fill_slots(block=idle)
+            self.step()
+
+    def stats(self) -> dict:
+        busy = sum(slot.busy for slot in self.slots)
+        stats = {**self._stats, "slots": len(self.slots), "active": busy, "queued": self._queue.qsize()}
+        if self.cache is not None:
+            stats["prefix_cache"] = self.cache.stats()
+        return stats
+
+
+class InferenceServer:
+    def __init__(self, scheduler: BatchScheduler, socket_path: str, threads: int):
+        self.scheduler = scheduler
+        self.socket_path = socket_path
+        self.threads = threads
+
+    @staticmethod
+    async def _send(writer: asyncio.StreamWriter, reply: dict):
+        writer.write(json.dumps(reply).encode("utf-8") + b"\n")
+        await writer.drain()
+
+    async def _generate(self, message: dict, writer: asyncio.StreamWriter) -> dict:
+        request = Request(
+            prompt=message["prompt"],
+            max_tokens=int(message.get("max_tokens", 256)),
+            temperature=float(message.get("temperature", 0.7)),
+            top_p=float(message.get("top_p", 0.95)),
+            stop=list(message.get("stop") or []),
+            session=message.get("session"),
+            pinned=message.get("op") == "cache_prefix",
+        )
+        if request.pinned:
+            request.max_tokens = 0
+        if not message.get("stream"):
+            return {"text": await asyncio.wrap_future(self.scheduler.submit(request))}
+
+        loop = asyncio.get_running_loop()
+        tokens: "asyncio.Queue[str]" = asyncio.Queue()
+        request.on_token = lambda text: loop.call_soon_threadsafe(tokens.put_nowait, text)
+        result = asyncio.wrap_future(self.scheduler.submit(request))
+        try:
+            while not (result.done() and tokens.empty()):
+                getter = asyncio.ensure_future(tokens.get())
+                await asyncio.wait({getter, result}, return_when=asyncio.FIRST_COMPLETED)
+                if getter.done():
+                    await self._send(writer, {"token": getter.result()})
+                else:
+                    getter.cancel()
+        except (ConnectionError, asyncio.CancelledError):
+            # The client went away: free its slot at the next step
+            request.cancelled = True
+            result.cancel()
+            raise
+        return {"text": await result, "done": True}
+
+    async def _reply(self, message: dict, writer: asyncio.StreamWriter) -> dict:
+        op = message.get("op", "generate")
+        if op == "health":
+            return {"status": "ok", "threads": self.threads, **self.scheduler.stats()}
+        if op == "tokenize":
+            return {"tokens": len(self.scheduler.backend.tokenize(message["prompt"]))}
+        if op not in ("generate", "cache_prefix"):
+            return {"error": f"Unknown op {op!r}"}
+        return await self._generate(message, writer)
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                try:
+                    reply = await self._reply(json.loads(line), writer)
+                except ConnectionError:
+                    break
+                except Exception as e:
+                    reply = {"error": str(e)}
+                await self._send(writer, reply)
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+    async def serve(self):
+        if os.path.exists(self.socket_path):
+            os.unlink(self.socket_path)
+        server = await asyncio.start_unix_server(self._handle, path=self.socket_path, limit=2 ** 22)
+        os.chmod(self.socket_path, 0o660)
+        logger.info("Xiara inference service listening on %s", self.socket_path)
+        async with server:
+            await server.serve_forever()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Xiara local LLM inference service")
+    parser.add_argument("--socket", default=settings.XIARA_LLM_SOCKET or "/tmp/xiara-llm.sock")
+    parser.add_argument("--model", default=os.getenv("MODEL_PATH"))
+    parser.add_argument("--threads", type=int, default=settings.XIARA_LLM_THREADS, help="0 = from core count")
+    parser.add_argument("--slots", type=int, default=settings.XIARA_LLM_SLOTS, help="0 = from core count")
+    parser.add_argument("--ctx", type=int, default=2048, help="context tokens per slot")
+    parser.add_argument("--kv-cache-mb", type=int, default=settings.XIARA_KV_CACHE_MB,
+                        help="memory for cached prompt prefixes and session snapshots (0 = off)")
+    parser.add_argument("--kv-cache-entries", type=int, default=settings.XIARA_KV_CACHE_ENTRIES)
+    args = parser.parse_args()
+    if not args.model:
+        parser.error("--model or MODEL_PATH is required")
+
+    threads, slots = plan_resources(available_cores(), args.threads, args.slots)
+    logger.info("Loading %s with %d threads and %d slots", args.model, threads, slots)
+    backend = LlamaBackend(args.model, threads=threads, slots=slots, ctx_per_slot=args.ctx,
+                           cache_mb=args.kv_cache_mb, cache_entries=args.kv_cache_entries)
+    cache = PrefixCache(backend.cache_seq_ids, backend.cache_tokens) if backend.cache_seq_ids else None
+    scheduler = BatchScheduler(backend, slots, cache=cache)
+    scheduler.start()
+    try:
+        asyncio.run(InferenceServer(scheduler, args.socket, threads).serve())
+    except KeyboardInterrupt:
+        pass
+    finally:
+        scheduler.stop()
+        backend.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,98 @@
+# xiara/core/keyword_matcher.py
+"""
+Keyword matching for the rule-based intent checks.
+
+All vocabularies of a check (product hints, price terms, negotiation
+phrases, ...) are merged into one KeywordIndex: a dict from each term to
+the vocabularies containing it. A query is then tokenized once and each of
+its words looked up once, which tells every vocabulary it matches in a
+single pass, whatever the number of terms. Phrases are only tried where
+their first word occurs.
+
+Matches respect word boundaries: "top" does not match "laptop" and "hp"
+does not match "php". A plural "s"/"es" on a query word is also tried
+without it, so "bags" still matches "bag" and "tvs" "tv". Compounds and
+other inflections ("smartwatch", "cheapest") are vocabulary terms of
+their own.
+
+Vocabularies are plain lists of terms grouped by name in a JSON file
+(xiara/core/vocabularies.json, or XIARA_VOCABULARY_PATH), so they can be
+tuned without a code change.
+"""
+
+import json
+import os
+import re
+from functools import lru_cache
+from typing import Dict, FrozenSet, Iterable, List, Optional, Set, Tuple
+
+from shared.config.settings import settings
+
+DEFAULT_VOCABULARY_PATH = os.path.join(os.path.dirname(__file__), "vocabularies.json")
+
+WORD = re.compile(r"\w+(?:[-']\w+)*")
+
+
+def tokenize(text: str) -> List[str]:
+    return WORD.findall(text.lower())
+
+
+class KeywordIndex:
+    def __init__(self, vocabularies: Dict[str, Iterable[str]]):
+        self.names = list(vocabularies)
+        labels: Dict[str, Set[str]] = {}
+        phrases: Dict[str, Set[Tuple[str, ...]]] = {}
+        for name, terms in vocabularies.items():
+            for term in terms:
+                words = tuple(tokenize(term))
+                if not words:
+                    continue
+                labels.setdefault(" ".join(words), set()).add(name)
+                if len(words) > 1:
+                    phrases.setdefault(words[0], set()).add(words)
+        self._labels: Dict[str, FrozenSet[str]] = {term: frozenset(names) for term, names in labels.items()}
+        # First word -> the phrases starting with it
+        self._phrases = {first: sorted(group, key=len) for first, group in phrases.items()}
+
+    def find_all(self, text: str) -> List[str]:
+        """Terms of any vocabulary found in `text`, in order of appearance."""
+        tokens = tokenize(text)
+        lookup, found = self._labels.get, []
+        for i, token in enumerate(tokens):
+            for phrase in self._phrases.get(token, ()):
+                if tuple(tokens[i:i + len(phrase)]) == phrase:
+                    found.append(" ".join(phrase))
+            if lookup(token) is not None:
+                found.append(token)
+            elif len(token) > 2 and token[-1] == "s":
+                # Plural: "tvs" -> "tv", "bags" -> "bag", "dresses" -> "dress"
+                for singular in (token[:-1], token[:-2]):
+                    if lookup(singular) is not None:
+                        found.append(singular)
+                        break
+        return found
+
+    def labels(self, text: str) -> Set[str]:
+        """Names of the vocabularies with at least one term in `text`."""
+        lookup, names = self._labels.get, set()
+        for term in self.find_all(text):
+            names |= lookup(term)
+        return names
+
+    def first(self, text: str, order: Optional[Iterable[str]] = None) -> Optional[str]:
+        """The first vocabulary (in `order`, by default the index's) matching `text`, or None."""
+        names = self.labels(text)
+        return next((name for name in (order or self.names) if name in names), None)
+
+
+def load_vocabularies(path: Optional[str] = None) -> Dict[str, Dict[str, List[str]]]:
+    """Vocabulary groups from the JSON file: {"group": {"name": [terms]}}."""
+    path = path or settings.XIARA_VOCABULARY_PATH or DEFAULT_VOCABULARY_PATH
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+@lru_cache(maxsize=None)
+def vocabulary(group: str) -> Dict[str, List[str]]:
+    """One group of the configured vocabulary file (read once per process)."""
+    return load_vocabularies()[group]
@@ -1,16 +1,99 @@
-from langchain_community.llms import LlamaCpp
+import threading
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Optional
 from dotenv import load_dotenv
 import os
 
+from shared.config.settings import settings
+
 load_dotenv()  # Load variables from .env
 
 model_path = os.getenv("MODEL_PATH")
 
-llm = LlamaCpp(
-    model_path=model_path,
-    n_ctx=2048,
-    temperature=0.7,
-    top_p=0.95,
-    verbose=True,
-    n_threads=4
-)
\ No newline at end of file
+_llm = None
+_llm_lock = threading.Lock()
+
+# Conversation the current LLM calls belong to; the inference service keeps
+# each session's KV state so its next turn only evaluates the new tokens
+llm_session: ContextVar = ContextVar("llm_session", default=None)
+
+
+@contextmanager
+def session_scope(session_id: str):
+    token = llm_session.set(session_id)
+    try:
+        yield
+    finally:
+        llm_session.reset(token)
+
+
+def get_llm():
+    """
+    Return the shared LLM, loading it on first use: a client for the local
+    inference service when XIARA_LLM_SOCKET is set, else an in-process LlamaCpp.
+    """
+    global _llm
+    if _llm is None:
+        with _llm_lock:
+            if _llm is None and settings.XIARA_LLM_SOCKET:
+                from xiara.core.inference_client import InferenceServiceLLM
+
+                llm = InferenceServiceLLM(socket_path=settings.XIARA_LLM_SOCKET, temperature=0.7, top_p=0.95)
+                # Fail warm-up (not the first request) if the service isn't running
+                llm.client.health()
+                _llm = llm
+            if _llm is None:
+                # Imported here so importing this module stays cheap
+                from langchain_community.llms import LlamaCpp
+
+                _llm = LlamaCpp(
+                    model_path=model_path,
+                    n_ctx=2048,
+                    temperature=0.7,
+                    top_p=0.95,
+                    verbose=True,
+                    n_threads=4
+                )
+                if settings.XIARA_KV_CACHE_MB > 0:
+                    # Keep evaluated prompt states (LRU, capped) so a follow-up turn resumes
+                    # from its longest cached prefix instead of re-evaluating the history
+                    from llama_cpp import LlamaRAMCache
+
+                    _llm.client.set_cache(LlamaRAMCache(capacity_bytes=settings.XIARA_KV_CACHE_MB * 2 ** 20))
+    return _llm
+
+
+def count_tokens(text: str) -> Optional[int]:
+    """Tokens `text` takes with the loaded model's tokenizer; None until the LLM is loaded (or if it can't count)."""
+    if _llm is not None:
+        try:
+            return _llm.get_num_tokens(text)
+        except Exception:
+            pass
+    return None
+
+
+def cache_prompt_prefixes(prefixes):
+    """
+    Pin the KV state of static prompt prefixes (system prompt, chain templates)
+    in the inference service. In-process llama.cpp already reuses the prefix it
+    evaluated last, so there is nothing to do there.
+    """
+    cache_prefix = getattr(get_llm(), "cache_prefix", None)
+    if cache_prefix is None:
+        return 0
+    for prefix in prefixes:
+        cache_prefix(prefix)
+    return len(prefixes)
+
+
+def is_llm_loaded() -> bool:
+    return _llm is not None
+
+
+def __getattr__(name):
+    # Backwards compatibility for `from xiara.core.llm_config import llm`
+    if name == "llm":
+        return get_llm()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
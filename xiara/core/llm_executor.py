@@ -0,0 +1,176 @@
+# xiara/core/llm_executor.py
+"""
+Dedicated executor for LLM-bound request work, with admission control.
+
+Async routes hand their blocking pipeline (ambiguity LLM check, retrieval,
+llama.cpp generation) to a small, fixed pool of worker threads instead of
+Starlette's shared threadpool. One worker by default: the in-process
+LlamaCpp model must not be called from several threads at once. At most
+`max_queue` requests wait behind the busy workers; beyond that, new work
+is rejected immediately with Overloaded, which the API maps to a 429 with
+a Retry-After estimated from recent service times. Background work (history
+summarization) waits in its own queue and is only started while no request
+is running or waiting, so it never takes a request's place in the queue.
+"""
+
+import asyncio
+import contextvars
+import math
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import AsyncIterator, Callable, Iterable, Optional
+
+from shared.config.settings import settings
+
+
+class Overloaded(Exception):
+    """Raised when the LLM queue is full."""
+
+    def __init__(self, retry_after: int):
+        super().__init__("Xiara is busy, please retry shortly")
+        self.retry_after = retry_after
+
+
+class LLMExecutor:
+    def __init__(self, workers: int = 1, max_queue: int = 16):
+        self.workers = max(1, workers)
+        self.max_queue = max(0, max_queue)
+        self._pool: Optional[ThreadPoolExecutor] = None
+        self._lock = threading.Lock()
+        self._admitted = 0  # running + waiting
+        self._avg_service = 2.0  # seconds, exponentially weighted
+        self._background = deque()  # (fn, args, kwargs) waiting for idle workers
+        self._stats = {"submitted": 0, "completed": 0, "failed": 0, "rejected": 0, "background_dropped": 0}
+
+    def _executor(self) -> ThreadPoolExecutor:
+        with self._lock:
+            if self._pool is None:
+                self._pool = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="xiara-llm")
+            return self._pool
+
+    def retry_after(self) -> int:
+        """Seconds until a slot is likely to free up."""
+        backlog = max(1, self._admitted - self.workers + 1)
+        return max(1, math.ceil(backlog * self._avg_service / self.workers))
+
+    def _admit(self):
+        with self._lock:
+            if self._admitted >= self.workers + self.max_queue:
+                self._stats["rejected"] += 1
+                raise Overloaded(self.retry_after())
+            self._admitted += 1
+            self._stats["submitted"] += 1
+
+    def _run(self, fn: Callable, args, kwargs):
+        start = time.monotonic()
+        ok = False
+        try:
+            result = fn(*args, **kwargs)
+            ok = True
+            return result
+        finally:
+            elapsed = time.monotonic() - start
+            with self._lock:
+                self._admitted -= 1
+                self._stats["completed" if ok else "failed"] += 1
+                self._avg_service = 0.8 * self._avg_service + 0.2 * elapsed
+            self._start_background()
+
+    def submit(self, fn: Callable, *args, **kwargs):
+        """Queue blocking work; raises Overloaded instead of waiting when the queue is full."""
+        self._admit()
+        return self._start(fn, args, kwargs)
+
+    def submit_when_idle(self, fn: Callable, *args, **kwargs) -> bool:
+        """
+        Run low-priority work once no request is running or queued. False
+        (nothing will run) when `max_queue` background jobs are already waiting.
+        """
+        with self._lock:
+            if len(self._background) >= max(1, self.max_queue):
+                self._stats["background_dropped"] += 1
+                return False
+            self._background.append((fn, args, kwargs))
+        self._start_background()
+        return True
+
+    def _start_background(self):
+        """Start waiting background work while the workers have nothing else to do."""
+        while True:
+            with self._lock:
+                if self._admitted or not self._background:
+                    return
+                fn, args, kwargs = self._background.popleft()
+                self._admitted += 1
+                self._stats["submitted"] += 1
+            self._start(fn, args, kwargs)
+
+    def _start(self, fn: Callable, args, kwargs):
+        try:
+            # Context variables (e.g. the LLM session) follow the work onto the worker thread
+            return self._executor().submit(contextvars.copy_context().run, self._run, fn, args, kwargs)
+        except Exception:
+            with self._lock:
+                self._admitted -= 1
+            raise
+
+    async def run(self, fn: Callable, *args, **kwargs):
+        """Await blocking work on the LLM workers without holding an event-loop or threadpool thread."""
+        return await asyncio.wrap_future(self.submit(fn, *args, **kwargs))
+
+    def stream(self, fn: Callable[..., Iterable], *args, **kwargs) -> AsyncIterator:
+        """
+        Iterate a blocking generator (e.g. llm.stream(prompt)) on the LLM workers,
+        yielding its items on the event loop as they are produced. Admission is
+        decided now, so Overloaded is raised before anything is streamed; closing
+        the returned iterator early stops the generator at its next item.
+        """
+        loop = asyncio.get_running_loop()
+        items: asyncio.Queue = asyncio.Queue()
+        stopped = threading.Event()
+        end = object()
+
+        def produce():
+            try:
+                for item in fn(*args, **kwargs):
+                    if stopped.is_set():
+                        break
+                    loop.call_soon_threadsafe(items.put_nowait, (item, None))
+            except Exception as e:
+                loop.call_soon_threadsafe(items.put_nowait, (end, e))
+                raise
+            loop.call_soon_threadsafe(items.put_nowait, (end, None))
+
+        self.submit(produce)
+
+        async def consume():
+            try:
+                while True:
+                    item, error = await items.get()
+                    if error is not None:
+                        raise error
+                    if item is end:
+                        return
+                    yield item
+            finally:
+                stopped.set()
+
+        return consume()
+
+    def stats(self) -> dict:
+        with self._lock:
+            admitted = self._admitted
+        return {
+            **self._stats,
+            "running": min(admitted, self.workers),
+            "queued": max(0, admitted - self.workers),
+            "background_waiting": len(self._background),
+            "workers": self.workers,
+            "max_queue": self.max_queue,
+            "avg_service_seconds": round(self._avg_service, 3),
+        }
+
+
+llm_executor = LLMExecutor(workers=settings.XIARA_LLM_WORKERS, max_queue=settings.XIARA_LLM_QUEUE_SIZE)
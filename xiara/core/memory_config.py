@@ -1,7 +1,7 @@
-from langchain.memory import ConversationBufferMemory
+from xiara.core.memory_manager import BudgetedConversationMemory
 
 # Single point of memory creation — easy to swap with RedisMemory later
-memory = ConversationBufferMemory(
+memory = BudgetedConversationMemory(
     memory_key="chat_history",
     return_messages=True
 )
@@ -3,19 +3,162 @@
 Memory Manager for Xiara
 Supports in-memory (default) or Redis-backed conversation history,
 structured query persistence, and caching of product search results.
+Per-user state is kept in bounded, expiring session stores.
 """
 
-from langchain.memory import ConversationBufferMemory
+import threading
+from typing import Any, Dict, List, Optional
 
-# Toggle this to switch memory backends later
-USE_REDIS = False  # Set to True to use RedisMemory
+from langchain.memory.chat_memory import BaseChatMemory
+from langchain_core.messages import BaseMessage, SystemMessage, get_buffer_string
+from pydantic import PrivateAttr
 
-# Store per-user memories here
-_memory_store = {}
+from shared.config.settings import settings
+from shared.storage.redis_client import get_bytes_redis, redis_url
+from xiara.core.response_cache import response_cache
+from xiara.core.session_store import session_store
+from xiara.core.token_budget import TokenCounter, fold_point, window_start
 
-# Fallback storage for last queries and cached results
-_last_queries = {}
-_query_cache = {}
+# Redis mode shares session state between workers and nodes (XIARA_SESSION_STORE=redis)
+USE_REDIS = settings.XIARA_SESSION_STORE == "redis"
+
+
+def _memory_size(memory) -> int:
+    """Characters held in process by a memory (Redis-backed histories hold only the wrapper)."""
+    size = len(memory.summary)
+    if not USE_REDIS:
+        size += sum(len(m.content) for m in memory.chat_memory.messages)
+    return size
+
+
+# Per-user memories. The objects themselves stay in process; in Redis mode their messages and
+# summaries live in Redis, so any worker can rebuild them
+_memory_store = session_store("memory", local=True, sizeof=_memory_size)
+
+# Running summaries of Redis-backed conversations
+_summaries = session_store("summary") if USE_REDIS else None
+
+# Last structured query per user
+_last_queries = session_store("last_query")
+
+
+def count_tokens(text: str) -> Optional[int]:
+    from xiara.core.llm_config import count_tokens as llm_count_tokens
+
+    return llm_count_tokens(text)
+
+
+# Shared across sessions: a message is tokenized once
+token_counter = TokenCounter(count_tokens)
+
+
+class BudgetedConversationMemory(BaseChatMemory):
+    """
+    Conversation memory that fits a token budget.
+
+    The newest `recent_messages` are always kept verbatim; older messages are
+    folded into a running summary by the LLM in the background (on the LLM
+    executor once it is idle, after the turn has been answered), so loading
+    the history never waits for summarization and requests never wait for a
+    fold. Until a fold completes, older messages are included newest-first
+    only as far as the budget allows.
+    """
+
+    memory_key: str = "chat_history"
+    max_tokens: int = 768
+    recent_messages: int = 4
+    summary: str = ""
+    # Shared summary (Redis mode): another worker may have folded this session meanwhile
+    summary_store: Any = None
+    session_id: str = ""
+    _lock: Any = PrivateAttr(default_factory=threading.RLock)
+    _folding: bool = PrivateAttr(default=False)
+
+    @property
+    def memory_variables(self) -> List[str]:
+        return [self.memory_key]
+
+    def current_summary(self) -> str:
+        if self.summary_store is not None:
+            return self.summary_store.get(self.session_id, "")
+        return self.summary
+
+    def budgeted_messages(self) -> List[BaseMessage]:
+        with self._lock:
+            messages = list(self.chat_memory.messages)
+            summary = self.current_summary()
+        prefix = [SystemMessage(content=f"Summary of the earlier conversation: {summary}")] if summary else []
+        budget = self.max_tokens - token_counter.total([m.content for m in prefix])
+        start = window_start([token_counter(m.content) for m in messages], budget, self.recent_messages)
+        return prefix + messages[start:]
+
+    def load_memory_variables(self, inputs: Dict[str, Any]) -> Dict[str, Any]:
+        messages = self.budgeted_messages()
+        if self.return_messages:
+            return {self.memory_key: messages}
+        return {self.memory_key: get_buffer_string(messages)}
+
+    def save_context(self, inputs: Dict[str, Any], outputs: Dict[str, str]) -> None:
+        with self._lock:
+            super().save_context(inputs, outputs)
+        self._schedule_fold()
+
+    def clear(self) -> None:
+        with self._lock:
+            super().clear()
+            self.summary = ""
+            if self.summary_store is not None:
+                self.summary_store.delete(self.session_id)
+
+    def _schedule_fold(self):
+        with self._lock:
+            counts = [token_counter(m.content) for m in self.chat_memory.messages]
+            n = fold_point(counts, self.recent_messages, self.max_tokens // 4)
+            if not n or self._folding:
+                return
+            self._folding = True
+        from xiara.core.llm_executor import llm_executor
+
+        if not llm_executor.submit_when_idle(self._fold, n):
+            # Too many folds waiting: the history stays within budget meanwhile; retry after the next turn
+            with self._lock:
+                self._folding = False
+
+    def _fold(self, n: int):
+        """Summarize the oldest `n` messages into the running summary (runs on an LLM worker)."""
+        from langchain.memory.prompt import SUMMARY_PROMPT
+        from xiara.core.llm_config import get_llm
+
+        try:
+            with self._lock:
+                folded = list(self.chat_memory.messages)[:n]
+                summary = self.current_summary()
+            result = get_llm().invoke(SUMMARY_PROMPT.format(summary=summary, new_lines=get_buffer_string(folded)))
+            new_summary = getattr(result, "content", result).strip()
+            with self._lock:
+                messages = list(self.chat_memory.messages)
+                # Cleared or rewritten meanwhile: drop this fold
+                if messages[:n] != folded or not new_summary:
+                    return
+                self.chat_memory.clear()
+                self.chat_memory.add_messages(messages[n:])
+                self.summary = new_summary
+                if self.summary_store is not None:
+                    self.summary_store[self.session_id] = new_summary
+        finally:
+            with self._lock:
+                self._folding = False
+
+
+def _new_memory(**kwargs) -> BudgetedConversationMemory:
+    return BudgetedConversationMemory(
+        memory_key="chat_history",
+        return_messages=True,
+        output_key="answer",
+        max_tokens=settings.XIARA_MEMORY_MAX_TOKENS,
+        recent_messages=settings.XIARA_MEMORY_RECENT_MESSAGES,
+        **kwargs
+    )
 
 
 def get_memory(session_id: str = "default_session"):
@@ -23,31 +166,28 @@ def get_memory(session_id: str = "default_session"):
     Returns a memory object for storing conversation context.
     Each user/session_id gets its own memory buffer.
     """
+    memory = _memory_store.get(session_id)
+    if memory is not None:
+        # Sizes are re-measured once per turn: the previous turn's messages are counted now
+        _memory_store.resize(session_id)
+        return memory
+
     if USE_REDIS:
         from langchain.memory.chat_message_histories import RedisChatMessageHistory
 
-        if session_id not in _memory_store:
-            history = RedisChatMessageHistory(
-                url="redis://localhost:6379/0",
-                session_id=session_id
-            )
-            _memory_store[session_id] = ConversationBufferMemory(
-                memory_key="chat_history",
-                return_messages=True,
-                chat_memory=history,
-                output_key="answer"
-            )
-        return _memory_store[session_id]
-
+        history = RedisChatMessageHistory(
+            url=redis_url(),
+            session_id=session_id,
+            ttl=settings.XIARA_SESSION_TTL
+        )
+        # The shared pool instead of the client (and pool) it makes per session; it decodes bytes itself
+        history.redis_client = get_bytes_redis()
+        memory = _new_memory(chat_memory=history, summary_store=_summaries, session_id=session_id)
     else:
         # Default: In-memory buffer (per session)
-        if session_id not in _memory_store:
-            _memory_store[session_id] = ConversationBufferMemory(
-                memory_key="chat_history",
-                return_messages=True,
-                output_key="answer"
-            )
-        return _memory_store[session_id]
+        memory = _new_memory(session_id=session_id)
+    _memory_store[session_id] = memory
+    return memory
 
 
 # -------------------------------
@@ -55,87 +195,63 @@ def get_memory(session_id: str = "default_session"):
 # -------------------------------
 
 def set_last_query(user_id: str, query: str):
-    """Save last structured query in Redis or memory."""
-    if USE_REDIS:
-        import redis, json
-        global redis_client
-        if "redis_client" not in globals():
-            redis_client = redis.Redis.from_url("redis://localhost:6379/0")
-        redis_client.set(f"xiara:last_query:{user_id}", json.dumps({"query": query}))
-    else:
-        _last_queries[user_id] = query
+    """Save last structured query in the session store."""
+    _last_queries[user_id] = query
 
 
 def get_last_query(user_id: str):
-    """Retrieve last structured query from Redis or memory."""
-    if USE_REDIS:
-        import redis, json
-        global redis_client
-        if "redis_client" not in globals():
-            redis_client = redis.Redis.from_url("redis://localhost:6379/0")
-        data = redis_client.get(f"xiara:last_query:{user_id}")
-        if data:
-            return json.loads(data).get("query")
-        return None
-    else:
-        return _last_queries.get(user_id)
+    """Retrieve last structured query from the session store."""
+    return _last_queries.get(user_id)
+
+
+async def aset_last_query(user_id: str, query: str):
+    """Async variant of set_last_query."""
+    await _last_queries.aset(user_id, query)
+
+
+async def aget_last_query(user_id: str):
+    """Async variant of get_last_query."""
+    return await _last_queries.aget(user_id)
+
+
+def batch_get_last_query(batch, user_id: str):
+    """Queue the last-query read on a RedisBatch; the query (or None) is in `.value` once it has run."""
+    return _last_queries.batch_get(batch, user_id)
+
+
+def batch_set_last_query(batch, user_id: str, query: str):
+    """Queue the last-query write on a RedisBatch."""
+    return _last_queries.batch_set(batch, user_id, query)
 
 
 def clear_last_query(user_id: str):
     """Clear stored query for a user."""
-    if USE_REDIS:
-        import redis
-        global redis_client
-        if "redis_client" not in globals():
-            redis_client = redis.Redis.from_url("redis://localhost:6379/0")
-        redis_client.delete(f"xiara:last_query:{user_id}")
-    else:
-        if user_id in _last_queries:
-            del _last_queries[user_id]
+    _last_queries.delete(user_id)
 
 
 # -------------------------------
 # Product Search Caching
 # -------------------------------
+# Backed by the two-tier response cache (bounded LRU + TTL, optional Redis), in
+# their own key space so a search result is never served as an answer
+
+def _search_key(query: str) -> str:
+    return f"search:{response_cache.key_for(query)}"
+
 
-def cache_search_result(query: str, result: str, ttl: int = 600):
+def cache_search_result(query: str, result: str, ttl: Optional[int] = None):
     """
     Cache a product search result for a given query.
-    Default TTL = 600s (10 minutes).
+    Default TTL = XIARA_RESPONSE_CACHE_TTL (10 minutes).
     """
-    if USE_REDIS:
-        import redis, json
-        global redis_client
-        if "redis_client" not in globals():
-            redis_client = redis.Redis.from_url("redis://localhost:6379/0")
-        redis_client.setex(f"xiara:query_cache:{query}", ttl, json.dumps({"result": result}))
-    else:
-        _query_cache[query] = result
+    response_cache.set(_search_key(query), result, ttl)
 
 
 def get_cached_result(query: str):
     """Retrieve cached result if available."""
-    if USE_REDIS:
-        import redis, json
-        global redis_client
-        if "redis_client" not in globals():
-            redis_client = redis.Redis.from_url("redis://localhost:6379/0")
-        data = redis_client.get(f"xiara:query_cache:{query}")
-        if data:
-            return json.loads(data).get("result")
-        return None
-    else:
-        return _query_cache.get(query)
+    return response_cache.get(_search_key(query))
 
 
 def clear_cached_result(query: str):
     """Remove a query result from cache."""
-    if USE_REDIS:
-        import redis
-        global redis_client
-        if "redis_client" not in globals():
-            redis_client = redis.Redis.from_url("redis://localhost:6379/0")
-        redis_client.delete(f"xiara:query_cache:{query}")
-    else:
-        if query in _query_cache:
-            del _query_cache[query]
+    response_cache.delete(_search_key(query))
@@ -0,0 +1,123 @@
+# xiara/core/model_registry.py
+"""
+Process-wide registry of embedding models for Xiara.
+
+Each model is loaded lazily, once, and shared by retrieval, user embeddings
+and classifiers. Small concurrent embedding calls (one query per request)
+are coalesced by a micro-batcher into a single forward pass. User texts
+(profiles, histories) use `get_uncached_embeddings`, so they never reach
+the on-disk document cache shared with the product catalog.
+"""
+
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from typing import Dict, List, Tuple
+
+from langchain_core.embeddings import Embeddings
+
+from shared.config.settings import settings
+from xiara.core.embedding_cache import CachedEmbeddings, cached_embeddings
+
+DEFAULT_EMBEDDING_MODEL = "sentence-transformers/all-MiniLM-L6-v2"
+
+_models: Dict[str, CachedEmbeddings] = {}
+_models_lock = threading.Lock()
+
+
+class BatchingEmbeddings(Embeddings):
+    """
+    Coalesces embedding calls from concurrent threads.
+    Callers block while a worker thread gathers requests for up to
+    `max_wait_ms` (or `max_batch` texts) and embeds them in one call.
+    Queries go through the document path, which is equivalent for symmetric
+    models such as MiniLM that use no query instruction.
+    """
+
+    def __init__(self, model: Embeddings, max_batch: int = 64, max_wait_ms: float = 5.0):
+        self.model = model
+        self.max_batch = max_batch
+        self.max_wait = max_wait_ms / 1000.0
+        self._queue: "queue.Queue[Tuple[List[str], Future]]" = queue.Queue()
+        self._worker = None
+        self._worker_lock = threading.Lock()
+        self.batches = 0
+        self.batched_calls = 0
+
+    def _ensure_worker(self):
+        if self._worker is None:
+            with self._worker_lock:
+                if self._worker is None:
+                    self._worker = threading.Thread(target=self._run, name="xiara-embed-batcher", daemon=True)
+                    self._worker.start()
+
+    def _run(self):
+        while True:
+            pending = [self._queue.get()]
+            size = len(pending[0][0])
+            deadline = time.monotonic() + self.max_wait
+            while size < self.max_batch:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    item = self._queue.get(timeout=remaining)
+                except queue.Empty:
+                    break
+                pending.append(item)
+                size += len(item[0])
+
+            texts = [t for item_texts, _ in pending for t in item_texts]
+            try:
+                vectors = self.model.embed_documents(texts)
+            except Exception as e:
+                for _, future in pending:
+                    future.set_exception(e)
+                continue
+            self.batches += 1
+            self.batched_calls += len(pending)
+            offset = 0
+            for item_texts, future in pending:
+                future.set_result(vectors[offset:offset + len(item_texts)])
+                offset += len(item_texts)
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        # Bulk calls (index builds) already fill a forward pass on their own
+        if len(texts) >= self.max_batch or self.max_wait <= 0:
+            return self.model.embed_documents(texts)
+        self._ensure_worker()
+        future: Future = Future()
+        self._queue.put((list(texts), future))
+        return future.result()
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.embed_documents([text])[0]
+
+
+def get_embeddings(model_name: str = DEFAULT_EMBEDDING_MODEL) -> CachedEmbeddings:
+    """Return the shared (cached, batched) embeddings for a model, loading it on first use."""
+    model = _models.get(model_name)
+    if model is not None:
+        return model
+    with _models_lock:
+        if model_name not in _models:
+            from langchain_huggingface import HuggingFaceEmbeddings
+
+            base = HuggingFaceEmbeddings(model_name=model_name)
+            batcher = BatchingEmbeddings(
+                base,
+                max_batch=settings.XIARA_EMBED_MAX_BATCH,
+                max_wait_ms=settings.XIARA_EMBED_BATCH_WAIT_MS,
+            )
+            _models[model_name] = cached_embeddings(batcher, model_name)
+        return _models[model_name]
+
+
+def get_uncached_embeddings(model_name: str = DEFAULT_EMBEDDING_MODEL) -> Embeddings:
+    """The shared (batched) model without the persistent document cache, for personal texts."""
+    return get_embeddings(model_name).model
+
+
+def loaded_models() -> List[str]:
+    return list(_models)
@@ -0,0 +1,135 @@
+# xiara/core/multi_product.py
+"""
+Answering multi-product requests ("boots and a backpack and a watch").
+
+Sub-queries produced by split_multi_product_query are already standalone,
+so they skip the chain's question-condensing LLM call. Their product
+context is retrieved together (one embedding batch, one FAISS search) and
+the answers are generated either:
+
+- "merged":     one LLM call with a "### n" section per product, or
+- "concurrent": one LLM call per product, up to XIARA_GENERATION_CONCURRENCY
+                at a time (for backends that serve parallel requests).
+
+Prompts are filled by a PromptAssembler, like single product answers: a
+merged prompt splits the token budget between its requests, and one that
+still doesn't fit is answered per product instead.
+"""
+
+import re
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import List, Optional
+
+from langchain_core.documents import Document
+
+from xiara.core.prompt_assembler import PromptAssembler
+
+MODES = ("merged", "concurrent")
+
+SYSTEM = (
+    "You are Xiara, a conversational and friendly AI shopping assistant for the Pasar marketplace.\n"
+    "Recommend products using only the product context provided. "
+    "Keep responses conversational, concise, and engaging."
+)
+
+MERGED_SYSTEM = (
+    SYSTEM + "\nThe shopper asked for several products. Answer every numbered request "
+    "separately, starting each answer with a line holding only \"###\" and its number, e.g. \"### 1\"."
+)
+
+
+@dataclass
+class SubAnswer:
+    question: str
+    answer: str = ""
+    sources: List[Document] = field(default_factory=list)
+    error: Optional[str] = None
+
+
+def _text(result) -> str:
+    return getattr(result, "content", result) if not isinstance(result, str) else result
+
+
+def _answer_one(llm, assembler: PromptAssembler, item: SubAnswer):
+    try:
+        assembled = assembler.assemble(SYSTEM, item.question, item.sources)
+        if assembled.over_budget:
+            print(f"⚠️ Answer prompt for {item.question!r} is over XIARA_PROMPT_MAX_TOKENS ({assembled.tokens} tokens)")
+        item.sources = assembled.products
+        item.answer = _text(llm.invoke(assembled.text)).strip() or "I'm not sure."
+    except Exception as e:
+        item.error = str(e)
+
+
+def answer_concurrently(llm, assembler: PromptAssembler, items: List[SubAnswer], limit: int):
+    """One generation per sub-query, at most `limit` in flight."""
+    with ThreadPoolExecutor(max_workers=max(1, limit), thread_name_prefix="xiara-gen") as pool:
+        list(pool.map(lambda item: _answer_one(llm, assembler, item), items))
+
+
+# A "### 1" line; numbered lists inside an answer ("1. Timberland ...") are not headers
+_SECTION = re.compile(r"^[ \t]*###[ \t]*(\d+)[.):]?[ \t]*$", re.MULTILINE)
+
+
+def split_sections(text: str, count: int) -> Optional[List[str]]:
+    """Split a "### n" multi-answer into `count` parts, or None if the headers are off."""
+    headers, expected = [], 1
+    for m in _SECTION.finditer(text):
+        if int(m.group(1)) == expected:
+            headers.append(m)
+            expected += 1
+    if len(headers) != count:
+        return None
+    ends = [m.start() for m in headers[1:]] + [len(text)]
+    sections = [text[m.end():end].strip() for m, end in zip(headers, ends)]
+    return sections if all(sections) else None
+
+
+def answer_merged(llm, assembler: PromptAssembler, items: List[SubAnswer]):
+    """
+    All sub-queries in one prompt; falls back to per-query calls if they
+    don't fit in the token budget together or the answer can't be split.
+    """
+    assembled = assembler.assemble_merged(MERGED_SYSTEM, [item.question for item in items],
+                                          [item.sources for item in items])
+    if assembled.over_budget:
+        print(f"⚠️ Merged prompt for {len(items)} products is over XIARA_PROMPT_MAX_TOKENS "
+              f"({assembled.tokens} tokens), answering them one by one")
+        answer_concurrently(llm, assembler, items, 1)
+        return
+    try:
+        text = _text(llm.invoke(assembled.text))
+    except Exception as e:
+        for item in items:
+            item.error = str(e)
+        return
+    sections = split_sections(text, len(items))
+    if sections is None:
+        answer_concurrently(llm, assembler, items, 1)
+        return
+    for item, section, sources in zip(items, sections, assembled.sections):
+        item.answer, item.sources = section, sources
+
+
+def answer_sub_queries(llm, retriever, sub_queries: List[str], assembler: PromptAssembler, mode: str = "merged",
+                       limit: int = 1) -> List[SubAnswer]:
+    """
+    Retrieve context for all sub-queries in one batch, then generate their
+    answers from prompts filled by `assembler`.
+    """
+    if mode not in MODES:
+        raise ValueError(f"Unknown multi-product mode {mode!r}; expected one of {MODES}")
+    items = [SubAnswer(q) for q in sub_queries]
+    try:
+        for item, docs in zip(items, retriever.retrieve_many(sub_queries)):
+            item.sources = docs
+    except Exception as e:
+        for item in items:
+            item.error = str(e)
+        return items
+    if mode == "merged":
+        answer_merged(llm, assembler, items)
+    else:
+        answer_concurrently(llm, assembler, items, limit)
+    return items
@@ -1,7 +1,11 @@
-from typing import Dict, Tuple, Optional
-from dataclasses import dataclass
+import json
+from typing import Tuple, Optional
+from dataclasses import asdict, dataclass
 from datetime import datetime
 
+from xiara.core.keyword_matcher import KeywordIndex, vocabulary
+from xiara.core.session_store import session_store
+
 @dataclass
 class NegotiationState:
     original_price: float
@@ -11,33 +15,56 @@ class NegotiationState:
     last_update: datetime
     product_id: str
 
+    def to_json(self) -> str:
+        return json.dumps({**asdict(self), "last_update": self.last_update.isoformat()})
+
+    @classmethod
+    def from_json(cls, data: str) -> "NegotiationState":
+        fields = json.loads(data)
+        fields["last_update"] = datetime.fromisoformat(fields["last_update"])
+        return cls(**fields)
+
 class NegotiationHandler:
     def __init__(self):
-        self.negotiation_keywords = {
-            'discount': ['discount', 'cheaper', 'lower price', 'better price', 'deal', 'offer'],
-            'bargain': ['negotiate', 'bargain', 'reduce', 'cut price', 'best price'],
-            'inquiry': ['how much', 'price', 'cost', 'pricing']
-        }
+        # Intent -> phrases, checked in this order (xiara/core/vocabularies.json, "negotiation" group)
+        self.negotiation_keywords = dict(vocabulary("negotiation"))
+        self.intent_index = KeywordIndex(self.negotiation_keywords)
         
-        self.active_negotiations: Dict[str, NegotiationState] = {}
+        # Per-user state, bounded and expiring; shared across workers in Redis mode
+        self.active_negotiations = session_store(
+            "negotiations", encode=NegotiationState.to_json, decode=NegotiationState.from_json
+        )
         self.MIN_DISCOUNT = 0.05  # 5% minimum discount
         self.MAX_DISCOUNT = 0.30  # 30% maximum discount
         
     def detect_negotiation_intent(self, message: str) -> Tuple[bool, Optional[str]]:
-        message = message.lower()
-        for intent, keywords in self.negotiation_keywords.items():
-            if any(keyword in message for keyword in keywords):
-                return True, intent
-        return False, None
+        intent = self.intent_index.first(message)
+        return intent is not None, intent
 
     def generate_response(self, 
                          user_id: str, 
                          product_id: str, 
                          original_price: float, 
                          intent: str) -> str:
-        
         # Get or create negotiation state
         neg_state = self.active_negotiations.get(user_id)
+        response, neg_state = self._negotiate(neg_state, product_id, original_price, intent)
+        if neg_state is not None:
+            self.active_negotiations[user_id] = neg_state
+        return response
+
+    async def agenerate_response(self, user_id: str, product_id: str, original_price: float, intent: str) -> str:
+        """generate_response with the async session store reads and writes (for async routes)"""
+        neg_state = await self.active_negotiations.aget(user_id)
+        response, neg_state = self._negotiate(neg_state, product_id, original_price, intent)
+        if neg_state is not None:
+            await self.active_negotiations.aset(user_id, neg_state)
+        return response
+
+    def _negotiate(self, neg_state: Optional[NegotiationState], product_id: str, original_price: float,
+                   intent: str) -> Tuple[str, Optional[NegotiationState]]:
+        """(response, the state to store, or None when it is unchanged)"""
+        changed = not neg_state
         if not neg_state:
             neg_state = NegotiationState(
                 original_price=original_price,
@@ -47,43 +74,45 @@ class NegotiationHandler:
                 last_update=datetime.now(),
                 product_id=product_id
             )
-            self.active_negotiations[user_id] = neg_state
+        saved = neg_state if changed else None
 
         # Handle different intents
         if intent == 'inquiry':
-            return f"The current price is ${neg_state.current_offer:.2f}. Would you like to discuss a better price?"
+            return f"The current price is ${neg_state.current_offer:.2f}. Would you like to discuss a better price?", saved
             
         if intent == 'discount':
             if neg_state.attempts >= 3:
-                return "I'll need to check with the seller for any additional discounts. Would you like me to do that?"
+                return ("I'll need to check with the seller for any additional discounts. "
+                        "Would you like me to do that?"), saved
             
             # Calculate new offer based on attempts
             discount = min(0.05 * (neg_state.attempts + 1), self.MAX_DISCOUNT)
             new_offer = neg_state.original_price * (1 - discount)
             neg_state.current_offer = new_offer
             neg_state.attempts += 1
+            neg_state.last_update = datetime.now()
             
             return (f"I can offer you a special price of ${new_offer:.2f}. "
-                   f"That's a {discount*100:.0f}% discount!")
+                   f"That's a {discount*100:.0f}% discount!"), neg_state
                    
         if intent == 'bargain':
             if neg_state.current_offer <= neg_state.target_price:
                 return ("This is already our best possible price. "
-                       "Would you like to proceed with the purchase?")
+                       "Would you like to proceed with the purchase?"), saved
             
             # Calculate counter-offer
             discount = min(0.07 * (neg_state.attempts + 1), self.MAX_DISCOUNT)
             new_offer = neg_state.original_price * (1 - discount)
             neg_state.current_offer = new_offer
             neg_state.attempts += 1
+            neg_state.last_update = datetime.now()
             
             return (f"I understand you're looking for a better deal. "
-                   f"I can offer it at ${new_offer:.2f}. How does that sound?")
+                   f"I can offer it at ${new_offer:.2f}. How does that sound?"), neg_state
 
         # Default response if intent is not recognized
-        return "I'm sorry, I didn't understand your request. Could you please clarify?"
+        return "I'm sorry, I didn't understand your request. Could you please clarify?", saved
 
     def reset_negotiation(self, user_id: str):
         """Reset negotiation state for a user"""
-        if user_id in self.active_negotiations:
-            del self.active_negotiations[user_id]
\ No newline at end of file
+        self.active_negotiations.delete(user_id)
\ No newline at end of file
@@ -1,8 +1,9 @@
-from typing import Tuple
+from typing import Optional, Tuple
+from xiara.core.attribute_store import Constraints, parse_currency, parse_price_range
 from xiara.core.user_profile_manager import get_user_profile
 
 def apply_personalization_filters(query: str, user_id: str) -> str:
-    profile = get_user_profile(user_id)
+    profile = get_user_profile(user_id, history=False)
     if not profile:
         return query  # No profile, return original query
     
@@ -22,3 +23,25 @@ def apply_personalization_filters(query: str, user_id: str) -> str:
         query = f"{query}\n\n[Personalization: {' '.join(personalization_context)}]"
 
     return query
+
+
+def personalization_constraints(user_id: str) -> Optional[Constraints]:
+    """Structured retrieval filters from the user's profile (applied softly by the retriever)."""
+    return profile_constraints(get_user_profile(user_id, history=False))
+
+
+def profile_constraints(profile) -> Optional[Constraints]:
+    """personalization_constraints for a profile the request has already loaded."""
+    if not profile:
+        return None
+
+    price_range = getattr(profile, "preferred_price_range", None)
+    min_price, max_price = parse_price_range(price_range)
+    constraints = Constraints(
+        min_price=min_price,
+        max_price=max_price,
+        currency=parse_currency(price_range),
+        categories={c.strip().lower() for c in getattr(profile, "liked_categories", []) if c.strip()},
+        exclude_categories={c.strip().lower() for c in getattr(profile, "disliked_categories", []) if c.strip()},
+    )
+    return None if constraints.is_empty() else constraints
@@ -0,0 +1,120 @@
+# xiara/core/prefix_cache.py
+"""
+Bookkeeping for KV-cache reuse in the inference service.
+
+Finished prompts (and pinned static prefixes such as Xiara's system prompt)
+keep their llama.cpp KV state in spare sequences of the shared context. A
+new prompt starts from the cached sequence sharing its longest token
+prefix: the scheduler copies those positions into the request's slot
+(llama_kv_cache_seq_cp shares the cells, nothing is recomputed) and only
+evaluates the remaining tokens. A follow-up turn therefore pays for the
+new message, not the system prompt and the whole conversation again.
+
+Entries are keyed by session (one snapshot per session and prompt
+template) or pinned. Unpinned entries are evicted least recently used
+first when the token budget (the memory cap) or the spare sequences run
+out. This class only tracks which sequence holds which tokens; the
+scheduler does the KV copies and clears.
+"""
+
+import hashlib
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import List, Optional, Sequence, Tuple
+
+import numpy as np
+
+# Prompts sharing fewer tokens than this with every entry are evaluated from scratch
+MIN_MATCH = 8
+
+
+@dataclass
+class CacheEntry:
+    seq_id: int
+    tokens: np.ndarray
+    pinned: bool = False
+
+
+def common_prefix(a: np.ndarray, b: np.ndarray) -> int:
+    n = min(len(a), len(b))
+    mismatch = np.flatnonzero(a[:n] != b[:n])
+    return int(mismatch[0]) if len(mismatch) else n
+
+
+def template_key(session: str, tokens: Sequence[int], head: int = 32) -> str:
+    """One snapshot per session and prompt template (condense, QA, ...), told apart by their first tokens."""
+    digest = hashlib.sha1(np.asarray(tokens[:head], dtype=np.int32).tobytes()).hexdigest()[:12]
+    return f"{session}/{digest}"
+
+
+class PrefixCache:
+    def __init__(self, seq_ids: Sequence[int], max_tokens: int, min_match: int = MIN_MATCH):
+        self.max_tokens = max_tokens
+        self.min_match = min_match
+        self._free = list(seq_ids)
+        self._entries: "OrderedDict[str, CacheEntry]" = OrderedDict()
+        self._stats = {"lookups": 0, "hits": 0, "reused_tokens": 0, "stores": 0, "evictions": 0}
+
+    @property
+    def tokens(self) -> int:
+        return sum(len(entry.tokens) for entry in self._entries.values())
+
+    def lookup(self, tokens: Sequence[int]) -> Tuple[Optional[int], int]:
+        """(sequence id, matched length) of the entry sharing the longest prefix with `tokens`."""
+        self._stats["lookups"] += 1
+        tokens = np.asarray(tokens, dtype=np.int32)
+        best_key, best = None, 0
+        for key, entry in self._entries.items():
+            n = common_prefix(entry.tokens, tokens)
+            if n > best:
+                best_key, best = key, n
+        if best_key is None or best < self.min_match:
+            return None, 0
+        self._entries.move_to_end(best_key)
+        self._stats["hits"] += 1
+        self._stats["reused_tokens"] += best
+        return self._entries[best_key].seq_id, best
+
+    def store(self, key: str, tokens: Sequence[int], pinned: bool = False) -> Tuple[Optional[int], List[int]]:
+        """
+        Reserve a sequence for `tokens` under `key`. Returns the sequence id to
+        fill (its old contents must be cleared first) or None if it cannot fit,
+        and the sequence ids of evicted entries, to be cleared.
+        """
+        tokens = np.asarray(tokens, dtype=np.int32)
+        if len(tokens) < self.min_match or len(tokens) > self.max_tokens:
+            return None, []
+        evicted = []
+        previous = self._entries.pop(key, None)
+        if previous is not None:
+            self._free.append(previous.seq_id)
+            evicted.append(previous.seq_id)
+        while (not self._free or self.tokens + len(tokens) > self.max_tokens) and self._evict_one(evicted):
+            pass
+        if not self._free or self.tokens + len(tokens) > self.max_tokens:
+            return None, evicted
+        seq_id = self._free.pop()
+        self._entries[key] = CacheEntry(seq_id, tokens, pinned)
+        self._stats["stores"] += 1
+        return seq_id, evicted
+
+    def _evict_one(self, evicted: List[int]) -> bool:
+        for key, entry in self._entries.items():
+            if not entry.pinned:
+                del self._entries[key]
+                self._free.append(entry.seq_id)
+                evicted.append(entry.seq_id)
+                self._stats["evictions"] += 1
+                return True
+        return False
+
+    def stats(self) -> dict:
+        lookups = self._stats["lookups"]
+        return {
+            **self._stats,
+            "hit_rate": self._stats["hits"] / lookups if lookups else 0.0,
+            "entries": len(self._entries),
+            "pinned": sum(entry.pinned for entry in self._entries.values()),
+            "tokens": self.tokens,
+            "max_tokens": self.max_tokens,
+        }
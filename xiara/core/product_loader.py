@@ -1,51 +1,217 @@
 import os
+import re
 import json
 import pandas as pd
 from langchain_core.documents import Document
-from typing import Optional, List
+from typing import Iterator, Optional, List
 
-def load_all_products(data_path: Optional[str] = None) -> List[Document]:
-    """Load all product documents from the data directory."""
-    if data_path is None:
-        current_dir = os.path.dirname(os.path.abspath(__file__))
-        data_path = os.path.join(current_dir, '..', 'data')
+from shared.config.settings import settings
+from xiara.core.attribute_store import attribute_columns, extract_attributes
+
+PRODUCT_EXTENSIONS = (".txt", ".csv", ".json", ".ndjson", ".jsonl")
+JSON_READ_SIZE = 1 << 16
+
+
+def default_data_path() -> str:
+    current_dir = os.path.dirname(os.path.abspath(__file__))
+    return os.path.join(current_dir, '..', 'data')
 
-    docs = []
+
+def list_product_files(data_path: Optional[str] = None) -> List[str]:
+    """Return paths of the loadable product files in the data directory."""
+    if data_path is None:
+        data_path = default_data_path()
 
     if not os.path.exists(data_path):
         print(f" Data directory not found: {data_path}. Continuing without loading products.")
-        return docs  # Just return empty
+        return []
 
     try:
-        files = os.listdir(data_path)
+        files = sorted(os.listdir(data_path))
     except Exception as e:
         print(f" Cannot access data directory {data_path}: {e}")
-        return docs
+        return []
+
+    return [
+        os.path.join(data_path, filename)
+        for filename in files
+        if filename.endswith(PRODUCT_EXTENSIONS) and os.path.isfile(os.path.join(data_path, filename))
+    ]
+
+
+def format_csv_chunk(df: pd.DataFrame) -> pd.Series:
+    """
+    Vectorized "col: value, ..." formatting of every row in a DataFrame chunk.
+    Cells are expected as read (dtype=str, empty cells as ""), so a row
+    renders the same whichever chunk it lands in.
+    """
+    columns = list(df.columns)
+    if not columns:
+        return pd.Series([""] * len(df), index=df.index, dtype=object)
+    content = f"{columns[0]}: " + df[columns[0]].astype(str)
+    for col in columns[1:]:
+        content = content + f", {col}: " + df[col].astype(str)
+    return content
+
+
+def format_item(item: dict) -> str:
+    return ", ".join(f"{k}: {v}" for k, v in item.items())
+
+
+def product_document(content: str, filename: str, fields: dict) -> Document:
+    """A product document whose metadata carries its structured attributes (price, brand, ...)."""
+    return Document(page_content=content, metadata={"source": filename, **extract_attributes(fields)})
+
+
+def iter_text_products(text: str, filename: str) -> Iterator[Document]:
+    """
+    One document per blank-line separated block. Blocks written as
+    "Key: value" lines (e.g. "Price: $79") get their attributes extracted.
+    """
+    for block in re.split(r"\n\s*\n", text):
+        block = block.strip()
+        if not block:
+            continue
+        fields = dict(
+            line.split(":", 1) for line in block.splitlines() if ":" in line
+        )
+        fields = {k.strip(): v.strip() for k, v in fields.items()}
+        yield product_document(block, filename, fields)
+
+
+def iter_json_array(f) -> Iterator:
+    """
+    Yield the items of a top-level JSON array one at a time without loading
+    the whole file. Anything other than an array yields nothing.
+    """
+    decoder = json.JSONDecoder()
+    buf, eof, read_size = "", False, JSON_READ_SIZE
+    started = False
+
+    while True:
+        buf = buf.lstrip()
+        if not buf:
+            if eof:
+                return
+            chunk = f.read(read_size)
+            eof = not chunk
+            buf += chunk
+            continue
+
+        if not started:
+            if buf[0] != "[":
+                return
+            buf, started = buf[1:], True
+            continue
+        if buf[0] == "]":
+            return
+        if buf[0] == ",":
+            buf = buf[1:]
+            continue
 
-    for filename in files:
-        filepath = os.path.join(data_path, filename)
-        if not os.path.isfile(filepath):
+        try:
+            item, end = decoder.raw_decode(buf)
+        except json.JSONDecodeError:
+            item, end = None, None
+        # Decoding up to the buffer edge may have cut a value short — read more first
+        if end is None or (end == len(buf) and not eof):
+            if eof:
+                raise ValueError("Truncated JSON array")
+            chunk = f.read(read_size)
+            eof = not chunk
+            buf += chunk
+            read_size *= 2
             continue
+
+        read_size = JSON_READ_SIZE
+        yield item
+        buf = buf[end:]
+
+
+def iter_json_items(item, filename: str) -> Iterator[Document]:
+    """
+    One document per JSON item. Table dumps ({"header": [...], "rows": [[...]]})
+    are expanded so every row becomes its own product document.
+    """
+    if not isinstance(item, dict):
+        return
+    header, rows = item.get("header"), item.get("rows")
+    if isinstance(header, list) and isinstance(rows, list):
+        for row in rows:
+            if isinstance(row, list):
+                fields = dict(zip(header, row))
+                yield product_document(format_item(fields), filename, fields)
+        return
+    yield product_document(format_item(item), filename, item)
+
+
+def iter_product_file(filepath: str, chunksize: Optional[int] = None) -> Iterator[Document]:
+    """
+    Stream the product documents (one per row/item) from a single file.
+    Read errors (a truncated or malformed file) are raised after the rows
+    read so far, so the index sync can tell a short read from deleted rows.
+    """
+    filename = os.path.basename(filepath)
+    chunksize = chunksize or settings.XIARA_INGEST_BATCH_SIZE
+    if filename.endswith(".txt"):
+        with open(filepath, "r", encoding="utf-8") as f:
+            yield from iter_text_products(f.read(), filename)
+
+    elif filename.endswith(".csv"):
+        # Cells as written: dtypes guessed per chunk would render "100" as "100.0" in some chunks
+        # and empty cells as "nan", changing the row keys (see index_manifest) for nothing
+        for chunk in pd.read_csv(filepath, chunksize=chunksize, dtype=str, keep_default_na=False):
+            # Only the attribute columns are walked row by row
+            attr_columns = attribute_columns(chunk.columns)
+            records = chunk[attr_columns].to_dict("records") if attr_columns else [{}] * len(chunk)
+            for content, fields in zip(format_csv_chunk(chunk), records):
+                yield product_document(content, filename, fields)
+
+    elif filename.endswith(".json"):
+        with open(filepath, "r", encoding="utf-8") as f:
+            for item in iter_json_array(f):
+                yield from iter_json_items(item, filename)
+
+    elif filename.endswith((".ndjson", ".jsonl")):
+        with open(filepath, "r", encoding="utf-8") as f:
+            for line in f:
+                if line.strip():
+                    yield from iter_json_items(json.loads(line), filename)
+
+
+def iter_batches(docs: Iterator[Document], batch_size: Optional[int] = None) -> Iterator[List[Document]]:
+    """Group a document stream into lists of at most batch_size."""
+    batch_size = batch_size or settings.XIARA_INGEST_BATCH_SIZE
+    batch = []
+    for doc in docs:
+        batch.append(doc)
+        if len(batch) >= batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def iter_products(data_path: Optional[str] = None) -> Iterator[Document]:
+    """Stream all product documents from the data directory, skipping the rest of unreadable files."""
+    for filepath in list_product_files(data_path):
         try:
-            if filename.endswith(".txt"):
-                with open(filepath, "r", encoding="utf-8") as f:
-                    docs.append(Document(page_content=f.read(), metadata={"source": filename}))
-
-            elif filename.endswith(".csv"):
-                df = pd.read_csv(filepath)
-                for _, row in df.iterrows():
-                    content = ", ".join(f"{col}: {row[col]}" for col in df.columns)
-                    docs.append(Document(page_content=content, metadata={"source": filename}))
-
-            elif filename.endswith(".json"):
-                with open(filepath, "r", encoding="utf-8") as f:
-                    data = json.load(f)
-                    if isinstance(data, list):
-                        for item in data:
-                            content = ", ".join(f"{k}: {v}" for k, v in item.items())
-                            docs.append(Document(page_content=content, metadata={"source": filename}))
+            yield from iter_product_file(filepath)
         except Exception as e:
-            print(f" Failed to process file {filename}: {e}")
+            print(f" Failed to process file {os.path.basename(filepath)}: {e}")
+
+
+def load_product_file(filepath: str) -> List[Document]:
+    """Load the product documents (one per row/item) from a single file."""
+    return list(iter_product_file(filepath))
+
+
+def load_all_products(data_path: Optional[str] = None) -> List[Document]:
+    """Load all product documents from the data directory."""
+    if data_path is None:
+        data_path = default_data_path()
+
+    docs = list(iter_products(data_path))
 
     if not docs:
         print(f" No documents loaded from {data_path}. Check file formats and content.")
@@ -0,0 +1,262 @@
+# xiara/core/prompt_assembler.py
+"""
+Token-budgeted answer prompts for product queries.
+
+The model has a 2048-token context and prompt evaluation dominates CPU
+time, so the answer prompt is filled against a token budget
+(XIARA_PROMPT_MAX_TOKENS) in priority order:
+
+1. the system prompt and the question, always
+2. retrieved products, best first: one entry per product (other chunks
+   of the same product are dropped) and only its key fields (name,
+   brand, price, category, features, a clipped description)
+3. the conversation history, newest messages first
+
+Every piece is counted with the model's tokenizer through a TokenCounter,
+so a product chunk or a message is tokenized once, not on every prompt
+it appears in. What doesn't fit is left out whole and counted (never cut
+mid-way by the model's context window), and the retrieval depth for the
+next query follows the budget left after the system prompt and question,
+at the average size of a trimmed product.
+
+A multi-product prompt (`assemble_merged`) numbers the requests and
+splits the product budget between them: each request gets an even share
+of what is left, so room one doesn't use goes to the next.
+"""
+
+import re
+import threading
+from dataclasses import dataclass, field
+from typing import Callable, List, Optional, Sequence
+
+from xiara.core.attribute_store import BRAND_FIELDS, CATEGORY_FIELDS, NAME_FIELDS, PRICE_FIELDS
+from xiara.core.token_budget import window_start
+
+# Fields kept from a product's "key: value" text, in this order
+KEY_FIELDS = (NAME_FIELDS, BRAND_FIELDS, PRICE_FIELDS, CATEGORY_FIELDS,
+              {"features", "size", "color", "colour"}, {"description"})
+# Free-text fields, clipped to the description length
+LONG_FIELDS = {"features", "description"}
+
+# "key: value" pairs, whether on their own lines ("Price: $79") or comma-separated (CSV rows)
+_FIELD = re.compile(r"(?:^|,\s+|\n)\s*([A-Za-z][\w ]{0,30}?):\s", re.MULTILINE)
+
+ROLES = {"human": "Human", "ai": "Assistant", "system": "Summary"}
+
+
+def clip(text: str, max_chars: int) -> str:
+    """`text` cut at a word boundary to at most `max_chars` characters, marked with "…"."""
+    if len(text) <= max_chars:
+        return text
+    cut = text[:max_chars]
+    if not text[max_chars].isspace():
+        # Don't end on part of a word
+        cut = cut.rsplit(" ", 1)[0]
+    return cut.rstrip(" ,.;") + "…"
+
+
+def product_fields(content: str) -> List[tuple]:
+    """The (key, value) pairs of a product text, in order."""
+    matches = list(_FIELD.finditer(content))
+    fields = []
+    for match, nxt in zip(matches, matches[1:] + [None]):
+        value = content[match.end():nxt.start() if nxt is not None else len(content)].strip()
+        fields.append((match.group(1).strip(), value))
+    return fields
+
+
+def trim_product(content: str, description_chars: int = 200) -> str:
+    """
+    A product's key fields as one line ("Name: ..., Price: ..."), or the
+    clipped text when it has no recognizable fields.
+    """
+    fields = product_fields(content)
+    kept = []
+    for names in KEY_FIELDS:
+        for key, value in fields:
+            normalized = key.lower().replace("_", " ")
+            if (normalized in names or key.lower() in names) and value and value.lower() not in ("none", "null", "nan"):
+                kept.append(f"{key}: {clip(value, description_chars) if normalized in LONG_FIELDS else value}")
+                break
+    if not kept:
+        return clip(" ".join(content.split()), description_chars)
+    return ", ".join(kept)
+
+
+def product_identity(doc) -> str:
+    """What makes two retrieved chunks the same product: its name, else its trimmed text."""
+    name = (getattr(doc, "metadata", None) or {}).get("name")
+    return str(name).strip().lower() if name else " ".join(doc.page_content.split()).lower()
+
+
+@dataclass
+class AssembledPrompt:
+    text: str
+    tokens: int
+    products: List = field(default_factory=list)  # the documents included
+    products_dropped: int = 0
+    duplicates: int = 0
+    history_dropped: int = 0
+    over_budget: bool = False
+    sections: List[List] = field(default_factory=list)  # per request of a merged prompt, the documents included
+
+
+@dataclass
+class ProductSection:
+    text: str
+    tokens: int
+    products: List = field(default_factory=list)
+    dropped: int = 0
+    duplicates: int = 0
+
+
+class PromptAssembler:
+    """Fills the answer prompt within a token budget (see the module docstring)."""
+
+    def __init__(self, count: Callable[[str], int], max_tokens: int, max_products: int = 4,
+                 description_chars: int = 200, initial_product_tokens: int = 60):
+        self.count = count
+        self.max_tokens = max_tokens
+        self.max_products = max_products
+        self.description_chars = description_chars
+        self._lock = threading.Lock()
+        self._product_tokens = [initial_product_tokens, 1]  # running total and count
+        self.prompts = 0
+        self.total_tokens = 0
+        self.products_dropped = 0
+        self.duplicates = 0
+        self.history_dropped = 0
+        self.over_budget = 0
+
+    @staticmethod
+    def _frame(system: str, question: str) -> tuple:
+        return f"{system}\n\n", f"Question: {question}\nAnswer:"
+
+    def prefix(self, system: str) -> str:
+        """The static start of every prompt, for KV-cache pinning."""
+        return self._frame(system, "")[0]
+
+    def retrieval_depth(self, system: str, question: str) -> int:
+        """How many products are worth retrieving for this question, at the average trimmed size."""
+        head, tail = self._frame(system, question)
+        remaining = self.max_tokens - self.count(head) - self.count(tail)
+        with self._lock:
+            average = self._product_tokens[0] / self._product_tokens[1]
+        return max(1, min(self.max_products, int(remaining // max(1.0, average))))
+
+    def products(self, documents: Sequence, budget: int, empty: str = "") -> ProductSection:
+        """
+        The "Products:" section within `budget` tokens: best first, one entry
+        per product, trimmed to its key fields. `empty` is the text used when
+        no product fits.
+        """
+        seen, lines, included, duplicates, dropped, used = set(), [], [], 0, 0, 0
+        header = "Products:\n"
+        header_tokens = self.count(header)
+        for doc in documents:
+            identity = product_identity(doc)
+            if identity in seen:
+                duplicates += 1
+                continue
+            seen.add(identity)
+            line = f"- {trim_product(doc.page_content, self.description_chars)}\n"
+            tokens = self.count(line)
+            with self._lock:
+                self._product_tokens[0] += tokens
+                self._product_tokens[1] += 1
+            extra = tokens + (header_tokens if not lines else 0)
+            if used + extra > budget:
+                dropped += 1
+                continue
+            used += extra
+            lines.append(line)
+            included.append(doc)
+        if not lines:
+            return ProductSection(empty, self.count(empty) if empty else 0, [], dropped, duplicates)
+        return ProductSection(header + "".join(lines) + "\n", used, included, dropped, duplicates)
+
+    def _record(self, used: int, dropped: int, duplicates: int, history_dropped: int, over_budget: bool):
+        with self._lock:
+            self.prompts += 1
+            self.total_tokens += used
+            self.products_dropped += dropped
+            self.duplicates += duplicates
+            self.history_dropped += history_dropped
+            self.over_budget += over_budget
+
+    def assemble(self, system: str, question: str, documents: Sequence, messages: Sequence = ()) -> AssembledPrompt:
+        head, tail = self._frame(system, question)
+        used = self.count(head) + self.count(tail)
+        over_budget = used > self.max_tokens
+
+        section = self.products(documents, self.max_tokens - used)
+        used += section.tokens
+        products, included, dropped, duplicates = section.text, section.products, section.dropped, section.duplicates
+
+        # History, newest first, whole messages only
+        history_lines = [f"{ROLES.get(m.type, m.type)}: {m.content}\n" for m in messages]
+        history_header = "Conversation so far:\n"
+        history = ""
+        if history_lines:
+            budget = self.max_tokens - used - self.count(history_header)
+            start = window_start([self.count(line) for line in history_lines], budget)
+            if start < len(history_lines):
+                kept = history_lines[start:]
+                used += self.count(history_header) + sum(self.count(line) for line in kept)
+                history = history_header + "".join(kept) + "\n"
+            history_dropped = start
+        else:
+            history_dropped = 0
+
+        self._record(used, dropped, duplicates, history_dropped, over_budget)
+        return AssembledPrompt(head + products + history + tail, used, included, dropped, duplicates,
+                               history_dropped, over_budget)
+
+    def assemble_merged(self, system: str, questions: Sequence[str], documents: Sequence[Sequence],
+                        empty: str = "Products: (no matching products found)\n\n") -> AssembledPrompt:
+        """
+        One prompt answering several numbered requests, each with its own
+        products (`documents[i]` for `questions[i]`) from a share of the budget.
+        """
+        head, tail = f"{system}\n\n", "Answer:"
+        frames = [f"{n}. {question}\n" for n, question in enumerate(questions, start=1)]
+        used = self.count(head) + self.count(tail) + sum(self.count(frame) for frame in frames)
+        over_budget = used > self.max_tokens
+
+        parts, sections, dropped, duplicates = [], [], 0, 0
+        for n, (frame, docs) in enumerate(zip(frames, documents)):
+            share = max(0, self.max_tokens - used) // (len(frames) - n)
+            section = self.products(docs, share, empty)
+            used += section.tokens
+            parts.append(frame + section.text)
+            sections.append(section.products)
+            dropped += section.dropped
+            duplicates += section.duplicates
+        over_budget = over_budget or used > self.max_tokens
+
+        self._record(used, dropped, duplicates, 0, over_budget)
+        return AssembledPrompt(head + "".join(parts) + tail, used, [doc for docs in sections for doc in docs],
+                               dropped, duplicates, 0, over_budget, sections)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "max_tokens": self.max_tokens,
+                "prompts": self.prompts,
+                "avg_prompt_tokens": round(self.total_tokens / self.prompts, 1) if self.prompts else 0.0,
+                "avg_product_tokens": round(self._product_tokens[0] / self._product_tokens[1], 1),
+                "products_dropped": self.products_dropped,
+                "duplicates_removed": self.duplicates,
+                "history_messages_dropped": self.history_dropped,
+                "over_budget": self.over_budget,
+            }
+
+
+def prompt_assembler(count: Optional[Callable[[str], int]] = None) -> PromptAssembler:
+    """An assembler configured from settings, counting with the shared cached tokenizer counts."""
+    from shared.config.settings import settings
+
+    if count is None:
+        from xiara.core.memory_manager import token_counter as count
+    return PromptAssembler(count, settings.XIARA_PROMPT_MAX_TOKENS, max_products=settings.XIARA_RETRIEVER_K,
+                           description_chars=settings.XIARA_PROMPT_DESCRIPTION_CHARS)
@@ -1,25 +1,40 @@
 # xiara/core/prompt_chain.py
+import asyncio
 import os
 import re
+from dataclasses import dataclass, field
+from typing import AsyncIterator, List, Optional
 from dotenv import load_dotenv
 from langchain.prompts import ChatPromptTemplate
-from langchain.chains import ConversationalRetrievalChain, LLMChain
-from langchain_community.vectorstores import FAISS
-from langchain_huggingface import HuggingFaceEmbeddings
-from langchain.text_splitter import CharacterTextSplitter
-from xiara.core.product_loader import load_all_products
-from xiara.core.llm_config import llm
-from xiara.core.vectorstore_loader import get_vectorstore
-from xiara.core.user_profile_manager import get_user_profile, save_user_profile, UserProfile
+from shared.config.settings import settings
+from xiara.core.llm_config import get_llm, session_scope
+from xiara.core.warmup import require_llm
+from xiara.core.user_profile_manager import (
+    batch_add_to_history, batch_get_user_profile, HISTORY_LIMIT, UserProfile,
+)
+from xiara.core.llm_executor import llm_executor
 from xiara.core.memory_manager import get_memory
 from xiara.core.ambiguity_detector import AmbiguityDetector
+from xiara.core.personalization_rules import profile_constraints
+from xiara.core.request_pipeline import RequestContext
+from xiara.core.query_rewriter import FOLLOW_UP_PATTERN, question_rewriter
 import re
-from xiara.core.memory_manager import get_last_query, set_last_query
+from xiara.core.memory_manager import batch_get_last_query, batch_set_last_query
+from shared.storage.redis_client import RedisBatch
+from xiara.core.response_cache import profile_fingerprint, response_cache
+from xiara.core.semantic_cache import semantic_cache
+from xiara.core.multi_product import MERGED_SYSTEM, SYSTEM, answer_sub_queries
+from xiara.core.prompt_assembler import prompt_assembler
+from xiara.core.fast_path import fast_path
 # Load env vars
 load_dotenv()
 DATA_PATH = os.getenv("DATA_PATH")
 USE_RAG = os.getenv("USE_RAG", "true").lower() == "true"
 ambiguity_detector = AmbiguityDetector()
+# Answer prompts for product queries, filled within XIARA_PROMPT_MAX_TOKENS
+answer_prompts = prompt_assembler()
+# Lookups answered from the retrieved products, without generation (XIARA_FAST_PATH_INTENTS)
+lookups = fast_path()
 
 # Helper: split multi-product queries
 def split_multi_product_query(query: str):
@@ -62,25 +77,30 @@ def split_multi_product_query(query: str):
     return sub_queries
 
 
-# Load vectorstore if RAG enabled
-if USE_RAG:
-    documents = load_all_products(DATA_PATH)
-    splitter = CharacterTextSplitter(chunk_size=500, chunk_overlap=50)
-    docs = splitter.split_documents(documents)
-    embedding_model = HuggingFaceEmbeddings(model_name="sentence-transformers/all-MiniLM-L6-v2")
-    VECTORSTORE_PATH = "xiara/core/faiss_index"
+# Set by load_retriever() during warm-up; until then requests run LLM-only
+retriever = None
 
-    if not os.path.exists(VECTORSTORE_PATH):
-        vectorstore = FAISS.from_documents(docs, embedding_model)
-        vectorstore.save_local(VECTORSTORE_PATH)
-    else:
-        vectorstore = get_vectorstore()
+
+def load_retriever():
+    """Load (or build) the product index and publish its retriever."""
+    global retriever
+    from xiara.core.filtered_retriever import FilteredRetriever
+    from xiara.core.vectorstore_loader import get_attribute_store, get_vectorstore, on_index_change, start_index_watcher
+
+    # Cached answers are keyed to the catalog version and dropped when it changes
+    on_index_change(response_cache.invalidate)
+    on_index_change(semantic_cache.invalidate)
+    # Builds the index on first run, otherwise applies only changed product rows
+    vectorstore = get_vectorstore()
 
     if vectorstore is None:
         raise ValueError("Vectorstore could not be loaded. Please check initialization.")
-    retriever = vectorstore.as_retriever()
-else:
-    retriever = None
+    if settings.XIARA_INDEX_WATCH:
+        start_index_watcher(vectorstore)
+    # Budget/brand/category constraints narrow the candidates before vector search
+    retriever = FilteredRetriever(vectorstore=vectorstore, store=get_attribute_store(),
+                                  k=settings.XIARA_RETRIEVER_K)
+    return retriever
 
 # Prompt template
 prompt = ChatPromptTemplate.from_messages([
@@ -93,40 +113,165 @@ prompt = ChatPromptTemplate.from_messages([
     ("human", "{question}")
 ])
 
+def _static_prefix(template) -> str:
+    """The part of a prompt template before its first variable."""
+    marker = "\x00"
+    return template.format(**{name: marker for name in template.input_variables}).split(marker)[0]
+
+
+def prompt_prefixes():
+    """Static prefixes of every prompt Xiara sends, for KV-cache pinning at warm-up."""
+    from langchain.chains.conversational_retrieval.prompts import CONDENSE_QUESTION_PROMPT
+
+    templates = [prompt, CONDENSE_QUESTION_PROMPT]
+    prefixes = [_static_prefix(t) for t in templates] + [answer_prompts.prefix(s) for s in (SYSTEM, MERGED_SYSTEM)]
+    return [p for p in dict.fromkeys(prefixes) if p.strip()]
+
+
 def build_user_chain(user_id: str):
+    """Conversation chain for LLM-only answers (no product index)."""
+    from langchain.chains import LLMChain
+
     memory = get_memory(session_id=user_id)
-    if USE_RAG:
-        return ConversationalRetrievalChain.from_llm(
-            llm=llm,
-            retriever=retriever,
-            memory=memory,
-            return_source_documents=True,
-            verbose=False
-        )
-    else:
-        return LLMChain(llm=llm, prompt=prompt, memory=memory, verbose=False)
+    return LLMChain(llm=get_llm(), prompt=prompt, memory=memory, verbose=False)
 
-def update_user_history(user_id: str, query: str):
-    profile = get_user_profile(user_id)
+def _with_history(profile: Optional[UserProfile], user_id: str, query: str) -> UserProfile:
     if profile is None:
         profile = UserProfile(user_id=user_id)
-    if not hasattr(profile, "history"):
-        profile.history = []
     profile.history.append(query)
-    profile.history = profile.history[-10:]
-    save_user_profile(profile)
+    profile.history = profile.history[-HISTORY_LIMIT:]
+    return profile
+
+def _turn_state_reads(user_id: str):
+    batch = RedisBatch()
+    return batch, batch_get_last_query(batch, user_id), batch_get_user_profile(batch, user_id)
+
+def load_turn_state(user_id: str):
+    """(last structured query, profile) in one Redis round trip."""
+    batch, last_query, profile = _turn_state_reads(user_id)
+    batch.execute()
+    return last_query.value, profile.value
+
+async def aload_turn_state(user_id: str):
+    batch, last_query, profile = _turn_state_reads(user_id)
+    await batch.aexecute()
+    return last_query.value, profile.value
+
+def _turn_state_batch(user_id: str, query: str) -> RedisBatch:
+    batch = RedisBatch()
+    batch_set_last_query(batch, user_id, query)
+    batch_add_to_history(batch, user_id, query)
+    return batch
+
+def _turn_state_writes(user_id: str, query: str, profile: Optional[UserProfile]):
+    return _turn_state_batch(user_id, query), _with_history(profile, user_id, query)
 
-def handle_product_query(query: str, user_id: str) -> str:
-    """Main handler with ambiguity, multi-product, context updates, and RAG toggle."""
-    # Check for ambiguity first
-    is_ambiguous, ambiguity_type = ambiguity_detector.is_ambiguous(query, user_id=user_id)
+def save_turn_state(user_id: str, query: str, profile: Optional[UserProfile]) -> UserProfile:
+    """Store the structured query and append it to the profile history, in one round trip."""
+    batch, profile = _turn_state_writes(user_id, query, profile)
+    batch.execute()
+    return profile
+
+async def asave_turn_state(user_id: str, query: str, profile: Optional[UserProfile]) -> UserProfile:
+    batch, profile = _turn_state_writes(user_id, query, profile)
+    await batch.aexecute()
+    return profile
+
+
+def is_cacheable(query: str, user_id: str) -> bool:
+    """Only self-contained questions are served from the response cache."""
+    if not FOLLOW_UP_PATTERN.search(query):
+        return True
+    memory = get_memory(session_id=user_id)
+    return not (hasattr(memory, "chat_memory") and memory.chat_memory.messages)
+
+
+def related_products(sources) -> str:
+    """Snippets of the top source documents appended to an answer (max 2 per product)."""
+    snippets = [f"- {doc.page_content.strip().replace(chr(10), ' ')}" for doc in sources[:2]]
+    return "\n  Related products:\n  " + "\n  ".join(snippets) if snippets else ""
+
+
+def _serve_cached(user_id: str, query: str, answer: str) -> str:
+    """Record the turn in session memory as if the chain had answered it."""
+    get_memory(session_id=user_id).save_context({"question": query}, {"answer": answer})
+    return answer
+
+
+def answer_with_chain(sub_queries, user_id: str):
+    """Run each sub-query through the user's LLM-only chain. Returns (responses, failed)."""
+    qa = build_user_chain(user_id)
+    all_responses = []
+    failed = False
+
+    for sub_q in sub_queries:
+        try:
+            result = qa.invoke({"question": sub_q})
+            answer = (
+                result.get("answer")
+                or result.get("result")
+                or result.get("text")
+                or result.get("response")
+                or str(result)
+                if isinstance(result, dict) else str(result)
+            )
+            all_responses.append((sub_q, answer))
+
+        except Exception as e:
+            failed = True
+            all_responses.append((sub_q, f"Sorry, I had trouble with that query: {e}"))
+    return all_responses, failed
+
+
+def answer_with_retrieval(query: str, user_id: str, profile, ctx: RequestContext):
+    """
+    One product query over the index: standalone question, retrieval, one
+    generation (none for fast-path lookups). Returns (responses, failed) like
+    answer_with_chain.
+    """
+    try:
+        rag_prompt, sources, answer = prepare_rag_prompt(query, user_id, profile, ctx)
+        if answer is None:
+            result = get_llm().invoke(rag_prompt)
+            answer = getattr(result, "content", result).strip() or "I'm not sure."
+    except Exception as e:
+        return [(query, f"Sorry, I had trouble with that query: {e}")], True
+    get_memory(session_id=user_id).save_context({"question": query}, {"answer": answer})
+    return [(query, answer + related_products(sources))], False
+
+
+def answer_batched(sub_queries, user_id: str, profile: Optional[UserProfile] = None):
+    """
+    Standalone sub-queries of a multi-product request: no condensing call,
+    one retrieval batch, merged or concurrent generation. Returns (responses, failed).
+    """
+    memory = get_memory(session_id=user_id)
+    user_retriever = retriever.with_profile(profile_constraints(profile))
+    all_responses = []
+    failed = False
+    for item in answer_sub_queries(get_llm(), user_retriever, sub_queries, answer_prompts,
+                                   mode=settings.XIARA_MULTI_PRODUCT_MODE,
+                                   limit=settings.XIARA_GENERATION_CONCURRENCY):
+        if item.error:
+            failed = True
+            all_responses.append((item.question, f"Sorry, I had trouble with that query: {item.error}"))
+            continue
+        memory.save_context({"question": item.question}, {"answer": item.answer})
+        all_responses.append((item.question, item.answer + related_products(item.sources)))
+    return all_responses, failed
+
+
+def check_ambiguity(ctx: RequestContext):
+    """Clarification to send back if the query is ambiguous, else None (may call the LLM)."""
+    is_ambiguous, ambiguity_type = ambiguity_detector.assess(ctx)
     if is_ambiguous:
         clarification_type = ambiguity_type if ambiguity_type else "general"
         return ambiguity_detector.generate_clarification(clarification_type)
-    
-     # Retrieve last query context
-    last_query = get_last_query(user_id)
+    return None
+
 
+def resolve_query(query: str, last_query) -> str:
+    """Merge a follow-up like "actually, make it under ₦10,000" into the last query."""
     # Detect update words like "actually", "make it", "instead", "change"
     if last_query and re.search(r"(actually|instead|make it|change|update|no,)", query.lower()):
         # Merge by replacing budget or product details in last query
@@ -135,67 +280,335 @@ def handle_product_query(query: str, user_id: str) -> str:
             # if no budget pattern found, append modification
             updated_query = f"{last_query}, but {query}"
         query = updated_query
+    return query
 
-    # Save structured query in memory
-    set_last_query(user_id, query)
 
+def handle_product_query(query: str, user_id: str, ctx: Optional[RequestContext] = None) -> str:
+    """
+    Main handler with ambiguity, multi-product, context updates, and RAG toggle.
+    `ctx` carries what earlier stages (the chat route) already computed for this request.
+    """
+    # Fail fast while the LLM is still loading; without the index we run LLM-only
+    require_llm()
+    ctx = ctx or RequestContext(query, user_id)
 
-    # Update profile history
-    update_user_history(user_id, query)
+    with session_scope(user_id):
+        # Check for ambiguity first (a no-op if the route already did)
+        clarification = check_ambiguity(ctx)
+        if clarification is not None:
+            return clarification
 
-    # Build chain
-    qa = build_user_chain(user_id)
+        # Retrieve last query context and profile, then save the structured query and profile history
+        with ctx.stage("load_state"):
+            ctx.last_query, profile = load_turn_state(user_id)
+        query = resolve_query(query, ctx.last_query)
+        with ctx.stage("save_state"):
+            profile = save_turn_state(user_id, query, profile)
+        return answer_query(query, user_id, profile, ctx)
+
+
+async def precheck_ambiguity(ctx: RequestContext) -> Optional[str]:
+    """
+    The ambiguity check without the LLM (keywords, session history, the
+    classifier), in a worker thread outside the LLM executor. The
+    clarification if the query is ambiguous, else None; `ctx.ambiguity`
+    stays None when only the LLM can decide.
+    """
+    if await asyncio.to_thread(ambiguity_detector.assess, ctx, False) is None:
+        return None
+    return check_ambiguity(ctx)
+
+
+def _answer_turn(query: str, user_id: str, profile, ctx: RequestContext) -> str:
+    """The LLM ambiguity check, then the answer, in one executor slot."""
+    clarification = check_ambiguity(ctx)
+    if clarification is not None:
+        return clarification
+    return answer_query(query, user_id, _with_history(profile, user_id, query), ctx)
+
+
+async def ahandle_product_query(query: str, user_id: str, ctx: Optional[RequestContext] = None) -> str:
+    """
+    Async handle_product_query: the ambiguity check and the session state
+    reads and writes run outside the LLM executor, then the request is
+    admitted to it once (raises Overloaded when full) for the answer. A
+    query only the LLM can call ambiguous gets that check in the same slot,
+    and its turn state is saved afterwards.
+    """
+    require_llm()
+    ctx = ctx or RequestContext(query, user_id)
+
+    with session_scope(user_id):
+        clarification = await precheck_ambiguity(ctx)
+        if clarification is not None:
+            return clarification
+
+        with ctx.stage("load_state"):
+            ctx.last_query, profile = await aload_turn_state(user_id)
+        query = resolve_query(query, ctx.last_query)
+        if ctx.ambiguity is not None:
+            with ctx.stage("save_state"):
+                profile = await asave_turn_state(user_id, query, profile)
+            return await llm_executor.run(answer_query, query, user_id, profile, ctx)
+
+        answer = await llm_executor.run(_answer_turn, query, user_id, profile, ctx)
+        if not ctx.ambiguity[0]:
+            with ctx.stage("save_state"):
+                await _turn_state_batch(user_id, query).aexecute()
+        return answer
+
+
+def cached_answer(query: str, user_id: str, profile, ctx: RequestContext):
+    """
+    (answer or None, cache key, query vector) from the response caches. The
+    key is None for uncacheable queries; the vector is set once the query has
+    been embedded for the semantic cache.
+    """
+    with ctx.stage("cache"):
+        # Popular questions skip retrieval and the LLM entirely
+        cache_key = (response_cache.key_for(query, profile, ctx.normalized_for(query))
+                     if is_cacheable(query, user_id) else None)
+        cached = response_cache.get(cache_key) if cache_key else None
+        query_vector = None
+        # Near-duplicate phrasings ("cheap nivea lotion" / "affordable nivea body lotion")
+        if cached is None and cache_key and settings.XIARA_SEMANTIC_CACHE and USE_RAG and retriever is not None:
+            query_vector = ctx.embedding_for(query, retriever.vectorstore.embedding_function)
+            cached = semantic_cache.get(query, query_vector, profile_fingerprint(profile))
+    return cached, cache_key, query_vector
+
+
+def answer_query(query: str, user_id: str, profile, ctx: Optional[RequestContext] = None) -> str:
+    """Answer a resolved query: response caches, then retrieval and generation."""
+    ctx = ctx or RequestContext(query, user_id)
+    cached, cache_key, query_vector = cached_answer(query, user_id, profile, ctx)
+    if cached is not None:
+        return _serve_cached(user_id, query, cached)
 
     # Split multi-product queries
     sub_queries = split_multi_product_query(query)
-    all_responses = []
-
-    for sub_q in sub_queries:
-        try:
-            if USE_RAG:
-                result = qa.invoke({"question": sub_q}, config={"configurable": {"session_id": user_id}})
-                if isinstance(result, dict):
-                    answer = (
-                        result.get("answer")
-                        or result.get("result")
-                        or result.get("text")
-                        or result.get("response")
-                        or "I'm not sure."
-                    )
-                    sources = result.get("source_documents", [])
-                    if sources:
-                        snippets = []
-                        for i, doc in enumerate(sources[:2], start=1):  # max 2 per product
-                            content = doc.page_content.strip().replace("\n", " ")
-                            snippets.append(f"- {content}")
-                        if snippets:
-                            answer += "\n  Related products:\n  " + "\n  ".join(snippets)
-                else:
-                    answer = str(result)
-            else:
-                result = qa.invoke({"question": sub_q})
-                answer = (
-                    result.get("answer")
-                    or result.get("result")
-                    or result.get("text")
-                    or result.get("response")
-                    or str(result)
-                    if isinstance(result, dict) else str(result)
-                )
+    with ctx.stage("generation"):
+        if not (USE_RAG and retriever is not None):
+            all_responses, failed = answer_with_chain(sub_queries, user_id)
+        elif len(sub_queries) > 1:
+            all_responses, failed = answer_batched(sub_queries, user_id, profile)
+        else:
+            all_responses, failed = answer_with_retrieval(query, user_id, profile, ctx)
 
-            all_responses.append((sub_q, answer))
+    final = merge_responses(all_responses)
+    if cache_key and not failed:
+        response_cache.set(cache_key, final)
+        if query_vector is not None:
+            semantic_cache.put(query, query_vector, profile_fingerprint(profile), final)
+    return final
 
-        except Exception as e:
-            all_responses.append((sub_q, f"Sorry, I had trouble with that query: {e}"))
 
-    # Merge into conversational flow
+def merge_responses(all_responses) -> str:
+    """Merge per-product answers into conversational flow."""
     if len(all_responses) == 1:
         return all_responses[0][1]  # just one product, return directly
+    final = "Here's what I found for you:\n\n"
+    for sub_q, ans in all_responses:
+        final += f"For **{sub_q}**:\n{ans}\n\n"
+    return final.strip()
+
+
+async def _chunks(*texts: str):
+    for text in texts:
+        yield text
+
+
+@dataclass
+class StreamedAnswer:
+    """
+    One chat turn whose answer is streamed as llama.cpp generates it. Iterate
+    `events()` for the text, then call `save()` once the stream has ended to
+    write session memory, last query, profile history and the caches.
+    """
+    query: str
+    user_id: str
+    profile: Optional[UserProfile] = None
+    chunks: Optional[AsyncIterator[str]] = None
+    prompt: Optional[str] = None  # generation still to run, if any
+    sources: list = field(default_factory=list)
+    answer: str = ""
+    clarification: bool = False
+    remember: bool = True  # False when memory was already written (multi-product path)
+    cacheable: bool = True
+    cache_key: Optional[str] = None
+    query_vector: Optional[list] = None
+    completed: bool = False
+    context: Optional[RequestContext] = None
+
+    @property
+    def products(self) -> List[str]:
+        """Related-product snippets for the final event."""
+        return [doc.page_content.strip().replace(chr(10), " ") for doc in self.sources[:2]]
+
+    def final_text(self) -> str:
+        """The answer as the non-streaming endpoints would return it."""
+        return self.answer + related_products(self.sources)
+
+    async def events(self) -> AsyncIterator[str]:
+        parts = []
+        async for chunk in self.chunks:
+            parts.append(chunk)
+            yield chunk
+        self.answer = "".join(parts).strip() or "I'm not sure."
+        self.completed = True
+
+    async def save(self):
+        if self.clarification or not self.completed:
+            return
+        self.profile = await asave_turn_state(self.user_id, self.query, self.profile)
+        # Memory and cache writes are blocking calls: keep them off the event loop
+        await asyncio.to_thread(self._save_answer)
+
+    def _save_answer(self):
+        if self.remember:
+            get_memory(session_id=self.user_id).save_context({"question": self.query}, {"answer": self.answer})
+        if self.cache_key and self.cacheable:
+            final = self.final_text()
+            response_cache.set(self.cache_key, final)
+            if self.query_vector is not None:
+                semantic_cache.put(self.query, self.query_vector, profile_fingerprint(self.profile), final)
+
+
+def _format_chat_history(messages) -> str:
+    # Same layout ConversationalRetrievalChain used for its condensing prompt
+    lines = []
+    for msg in messages:
+        role = {"human": "Human", "ai": "Assistant"}.get(msg.type, msg.type)
+        lines.append(f"{role}: {msg.content}")
+    return "\n" + "\n".join(lines) if lines else ""
+
+
+def retrieval_question(query: str, messages, ctx: RequestContext) -> str:
+    """
+    Standalone question for retrieval. The LLM condenses the history only
+    when the message can't be used as it is or rewritten from the last query
+    (see query_rewriter).
+    """
+    if query == ctx.query and ctx.hits is not None:
+        hits = ctx.hits
     else:
-        final = "Here's what I found for you:\n\n"
-        for sub_q, ans in all_responses:
-            final += f"For **{sub_q}**:\n{ans}\n\n"
-        return final.strip()
+        hits = ambiguity_detector.keywords.labels(query)
+    question, path = question_rewriter.plan(query, bool(messages), ctx.last_query,
+                                            names_product=bool(hits & {"product", "brand"}),
+                                            resolved=query != ctx.query)
+    if question is None:
+        from langchain.chains.conversational_retrieval.prompts import CONDENSE_QUESTION_PROMPT
+
+        with ctx.stage("condense"):
+            condensed = get_llm().invoke(CONDENSE_QUESTION_PROMPT.format(
+                chat_history=_format_chat_history(messages), question=query))
+        question = getattr(condensed, "content", condensed).strip() or query
+    return question
+
+
+def prepare_rag_prompt(query: str, user_id: str, profile, ctx: RequestContext):
+    """
+    (answer prompt, products in it, answer) for one product query over the
+    index: retrieval with the standalone question, as deep as the prompt
+    budget allows, then products and history fitted into a prompt that asks
+    the user's own message. Lookups the fast path can answer come back as
+    (None, [], answer) instead, with no generation left to run.
+    """
+    messages = get_memory(session_id=user_id).load_memory_variables({})["chat_history"]
+    question = retrieval_question(query, messages, ctx)
+    # The standalone question is a retrieval key; the answer is to what the user asked
+    message = ctx.query
+    with ctx.stage("retrieval"):
+        depth = answer_prompts.retrieval_depth(SYSTEM, message)
+        sources = retriever.with_profile(profile_constraints(profile), k=depth, ctx=ctx).invoke(question)
+    with ctx.stage("fast_path"):
+        answer = lookups.answer(message, question, sources, ctx.budget_for(question))
+    if answer is not None:
+        return None, [], answer
+    with ctx.stage("prompt"):
+        assembled = answer_prompts.assemble(SYSTEM, message, sources, messages)
+    if assembled.over_budget:
+        print(f"⚠️ Answer prompt for {user_id} is over XIARA_PROMPT_MAX_TOKENS ({assembled.tokens} tokens)")
+    return assembled.text, assembled.products, None
+
+
+def prepare_streamed_answer(turn: StreamedAnswer):
+    """
+    Everything before generation (blocking, runs on the LLM executor): the
+    ambiguity check if the LLM has to make it, cache lookups, the standalone
+    question, retrieval and prompt assembly. Sets either `turn.answer`
+    (served whole, possibly a clarification) or `turn.prompt`.
+    """
+    ctx = turn.context = turn.context or RequestContext(turn.query, turn.user_id)
+    clarification = check_ambiguity(ctx)
+    if clarification is not None:
+        turn.answer, turn.clarification = clarification, True
+        return
+    turn.query = resolve_query(turn.query, ctx.last_query)
+    query, user_id = turn.query, turn.user_id
+    cached, turn.cache_key, turn.query_vector = cached_answer(query, user_id, turn.profile, ctx)
+    if cached is not None:
+        turn.answer, turn.cacheable = cached, False
+        return
+
+    sub_queries = split_multi_product_query(query)
+    if len(sub_queries) > 1:
+        # Several products: answered together, without token streaming
+        with ctx.stage("generation"):
+            if USE_RAG and retriever is not None:
+                all_responses, failed = answer_batched(sub_queries, user_id, turn.profile)
+            else:
+                all_responses, failed = answer_with_chain(sub_queries, user_id)
+        turn.answer, turn.cacheable, turn.remember = merge_responses(all_responses), not failed, False
+        return
+
+    if not (USE_RAG and retriever is not None):
+        turn.prompt = prompt.format(question=query)
+        return
+
+    turn.prompt, turn.sources, answer = prepare_rag_prompt(query, user_id, turn.profile, ctx)
+    if answer is not None:
+        turn.answer = answer
+
+
+def _prepare_and_generate(turn: StreamedAnswer):
+    """
+    prepare_streamed_answer, then the generated tokens, as one piece of
+    executor work. The first item (empty) marks the end of preparation.
+    """
+    prepare_streamed_answer(turn)
+    yield ""
+    if turn.prompt is not None:
+        yield from get_llm().stream(turn.prompt)
+
+
+async def astream_product_query(query: str, user_id: str, ctx: Optional[RequestContext] = None) -> StreamedAnswer:
+    """
+    Streaming handle_product_query. Everything that can reject the request
+    (warm-up, a full LLM queue) happens before this returns, so callers can
+    still answer 503/429; the returned turn then streams the answer text.
+    """
+    require_llm()
+    ctx = ctx or RequestContext(query, user_id)
+
+    with session_scope(user_id):
+        clarification = await precheck_ambiguity(ctx)
+        if clarification is not None:
+            return StreamedAnswer(query, user_id, chunks=_chunks(clarification), clarification=True,
+                                  context=ctx)
+
+        with ctx.stage("load_state"):
+            ctx.last_query, profile = await aload_turn_state(user_id)
+        # One admission covers preparation and generation; wait for preparation
+        # so the caller knows whether the turn is a clarification or a cached answer
+        turn = StreamedAnswer(query, user_id, profile=profile, context=ctx)
+        chunks = llm_executor.stream(_prepare_and_generate, turn)
+        await chunks.__anext__()
+        if turn.prompt is None:
+            await chunks.aclose()
+            turn.chunks = _chunks(turn.answer)
+        else:
+            turn.chunks = chunks
+        return turn
 
 
 def get_conversation_context(user_id: str) -> str:
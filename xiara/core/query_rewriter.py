@@ -0,0 +1,125 @@
+# xiara/core/query_rewriter.py
+"""
+Standalone retrieval questions for chat turns.
+
+Retrieval needs a question that makes sense on its own. The stock
+conversational chain gets one by asking the LLM to condense the history
+and the new message on every turn that has history, which roughly
+doubles the LLM time of a turn. Most turns don't need it:
+
+* no history: the message is the question
+* self-contained: the message names a product (or was already merged
+  into the last query by resolve_query) and doesn't refer back
+* follow-up: "do you have it in black", "any under ₦10,000?" are
+  rewritten deterministically from the stored last query ("waterproof
+  hiking boots in black", "waterproof hiking boots under ₦10,000")
+* llm: when there is no last query to build on, the message points at
+  something in the earlier answers ("compare the first two"), asks a
+  question about it ("does it come with a warranty?") or isn't about
+  products at all ("thanks!")
+
+The question is only the retrieval key: the answer prompt keeps the
+user's own message, with the conversation, as its question.
+
+Every decision is counted per path (/xiara/debug/pipeline).
+"""
+
+import re
+import threading
+from typing import Dict, Optional, Tuple
+
+# References to earlier turns make a message depend on the conversation
+FOLLOW_UP_PATTERN = re.compile(r"\b(it|its|that|this|these|those|them|ones?|cheaper|another|else|more)\b", re.IGNORECASE)
+
+# Messages about specific items of earlier answers, which only the LLM (with the history) can resolve
+ANSWER_REFERENCE = re.compile(
+    r"\b(compare|comparison|differences?|which|first|second|third|last one|both|either|neither)\b", re.IGNORECASE)
+
+BUDGET = re.compile(
+    r"\b(?:under|below|less than|cheaper than|max(?:imum)?|up to|within|over|above|more than|at least|between)"
+    r"\s*[₦$]?\s*\d[\d,]*(?:\.\d+)?\s*k?(?:\s*(?:and|-|to)\s*[₦$]?\s*\d[\d,]*\s*k?)?",
+    re.IGNORECASE,
+)
+
+# Words that carry no product information once the last query supplies the subject
+FILLER = re.compile(
+    r"\b(?:do you have|have you got|can you show me|can i get|show me|give me|what about|how about|"
+    r"is there|are there|i want|i need|please|any|also|instead|it|its|that|this|these|those|them|ones?|"
+    r"something|anything)\b",
+    re.IGNORECASE,
+)
+
+# Questions about the earlier answer ("how much is it?", "does it come with a warranty?"); the
+# lookup openings in LOOKUP_LEAD are follow-ups the rewrite handles
+QUESTION = re.compile(
+    r"^\s*(?:how|what|why|when|where|who|does|do|did|is|are|was|were|can|could|will|would|should|has|have)\b",
+    re.IGNORECASE)
+LOOKUP_LEAD = re.compile(
+    r"^\s*(?:do you have|have you got|can you show me|can i get|is there|are there|what about|how about)\b",
+    re.IGNORECASE)
+
+# Replies that aren't about products
+SMALL_TALK = re.compile(
+    r"^\s*(?:thanks?|thank you|ok(?:ay)?|great|cool|nice|perfect|awesome|yes|yeah|no|nope|bye|hi|hello)\b",
+    re.IGNORECASE)
+
+PATHS = ("no_history", "self_contained", "rewrite", "llm")
+
+
+def rewrite_follow_up(query: str, last_query: str) -> Optional[str]:
+    """
+    The last query with the follow-up's modifiers applied, or None when the
+    follow-up needs the conversation itself: it refers to or asks about the
+    earlier answers, or isn't about products. A budget in the follow-up
+    replaces the last query's.
+    """
+    if ANSWER_REFERENCE.search(query) or SMALL_TALK.search(query):
+        return None
+    if QUESTION.search(query) and not LOOKUP_LEAD.search(query):
+        return None
+    text, base = query.strip(), last_query.strip()
+    budget = BUDGET.search(text)
+    if budget:
+        text = BUDGET.sub(" ", text)
+        base = BUDGET.sub(" ", base)
+    modifiers = " ".join(re.sub(r"[^\w₦$.,'\s-]", " ", FILLER.sub(" ", text)).split()).strip(" ,.")
+    if not modifiers and not budget:
+        return None
+    parts = [" ".join(base.split()).strip(" ,"), modifiers, budget.group(0) if budget else ""]
+    return " ".join(part for part in parts if part)
+
+
+class QuestionRewriter:
+    """Chooses how each turn gets its standalone question, and counts the choices."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.counts: Dict[str, int] = {path: 0 for path in PATHS}
+
+    def plan(self, query: str, has_history: bool, last_query: Optional[str],
+             names_product: bool, resolved: bool = False) -> Tuple[Optional[str], str]:
+        """
+        (question, path). The question is None for the "llm" path: the
+        caller condenses with the LLM. `resolved` means resolve_query already
+        merged the message into the last query.
+        """
+        question, path = None, "llm"
+        if not has_history:
+            question, path = query, "no_history"
+        elif resolved or (names_product and not FOLLOW_UP_PATTERN.search(query)):
+            question, path = query, "self_contained"
+        elif last_query:
+            question = rewrite_follow_up(query, last_query)
+            if question is not None:
+                path = "rewrite"
+        with self._lock:
+            self.counts[path] += 1
+        return question, path
+
+    def stats(self) -> dict:
+        with self._lock:
+            total = sum(self.counts.values())
+            return {**self.counts, "llm_rate": round(self.counts["llm"] / total, 4) if total else 0.0}
+
+
+question_rewriter = QuestionRewriter()
@@ -0,0 +1,121 @@
+# xiara/core/request_pipeline.py
+"""
+Per-request context for the chat pipeline.
+
+A chat turn goes through several stages (negotiation, ambiguity, session
+state, caches, retrieval and generation) that used to recompute the same
+features of the prompt each: the route and the answer handler both ran
+the ambiguity check, with its own keyword scan, session-history scan and
+possibly an LLM call. A RequestContext is created once per request and
+passed down; features are computed on first use and kept:
+
+* `lower` / `normalized`: lowercased and cache-normalized text (the
+  response cache key and the ambiguity verdict cache)
+* `hits`: the ambiguity vocabularies matched (set by the detector)
+* `ambiguity`: the (is_ambiguous, type) verdict, once checked
+* `last_query`: the user's previous structured query (from the session state)
+* `embedding()`: the MiniLM query vector, shared by the ambiguity
+  classifier and the semantic cache
+* `budget`: the (min, max) price asked for (retrieval pre-filter, fast path)
+
+Stages that work on a rewritten question use `*_for(text)`, which returns
+the cached value when the text is the request's own.
+
+`stage(name)` times a stage; durations are kept on the context and
+aggregated per stage in `pipeline_stats` (/xiara/debug/pipeline).
+"""
+
+import threading
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from functools import cached_property
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+from xiara.core.attribute_store import parse_budget
+from xiara.core.response_cache import normalize_query
+
+
+class PipelineStats:
+    """Count, total and worst duration of every stage, process-wide."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._stages: Dict[str, List[float]] = {}
+
+    def record(self, stage: str, seconds: float):
+        with self._lock:
+            entry = self._stages.setdefault(stage, [0, 0.0, 0.0])
+            entry[0] += 1
+            entry[1] += seconds
+            entry[2] = max(entry[2], seconds)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                stage: {"count": count, "avg_ms": round(total / count * 1000, 2), "max_ms": round(worst * 1000, 2)}
+                for stage, (count, total, worst) in self._stages.items()
+            }
+
+
+pipeline_stats = PipelineStats()
+
+
+def _shared_embeddings():
+    from xiara.core.model_registry import get_embeddings
+
+    return get_embeddings()
+
+
+@dataclass
+class RequestContext:
+    query: str
+    user_id: str
+    hits: Optional[Set[str]] = None
+    last_query: Optional[str] = None
+    ambiguity: Optional[Tuple[bool, Optional[str]]] = None
+    timings: Dict[str, float] = field(default_factory=dict)
+    _embedding: Optional[List[float]] = field(default=None, repr=False)
+
+    @cached_property
+    def lower(self) -> str:
+        return self.query.strip().lower()
+
+    @cached_property
+    def normalized(self) -> str:
+        return normalize_query(self.query)
+
+    @cached_property
+    def budget(self) -> Tuple[Optional[float], Optional[float]]:
+        return parse_budget(self.query)
+
+    def normalized_for(self, text: str) -> str:
+        return self.normalized if text == self.query else normalize_query(text)
+
+    def budget_for(self, text: str) -> Tuple[Optional[float], Optional[float]]:
+        return self.budget if text == self.query else parse_budget(text)
+
+    def embedding(self, embeddings: Any = None) -> List[float]:
+        """The query's embedding, computed once (with the shared model unless `embeddings` is given)."""
+        if self._embedding is None:
+            self._embedding = (embeddings or _shared_embeddings()).embed_query(self.query)
+        return self._embedding
+
+    def embedding_for(self, query: str, embeddings: Any = None) -> List[float]:
+        """Embedding of `query`: the cached one when it is this request's own text."""
+        if query == self.query:
+            return self.embedding(embeddings)
+        return (embeddings or _shared_embeddings()).embed_query(query)
+
+    @contextmanager
+    def stage(self, name: str):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            seconds = time.perf_counter() - start
+            self.timings[name] = self.timings.get(name, 0.0) + seconds
+            pipeline_stats.record(name, seconds)
+
+    def timings_ms(self) -> Dict[str, float]:
+        return {name: round(seconds * 1000, 2) for name, seconds in self.timings.items()}
@@ -0,0 +1,197 @@
+# xiara/core/response_cache.py
+"""
+Two-tier cache of final Xiara answers.
+
+Tier 1 is a bounded in-process LRU with a TTL; tier 2 is Redis, shared by
+all workers and pods. Keys combine the normalized query, a fingerprint of
+the profile fields that shape the answer, and the catalog version, so a
+popular query answered once skips retrieval and the LLM everywhere until
+the product index changes or the entry expires. Redis errors degrade to a
+cache miss rather than failing the request.
+"""
+
+import hashlib
+import json
+import re
+import threading
+import time
+from collections import OrderedDict
+from typing import Optional
+
+from shared.config.settings import settings
+
+KEY_PREFIX = "xiara:response_cache"
+
+# Profile fields that change what Xiara recommends (history does not)
+PROFILE_FIELDS = ("liked_categories", "disliked_categories", "preferred_price_range", "purchase_intent")
+
+
+def normalize_query(text: str) -> str:
+    """Case-, spacing- and punctuation-insensitive form of a query ("₦20,000" == "₦20000")."""
+    text = text.lower().strip()
+    text = re.sub(r"(?<=\d),(?=\d{3}\b)", "", text)
+    text = re.sub(r"[^\w₦$.\s]", " ", text)
+    text = re.sub(r"\.(?!\d)", " ", text)
+    return " ".join(text.split())
+
+
+def profile_fingerprint(profile) -> str:
+    """Short stable hash of the answer-relevant profile fields ("anon" without a profile)."""
+    if profile is None:
+        return "anon"
+    fields = {}
+    for name in PROFILE_FIELDS:
+        value = getattr(profile, name, None)
+        fields[name] = sorted(v.strip().lower() for v in value) if isinstance(value, list) else value
+    digest = hashlib.sha1(json.dumps(fields, sort_keys=True).encode("utf-8")).hexdigest()
+    return digest[:16]
+
+
+class TTLCache:
+    """Thread-safe LRU with per-entry expiry."""
+
+    def __init__(self, max_entries: int, ttl: float):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.evictions = 0
+        self.expirations = 0
+
+    def get(self, key: str) -> Optional[str]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            value, expires_at = entry
+            if expires_at <= time.monotonic():
+                del self._entries[key]
+                self.expirations += 1
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key: str, value: str, ttl: Optional[float] = None):
+        expires_at = time.monotonic() + (self.ttl if ttl is None else ttl)
+        with self._lock:
+            self._entries[key] = (value, expires_at)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def delete(self, key: str):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+class ResponseCache:
+    def __init__(self, max_entries: int = 1024, ttl: float = 600, redis_client=None):
+        self.local = TTLCache(max_entries, ttl)
+        self.ttl = ttl
+        self.redis = redis_client
+        self.namespace = "none"
+        self._stats_lock = threading.Lock()
+        self._stats = {"local_hits": 0, "redis_hits": 0, "misses": 0, "stores": 0,
+                       "invalidations": 0, "redis_errors": 0}
+
+    def _count(self, stat: str):
+        with self._stats_lock:
+            self._stats[stat] += 1
+
+    def key_for(self, query: str, profile=None, normalized: Optional[str] = None) -> str:
+        """Cache key of a query for a profile; `normalized` is normalize_query(query) if already known."""
+        raw = f"{normalized or normalize_query(query)}\0{profile_fingerprint(profile)}"
+        return hashlib.sha1(raw.encode("utf-8")).hexdigest()
+
+    def _redis_key(self, key: str) -> str:
+        return f"{KEY_PREFIX}:{self.namespace}:{key}"
+
+    def get(self, key: str) -> Optional[str]:
+        local_key = f"{self.namespace}:{key}"
+        value = self.local.get(local_key)
+        if value is not None:
+            self._count("local_hits")
+            return value
+        if self.redis is not None:
+            try:
+                value = self.redis.get(self._redis_key(key))
+            except Exception as e:
+                self._count("redis_errors")
+                print(f"Response cache: Redis read failed: {e}")
+                value = None
+            if value is not None:
+                value = value.decode("utf-8") if isinstance(value, bytes) else value
+                self._count("redis_hits")
+                self.local.set(local_key, value)
+                return value
+        self._count("misses")
+        return None
+
+    def set(self, key: str, value: str, ttl: Optional[int] = None):
+        ttl = self.ttl if ttl is None else ttl
+        self.local.set(f"{self.namespace}:{key}", value, ttl)
+        self._count("stores")
+        if self.redis is not None:
+            try:
+                self.redis.setex(self._redis_key(key), int(ttl), value)
+            except Exception as e:
+                self._count("redis_errors")
+                print(f"Response cache: Redis write failed: {e}")
+
+    def delete(self, key: str):
+        self.local.delete(f"{self.namespace}:{key}")
+        if self.redis is not None:
+            try:
+                self.redis.delete(self._redis_key(key))
+            except Exception as e:
+                self._count("redis_errors")
+                print(f"Response cache: Redis delete failed: {e}")
+
+    def invalidate(self, namespace: Optional[str] = None):
+        """
+        Drop every cached answer. Called with the new catalog version when the
+        product index changes; Redis entries of older versions become
+        unreachable and expire on their TTL.
+        """
+        if namespace is not None:
+            self.namespace = namespace
+        self.local.clear()
+        self._count("invalidations")
+
+    def stats(self) -> dict:
+        with self._stats_lock:
+            counts = dict(self._stats)
+        hits = counts["local_hits"] + counts["redis_hits"]
+        lookups = hits + counts["misses"]
+        return {
+            **counts,
+            "hit_rate": hits / lookups if lookups else 0.0,
+            "entries": len(self.local),
+            "evictions": self.local.evictions,
+            "expirations": self.local.expirations,
+            "namespace": self.namespace,
+            "redis": self.redis is not None,
+        }
+
+
+def _redis_client():
+    if not settings.XIARA_RESPONSE_CACHE_REDIS:
+        return None
+    from shared.storage.redis_client import get_redis
+
+    return get_redis()
+
+
+response_cache = ResponseCache(
+    max_entries=settings.XIARA_RESPONSE_CACHE_SIZE,
+    ttl=settings.XIARA_RESPONSE_CACHE_TTL,
+    redis_client=_redis_client(),
+)
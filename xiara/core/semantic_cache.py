@@ -0,0 +1,175 @@
+# xiara/core/semantic_cache.py
+"""
+Semantic cache of Xiara answers for near-duplicate queries.
+
+"cheap nivea lotion" and "affordable nivea body lotion" are different
+strings but the same request. Recent query embeddings are kept in a small
+FAISS inner-product index over normalized vectors (cosine similarity);
+a new query whose nearest cached query clears the threshold, in the same
+profile segment, gets that query's answer. Queries that differ in their
+numbers (budgets, sizes, quantities) never match, whatever their
+similarity.
+
+Entries expire after a TTL and the least recently used ones are evicted
+past the size cap. Every semantic hit is counted by similarity band and
+sampled into an audit log so false positives can be reviewed, reported
+and the threshold tuned.
+"""
+
+import re
+import threading
+import time
+from collections import OrderedDict, deque
+from dataclasses import dataclass
+from itertools import islice
+from typing import List, Optional
+
+import numpy as np
+
+from shared.config.settings import settings
+from xiara.core.response_cache import normalize_query
+
+# Hits this close above the threshold are counted separately for auditing
+NEAR_THRESHOLD_MARGIN = 0.02
+
+
+@dataclass
+class Entry:
+    query: str
+    segment: str
+    answer: str
+    expires_at: float
+    hits: int = 0
+
+
+def _numbers(text: str) -> List[str]:
+    return sorted(re.findall(r"\d+(?:\.\d+)?", normalize_query(text)))
+
+
+class SemanticCache:
+    def __init__(self, threshold: float = 0.9, max_entries: int = 2048, ttl: float = 600,
+                 candidates: int = 8, audit_size: int = 200):
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.candidates = candidates
+        self.namespace = "none"
+        self._index = None
+        self._entries: "OrderedDict[int, Entry]" = OrderedDict()
+        self._next_id = 0
+        self._lock = threading.Lock()
+        self.audit = deque(maxlen=audit_size)
+        self._stats = {"lookups": 0, "hits": 0, "near_threshold_hits": 0, "misses": 0,
+                       "number_mismatches": 0, "stores": 0, "evictions": 0, "expirations": 0,
+                       "false_positives": 0, "invalidations": 0}
+
+    @staticmethod
+    def _normalized(vector) -> np.ndarray:
+        vector = np.asarray(vector, dtype=np.float32).reshape(1, -1)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def _ensure_index(self, dim: int):
+        if self._index is None:
+            import faiss
+
+            self._index = faiss.IndexIDMap2(faiss.IndexFlatIP(dim))
+
+    def _remove(self, ids: List[int]):
+        for entry_id in ids:
+            self._entries.pop(entry_id, None)
+        if ids and self._index is not None:
+            self._index.remove_ids(np.array(ids, dtype=np.int64))
+
+    def get(self, query: str, vector, segment: str) -> Optional[str]:
+        """Answer of the closest cached query in the segment, if it is similar enough."""
+        with self._lock:
+            self._stats["lookups"] += 1
+            if self._index is None or not self._entries:
+                self._stats["misses"] += 1
+                return None
+            now = time.monotonic()
+            scores, ids = self._index.search(self._normalized(vector), min(self.candidates, len(self._entries)))
+            expired = []
+            for score, entry_id in zip(scores[0], ids[0]):
+                entry = self._entries.get(int(entry_id))
+                if entry is None or score < self.threshold:
+                    continue
+                if entry.expires_at <= now:
+                    expired.append(int(entry_id))
+                    continue
+                if entry.segment != segment:
+                    continue
+                if _numbers(query) != _numbers(entry.query):
+                    self._stats["number_mismatches"] += 1
+                    continue
+                entry.hits += 1
+                self._entries.move_to_end(int(entry_id))
+                self._stats["hits"] += 1
+                if score < self.threshold + NEAR_THRESHOLD_MARGIN:
+                    self._stats["near_threshold_hits"] += 1
+                self.audit.append({"query": query, "matched": entry.query, "score": round(float(score), 4),
+                                   "segment": segment})
+                self._remove(expired)
+                self._stats["expirations"] += len(expired)
+                return entry.answer
+            self._remove(expired)
+            self._stats["expirations"] += len(expired)
+            self._stats["misses"] += 1
+            return None
+
+    def put(self, query: str, vector, segment: str, answer: str):
+        with self._lock:
+            vector = self._normalized(vector)
+            self._ensure_index(vector.shape[1])
+            entry_id = self._next_id
+            self._next_id += 1
+            self._index.add_with_ids(vector, np.array([entry_id], dtype=np.int64))
+            self._entries[entry_id] = Entry(query, segment, answer, time.monotonic() + self.ttl)
+            self._stats["stores"] += 1
+            overflow = list(islice(self._entries, max(0, len(self._entries) - self.max_entries)))
+            self._remove(overflow)
+            self._stats["evictions"] += len(overflow)
+
+    def report_false_positive(self, query: str, segment: Optional[str] = None) -> bool:
+        """
+        Record that an answer served for `query` was wrong and drop the cached
+        entry it matched, so the next such query goes through RAG again.
+        """
+        with self._lock:
+            for hit in reversed(self.audit):
+                if hit["query"] == query and (segment is None or hit["segment"] == segment):
+                    stale = [i for i, e in self._entries.items()
+                             if e.query == hit["matched"] and e.segment == hit["segment"]]
+                    self._remove(stale)
+                    self._stats["false_positives"] += 1
+                    return True
+        return False
+
+    def invalidate(self, namespace: Optional[str] = None):
+        """Drop every entry (the catalog changed)."""
+        with self._lock:
+            if namespace is not None:
+                self.namespace = namespace
+            if self._index is not None:
+                self._index.reset()
+            self._entries.clear()
+            self._stats["invalidations"] += 1
+
+    def stats(self) -> dict:
+        hits, lookups = self._stats["hits"], self._stats["lookups"]
+        return {
+            **self._stats,
+            "hit_rate": hits / lookups if lookups else 0.0,
+            "false_positive_rate": self._stats["false_positives"] / hits if hits else 0.0,
+            "entries": len(self._entries),
+            "threshold": self.threshold,
+            "namespace": self.namespace,
+        }
+
+
+semantic_cache = SemanticCache(
+    threshold=settings.XIARA_SEMANTIC_CACHE_THRESHOLD,
+    max_entries=settings.XIARA_SEMANTIC_CACHE_SIZE,
+    ttl=settings.XIARA_RESPONSE_CACHE_TTL,
+)
@@ -0,0 +1,311 @@
+# xiara/core/session_store.py
+"""
+Bounded, expiring per-user session state.
+
+Every piece of state Xiara keeps per user between requests (conversation
+memory, last structured query, clarification attempts, price negotiations)
+lives in a SessionStore namespace instead of an unbounded module-level dict.
+
+In-process mode keeps an LRU capped by entry count and by total size: each
+entry's size is measured when it is stored (the length of its serialized
+form, or a custom `sizeof`) and least recently used sessions are evicted
+once the cap is reached. Entries expire after `ttl` seconds without being
+read or written (idle TTL).
+
+Redis mode (XIARA_SESSION_STORE=redis) keeps the serialized value under
+`xiara:session:<namespace>:<key>` with an EXPIRE that every read refreshes
+(GETEX), so any worker or node can serve any user's next turn and Redis
+bounds memory with its own maxmemory/LRU policy. Redis errors degrade to a
+missing entry rather than failing the request. batch_get/batch_set queue
+reads and writes on a RedisBatch so they share a round trip with other
+per-request state.
+"""
+
+import json
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Optional
+
+from shared.config.settings import settings
+from shared.storage.redis_client import Pending, get_async_redis, get_redis
+
+KEY_PREFIX = "xiara:session"
+
+_MISSING = object()
+
+
+class SessionStore:
+    """
+    Dict-like store of per-session values. `encode`/`decode` turn a value
+    into a string and back (JSON by default); values are only serialized in
+    Redis mode or to measure their size. Values mutated in place must be
+    stored again to be seen by other workers.
+    """
+
+    def __init__(self, namespace: str, ttl: float = 1800, max_entries: int = 10000,
+                 max_bytes: int = 64 * 1024 * 1024, redis_client=None, async_redis_client=None,
+                 encode: Callable[[Any], str] = json.dumps, decode: Callable[[str], Any] = json.loads,
+                 sizeof: Optional[Callable[[Any], int]] = None, clock: Callable[[], float] = time.monotonic):
+        self.namespace = namespace
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.redis = redis_client
+        self.async_redis = async_redis_client
+        self.encode = encode
+        self.decode = decode
+        self.sizeof = sizeof or (lambda value: len(self.encode(value)))
+        self._clock = clock
+        # key -> [value, size, expires_at]
+        self._entries: "OrderedDict[str, list]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self._stats = {"hits": 0, "misses": 0, "stores": 0, "evictions": 0, "expirations": 0,
+                       "redis_errors": 0}
+
+    def _redis_key(self, key: str) -> str:
+        return f"{KEY_PREFIX}:{self.namespace}:{key}"
+
+    # -------------------------------
+    # In-process LRU
+    # -------------------------------
+
+    def _drop(self, key: str):
+        _, size, _ = self._entries.pop(key)
+        self._bytes -= size
+
+    def _local_get(self, key: str, default):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self._stats["misses"] += 1
+                return default
+            if entry[2] <= self._clock():
+                self._drop(key)
+                self._stats["expirations"] += 1
+                self._stats["misses"] += 1
+                return default
+            entry[2] = self._clock() + self.ttl
+            self._entries.move_to_end(key)
+            self._stats["hits"] += 1
+            return entry[0]
+
+    def _local_set(self, key: str, value):
+        size = self.sizeof(value)
+        with self._lock:
+            if key in self._entries:
+                self._drop(key)
+            self._entries[key] = [value, size, self._clock() + self.ttl]
+            self._bytes += size
+            self._stats["stores"] += 1
+            self._evict()
+
+    def _evict(self):
+        now = self._clock()
+        while self._entries:
+            key, (_, _, expires_at) = next(iter(self._entries.items()))
+            if expires_at <= now:
+                self._stats["expirations"] += 1
+            elif len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+                self._stats["evictions"] += 1
+            else:
+                break
+            self._drop(key)
+
+    def _local_delete(self, key: str) -> bool:
+        with self._lock:
+            if key not in self._entries:
+                return False
+            self._drop(key)
+            return True
+
+    def resize(self, key: str):
+        """Re-measure an entry that was mutated in place (in-process mode)."""
+        with self._lock:
+            entry = self._entries.get(key)
+        if entry is None:
+            return
+        size = self.sizeof(entry[0])
+        with self._lock:
+            if self._entries.get(key) is entry:
+                self._bytes += size - entry[1]
+                entry[1] = size
+                self._evict()
+
+    # -------------------------------
+    # Redis
+    # -------------------------------
+
+    def _redis_error(self, op: str, e: Exception):
+        self._stats["redis_errors"] += 1
+        print(f"Session store ({self.namespace}): Redis {op} failed: {e}")
+
+    def _decoded(self, raw, default):
+        if raw is None:
+            self._stats["misses"] += 1
+            return default
+        self._stats["hits"] += 1
+        return self.decode(raw.decode("utf-8") if isinstance(raw, bytes) else raw)
+
+    # -------------------------------
+    # Public API
+    # -------------------------------
+
+    def get(self, key: str, default=None):
+        if self.redis is None:
+            return self._local_get(key, default)
+        try:
+            raw = self.redis.getex(self._redis_key(key), ex=int(self.ttl))
+        except Exception as e:
+            self._redis_error("read", e)
+            raw = None
+        return self._decoded(raw, default)
+
+    def set(self, key: str, value):
+        if self.redis is None:
+            return self._local_set(key, value)
+        self._stats["stores"] += 1
+        try:
+            self.redis.set(self._redis_key(key), self.encode(value), ex=int(self.ttl))
+        except Exception as e:
+            self._redis_error("write", e)
+
+    def delete(self, key: str) -> bool:
+        if self.redis is None:
+            return self._local_delete(key)
+        try:
+            return bool(self.redis.delete(self._redis_key(key)))
+        except Exception as e:
+            self._redis_error("delete", e)
+            return False
+
+    async def aget(self, key: str, default=None):
+        """Async variant of get (uses the asyncio Redis client in Redis mode)."""
+        if self.async_redis is None:
+            return self.get(key, default)
+        try:
+            raw = await self.async_redis.getex(self._redis_key(key), ex=int(self.ttl))
+        except Exception as e:
+            self._redis_error("read", e)
+            raw = None
+        return self._decoded(raw, default)
+
+    async def aset(self, key: str, value):
+        """Async variant of set."""
+        if self.async_redis is None:
+            return self.set(key, value)
+        self._stats["stores"] += 1
+        try:
+            await self.async_redis.set(self._redis_key(key), self.encode(value), ex=int(self.ttl))
+        except Exception as e:
+            self._redis_error("write", e)
+
+    async def adelete(self, key: str) -> bool:
+        """Async variant of delete."""
+        if self.async_redis is None:
+            return self.delete(key)
+        try:
+            return bool(await self.async_redis.delete(self._redis_key(key)))
+        except Exception as e:
+            self._redis_error("delete", e)
+            return False
+
+    def batch_get(self, batch, key: str, default=None):
+        """
+        Queue a read on a RedisBatch (shared/storage/redis_client.py) so it
+        shares a round trip with other state; the value is in `.value` once
+        the batch has run. In-process stores resolve immediately.
+        """
+        if self.redis is None:
+            return Pending(self._local_get(key, default))
+
+        def parse(reply):
+            if isinstance(reply, Exception):
+                self._redis_error("read", reply)
+                reply = None
+            return self._decoded(reply, default)
+
+        return batch.add(lambda pipe: pipe.getex(self._redis_key(key), ex=int(self.ttl)), parse=parse)
+
+    def batch_set(self, batch, key: str, value):
+        """Queue a write on a RedisBatch (in-process stores write immediately)."""
+        if self.redis is None:
+            self._local_set(key, value)
+            return Pending()
+        self._stats["stores"] += 1
+        data = self.encode(value)
+
+        def parse(reply):
+            if isinstance(reply, Exception):
+                self._redis_error("write", reply)
+            return reply
+
+        return batch.add(lambda pipe: pipe.set(self._redis_key(key), data, ex=int(self.ttl)), parse=parse)
+
+    def __getitem__(self, key: str):
+        value = self.get(key, _MISSING)
+        if value is _MISSING:
+            raise KeyError(key)
+        return value
+
+    def __setitem__(self, key: str, value):
+        self.set(key, value)
+
+    def __delitem__(self, key: str):
+        if not self.delete(key):
+            raise KeyError(key)
+
+    def __contains__(self, key: str) -> bool:
+        return self.get(key, _MISSING) is not _MISSING
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def clear(self):
+        """Drop the in-process entries (Redis entries expire on their TTL)."""
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self) -> dict:
+        lookups = self._stats["hits"] + self._stats["misses"]
+        return {
+            **self._stats,
+            "hit_rate": self._stats["hits"] / lookups if lookups else 0.0,
+            "entries": len(self._entries),
+            "bytes": self._bytes,
+            "max_entries": self.max_entries,
+            "max_bytes": self.max_bytes,
+            "ttl": self.ttl,
+            "redis": self.redis is not None,
+        }
+
+
+# Every store created through session_store(), for /xiara/debug/sessions
+stores: Dict[str, SessionStore] = {}
+
+
+def _redis_clients():
+    if settings.XIARA_SESSION_STORE != "redis":
+        return None, None
+    return get_redis(), get_async_redis()
+
+
+def session_store(namespace: str, local: bool = False, **kwargs) -> SessionStore:
+    """
+    A store configured from settings (XIARA_SESSION_*). `local=True` keeps it
+    in-process even in Redis mode, for values that cannot be serialized.
+    """
+    redis_client, async_redis_client = (None, None) if local else _redis_clients()
+    store = SessionStore(
+        namespace,
+        ttl=settings.XIARA_SESSION_TTL,
+        max_entries=settings.XIARA_SESSION_MAX_ENTRIES,
+        max_bytes=settings.XIARA_SESSION_MAX_MB * 1024 * 1024,
+        redis_client=redis_client,
+        async_redis_client=async_redis_client,
+        **kwargs
+    )
+    stores[namespace] = store
+    return store
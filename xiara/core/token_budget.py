@@ -0,0 +1,78 @@
+# xiara/core/token_budget.py
+"""
+Token accounting for prompt pieces (conversation messages, summaries).
+
+Counting tokens means running the model's tokenizer, so counts are cached
+by text: a conversation's messages are counted once, not on every turn.
+Estimates made while no tokenizer is available are not cached, so texts
+are counted exactly once it is.
+"""
+
+import threading
+from collections import OrderedDict
+from typing import Callable, List, Optional, Sequence
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough count (~4 characters per token) for when no tokenizer is available."""
+    return max(1, len(text) // 4) if text else 0
+
+
+class TokenCounter:
+    """
+    Cached token counts per text (bounded LRU). `count` returns None when it
+    can't count yet; the text is then estimated and counted again next time.
+    """
+
+    def __init__(self, count: Callable[[str], Optional[int]] = estimate_tokens, max_entries: int = 8192):
+        self._count = count
+        self.max_entries = max_entries
+        self._cache: "OrderedDict[str, int]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def __call__(self, text: str) -> int:
+        with self._lock:
+            n = self._cache.get(text)
+            if n is not None:
+                self._cache.move_to_end(text)
+                self.hits += 1
+                return n
+        n = self._count(text)
+        if n is None:
+            with self._lock:
+                self.misses += 1
+            return estimate_tokens(text)
+        with self._lock:
+            self.misses += 1
+            self._cache[text] = n
+            if len(self._cache) > self.max_entries:
+                self._cache.popitem(last=False)
+        return n
+
+    def total(self, texts: Sequence[str]) -> int:
+        return sum(self(text) for text in texts)
+
+
+def window_start(counts: Sequence[int], budget: int, keep_last: int = 0) -> int:
+    """
+    Index of the oldest item of the newest run of items fitting in `budget`
+    tokens. The last `keep_last` items are always included, even over budget.
+    """
+    start, used = len(counts), 0
+    for i in range(len(counts) - 1, -1, -1):
+        used += counts[i]
+        if used > budget and len(counts) - i > keep_last:
+            break
+        start = i
+    return start
+
+
+def fold_point(counts: List[int], keep_last: int, min_tokens: int) -> int:
+    """
+    Number of oldest items worth folding into a summary: everything before the
+    last `keep_last` items, once that backlog holds at least `min_tokens`.
+    """
+    older = max(0, len(counts) - keep_last)
+    return older if older and sum(counts[:older]) >= min_tokens else 0
@@ -1,11 +1,10 @@
-from langchain_huggingface import HuggingFaceEmbeddings
 from langchain_community.vectorstores import FAISS
+from xiara.core.model_registry import get_uncached_embeddings
 from xiara.core.user_profile_manager import get_user_profile
 import os
 import re
 
 USER_EMBEDDINGS_PATH = "xiara/data/user_embeddings"
-embedding_model = HuggingFaceEmbeddings(model_name="sentence-transformers/all-MiniLM-L6-v2")
 
 def sanitize_user_id(user_id: str) -> str:
     """Sanitize user_id to prevent path traversal attacks."""
@@ -25,7 +24,7 @@ def generate_user_embedding(user_id: str):
     )
     
     try:
-        vectorstore = FAISS.from_texts([text_representation], embedding_model)
+        vectorstore = FAISS.from_texts([text_representation], get_uncached_embeddings())
         os.makedirs(USER_EMBEDDINGS_PATH, exist_ok=True)
         vectorstore.save_local(f"{USER_EMBEDDINGS_PATH}/{safe_user_id}")
     except Exception as e:
@@ -37,7 +36,7 @@ def load_user_embedding(user_id: str):
     path = f"{USER_EMBEDDINGS_PATH}/{safe_user_id}"
     if os.path.exists(path):
         try:
-            return FAISS.load_local(path, embedding_model)
+            return FAISS.load_local(path, get_uncached_embeddings())
         except Exception as e:
             print(f"Error loading embedding for user {user_id}: {e}")
     return None
@@ -1,14 +1,27 @@
 import json
 from pydantic import BaseModel
-from typing import List, Optional
-import redis
+from typing import Dict, List, Optional
 import os
 
-# Redis connection
+import redis
+
+from shared.storage.redis_client import Pending, RedisBatch, get_async_redis, get_redis
+
+# Redis connection (shared pools)
 REDIS_URL = os.getenv("REDIS_URL")
 if not REDIS_URL:
     raise ValueError("REDIS_URL environment variable is not set")
-redis_client = redis.Redis.from_url(REDIS_URL, decode_responses=True)
+redis_client = get_redis()
+# Used by the async request path so profile I/O doesn't block the event loop
+async_redis_client = get_async_redis()
+
+# Layout: a hash per profile (list fields JSON-encoded, unset fields absent) and the query
+# history in a list, newest first, capped at HISTORY_LIMIT. Appends and field updates touch
+# only their own keys/fields, so concurrent workers don't overwrite each other's changes.
+HISTORY_LIMIT = 10
+LIST_FIELDS = ("liked_categories", "disliked_categories")
+TEXT_FIELDS = ("preferred_price_range", "purchase_intent")
+FIELDS = ("user_id",) + LIST_FIELDS + TEXT_FIELDS
 
 class UserProfile(BaseModel):
     user_id: str
@@ -18,22 +31,212 @@ class UserProfile(BaseModel):
     purchase_intent: Optional[str] = None
     history: List[str] = []
 
-def get_user_profile(user_id: str) -> Optional[UserProfile]:
-    """Retrieve user profile from Redis"""
-    data = redis_client.get(f"user_profile:{user_id}")
-    if data:
+def _profile_key(user_id: str) -> str:
+    return f"xiara:profile:{user_id}"
+
+def _history_key(user_id: str) -> str:
+    return f"xiara:profile:{user_id}:history"
+
+def _legacy_key(user_id: str) -> str:
+    # Profiles saved before the hash layout: one JSON string, migrated on first read
+    return f"user_profile:{user_id}"
+
+def _encode_fields(fields: Dict) -> Dict[str, str]:
+    return {name: json.dumps(value) if name in LIST_FIELDS else value
+            for name, value in fields.items() if value is not None}
+
+# -------------------------------
+# Pipeline steps (shared by the sync, async and batched helpers)
+# -------------------------------
+
+def _queue_read(pipe, user_id: str, history: bool = True):
+    pipe.hmget(_profile_key(user_id), FIELDS)
+    if history:
+        pipe.lrange(_history_key(user_id), 0, HISTORY_LIMIT - 1)
+    pipe.get(_legacy_key(user_id))
+
+def _checked(replies):
+    for reply in replies:
+        if isinstance(reply, Exception):
+            raise reply
+    return replies
+
+def _parse_read(user_id: str, replies, history: bool = True):
+    """(profile or None, the legacy JSON profile when it still has to be migrated)."""
+    replies = _checked(replies)
+    if history:
+        values, recent, legacy = replies
+    else:
+        (values, legacy), recent = replies, []
+    recent = list(reversed(recent))
+    fields = {name: value for name, value in zip(FIELDS, values) if value is not None}
+    for name in LIST_FIELDS:
+        if name in fields:
+            fields[name] = json.loads(fields[name])
+    if legacy:
         # Explicitly cast to str for type checkers
-        return UserProfile(**json.loads(str(data)))
-    return None
+        legacy = str(legacy)
+        saved = json.loads(legacy)
+        # Fields set and queries appended since (hash and list) are newer than the saved ones
+        profile = UserProfile(**{**saved, **fields, "user_id": user_id})
+        profile.history = (saved.get("history", []) + recent)[-HISTORY_LIMIT:]
+        return profile, legacy
+    if "user_id" in fields:
+        return UserProfile(**fields, history=recent), None
+    if recent:
+        return UserProfile(user_id=user_id, history=recent), None
+    return None, None
+
+def _queue_legacy_history(pipe, user_id: str, saved: UserProfile):
+    # Saved queries go behind the ones appended since
+    older = saved.history[-HISTORY_LIMIT:]
+    if older:
+        pipe.rpush(_history_key(user_id), *reversed(older))
+        pipe.ltrim(_history_key(user_id), 0, HISTORY_LIMIT - 1)
+
+def _queue_save(pipe, profile: UserProfile, legacy: Optional[str] = None):
+    """
+    Replace the profile fields (run in a MULTI pipeline, with the legacy key
+    WATCHed). The history list is only ever appended to (add_to_history), so
+    concurrent appends survive; a legacy profile's history is moved into it.
+    """
+    user_id = profile.user_id
+    if legacy:
+        _queue_legacy_history(pipe, user_id, UserProfile(**json.loads(legacy)))
+    pipe.delete(_profile_key(user_id), _legacy_key(user_id))
+    pipe.hset(_profile_key(user_id), mapping=_encode_fields(profile.dict(include=set(FIELDS))))
+
+def _queue_migration(pipe, user_id: str, legacy: str):
+    """
+    Move a legacy JSON profile into the hash layout (run in MULTI, with the
+    legacy key WATCHed). Fields and queries written since are kept: saved
+    fields only fill gaps and saved queries go behind the newer ones.
+    """
+    saved = UserProfile(**json.loads(legacy))
+    for name, value in _encode_fields(saved.dict(include=set(FIELDS))).items():
+        pipe.hsetnx(_profile_key(user_id), name, value)
+    _queue_legacy_history(pipe, user_id, saved)
+    pipe.delete(_legacy_key(user_id))
+
+def _queue_update(pipe, user_id: str, fields: Dict):
+    values = _encode_fields({**fields, "user_id": user_id})
+    pipe.hset(_profile_key(user_id), mapping=values)
+    unset = [name for name, value in fields.items() if value is None]
+    if unset:
+        pipe.hdel(_profile_key(user_id), *unset)
+
+def _queue_history(pipe, user_id: str, query: str):
+    pipe.lpush(_history_key(user_id), query)
+    pipe.ltrim(_history_key(user_id), 0, HISTORY_LIMIT - 1)
+
+# -------------------------------
+# Reads
+# -------------------------------
+
+def get_user_profile(user_id: str, history: bool = True) -> Optional[UserProfile]:
+    """Retrieve user profile from Redis (one round trip; `history=False` skips the query history)"""
+    pipe = redis_client.pipeline(transaction=False)
+    _queue_read(pipe, user_id, history)
+    profile, legacy = _parse_read(user_id, pipe.execute(raise_on_error=False), history)
+    if legacy:
+        migrate_user_profile(user_id, legacy)
+    return profile
+
+async def aget_user_profile(user_id: str, history: bool = True) -> Optional[UserProfile]:
+    """Retrieve user profile from Redis without blocking the event loop"""
+    async with async_redis_client.pipeline(transaction=False) as pipe:
+        _queue_read(pipe, user_id, history)
+        replies = await pipe.execute(raise_on_error=False)
+    profile, legacy = _parse_read(user_id, replies, history)
+    if legacy:
+        await amigrate_user_profile(user_id, legacy)
+    return profile
+
+def batch_get_user_profile(batch: RedisBatch, user_id: str) -> Pending:
+    """Queue a profile read on `batch`; the profile (or None) is in `.value` once it has run."""
+    # Legacy profiles are returned as they are here; the next plain read migrates them
+    return batch.add(lambda pipe: _queue_read(pipe, user_id),
+                     parse=lambda replies: _parse_read(user_id, replies)[0], commands=3)
+
+# -------------------------------
+# Writes
+# -------------------------------
 
 def save_user_profile(profile: UserProfile):
-    """Save user profile to Redis"""
-    redis_client.set(f"user_profile:{profile.user_id}", profile.json())
+    """
+    Replace a user profile's fields in Redis (atomically; the query history
+    is kept, including a not yet migrated legacy profile's)
+    """
+    with redis_client.pipeline() as pipe:
+        while True:
+            try:
+                pipe.watch(_legacy_key(profile.user_id))
+                legacy = pipe.get(_legacy_key(profile.user_id))
+                pipe.multi()
+                _queue_save(pipe, profile, legacy)
+                pipe.execute()
+                return
+            except redis.WatchError:
+                continue  # migrated by a reader meanwhile: save again without it
+
+async def asave_user_profile(profile: UserProfile):
+    """Replace a user profile in Redis without blocking the event loop"""
+    async with async_redis_client.pipeline() as pipe:
+        while True:
+            try:
+                await pipe.watch(_legacy_key(profile.user_id))
+                legacy = await pipe.get(_legacy_key(profile.user_id))
+                pipe.multi()
+                _queue_save(pipe, profile, legacy)
+                await pipe.execute()
+                return
+            except redis.WatchError:
+                continue
+
+def migrate_user_profile(user_id: str, legacy: str):
+    """Migrate the legacy JSON profile `legacy` once: nothing happens if another reader already did"""
+    with redis_client.pipeline() as pipe:
+        try:
+            pipe.watch(_legacy_key(user_id))
+            if pipe.get(_legacy_key(user_id)) != legacy:
+                return
+            pipe.multi()
+            _queue_migration(pipe, user_id, legacy)
+            pipe.execute()
+        except redis.WatchError:
+            pass  # migrated (or replaced) by another worker meanwhile
+
+async def amigrate_user_profile(user_id: str, legacy: str):
+    """Async variant of migrate_user_profile"""
+    async with async_redis_client.pipeline() as pipe:
+        try:
+            await pipe.watch(_legacy_key(user_id))
+            if await pipe.get(_legacy_key(user_id)) != legacy:
+                return
+            pipe.multi()
+            _queue_migration(pipe, user_id, legacy)
+            await pipe.execute()
+        except redis.WatchError:
+            pass
+
+def update_user_profile(user_id: str, **fields):
+    """Set only the given profile fields (None unsets one); history is left untouched"""
+    pipe = redis_client.pipeline()
+    _queue_update(pipe, user_id, fields)
+    pipe.execute()
+
+async def aupdate_user_profile(user_id: str, **fields):
+    """Async variant of update_user_profile"""
+    async with async_redis_client.pipeline() as pipe:
+        _queue_update(pipe, user_id, fields)
+        await pipe.execute()
 
 def add_to_history(user_id: str, query: str):
-    """Append a query to user's history in Redis"""
-    profile = get_user_profile(user_id)
-    if not profile:
-        profile = UserProfile(user_id=user_id)
-    profile.history.append(query)
-    save_user_profile(profile)
+    """Append a query to user's history in Redis (LPUSH + LTRIM, one round trip)"""
+    pipe = redis_client.pipeline()
+    _queue_history(pipe, user_id, query)
+    pipe.execute()
+
+def batch_add_to_history(batch: RedisBatch, user_id: str, query: str) -> Pending:
+    """Queue a history append on `batch`."""
+    return batch.add(lambda pipe: _queue_history(pipe, user_id, query), parse=_checked, commands=2)
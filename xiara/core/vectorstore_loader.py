@@ -1,65 +1,472 @@
+import contextlib
 import os
+import threading
 import time
+import numpy as np
 from langchain_community.vectorstores import FAISS
-from langchain_huggingface import HuggingFaceEmbeddings
-from langchain.text_splitter import CharacterTextSplitter
-from xiara.core.product_loader import load_all_products
+from langchain_text_splitters import CharacterTextSplitter
+from shared.config.settings import settings
+from xiara.core.ann_index import (
+    create_vectorstore, index_type, needs_training, read_index, removal_mode, remove_rows, reservoir_sample,
+    write_index,
+)
+from xiara.core.attribute_store import AttributeStore
+from xiara.core.compact_docstore import DELETED_ROW, load_docstore, write_docstore
+from xiara.core.embedding_cache import text_key
+from xiara.core.index_access import index_access
+from xiara.core.index_manifest import IndexManifest, file_digest, file_fingerprint, row_keys
+from xiara.core.model_registry import get_embeddings
+from xiara.core.product_loader import iter_batches, iter_product_file, list_product_files
+
+try:  # POSIX only — serializes index writes between worker processes
+    import fcntl
+except ImportError:  # pragma: no cover - Windows dev machines
+    fcntl = None
 
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
-DATA_PATH = os.path.join(BASE_DIR, "data")
+DATA_PATH = os.getenv("DATA_PATH") or os.path.join(BASE_DIR, "data")
 VECTORSTORE_PATH = os.path.join(os.path.dirname(__file__), "faiss_index")
+INDEX_FILE = os.path.join(VECTORSTORE_PATH, "index.faiss")
+LEGACY_PICKLE_FILE = os.path.join(VECTORSTORE_PATH, "index.pkl")
+
+splitter = CharacterTextSplitter(chunk_size=500, chunk_overlap=50)
+
+# Serializes index mutation between the loader and the watcher thread; the
+# lock file in the index directory extends it to the other worker processes
+index_lock = threading.RLock()
+_lock_state = {"depth": 0, "file": None}
+
+# Structured price/brand/category columns for the indexed rows
+attribute_store = None
+
+# Identity of the index files this process loaded, and the read-only mapped index
+loaded_signature = None
+mapped_index = None
+
+# Content version of the indexed catalog, and callbacks run when it changes
+catalog_version = None
+_index_listeners = []
+
+
+def get_attribute_store():
+    return attribute_store
 
-def get_vectorstore():
-    embedding_model = HuggingFaceEmbeddings(model_name="sentence-transformers/all-MiniLM-L6-v2")
-    index_file = os.path.join(VECTORSTORE_PATH, "index.faiss")
-    pkl_file = os.path.join(VECTORSTORE_PATH, "index.pkl")
 
-    # Check for both files
-    if os.path.exists(index_file) and os.path.exists(pkl_file):
+@contextlib.contextmanager
+def locked_index():
+    """Hold the index lock across threads and worker processes (re-entrant within a thread)."""
+    with index_lock:
+        if _lock_state["depth"] == 0:
+            os.makedirs(VECTORSTORE_PATH, exist_ok=True)
+            lock_file = open(os.path.join(VECTORSTORE_PATH, ".lock"), "a")
+            if fcntl:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+            _lock_state["file"] = lock_file
+        _lock_state["depth"] += 1
         try:
-            if data_is_newer(DATA_PATH, VECTORSTORE_PATH):
-                print("Product data changed — rebuilding FAISS index...")
-                return rebuild_vectorstore(embedding_model)
-            return FAISS.load_local(
-                VECTORSTORE_PATH,
-                embedding_model,
-                allow_dangerous_deserialization=True
-            )
-        except ValueError as e:
-            if "allow_dangerous_deserialization" in str(e):
-                print("Pickle restriction detected. Rebuilding FAISS index for safety...")
-                return rebuild_vectorstore(embedding_model)
-            else:
-                raise e
-
-    # No complete index found — build from scratch
-    return rebuild_vectorstore(embedding_model)
-
-def data_is_newer(data_path, index_path):
-    index_mtime = latest_modified_time(index_path)
-    data_mtime = latest_modified_time(data_path)
-    return data_mtime > index_mtime
-
-def latest_modified_time(path):
-    if os.path.isfile(path):
-        return os.path.getmtime(path)
-    latest_time = 0
-    for root, _, files in os.walk(path):
-        for f in files:
-            full_path = os.path.join(root, f)
-            latest_time = max(latest_time, os.path.getmtime(full_path))
-    return latest_time
-
-def rebuild_vectorstore(embedding_model):
-    documents = load_all_products(DATA_PATH)
-    if not documents:
-        print("No product documents found. Cannot build vectorstore.")
+            yield
+        finally:
+            _lock_state["depth"] -= 1
+            if _lock_state["depth"] == 0:
+                _lock_state["file"].close()  # releases the flock
+                _lock_state["file"] = None
+
+
+def _require_index_lock():
+    """
+    The docstore files are replaced one at a time (see compact_docstore):
+    they may only be written or opened inside locked_index().
+    """
+    owned = index_lock.acquire(blocking=False)  # re-entrant: succeeds if this thread holds it
+    try:
+        if not (owned and _lock_state["depth"]):
+            raise RuntimeError("The index files can only be read or written inside locked_index()")
+    finally:
+        if owned:
+            index_lock.release()
+
+
+def on_index_change(callback):
+    """Register callback(version), called whenever the indexed catalog changes (e.g. cache invalidation)."""
+    _index_listeners.append(callback)
+    if catalog_version is not None:
+        callback(catalog_version)
+
+
+def _publish_version(manifest):
+    global catalog_version
+    version = manifest.catalog_version()
+    if version == catalog_version:
+        return
+    catalog_version = version
+    for callback in _index_listeners:
+        try:
+            callback(version)
+        except Exception as e:
+            print(f"Index change listener failed: {e}")
+
+
+def index_signature():
+    """Identity of the saved index file; changes whenever any worker saves."""
+    try:
+        stat = os.stat(INDEX_FILE)
+    except FileNotFoundError:
+        return None
+    return stat.st_ino, stat.st_mtime_ns
+
+
+def save_vectorstore(vectorstore):
+    """Write the flat docstore files and the FAISS index — no pickle. Call inside locked_index()."""
+    _require_index_lock()
+    write_docstore(VECTORSTORE_PATH, vectorstore.docstore, vectorstore.index_to_docstore_id)
+    write_index(vectorstore.index, INDEX_FILE)
+    if os.path.exists(LEGACY_PICKLE_FILE):
+        os.remove(LEGACY_PICKLE_FILE)
+
+
+def load_vectorstore(embedding_model):
+    """
+    Open the saved index and docstore, memory-mapped so worker processes
+    share one copy in the page cache. Returns None if they are missing,
+    e.g. for an index saved in the old pickle format. Call inside locked_index().
+    """
+    global loaded_signature, mapped_index
+    _require_index_lock()
+    loaded = load_docstore(VECTORSTORE_PATH)
+    if loaded is None or not os.path.exists(INDEX_FILE):
         return None
+    docstore, index_to_docstore_id = loaded
+    signature = index_signature()
+    index = read_index(INDEX_FILE, mmap=settings.XIARA_INDEX_MMAP)
+    if index.ntotal != len(index_to_docstore_id):
+        print("FAISS index and docstore are out of step — rebuilding.")
+        return None
+    loaded_signature = signature
+    mapped_index = index if settings.XIARA_INDEX_MMAP else None
+    vectorstore = FAISS(embedding_model, index, docstore, index_to_docstore_id)
+    vectorstore.deleted_rows = index_to_docstore_id.deleted_rows()
+    return vectorstore
+
+
+def deleted_rows(vectorstore) -> np.ndarray:
+    """Rows still in the (HNSW) index whose chunks were deleted; searches exclude them."""
+    rows = getattr(vectorstore, "deleted_rows", None)
+    return rows if rows is not None else np.empty(0, dtype=np.int64)
+
+
+def _publish_store(store):
+    """
+    Make `store` the attribute store searches use (in place, so the
+    retriever's reference sees it). Call inside index_access.write().
+    """
+    global attribute_store
+    if attribute_store is None or attribute_store is store:
+        attribute_store = store
+    else:
+        attribute_store.replace_with(store)
+
+
+def _swap(vectorstore, fresh, store=None):
+    """
+    Point the vectorstore held by the retriever (and, if given, the
+    attribute store) at freshly loaded data, in one step for searches.
+    """
+    with index_access.write():
+        replaced = vectorstore.docstore
+        vectorstore.index = fresh.index
+        vectorstore.docstore = fresh.docstore
+        vectorstore.index_to_docstore_id = fresh.index_to_docstore_id
+        vectorstore.deleted_rows = deleted_rows(fresh)
+        if store is not None:
+            _publish_store(store)
+        if replaced is not fresh.docstore and hasattr(replaced, "close"):
+            # No search can still be reading it: they all hold index_access
+            replaced.close()
+
+
+def _make_writable(vectorstore):
+    """
+    A mapped index is read-only: load a private copy before adding or
+    removing vectors. Call inside index_access.write().
+    """
+    if vectorstore.index is mapped_index:
+        vectorstore.index = read_index(INDEX_FILE, mmap=False)
+
 
-    splitter = CharacterTextSplitter(chunk_size=500, chunk_overlap=50)
-    chunks = splitter.split_documents(documents)
+def _add_chunks(vectorstore, chunks, ids):
+    """Embed chunks outside the index lock, then add them to the index and docstore under it."""
+    texts = [chunk.page_content for chunk in chunks]
+    vectors = vectorstore.embedding_function.embed_documents(texts)
+    with index_access.write():
+        _make_writable(vectorstore)
+        vectorstore.add_embeddings(list(zip(texts, vectors)), metadatas=[chunk.metadata for chunk in chunks], ids=ids)
 
-    vectorstore = FAISS.from_documents(chunks, embedding_model)
-    vectorstore.save_local(VECTORSTORE_PATH)
+
+def _delete_chunks(vectorstore, doc_ids):
+    """
+    Delete chunks in place. Like LangChain's FAISS.delete, the rows after
+    a removed one move down so FAISS ids stay row positions; on HNSW the
+    rows are only marked deleted. Call inside index_access.write().
+    """
+    mapping = vectorstore.index_to_docstore_id
+    if hasattr(mapping, "rows_for"):
+        rows = mapping.rows_for(list(doc_ids))
+    else:
+        wanted = set(doc_ids)
+        rows = np.array([row for row, doc_id in mapping.items() if doc_id in wanted], dtype=np.int64)
+    vectorstore.docstore.delete(list(doc_ids))
+    if removal_mode(vectorstore.index) == "mark":
+        for row in rows.tolist():
+            mapping[row] = DELETED_ROW
+        vectorstore.deleted_rows = np.union1d(deleted_rows(vectorstore), rows)
+        return
+    _make_writable(vectorstore)
+    remove_rows(vectorstore.index, rows)
+    removed = set(rows.tolist())
+    kept = (mapping[row] for row in range(len(mapping)) if row not in removed)
+    vectorstore.index_to_docstore_id = dict(enumerate(kept))
+
+
+def _needs_rebuild(vectorstore, stale_ids) -> bool:
+    """Whether deleting stale_ids needs a rebuild: the index can't delete, or HNSW has too many deleted rows."""
+    if not stale_ids:
+        return False
+    mode = removal_mode(vectorstore.index)
+    if mode == "mark":
+        deleted = len(deleted_rows(vectorstore)) + len(stale_ids)
+        return deleted > settings.XIARA_HNSW_MAX_DELETED_FRACTION * max(vectorstore.index.ntotal, 1)
+    return mode is None
+
+
+def _compact_embedding_cache(vectorstore):
+    """
+    Drop the cached vectors of texts that are no longer indexed (edited or
+    deleted products) once they exceed XIARA_EMBEDDING_CACHE_MAX_STALE of
+    the indexed chunks. Call inside locked_index().
+    """
+    documents = getattr(vectorstore.embedding_function, "documents", None)
+    live = len(vectorstore.index_to_docstore_id) - len(deleted_rows(vectorstore))
+    if documents is None or len(documents) <= live * (1 + settings.XIARA_EMBEDDING_CACHE_MAX_STALE):
+        return
+    docs = (vectorstore.docstore.search(doc_id) for doc_id in vectorstore.index_to_docstore_id.values()
+            if doc_id != DELETED_ROW)
+    dropped = documents.compact(text_key(doc.page_content) for doc in docs if not isinstance(doc, str))
+    if dropped:
+        print(f"Embedding cache compacted: dropped {dropped} vectors of texts no longer indexed")
+
+
+def get_vectorstore():
+    # Shared, cached model: unchanged chunks and repeated queries never reach it
+    embedding_model = get_embeddings()
+
+    with locked_index():
+        # An index without a manifest predates incremental updates, a changed
+        # XIARA_INDEX_TYPE needs a different index, and a pickled index predates
+        # the mapped docstore — rebuild once in each case
+        manifest = IndexManifest.load(VECTORSTORE_PATH)
+        store = AttributeStore.load(VECTORSTORE_PATH)
+        vectorstore = None
+        if store is not None and manifest is not None and manifest.index_type == index_type():
+            vectorstore = load_vectorstore(embedding_model)
+        if vectorstore is None:
+            # No complete index found — build from scratch
+            return rebuild_vectorstore(embedding_model)
+
+        with index_access.write():
+            _publish_store(store)
+        sync_vectorstore(vectorstore)
+        return vectorstore
+
+
+def _keyed_batches(filepath: str):
+    """Stream a file's product rows in batches, paired with their content-addressed keys."""
+    name, seen = os.path.basename(filepath), {}
+    for batch in iter_batches(iter_product_file(filepath)):
+        keys = row_keys(name, (doc.page_content for doc in batch), seen)
+        yield list(zip(keys, batch))
+
+
+def _chunk_rows(keyed_rows):
+    """Split rows into chunks with stable docstore ids ("<row key>:<chunk no>")."""
+    chunks, ids, row_ids = [], [], {}
+    for key, doc in keyed_rows:
+        row_chunks = splitter.split_documents([doc])
+        row_ids[key] = [f"{key}:{i}" for i in range(len(row_chunks))]
+        chunks.extend(row_chunks)
+        ids.extend(row_ids[key])
+    return chunks, ids, row_ids
+
+
+def sync_vectorstore(vectorstore, data_path: str = DATA_PATH) -> dict:
+    """
+    Apply product data changes to a loaded index using the manifest.
+    Only rows that were added, changed or deleted since the last sync are
+    embedded or removed. Returns counts of the applied changes.
+
+    Searches keep running meanwhile: new rows are embedded before the index
+    is locked, and index, docstore and attribute store change together
+    under index_access.
+    """
+    added, removed = 0, 0
+    with locked_index():
+        if loaded_signature != index_signature():
+            # Another worker saved a newer index — pick it up before diffing
+            fresh = load_vectorstore(vectorstore.embedding_function)
+            if fresh is not None:
+                _swap(vectorstore, fresh, AttributeStore.load(VECTORSTORE_PATH))
+        manifest = IndexManifest.load(VECTORSTORE_PATH) or IndexManifest()
+        store = attribute_store if attribute_store is not None else AttributeStore()
+        current = {os.path.basename(path): path for path in list_product_files(data_path)}
+        stale_ids = []
+        dirty = False
+
+        for name in set(manifest.files) - set(current):
+            stale_ids.extend(manifest.drop_file(name))
+            dirty = True
+
+        for name, path in current.items():
+            fingerprint = file_fingerprint(path)
+            if manifest.is_unchanged(name, fingerprint):
+                continue
+            dirty = True
+            digest = file_digest(path)
+            if manifest.has_digest(name, digest):
+                manifest.touch(name, fingerprint)
+                continue
+
+            # New rows are embedded batch by batch as the file streams in
+            file_rows = {}
+            try:
+                for keyed_rows in _keyed_batches(path):
+                    new_keys = set(manifest.unindexed_keys(name, (key for key, _ in keyed_rows)))
+                    chunks, ids, row_ids = _chunk_rows([(k, doc) for k, doc in keyed_rows if k in new_keys])
+                    if chunks:
+                        _add_chunks(vectorstore, chunks, ids)
+                        added += len(chunks)
+                    for key, doc in keyed_rows:
+                        if key in new_keys:
+                            store.add(key, doc.metadata, len(row_ids[key]))
+                    file_rows.update({key: row_ids.get(key, []) for key, _ in keyed_rows})
+            except Exception as e:
+                # A truncated or half-written file: rows it didn't yield are not deletions
+                print(f"Could not read {name} to the end ({e}) — keeping its indexed rows until it reads cleanly")
+                manifest.add_rows(name, file_rows)
+                continue
+            stale_ids.extend(manifest.stale_ids(name, file_rows))
+            manifest.set_file(name, fingerprint, digest, file_rows)
+
+        if _needs_rebuild(vectorstore, stale_ids):
+            # Cheap, since embeddings are cached
+            print("Too many deletions to apply in place — rebuilding from cached embeddings...")
+            rebuilt = rebuild_vectorstore(vectorstore.embedding_function, publish=False)
+            if rebuilt is not None:
+                _swap(vectorstore, rebuilt, AttributeStore.load(VECTORSTORE_PATH))
+            return {"added": added, "removed": len(stale_ids), "rebuilt": True}
+
+        # Deletions and the new attribute rows become visible to searches together
+        with index_access.write():
+            if stale_ids:
+                _delete_chunks(vectorstore, stale_ids)
+                store.remove({doc_id.rsplit(":", 1)[0] for doc_id in stale_ids})
+                removed = len(stale_ids)
+            if dirty:
+                store.finalize()
+                _publish_store(store)
+        if added or removed:
+            save_vectorstore(vectorstore)
+            # Back to the shared mapping; drops the private copy and the docstore overlay
+            fresh = load_vectorstore(vectorstore.embedding_function)
+            if fresh is not None:
+                _swap(vectorstore, fresh)
+            _compact_embedding_cache(vectorstore)
+        if dirty:
+            store.save(VECTORSTORE_PATH)
+            manifest.save(VECTORSTORE_PATH)
+        _publish_version(manifest)
+
+    if added or removed:
+        print(f"Vectorstore synced: {added} chunks added, {removed} removed")
+    return {"added": added, "removed": removed}
+
+
+def _training_sample() -> list:
+    """Reservoir-sample chunk texts across the catalog to train ANN indexes."""
+    def chunk_texts():
+        for path in list_product_files(DATA_PATH):
+            try:
+                for batch in iter_batches(iter_product_file(path)):
+                    for chunk in splitter.split_documents(batch):
+                        yield chunk.page_content
+            except Exception as e:
+                print(f"Could not read {os.path.basename(path)} for the training sample: {e}")
+
+    return reservoir_sample(chunk_texts(), settings.XIARA_INDEX_TRAIN_SAMPLE)
+
+
+def rebuild_vectorstore(embedding_model, publish: bool = True):
+    """
+    Build the index from scratch. The new attribute store is published
+    unless `publish` is False (the caller swaps it in with the index).
+    """
+    with locked_index():
+        kind = index_type()
+        manifest = IndexManifest(index_type=kind)
+        store = AttributeStore()
+        # Only IVF-PQ trains on a sample; otherwise the first batch creates the index
+        vectorstore = create_vectorstore(embedding_model, _training_sample(), kind) if needs_training(kind) else None
+        for path in list_product_files(DATA_PATH):
+            name, file_rows = os.path.basename(path), {}
+            try:
+                for keyed_rows in _keyed_batches(path):
+                    chunks, ids, row_ids = _chunk_rows(keyed_rows)
+                    file_rows.update(row_ids)
+                    for key, doc in keyed_rows:
+                        store.add(key, doc.metadata, len(row_ids[key]))
+                    if not chunks:
+                        continue
+                    # Feed each batch straight into the index so memory stays flat
+                    if vectorstore is None and kind == "hnsw":
+                        vectorstore = create_vectorstore(embedding_model, [chunks[0].page_content], kind)
+                    if vectorstore is None:
+                        vectorstore = FAISS.from_documents(chunks, embedding_model, ids=ids)
+                    else:
+                        vectorstore.add_documents(chunks, ids=ids)
+            except Exception as e:
+                # Index what was read; the next sync reads the file again
+                print(f"Could not read {name} to the end ({e}) — indexed the rows read so far")
+                manifest.add_rows(name, file_rows)
+                continue
+            manifest.set_file(name, file_fingerprint(path), file_digest(path), file_rows)
+
+        if vectorstore is None:
+            print("No product documents found. Cannot build vectorstore.")
+            return None
+
+        store.finalize()
+        save_vectorstore(vectorstore)
+        store.save(VECTORSTORE_PATH)
+        manifest.save(VECTORSTORE_PATH)
+        if publish:
+            with index_access.write():
+                _publish_store(store)
+        _publish_version(manifest)
+        # Serve from the mapped files rather than the in-memory build
+        vectorstore = load_vectorstore(embedding_model) or vectorstore
+        _compact_embedding_cache(vectorstore)
     print(f"Vectorstore rebuilt and saved to {VECTORSTORE_PATH}")
-    return vectorstore
\ No newline at end of file
+    return vectorstore
+
+
+def start_index_watcher(vectorstore, interval: float = settings.XIARA_INDEX_WATCH_INTERVAL) -> threading.Thread:
+    """Poll the data directory in a daemon thread and apply changes as they land."""
+    def watch():
+        while True:
+            time.sleep(interval)
+            try:
+                sync_vectorstore(vectorstore)
+            except Exception as e:
+                print(f"Vectorstore sync failed: {e}")
+
+    thread = threading.Thread(target=watch, name="xiara-index-watcher", daemon=True)
+    thread.start()
+    return thread
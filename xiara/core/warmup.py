@@ -0,0 +1,137 @@
+# xiara/core/warmup.py
+"""
+Background warm-up and readiness tracking for Xiara.
+
+The FastAPI lifespan starts `start_warmup()`, which loads the LLM and the
+product index in a worker thread so the pod binds its port immediately.
+Until the index is ready, requests run in LLM-only mode; until the LLM is
+loaded, they are rejected quickly with ServiceNotReady. A failed load is
+retried with exponential backoff (XIARA_WARMUP_RETRIES); once the retries
+are used up the failure is reported as such.
+"""
+
+import asyncio
+import os
+import time
+from typing import Optional
+
+from shared.config.settings import settings
+from shared.logging.logger import logger
+from xiara.core.llm_config import get_llm, is_llm_loaded
+
+USE_RAG = os.getenv("USE_RAG", "true").lower() == "true"
+RETRY_AFTER_SECONDS = 5
+
+_state = {
+    "started": False,
+    "llm": "pending",
+    "index": "pending" if USE_RAG else "disabled",
+    "error": None,
+    "attempts": 0,
+    "retrying": False,
+    "started_at": None,
+    "ready_at": None,
+}
+_task: Optional[asyncio.Task] = None
+
+
+class ServiceNotReady(Exception):
+    """Raised when a request needs a component that is still warming up."""
+
+    def __init__(self, component: str):
+        super().__init__(f"Xiara is warming up ({component} not loaded yet)")
+        self.component = component
+        self.retry_after = RETRY_AFTER_SECONDS
+
+
+def warm_up(sleep=time.sleep):
+    """
+    Load the LLM and the product index (blocking). Runs in a worker thread;
+    a failed load is retried after a growing delay, keeping what did load.
+    """
+    _state["started_at"] = time.time()
+    delay = settings.XIARA_WARMUP_RETRY_DELAY
+    for attempt in range(settings.XIARA_WARMUP_RETRIES + 1):
+        _state["attempts"] = attempt + 1
+        if _load():
+            return
+        _state["retrying"] = attempt < settings.XIARA_WARMUP_RETRIES
+        if not _state["retrying"]:
+            logger.error("Xiara warm-up gave up after %d attempts", attempt + 1)
+            return
+        logger.warning("Retrying Xiara warm-up in %.0fs", delay)
+        sleep(delay)
+        delay *= 2
+
+
+def _load() -> bool:
+    """One warm-up attempt over the components not loaded yet. False if one failed."""
+    try:
+        if _state["llm"] != "ready":
+            _state["llm"] = "loading"
+            get_llm()
+            _pin_prompt_prefixes()
+            _state["llm"] = "ready"
+
+        if USE_RAG and _state["index"] != "ready":
+            _state["index"] = "loading"
+            from xiara.core.prompt_chain import load_retriever
+
+            load_retriever()
+            _state["index"] = "ready"
+        _state["error"], _state["retrying"] = None, False
+        _state["ready_at"] = time.time()
+        logger.info("Xiara warm-up finished in %.1fs", _state["ready_at"] - _state["started_at"])
+        return True
+    except Exception as e:
+        _state["error"] = str(e)
+        for component in ("llm", "index"):
+            if _state[component] == "loading":
+                _state[component] = "failed"
+        logger.error("Xiara warm-up failed: %s", e)
+        return False
+
+
+def _pin_prompt_prefixes():
+    """Evaluate the static prompt prefixes once so requests start from their KV state."""
+    try:
+        from xiara.core.llm_config import cache_prompt_prefixes
+        from xiara.core.prompt_chain import prompt_prefixes
+
+        pinned = cache_prompt_prefixes(prompt_prefixes())
+        if pinned:
+            logger.info("Pinned %d prompt prefixes in the inference service KV cache", pinned)
+    except Exception as e:
+        # Only an optimization: requests still work without the pinned prefixes
+        logger.warning("Could not pin prompt prefixes: %s", e)
+
+
+def start_warmup() -> asyncio.Task:
+    """Schedule warm-up on the running event loop without blocking startup."""
+    global _task
+    _state["started"] = True
+    _task = asyncio.get_running_loop().create_task(asyncio.to_thread(warm_up))
+    return _task
+
+
+def is_ready() -> bool:
+    return _state["llm"] == "ready" and _state["index"] in ("ready", "disabled")
+
+
+def has_failed() -> bool:
+    """True once a component failed to load and no retry is left."""
+    return "failed" in (_state["llm"], _state["index"]) and not _state["retrying"]
+
+
+def llm_available() -> bool:
+    """True if the LLM can be used without blocking on a load in progress."""
+    return is_llm_loaded() or not _state["started"]
+
+
+def require_llm():
+    if not llm_available():
+        raise ServiceNotReady("llm")
+
+
+def status() -> dict:
+    return {key: value for key, value in _state.items() if key != "started"}
@@ -1,6 +1,7 @@
 import sys
 import os
-from fastapi import FastAPI
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse
 from pydantic import BaseModel
 from dotenv import load_dotenv
 from contextlib import asynccontextmanager
@@ -13,7 +14,10 @@ from shared.config.settings import settings
 from shared.logging.logger import logger
 from xiara.api.endpoints import router as extra_router  # Optional extra Xiara endpoints
 from xiara.api.product_query import router as product_query_router              # The actual product query route
-from xiara.core.prompt_chain import handle_product_query
+from xiara.core.prompt_chain import ahandle_product_query, astream_product_query
+from xiara.api.sse import stream_answer, stream_error
+from xiara.core.llm_executor import Overloaded
+from xiara.core import warmup
 from xiara.api import user_profile
 
 
@@ -24,6 +28,10 @@ load_dotenv()
 async def lifespan(app: FastAPI):
 
     logger.info(" Xiara Agent started in %s mode", settings.ENVIRONMENT)
+    mode = "RAG (Retrieval-Augmented Generation)" if warmup.USE_RAG else "LLM-only"
+    logger.info(" Xiara is running in %s mode", mode)
+    # Load the LLM and product index in the background so the port binds immediately
+    warmup.start_warmup()
     yield
 
 app = FastAPI(
@@ -33,38 +41,77 @@ app = FastAPI(
     lifespan=lifespan
 )
 
+@app.exception_handler(warmup.ServiceNotReady)
+async def service_not_ready_handler(request: Request, exc: warmup.ServiceNotReady):
+    return JSONResponse(
+        status_code=503,
+        content={"agent": "Xiara", "detail": str(exc)},
+        headers={"Retry-After": str(exc.retry_after)},
+    )
+
+@app.exception_handler(Overloaded)
+async def overloaded_handler(request: Request, exc: Overloaded):
+    return JSONResponse(
+        status_code=429,
+        content={"agent": "Xiara", "detail": str(exc)},
+        headers={"Retry-After": str(exc.retry_after)},
+    )
+
 # Health check
 @app.get("/")
 def health_check():
     return {"status": "ok", "service": "Xiara", "env": settings.ENVIRONMENT}
 
+# Liveness: the process is up and serving HTTP
+@app.get("/live")
+def live():
+    return {"status": "ok"}
+
+# Readiness: LLM and product index are loaded
+@app.get("/ready")
+def ready():
+    status = warmup.status()
+    if not warmup.is_ready():
+        state = "failed" if warmup.has_failed() else "warming_up"
+        return JSONResponse(status_code=503, content={"status": state, **status})
+    return {"status": "ready", **status}
+
 # Temporary direct chat endpoint (can be removed once router is used exclusively)
 class ChatRequest(BaseModel):
     userId: str
     prompt: str
 
 @app.post("/xiara/chat")
-def chat(request: ChatRequest):
+async def chat(request: ChatRequest):
     logger.info(f"Xiara received chat from {request.userId}: {request.prompt}")
     try:
-        answer = handle_product_query(request.prompt, user_id=request.userId)
+        answer = await ahandle_product_query(request.prompt, user_id=request.userId)
         return {
             "agent": "Xiara",
             "response": answer
         }
+    except (warmup.ServiceNotReady, Overloaded):
+        raise
     except Exception as e:
         logger.error(f"Xiara failed to respond: {e}")
         return {
             "agent": "Xiara",
             "response": "Sorry, I encountered an error trying to respond to your request."
         }
-# Startup event to log RAG mode
-@app.on_event("startup")
-async def startup_event():
-    use_rag = os.getenv("USE_RAG", "true").lower() == "true"
-    mode = "RAG (Retrieval-Augmented Generation)" if use_rag else "LLM-only"
-    print(f"\n Xiara is running in {mode} mode\n")
-    
+
+@app.post("/xiara/chat/stream")
+async def chat_stream(request: ChatRequest):
+    """Like /xiara/chat, but streams the answer as Server-Sent Events."""
+    logger.info(f"Xiara received streaming chat from {request.userId}: {request.prompt}")
+    try:
+        turn = await astream_product_query(request.prompt, user_id=request.userId)
+    except (warmup.ServiceNotReady, Overloaded):
+        raise
+    except Exception as e:
+        logger.error(f"Xiara failed to respond: {e}")
+        return stream_error()
+    return stream_answer(turn)
+
 # Include route(s) from product_query.py and extra_router (if used)
 app.include_router(product_query_router)
 app.include_router(extra_router, prefix="/xiara")
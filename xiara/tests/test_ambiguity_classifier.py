@@ -0,0 +1,65 @@
+import numpy as np
+
+from xiara.core import ambiguity_classifier
+from xiara.core.ambiguity_classifier import AmbiguityClassifier, AmbiguityGate
+from xiara.core.model_registry import DEFAULT_EMBEDDING_MODEL
+
+
+def _examples(n=200, dim=8, seed=0):
+    rng = np.random.default_rng(seed)
+    x = rng.normal(size=(n, dim))
+    y = (x[:, 0] + 0.3 * rng.normal(size=n) > 0).astype(float)
+    return x, y
+
+
+def test_fit_separates_classes_and_round_trips(tmp_path):
+    x, y = _examples()
+    classifier = AmbiguityClassifier.fit(x, y, embedding_model="test-model")
+    probabilities = np.array([classifier.predict_proba(v) for v in x])
+    assert ((probabilities >= 0.5) == y).mean() > 0.9
+    assert classifier.predict_proba(np.eye(8)[0] * 3) > 0.9
+
+    path = str(tmp_path / "model.npz")
+    classifier.save(path)
+    loaded = AmbiguityClassifier.load(path)
+    assert loaded.embedding_model == "test-model"
+    assert abs(loaded.predict_proba(x[0]) - classifier.predict_proba(x[0])) < 1e-6
+
+
+def test_model_for_other_embeddings_is_refused(tmp_path, monkeypatch, capsys):
+    x, y = _examples()
+    path = str(tmp_path / "model.npz")
+    monkeypatch.setattr(ambiguity_classifier.settings, "XIARA_AMBIGUITY_MODEL_PATH", path)
+    for model, usable in (("test-model", False), (DEFAULT_EMBEDDING_MODEL, True)):
+        AmbiguityClassifier.fit(x, y, embedding_model=model).save(path)
+        monkeypatch.setattr(ambiguity_classifier, "_classifier", None)
+        monkeypatch.setattr(ambiguity_classifier, "_classifier_loaded", False)
+        assert (ambiguity_classifier.get_classifier() is not None) == usable
+    assert "trained on test-model embeddings" in capsys.readouterr().out
+
+
+def test_gate_asks_the_llm_only_inside_the_band_and_caches_verdicts():
+    classifier = AmbiguityClassifier([1.0, 0.0], 0.0)
+    vectors = {"shoes": [5.0, 0.0], "red shoes": [-5.0, 0.0], "some bags": [0.1, 0.0]}
+    asked = []
+
+    def llm_check(query):
+        asked.append(query)
+        return True
+
+    gate = AmbiguityGate(lambda: classifier, vectors.__getitem__, low=0.35, high=0.65, cache_size=10, ttl=60)
+    assert gate.check("shoes", llm_check) is True
+    assert gate.check("red shoes", llm_check) is False
+    assert gate.check("some bags", llm_check) is True
+    assert gate.check("Some  bags!", llm_check) is True  # same normalized query: cached
+    assert asked == ["some bags"]
+    stats = gate.stats()
+    assert (stats["model_decisions"], stats["llm_fallbacks"], stats["cache_hits"]) == (2, 1, 1)
+
+
+def test_without_a_model_every_query_goes_to_the_llm_and_unanswered_is_not_cached():
+    answers = iter([None, True])
+    gate = AmbiguityGate(lambda: None, cache_size=10, ttl=60)
+    assert gate.check("shoes", lambda q: next(answers)) is False  # LLM still loading
+    assert gate.check("shoes", lambda q: next(answers)) is True
+    assert gate.stats()["llm_unanswered"] == 1
@@ -0,0 +1,54 @@
+import numpy as np
+import pytest
+from xiara.core.ann_index import build_index, excluding, removal_mode, remove_rows, reservoir_sample
+
+faiss = pytest.importorskip("faiss")
+
+
+def test_reservoir_sample_is_bounded_and_deterministic():
+    sample = reservoir_sample(range(10_000), 50)
+    assert len(sample) == 50 and len(set(sample)) == 50
+    assert sample == reservoir_sample(range(10_000), 50)
+    assert reservoir_sample(range(3), 50) == [0, 1, 2]
+
+
+def test_hnsw_finds_neighbours():
+    rng = np.random.default_rng(0)
+    data = rng.standard_normal((2000, 48)).astype(np.float32)
+
+    hnsw = build_index("hnsw", 48)
+    hnsw.add(data)
+    _, ids = hnsw.search(data[:5], 1)
+    assert ids[:, 0].tolist() == [0, 1, 2, 3, 4]
+    assert removal_mode(hnsw) == "mark"
+    assert removal_mode(faiss.IndexFlatL2(48)) == "remove"
+
+    # Deleted rows stay in the graph but are never returned
+    _, ids = hnsw.search(data[:5], 1, params=excluding(hnsw, np.array([0, 1])))
+    assert 0 not in ids and 1 not in ids and ids[2:, 0].tolist() == [2, 3, 4]
+
+
+def test_ivf_removal_keeps_ids_equal_to_rows():
+    rng = np.random.default_rng(0)
+    data = rng.standard_normal((500, 16)).astype(np.float32)
+    quantizer = faiss.IndexFlatL2(16)
+    ivf = faiss.IndexIVFFlat(quantizer, 16, 8)
+    ivf.train(data)
+    ivf.add(data)
+    ivf.nprobe = 8
+    assert removal_mode(ivf) == "remove"
+
+    remove_rows(ivf, np.array([3, 10, 250]))
+    kept = np.delete(data, [3, 10, 250], axis=0)
+    assert ivf.ntotal == 497
+    _, ids = ivf.search(kept[[0, 3, 9, 249, 496]], 1)
+    assert ids[:, 0].tolist() == [0, 3, 9, 249, 496]
+    ivf.add(data[:1])  # new rows continue after the last one
+    _, ids = ivf.search(data[:1], 2)
+    assert sorted(ids[0].tolist()) == [0, 497]
+
+
+def test_ivfpq_falls_back_without_enough_training_data():
+    rng = np.random.default_rng(0)
+    assert build_index("ivfpq", 48, rng.standard_normal((10, 48)).astype(np.float32)) is None
+    assert build_index("flat", 48) is None
@@ -0,0 +1,93 @@
+from xiara.core.attribute_store import (
+    AttributeStore, Constraints, budget_currency, extract_attributes, parse_budget, parse_currency, parse_price,
+    parse_price_range,
+)
+
+
+def _store():
+    store = AttributeStore()
+    store.add("a", {"price": 3000.0, "brand": "nivea", "category": "skincare"}, 1)
+    store.add("b", {"price": 8000.0, "brand": "nivea", "category": "skincare"}, 2)
+    store.add("c", {"price": 4500.0, "brand": "samsung", "category": "electronics"}, 1)
+    store.add("d", {"category": "electronics"}, 1)
+    store.finalize()
+    return store
+
+
+def test_parse_price_and_ranges():
+    assert parse_price("₦20,000") == 20000.0
+    assert parse_price("$79.99") == 79.99
+    assert parse_price("20k") == 20000.0
+    assert parse_price("n/a") is None
+    assert parse_price(float("nan")) is None
+    assert parse_price_range("₦20000 - ₦50000") == (20000.0, 50000.0)
+    assert parse_price_range(None) == (None, None)
+
+
+def test_extract_attributes_infers_brand_from_name():
+    attrs = extract_attributes({"Product Name": "Nivea Body Lotion", "Price": "₦4,500", "SKU": "x1"})
+    assert attrs == {"name": "Nivea Body Lotion", "price": 4500.0, "currency": "NGN", "brand": "nivea"}
+
+
+def test_parse_query_finds_budget_brand_and_category():
+    store = _store()
+    constraints = store.parse_query("Any Nivea skincare under ₦5,000?")
+    assert constraints.max_price == 5000.0
+    assert constraints.brands == {"nivea"}
+    assert constraints.categories == {"skincare"}
+    assert store.parse_query("phones between 10k and 20k").min_price == 10000.0
+
+
+def test_parse_budget_bounds():
+    assert parse_budget("boots under ₦20,000") == (None, 20000.0)
+    assert parse_budget("phones between 10k and 20k") == (10000.0, 20000.0)
+    assert parse_budget("bags above $50") == (50.0, None)
+    assert parse_budget("red shoes") == (None, None)
+
+
+def test_currencies_of_prices_and_budgets():
+    assert parse_currency("₦20,000") == "NGN" and parse_currency("$79") == "USD" and parse_currency("100") is None
+    assert budget_currency("lotion under ₦5,000") == "NGN"
+    assert budget_currency("phones between 100 and 200 dollars") == "USD"
+    assert budget_currency("₦ is fine, anything under 5000") is None
+
+
+def test_budgets_only_compare_prices_in_their_currency():
+    store = AttributeStore()
+    store.add("naira", {"price": 4500.0, "currency": "NGN"}, 1)
+    store.add("dollars", {"price": 15.0, "currency": "USD"}, 1)
+    store.add("unmarked", {"price": 3000.0}, 1)
+    store.finalize()
+    assert store.candidate_rows(Constraints(max_price=5000, currency="NGN")).tolist() == [0, 2]
+    assert store.candidate_rows(Constraints(max_price=20, currency="USD")).tolist() == [1]
+    assert store.candidate_rows(Constraints(max_price=5000)).tolist() == [0, 1, 2]
+    assert store.candidate_rows(Constraints(max_price=5000, currency="GBP")).tolist() == [2]
+    # No comparable price at all: the budget can't be applied
+    store.remove({"unmarked"})
+    store.finalize()
+    assert store.candidate_rows(Constraints(max_price=5000, currency="GBP")) is None
+    assert store.parse_query("lotion under ₦5,000").currency == "NGN"
+
+
+def test_candidate_rows_combines_price_index_and_bitmaps():
+    store = _store()
+    assert store.candidate_rows(Constraints()) is None
+    assert store.candidate_rows(Constraints(max_price=5000)).tolist() == [0, 2]
+    assert store.candidate_rows(Constraints(max_price=5000, brands={"nivea"})).tolist() == [0]
+    assert store.candidate_rows(Constraints(exclude_categories={"skincare"})).tolist() == [2, 3]
+    # Unknown values don't constrain the search
+    assert store.candidate_rows(Constraints(brands={"unknown"})) is None
+    assert store.docstore_ids([1]) == ["b:0", "b:1"]
+
+
+def test_remove_and_round_trip(tmp_path):
+    store = _store()
+    store.remove({"a"})
+    store.finalize()
+    store.save(str(tmp_path))
+
+    loaded = AttributeStore.load(str(tmp_path))
+    assert loaded.row_keys == ["b", "c", "d"]
+    assert loaded.candidate_rows(Constraints(brands={"nivea"})).tolist() == [0]
+    assert loaded.candidate_rows(Constraints(min_price=4000, max_price=5000)).tolist() == [1]
+    assert AttributeStore.load(str(tmp_path / "missing")) is None
@@ -0,0 +1,80 @@
+import os
+
+import pytest
+
+pytest.importorskip("faiss")
+pytest.importorskip("langchain_community")
+
+from langchain_community.vectorstores import FAISS
+from langchain_core.documents import Document
+from langchain_core.embeddings import DeterministicFakeEmbedding
+
+from xiara.core.ann_index import read_index, write_index
+from xiara.core.compact_docstore import load_docstore, write_docstore
+
+
+def _saved_vectorstore(path):
+    docs = [Document(page_content=f"product {i} ₦{i}000", metadata={"price": i * 1000.0}) for i in range(5)]
+    ids = [f"key{i}:0" for i in range(5)]
+    vectorstore = FAISS.from_documents(docs, DeterministicFakeEmbedding(size=16), ids=ids)
+    write_docstore(str(path), vectorstore.docstore, vectorstore.index_to_docstore_id)
+    write_index(vectorstore.index, os.path.join(str(path), "index.faiss"))
+    return vectorstore
+
+
+def test_round_trip_without_pickle(tmp_path):
+    _saved_vectorstore(tmp_path)
+    assert not any(name.endswith(".pkl") for name in os.listdir(tmp_path))
+
+    docstore, index_to_docstore_id = load_docstore(str(tmp_path))
+    assert len(index_to_docstore_id) == 5
+    assert index_to_docstore_id[3] == "key3:0"
+    doc = docstore.search("key3:0")
+    assert doc.page_content == "product 3 ₦3000"
+    assert doc.metadata == {"price": 3000.0}
+    assert docstore.search("missing") == "ID missing not found."
+    assert index_to_docstore_id.rows_for(["key4:0", "missing", "key1:0"]).tolist() == [4, 1]
+    assert load_docstore(str(tmp_path / "missing")) is None
+
+    docstore.close()  # a replaced docstore releases its mapping
+    with pytest.raises(ValueError):
+        docstore.search("key3:0")
+
+
+def test_overlay_add_and_delete(tmp_path):
+    _saved_vectorstore(tmp_path)
+    docstore, index_to_docstore_id = load_docstore(str(tmp_path))
+
+    docstore.add({"new:0": Document(page_content="new")})
+    index_to_docstore_id.update({5: "new:0"})
+    assert len(index_to_docstore_id) == 6
+    assert list(index_to_docstore_id)[-1] == 5
+    assert index_to_docstore_id.rows_for(["new:0"]).tolist() == [5]
+    with pytest.raises(ValueError):
+        docstore.add({"key0:0": Document(page_content="dup")})
+
+    docstore.delete(["key0:0", "new:0"])
+    assert docstore.search("key0:0") == "ID key0:0 not found."
+    assert docstore.search("new:0") == "ID new:0 not found."
+    with pytest.raises(ValueError):
+        docstore.delete(["key0:0"])
+
+
+def test_mapped_vectorstore_searches_and_updates(tmp_path):
+    original = _saved_vectorstore(tmp_path)
+    index_path = os.path.join(str(tmp_path), "index.faiss")
+    docstore, index_to_docstore_id = load_docstore(str(tmp_path))
+    mapped = FAISS(original.embedding_function, read_index(index_path), docstore, index_to_docstore_id)
+    assert mapped.similarity_search("product 2 ₦2000", k=1)[0].page_content == "product 2 ₦2000"
+
+    # Mapped indexes are read-only; updates go through a private copy
+    mapped.index = read_index(index_path, mmap=False)
+    mapped.add_documents([Document(page_content="extra")], ids=["extra:0"])
+    mapped.delete(["key0:0"])
+    write_docstore(str(tmp_path), mapped.docstore, mapped.index_to_docstore_id)
+    write_index(mapped.index, index_path)
+
+    docstore, index_to_docstore_id = load_docstore(str(tmp_path))
+    assert [index_to_docstore_id[i] for i in range(len(index_to_docstore_id))] == \
+        ["key1:0", "key2:0", "key3:0", "key4:0", "extra:0"]
+    assert read_index(index_path).ntotal == 5
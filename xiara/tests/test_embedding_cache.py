@@ -0,0 +1,76 @@
+import os
+from typing import List
+from langchain_core.embeddings import Embeddings
+from xiara.core.embedding_cache import CachedEmbeddings, text_key
+
+
+class CountingEmbeddings(Embeddings):
+    def __init__(self):
+        self.calls: List[str] = []
+
+    def embed_documents(self, texts):
+        self.calls.extend(texts)
+        return [[float(len(t)), 1.0, 0.5] for t in texts]
+
+    def embed_query(self, text):
+        self.calls.append(text)
+        return [float(len(text)), 0.0, 0.0]
+
+
+def test_documents_are_embedded_once_and_persisted(tmp_path):
+    model = CountingEmbeddings()
+    cache = CachedEmbeddings(model, str(tmp_path))
+
+    first = cache.embed_documents(["boots", "watch", "boots"])
+    assert model.calls == ["boots", "watch"]
+    assert first[0] == first[2] == [5.0, 1.0, 0.5]
+
+    assert cache.embed_documents(["watch", "bag"]) == [[5.0, 1.0, 0.5], [3.0, 1.0, 0.5]]
+    assert model.calls == ["boots", "watch", "bag"]
+
+    # A fresh process sees the vectors stored on disk
+    reopened = CachedEmbeddings(CountingEmbeddings(), str(tmp_path))
+    assert reopened.embed_documents(["bag", "boots"]) == [[3.0, 1.0, 0.5], [5.0, 1.0, 0.5]]
+    assert reopened.model.calls == []
+    assert reopened.stats()["document_hits"] == 2
+
+
+def test_query_lru_is_bounded(tmp_path):
+    model = CountingEmbeddings()
+    cache = CachedEmbeddings(model, str(tmp_path), query_cache_size=2)
+    for q in ["a", "b", "a", "c", "b"]:
+        cache.embed_query(q)
+    # "b" was evicted by "c" after "a" was refreshed
+    assert model.calls == ["a", "b", "c", "b"]
+    stats = cache.stats()
+    assert stats["query_hits"] == 1 and stats["query_misses"] == 4
+    assert stats["queries_cached"] == 2
+
+
+def test_embed_queries_batches_misses_and_shares_the_lru(tmp_path):
+    model = CountingEmbeddings()
+    cache = CachedEmbeddings(model, str(tmp_path))
+    cache.embed_query("boots")
+    vectors = cache.embed_queries(["boots", "watch", "bag", "watch"])
+    # One model call for the two distinct misses; nothing written to the document store
+    assert model.calls == ["boots", "watch", "bag"]
+    assert vectors[1] == vectors[3] == [5.0, 1.0, 0.5]
+    assert cache.stats()["documents_stored"] == 0
+
+
+def test_compaction_keeps_live_vectors_and_other_processes_follow(tmp_path):
+    cache = CachedEmbeddings(CountingEmbeddings(), str(tmp_path))
+    other = CachedEmbeddings(CountingEmbeddings(), str(tmp_path))  # another worker process
+    cache.embed_documents(["boots", "watch", "old bag"])
+    assert other.embed_documents(["watch"]) == [[5.0, 1.0, 0.5]]
+
+    assert cache.documents.compact([text_key("boots"), text_key("watch")]) == 1
+    assert len(cache.documents) == 2 and cache.documents.compact([text_key("boots"), text_key("watch")]) == 0
+    assert sorted(os.listdir(tmp_path)) == [".lock", "keys.1.txt", "meta.json", "vectors.1.f32"]
+
+    # The other process still reads its old mapping, then switches to the compacted files
+    assert other.documents.get_many([text_key("watch")]) == [[5.0, 1.0, 0.5]]
+    assert other.embed_documents(["lamp", "boots"]) == [[4.0, 1.0, 0.5], [5.0, 1.0, 0.5]]
+    assert other.model.calls == ["lamp"]
+    assert CachedEmbeddings(CountingEmbeddings(), str(tmp_path)).embed_documents(["lamp", "old bag"]) == \
+        [[4.0, 1.0, 0.5], [7.0, 1.0, 0.5]]
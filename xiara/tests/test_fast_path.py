@@ -0,0 +1,62 @@
+from langchain_core.documents import Document
+
+from xiara.core.fast_path import FastPath, lookup_intent, subject_terms
+
+
+def product(name, price, brand=None, **fields):
+    text = f"Product Name: {name}\nPrice: {price}\n" + "".join(f"{k}: {v}\n" for k, v in fields.items())
+    metadata = {"name": name}
+    if brand:
+        metadata["brand"] = brand
+    return Document(page_content=text, metadata=metadata)
+
+
+A15 = product("Samsung Galaxy A15", "₦150,000", brand="samsung")
+A25 = product("Samsung Galaxy A25", "₦210,000", brand="samsung")
+LOTION = product("Nivea Body Lotion 400ml", "₦4,500", brand="nivea")
+BIG_LOTION = product("Nivea Cocoa Butter Lotion", "₦7,200", brand="nivea")
+
+
+def test_lookup_intents():
+    assert lookup_intent("how much is the Samsung A15") == "price"
+    assert lookup_intent("show me nivea lotion under ₦5,000") == "list"
+    assert lookup_intent("which is better, the A15 or the A25?") is None
+    assert lookup_intent("recommend a lotion for dry skin") is None
+    assert subject_terms("how much is the Samsung A15") == ["samsung", "a15"]
+    assert subject_terms("show me nivea lotions under ₦5,000") == ["nivea", "lotion"]
+
+
+def test_templates_from_matching_products_within_budget():
+    fast = FastPath(["price", "list"])
+    assert fast.answer("how much is the Samsung A15", "how much is the Samsung A15", [A15, A25]) == \
+        "The Samsung Galaxy A15 is ₦150,000."
+    listed = fast.answer("show me nivea lotion under ₦5,000", "show me nivea lotion under ₦5,000",
+                         [BIG_LOTION, LOTION, LOTION])
+    assert listed == "Here's what I found:\n- Nivea Body Lotion 400ml: ₦4,500"
+
+
+def test_falls_back_to_generation_and_counts_it():
+    fast = FastPath(["price"])
+    assert fast.answer("how much is the iPhone 15", "how much is the iPhone 15", [A15]) is None  # no match
+    assert fast.answer("show me nivea lotion", "show me nivea lotion", [LOTION]) is None  # list disabled
+    assert fast.answer("compare the A15 and A25", "compare the A15 and A25", [A15, A25]) is None
+    assert fast.answer("price of samsung a25", "price of samsung a25", [A15, A25]) is not None
+    stats = fast.stats()
+    assert stats["fallbacks"] == {"not_lookup": 1, "disabled": 1, "currency": 0, "no_match": 1}
+    assert stats["served"]["price"] == 1 and stats["offload_rate"] == 0.25
+
+
+def test_budgets_in_another_currency_and_colour_lookups():
+    fast = FastPath(["price", "list"])
+    vaseline = product("Vaseline Body Lotion", "$15")
+    assert fast.answer("show me lotion under ₦5,000", "show me lotion under ₦5,000", [vaseline, LOTION]) is None
+    assert fast.stats()["fallbacks"]["currency"] == 1
+    assert fast.answer("show me lotion under $20", "show me lotion under $20", [vaseline]) == \
+        "Here's what I found:\n- Vaseline Body Lotion: $15"
+
+    shoes = product("UrbanStride Black Running Shoes", "$89")
+    question = "do you have running shoes in black"
+    assert fast.answer(question, question, [shoes]) == "Here's what I found:\n- UrbanStride Black Running Shoes: $89"
+    headphones = product("SoundBeat Pro Wireless Headphones", "$129")
+    assert fast.answer("how much are the soundbeat headphones", "how much are the soundbeat headphones",
+                       [headphones]) == "The SoundBeat Pro Wireless Headphones are $129."
@@ -0,0 +1,55 @@
+import pytest
+
+pytest.importorskip("faiss")
+pytest.importorskip("langchain_community")
+
+from langchain_community.vectorstores import FAISS
+from langchain_core.documents import Document
+from langchain_core.embeddings import DeterministicFakeEmbedding
+
+from xiara.core.attribute_store import AttributeStore
+from xiara.core.filtered_retriever import faiss_ids_for, filtered_search, filtered_search_many
+
+PRODUCTS = [
+    ("nivea lotion", {"price": 3000.0, "brand": "nivea", "category": "skincare"}),
+    ("nivea cream", {"price": 9000.0, "brand": "nivea", "category": "skincare"}),
+    ("samsung phone", {"price": 150000.0, "brand": "samsung", "category": "electronics"}),
+    ("hiking boots", {"price": 20000.0, "category": "shoes"}),
+]
+
+
+@pytest.fixture
+def catalog():
+    docs = [Document(page_content=text, metadata=meta) for text, meta in PRODUCTS]
+    ids = [f"row{i}:0" for i in range(len(docs))]
+    vectorstore = FAISS.from_documents(docs, DeterministicFakeEmbedding(size=16), ids=ids)
+    store = AttributeStore()
+    for i, (_, meta) in enumerate(PRODUCTS):
+        store.add(f"row{i}", meta, 1)
+    store.finalize()
+    return vectorstore, store
+
+
+def test_constraints_restrict_candidates(catalog):
+    vectorstore, store = catalog
+    docs = filtered_search(vectorstore, store, "nivea under 5000", k=4)
+    assert [d.page_content for d in docs] == ["nivea lotion"]
+
+
+def test_batched_search_matches_one_by_one(catalog):
+    vectorstore, store = catalog
+    queries = ["nivea under 5000", "hiking boots", "samsung phone"]
+    batched = filtered_search_many(vectorstore, store, queries, k=2)
+    single = [filtered_search(vectorstore, store, q, k=2) for q in queries]
+    assert [[d.page_content for d in docs] for docs in batched] == \
+        [[d.page_content for d in docs] for docs in single]
+    assert batched[1][0].page_content == "hiking boots"
+    assert filtered_search_many(vectorstore, store, [], k=2) == []
+
+
+def test_reverse_ids_follow_a_replaced_mapping(catalog):
+    vectorstore, _ = catalog
+    assert faiss_ids_for(vectorstore, ["row2:0"]).tolist() == [2]
+    # Same length, different rows: the cached reverse map must not be reused
+    vectorstore.index_to_docstore_id = {i: f"row{3 - i}:0" for i in range(4)}
+    assert faiss_ids_for(vectorstore, ["row2:0"]).tolist() == [1]
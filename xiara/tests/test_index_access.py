@@ -0,0 +1,59 @@
+import threading
+import time
+
+from xiara.core.index_access import ReadWriteLock
+
+
+def test_readers_share_and_writers_exclude():
+    lock, events = ReadWriteLock(), []
+    with lock.read(), lock.read():
+        events.append("two readers")
+
+    reading = threading.Event()
+
+    def reader():
+        with lock.read():
+            reading.set()
+            time.sleep(0.05)
+            events.append("read done")
+
+    thread = threading.Thread(target=reader)
+    thread.start()
+    reading.wait()
+    with lock.write():
+        events.append("write")
+    thread.join()
+    assert events == ["two readers", "read done", "write"]
+
+
+def test_a_waiting_writer_goes_before_new_readers():
+    lock, events = ReadWriteLock(), []
+    first_reader_in, release = threading.Event(), threading.Event()
+
+    def hold_read():
+        with lock.read():
+            first_reader_in.set()
+            release.wait()
+
+    def write():
+        with lock.write():
+            events.append("write")
+
+    def late_read():
+        with lock.read():
+            events.append("late read")
+
+    holder = threading.Thread(target=hold_read)
+    holder.start()
+    first_reader_in.wait()
+    writer = threading.Thread(target=write)
+    writer.start()
+    while not lock._writers_waiting:
+        time.sleep(0.001)
+    late = threading.Thread(target=late_read)
+    late.start()
+    time.sleep(0.02)
+    release.set()
+    for thread in (holder, writer, late):
+        thread.join()
+    assert events == ["write", "late read"]
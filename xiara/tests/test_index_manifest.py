@@ -0,0 +1,51 @@
+from xiara.core.index_manifest import IndexManifest, row_keys
+
+
+def test_row_keys_are_content_addressed():
+    keys = row_keys("products.csv", ["a", "b", "a"])
+    assert keys[0] != keys[1]
+    assert keys[2] == f"{keys[0]}#1"
+    assert row_keys("products.csv", ["a"]) == keys[:1]
+    assert row_keys("other.csv", ["a"]) != keys[:1]
+
+
+def test_file_diff_only_touches_changed_rows():
+    manifest = IndexManifest()
+    old_keys = row_keys("p.csv", ["row1", "row2", "row3"])
+    manifest.set_file("p.csv", [1, 1.0], "d1", {k: [f"{k}:0"] for k in old_keys})
+
+    new_keys = row_keys("p.csv", ["row1", "row2 changed", "row3", "row4"])
+    stale_ids, added = manifest.stale_ids("p.csv", new_keys), manifest.unindexed_keys("p.csv", new_keys)
+
+    assert stale_ids == [f"{old_keys[1]}:0"]
+    assert added == [new_keys[1], new_keys[3]]
+
+    manifest.set_file("p.csv", [2, 2.0], "d2", {k: ([f"{k}:0"] if k in added else []) for k in new_keys})
+    rows = manifest.files["p.csv"]["rows"]
+    assert rows[old_keys[0]] == [f"{old_keys[0]}:0"]
+    assert old_keys[1] not in rows
+    assert set(rows) == set(new_keys)
+
+
+def test_manifest_round_trip_and_drop(tmp_path):
+    manifest = IndexManifest()
+    manifest.set_file("p.json", [10, 5.0], "abc", {"k1": ["k1:0", "k1:1"]})
+    manifest.save(str(tmp_path))
+
+    loaded = IndexManifest.load(str(tmp_path))
+    assert loaded.is_unchanged("p.json", [10, 5.0])
+    assert not loaded.is_unchanged("p.json", [11, 5.0])
+    assert loaded.has_digest("p.json", "abc")
+    assert loaded.drop_file("p.json") == ["k1:0", "k1:1"]
+    assert IndexManifest.load(str(tmp_path / "missing")) is None
+
+
+def test_catalog_version_follows_content_not_stat():
+    manifest = IndexManifest()
+    manifest.set_file("p.csv", [1, 1.0], "d1", {})
+    version = manifest.catalog_version()
+    manifest.touch("p.csv", [1, 2.0])
+    assert manifest.catalog_version() == version
+    manifest.set_file("p.csv", [2, 3.0], "d2", {})
+    assert manifest.catalog_version() != version
+    assert IndexManifest(index_type="hnsw").catalog_version() != IndexManifest().catalog_version()
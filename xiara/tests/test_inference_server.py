@@ -0,0 +1,162 @@
+import asyncio
+import threading
+
+import numpy as np
+import pytest
+
+from xiara.core.inference_server import BatchScheduler, InferenceServer, Request, plan_resources, sample
+
+EOS = 0
+
+
+class CountingBackend:
+    """Byte-level fake model: after a prompt ending in "a" it writes "bcd...z", then EOS."""
+
+    batch_size = 16
+    ctx_per_slot = 64
+
+    def __init__(self):
+        self.batches = []
+        self.released = []
+
+    def tokenize(self, text):
+        return list(text.encode("utf-8"))
+
+    def piece(self, token):
+        return bytes([token])
+
+    def is_end(self, token):
+        return token == EOS
+
+    def decode(self, entries):
+        self.batches.append(len(entries))
+        logits = []
+        for token, _, _, want_logits in entries:
+            if want_logits:
+                row = np.zeros(256, dtype=np.float32)
+                row[token + 1 if token < ord("z") else EOS] = 1.0
+                logits.append(row)
+        return logits
+
+    def release(self, seq_id):
+        self.released.append(seq_id)
+
+
+def test_plan_resources_scales_with_cores():
+    assert plan_resources(1) == (1, 1)
+    assert plan_resources(8) == (7, 4)
+    assert plan_resources(64) == (63, 8)
+    assert plan_resources(8, threads=4, slots=2) == (4, 2)
+
+
+def test_sample_is_greedy_at_zero_temperature():
+    logits = np.array([0.1, 3.0, 0.2], dtype=np.float32)
+    rng = np.random.default_rng(0)
+    assert sample(logits, 0.0, 0.95, rng) == 1
+    assert sample(logits * 100, 0.7, 0.5, rng) == 1
+
+
+def test_concurrent_requests_share_decode_steps():
+    backend = CountingBackend()
+    scheduler = BatchScheduler(backend, slots=2)
+    first = scheduler.submit(Request("xa", max_tokens=3, temperature=0))
+    second = scheduler.submit(Request("a", max_tokens=10, temperature=0, stop=["f"]))
+    third = scheduler.submit(Request("w", max_tokens=10, temperature=0))
+    scheduler.start()
+
+    assert first.result(timeout=5) == "bcd"
+    assert second.result(timeout=5) == "bcde"
+    assert third.result(timeout=5) == "xyz"
+    scheduler.stop()
+
+    stats = scheduler.stats()
+    assert (stats["completed"], stats["active"], stats["queued"]) == (3, 0, 0)
+    # Prompts were prefilled together and the first two requests decoded side by side
+    assert backend.batches[0] == 3 and stats["max_batch"] >= 2
+    assert len(backend.released) == 3
+
+
+def test_streamed_tokens_hold_back_possible_stop_strings():
+    scheduler = BatchScheduler(CountingBackend(), slots=1)
+    pieces = []
+    request = Request("a", max_tokens=10, temperature=0, stop=["ef"], on_token=pieces.append)
+    future = scheduler.submit(request)
+    scheduler.start()
+    assert future.result(timeout=5) == "bcd"
+    scheduler.stop()
+    assert "".join(pieces) == "bcd"
+    assert all("e" not in piece for piece in pieces)
+
+
+def test_oversized_prompt_fails_only_its_request():
+    backend = CountingBackend()
+    scheduler = BatchScheduler(backend, slots=1)
+    too_long = scheduler.submit(Request("a" * 100))
+    ok = scheduler.submit(Request("y", temperature=0))
+    scheduler.start()
+    with pytest.raises(ValueError):
+        too_long.result(timeout=5)
+    assert ok.result(timeout=5) == "z"
+    scheduler.stop()
+
+
+def test_client_round_trip_over_unix_socket(tmp_path):
+    pytest.importorskip("langchain_core")
+    from xiara.core.inference_client import InferenceClient, InferenceServiceError, InferenceServiceLLM
+
+    scheduler = BatchScheduler(CountingBackend(), slots=2)
+    scheduler.start()
+    socket_path = str(tmp_path / "llm.sock")
+    server = InferenceServer(scheduler, socket_path, threads=1)
+    loop = asyncio.new_event_loop()
+
+    async def serve():
+        try:
+            await server.serve()
+        except asyncio.CancelledError:
+            pass
+
+    thread = threading.Thread(target=loop.run_until_complete, args=(serve(),), daemon=True)
+    thread.start()
+    client = InferenceClient(socket_path, timeout=5)
+    for _ in range(50):
+        try:
+            assert client.health()["slots"] == 2
+            break
+        except InferenceServiceError:
+            threading.Event().wait(0.05)
+
+    assert client.generate("u", temperature=0) == "vwxyz"
+    assert list(client.stream("v", temperature=0)) == ["w", "x", "y", "z"]
+    llm = InferenceServiceLLM(socket_path=socket_path, temperature=0)
+    assert llm.invoke("x", stop=["z"]) == "y"
+    assert "".join(llm.stream("w", temperature=0)) == "xyz"
+    with pytest.raises(InferenceServiceError):
+        client._request({"op": "nope"})
+
+    loop.call_soon_threadsafe(lambda: [t.cancel() for t in asyncio.all_tasks(loop)])
+    thread.join(timeout=5)
+    scheduler.stop()
+
+
+def test_session_turns_resume_from_cached_kv_state():
+    from xiara.core.prefix_cache import PrefixCache
+
+    backend = CountingBackend()
+    backend.copies = []
+    backend.copy = lambda src, dst, n: backend.copies.append((src, dst, n))
+    scheduler = BatchScheduler(backend, slots=1, cache=PrefixCache([1, 2], max_tokens=200))
+    scheduler.start()
+    system = "You are Xiara, a shopping assistant. "
+    scheduler.submit(Request(system, max_tokens=0, pinned=True)).result(timeout=5)
+    first = scheduler.submit(Request(system + "Human: a", max_tokens=2, temperature=0, session="u1"))
+    assert first.result(timeout=5) == "bc"
+    follow_up = system + "Human: abc Human: x"
+    assert scheduler.submit(Request(follow_up, max_tokens=1, temperature=0, session="u1")).result(timeout=5) == "y"
+    scheduler.stop()
+
+    stats = scheduler.stats()
+    # The first turn reused the pinned system prompt, the follow-up the first turn's KV
+    # state (its last sampled token, "c", was never decoded)
+    assert stats["prompt_tokens_reused"] == len(system) + len(system + "Human: ab")
+    assert stats["prefix_cache"]["pinned"] == 1 and stats["prefix_cache"]["entries"] == 2
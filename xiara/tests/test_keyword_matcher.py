@@ -0,0 +1,53 @@
+import pytest
+
+from xiara.core.keyword_matcher import KeywordIndex, load_vocabularies
+
+
+def test_matches_respect_word_boundaries_and_plurals():
+    index = KeywordIndex({"product": ["hp", "bag", "watch", "tv", "dress"], "quality": ["top"]})
+    assert index.labels("a cheap laptop") == set()
+    assert index.labels("php developer") == set()
+    assert index.labels("Two BAGS, top quality") == {"product", "quality"}
+    assert index.find_all("apple watches, dresses and a tv") == ["watch", "dress", "tv"]
+
+
+def test_phrases_match_whole_words_only():
+    index = KeywordIndex({"inquiry": ["how much", "price"], "generic": ["give me something", "some"]})
+    assert index.find_all("How   much is the price?") == ["how much", "price"]
+    assert index.labels("how muchness") == set()
+    assert index.find_all("please give me something nice") == ["give me something"]
+    assert KeywordIndex({}).labels("anything") == set()
+
+
+def test_first_follows_vocabulary_order():
+    index = KeywordIndex({"discount": ["cheaper"], "bargain": ["negotiate"], "inquiry": ["price"]})
+    assert index.first("Let's negotiate the price") == "bargain"
+    assert index.first("price, cheaper?") == "discount"
+    assert index.first("price, cheaper?", order=["inquiry", "discount"]) == "inquiry"
+    assert index.first("I love it") is None
+
+
+def test_bundled_vocabularies_have_the_expected_groups():
+    vocab = load_vocabularies()
+    assert {"product_hints", "brands", "descriptors", "price_terms"} <= set(vocab["ambiguity"])
+    assert list(vocab["negotiation"]) == ["discount", "bargain", "inquiry"]
+
+
+def bundled_index(group, names):
+    vocab = load_vocabularies()[group]
+    return KeywordIndex({label: vocab[name] for label, name in names.items()})
+
+
+@pytest.mark.parametrize("query", ["smartphone under 50000", "smartwatch", "SmartWatch Pro", "iphone 13", "tvs"])
+def test_bundled_product_hints_cover_compounds_and_short_plurals(query):
+    index = bundled_index("ambiguity", {"product": "product_hints", "price": "price_terms"})
+    assert "product" in index.labels(query)
+
+
+def test_bundled_price_and_deal_terms_cover_inflections():
+    ambiguity = bundled_index("ambiguity", {"price": "price_terms"})
+    for query in ("the cheapest phone", "a cheaper one", "too pricey"):
+        assert ambiguity.labels(query) == {"price"}
+    negotiation = bundled_index("negotiation", {"discount": "discount"})
+    for query in ("is it discounted?", "can I get it cheaper", "any deals?"):
+        assert negotiation.labels(query) == {"discount"}
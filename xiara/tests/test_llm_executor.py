@@ -0,0 +1,91 @@
+import asyncio
+import threading
+
+import pytest
+
+from xiara.core.llm_executor import LLMExecutor, Overloaded
+
+
+def test_rejects_when_queue_is_full():
+    executor = LLMExecutor(workers=1, max_queue=1)
+    release = threading.Event()
+    running = executor.submit(release.wait)
+    queued = executor.submit(lambda: "queued")
+
+    with pytest.raises(Overloaded) as exc:
+        executor.submit(lambda: "rejected")
+    assert exc.value.retry_after >= 1
+    stats = executor.stats()
+    assert (stats["running"], stats["queued"], stats["rejected"]) == (1, 1, 1)
+
+    release.set()
+    assert running.result(timeout=5) is True
+    assert queued.result(timeout=5) == "queued"
+    assert executor.submit(lambda: "accepted").result(timeout=5) == "accepted"
+    assert executor.stats()["completed"] == 3
+
+
+def test_background_work_waits_for_idle_workers():
+    executor = LLMExecutor(workers=1, max_queue=1)
+    release, order = threading.Event(), []
+    running = executor.submit(lambda: release.wait() and order.append("request"))
+    assert executor.submit_when_idle(order.append, "fold")
+    assert not executor.submit_when_idle(order.append, "fold 2")  # background queue full
+    queued = executor.submit(order.append, "queued request")  # not held up by the waiting fold
+    assert executor.stats()["background_waiting"] == 1
+
+    release.set()
+    running.result(timeout=5)
+    queued.result(timeout=5)
+    for _ in range(100):
+        if order[-1:] == ["fold"]:
+            break
+        threading.Event().wait(0.01)
+    assert order == ["request", "queued request", "fold"]
+    assert executor.stats()["background_dropped"] == 1
+
+
+def test_async_run_and_failures():
+    executor = LLMExecutor(workers=2, max_queue=0)
+
+    def boom():
+        raise RuntimeError("llm failed")
+
+    async def scenario():
+        assert await executor.run(lambda a, b=0: a + b, 1, b=2) == 3
+        with pytest.raises(RuntimeError):
+            await executor.run(boom)
+
+    asyncio.run(scenario())
+    stats = executor.stats()
+    assert (stats["completed"], stats["failed"], stats["running"]) == (1, 1, 0)
+
+
+def test_stream_yields_items_as_produced_and_stops_early():
+    executor = LLMExecutor(workers=1, max_queue=0)
+    produced = []
+
+    def tokens(n):
+        for i in range(n):
+            produced.append(i)
+            yield f"t{i}"
+
+    async def scenario():
+        assert [t async for t in executor.stream(tokens, 3)] == ["t0", "t1", "t2"]
+
+        stream = executor.stream(tokens, 1000)
+        with pytest.raises(Overloaded):
+            executor.stream(tokens, 1)  # admission is decided before streaming starts
+        async for token in stream:
+            if token == "t1":
+                break
+        await stream.aclose()
+
+    asyncio.run(scenario())
+    # The worker stopped shortly after the consumer went away
+    for _ in range(100):
+        if executor.stats()["running"] == 0:
+            break
+        threading.Event().wait(0.01)
+    assert executor.stats()["running"] == 0
+    assert len(produced) < 1000
@@ -0,0 +1,53 @@
+import threading
+from langchain_core.embeddings import Embeddings
+from xiara.core import model_registry
+from xiara.core.embedding_cache import CachedEmbeddings
+from xiara.core.model_registry import BatchingEmbeddings
+
+
+class RecordingEmbeddings(Embeddings):
+    def __init__(self):
+        self.batches = []
+
+    def embed_documents(self, texts):
+        self.batches.append(list(texts))
+        return [[float(len(t))] for t in texts]
+
+    def embed_query(self, text):
+        return self.embed_documents([text])[0]
+
+
+def test_concurrent_queries_share_a_forward_pass():
+    model = RecordingEmbeddings()
+    batcher = BatchingEmbeddings(model, max_batch=64, max_wait_ms=200)
+    results = {}
+    barrier = threading.Barrier(8)
+
+    def worker(i):
+        barrier.wait()
+        results[i] = batcher.embed_query("x" * (i + 1))
+
+    threads = [threading.Thread(target=worker, args=(i,)) for i in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    assert results == {i: [float(i + 1)] for i in range(8)}
+    assert len(model.batches) < 8
+    assert sum(len(b) for b in model.batches) == 8
+
+
+def test_bulk_calls_bypass_the_queue():
+    model = RecordingEmbeddings()
+    batcher = BatchingEmbeddings(model, max_batch=2, max_wait_ms=200)
+    assert batcher.embed_documents(["a", "bb", "ccc"]) == [[1.0], [2.0], [3.0]]
+    assert batcher.batches == 0 and model.batches == [["a", "bb", "ccc"]]
+
+
+def test_uncached_embeddings_skip_the_document_store(tmp_path, monkeypatch):
+    model = RecordingEmbeddings()
+    cached = CachedEmbeddings(model, str(tmp_path))
+    monkeypatch.setitem(model_registry._models, "test-model", cached)
+    assert model_registry.get_uncached_embeddings("test-model").embed_documents(["likes shoes"]) == [[11.0]]
+    assert len(cached.documents) == 0
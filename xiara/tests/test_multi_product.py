@@ -0,0 +1,102 @@
+import threading
+import time
+
+from langchain_core.documents import Document
+
+from xiara.core.multi_product import answer_sub_queries, split_sections
+from xiara.core.prompt_assembler import PromptAssembler
+
+
+def words(text):
+    return len(text.split())
+
+
+def assembler(max_tokens=500):
+    return PromptAssembler(words, max_tokens=max_tokens, max_products=4)
+
+
+class StubRetriever:
+    def __init__(self):
+        self.calls = []
+
+    def retrieve_many(self, queries):
+        self.calls.append(list(queries))
+        return [[Document(page_content=f"{q} product"), Document(page_content=f"{q} product")] for q in queries]
+
+
+class EchoLLM:
+    """Answers each prompt after a short delay, tracking how many run at once."""
+
+    def __init__(self, reply=None):
+        self.reply = reply
+        self.prompts = []
+        self.active = 0
+        self.peak = 0
+        self._lock = threading.Lock()
+
+    def invoke(self, prompt):
+        with self._lock:
+            self.prompts.append(prompt)
+            self.active += 1
+            self.peak = max(self.peak, self.active)
+        time.sleep(0.05)
+        with self._lock:
+            self.active -= 1
+        return self.reply if self.reply is not None else f"answer {len(self.prompts)}"
+
+
+def test_split_sections():
+    text = "### 1\nTry the Trail boots.\n###2.\nThe Nomad backpack fits.\n### 3\nCasio watch."
+    assert split_sections(text, 3) == ["Try the Trail boots.", "The Nomad backpack fits.", "Casio watch."]
+    assert split_sections("Here are some ideas", 2) is None
+    assert split_sections("1. Boots\n2. Backpack", 2) is None
+
+
+def test_split_sections_keeps_numbered_lists_inside_an_answer():
+    text = ("### 1\nHere are some boots:\n1. Timberland - N45,000\n2. Dr Martens - N30,000\n"
+            "### 2\nThe Jansport backpack fits.\n### 1\nStray header")
+    assert split_sections(text, 2) == [
+        "Here are some boots:\n1. Timberland - N45,000\n2. Dr Martens - N30,000",
+        "The Jansport backpack fits.\n### 1\nStray header",
+    ]
+
+
+def test_merged_mode_uses_one_retrieval_and_one_generation():
+    retriever = StubRetriever()
+    llm = EchoLLM(reply="### 1\nBoots answer\n### 2\nBackpack answer")
+    items = answer_sub_queries(llm, retriever, ["boots", "backpack"], assembler(), mode="merged")
+
+    assert retriever.calls == [["boots", "backpack"]]
+    assert len(llm.prompts) == 1 and "backpack product" in llm.prompts[0]
+    assert [i.answer for i in items] == ["Boots answer", "Backpack answer"]
+    assert llm.prompts[0].count("backpack product") == 1  # duplicate chunks are dropped
+    assert [d.page_content for d in items[1].sources] == ["backpack product"]
+
+
+def test_merged_mode_falls_back_when_answer_is_not_numbered():
+    llm = EchoLLM(reply="Here are some ideas")
+    items = answer_sub_queries(llm, StubRetriever(), ["boots", "backpack"], assembler(), mode="merged")
+    assert len(llm.prompts) == 3
+    assert all(i.answer == "Here are some ideas" for i in items)
+
+
+def test_concurrent_mode_respects_the_limit():
+    llm = EchoLLM()
+    items = answer_sub_queries(llm, StubRetriever(), ["a", "b", "c", "d"], assembler(), mode="concurrent",
+                               limit=2)
+    assert len(llm.prompts) == 4 and llm.peak == 2
+    assert all(i.answer and i.error is None for i in items)
+
+
+def test_merged_prompt_splits_the_budget_and_falls_back_when_over_it():
+    tight = assembler(max_tokens=60)
+    prompt = tight.assemble_merged("You are Xiara.", ["boots", "backpack"],
+                                   [[Document(page_content="boots " * 40)], [Document(page_content="backpack")]])
+    assert not prompt.over_budget and prompt.tokens <= 60
+    assert prompt.sections[0] == [] and len(prompt.sections[1]) == 1  # the long product didn't fit its share
+
+    llm = EchoLLM()
+    items = answer_sub_queries(llm, StubRetriever(), ["boots", "backpack"], assembler(max_tokens=10),
+                               mode="merged")
+    assert len(llm.prompts) == 2  # one prompt per product, no merged call
+    assert tight.stats()["over_budget"] == 0 and all(i.answer for i in items)
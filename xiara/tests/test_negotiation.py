@@ -90,4 +90,11 @@ def test_reset_negotiation(negotiation_handler):
 
     # Reset it
     negotiation_handler.reset_negotiation("test_user")
-    assert "test_user" not in negotiation_handler.active_negotiations
\ No newline at end of file
+    assert "test_user" not in negotiation_handler.active_negotiations
+def test_async_responses_share_the_state_of_sync_ones(negotiation_handler):
+    import asyncio
+
+    first = negotiation_handler.generate_response("async_user", "p1", 100.0, "discount")
+    second = asyncio.run(negotiation_handler.agenerate_response("async_user", "p1", 100.0, "discount"))
+    assert "$95.00" in first and "$90.00" in second
+    assert negotiation_handler.active_negotiations.get("async_user").attempts == 2
@@ -18,3 +18,45 @@ def test_personalization_rules():
     assert "laptops" in result
     assert "₦20000" in result or "₦20,000" in result
     assert "₦50000" in result or "₦50,000" in result
+
+
+def test_profile_history_is_capped_and_field_updates_keep_it():
+    from xiara.core.user_profile_manager import HISTORY_LIMIT, add_to_history, update_user_profile
+
+    save_user_profile(UserProfile(user_id="u2", liked_categories=["shoes"]))
+    for i in range(HISTORY_LIMIT + 5):
+        add_to_history("u2", f"query {i}")
+    update_user_profile("u2", purchase_intent="gift", preferred_price_range=None)
+
+    profile = get_user_profile("u2")
+    assert profile.liked_categories == ["shoes"] and profile.purchase_intent == "gift"
+    assert profile.history == [f"query {i}" for i in range(5, HISTORY_LIMIT + 5)]
+    assert get_user_profile("u2", history=False).history == []
+
+
+def test_legacy_json_profiles_are_migrated_on_read():
+    from xiara.core.user_profile_manager import redis_client
+
+    legacy = UserProfile(user_id="u3", disliked_categories=["bags"], history=["old query"])
+    redis_client.set("user_profile:u3", legacy.json())
+    redis_client.lpush("xiara:profile:u3:history", "new query")  # appended before the first read
+
+    migrated = legacy.copy(update={"history": ["old query", "new query"]})
+    assert get_user_profile("u3") == migrated
+    assert redis_client.get("user_profile:u3") is None
+    assert get_user_profile("u3") == migrated
+
+    # Saving the fields never drops the history
+    save_user_profile(UserProfile(user_id="u3", liked_categories=["shoes"]))
+    assert get_user_profile("u3").history == ["old query", "new query"]
+
+
+def test_saving_before_the_first_read_migrates_the_legacy_history():
+    from xiara.core.user_profile_manager import redis_client
+
+    legacy = UserProfile(user_id="u4", liked_categories=["bags"], history=["old query"])
+    redis_client.set("user_profile:u4", legacy.json())
+
+    save_user_profile(UserProfile(user_id="u4", liked_categories=["shoes"]))
+    assert redis_client.get("user_profile:u4") is None
+    assert get_user_profile("u4") == UserProfile(user_id="u4", liked_categories=["shoes"], history=["old query"])
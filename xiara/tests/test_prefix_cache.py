@@ -0,0 +1,38 @@
+from xiara.core.prefix_cache import PrefixCache, template_key
+
+
+def test_lookup_returns_longest_shared_prefix():
+    cache = PrefixCache([10, 11], max_tokens=100, min_match=2)
+    assert cache.lookup([1, 2, 3]) == (None, 0)
+    seq_a, _ = cache.store("a", [1, 2, 3, 4])
+    seq_b, _ = cache.store("b", [1, 2, 9])
+    assert cache.lookup([1, 2, 3, 4, 5]) == (seq_a, 4)
+    assert cache.lookup([1, 2, 9, 9]) == (seq_b, 3)
+    assert cache.lookup([1, 7]) == (None, 0)  # below min_match
+    assert cache.stats()["reused_tokens"] == 7
+
+
+def test_eviction_is_lru_and_respects_pins_and_the_token_cap():
+    cache = PrefixCache([1, 2, 3], max_tokens=10, min_match=1)
+    pinned, _ = cache.store("system", [0, 1, 2], pinned=True)
+    old, _ = cache.store("s1", [5, 5, 5])
+    recent, _ = cache.store("s2", [6, 6, 6])
+    cache.lookup([5, 5, 5])  # s1 is now the most recently used
+
+    seq, evicted = cache.store("s3", [7, 7, 7])
+    assert evicted == [recent] and seq == recent
+    assert cache.lookup([0, 1, 2]) == (pinned, 3)
+
+    # Too large to fit next to the pinned entry: everything unpinned goes, then it still fails
+    seq, evicted = cache.store("big", list(range(8)))
+    assert seq is None and set(evicted) == {old, recent}
+    assert cache.stats()["entries"] == 1
+
+
+def test_storing_a_session_again_replaces_its_snapshot():
+    cache = PrefixCache([1, 2], max_tokens=100, min_match=1)
+    first, _ = cache.store("u1", [1, 2])
+    second, evicted = cache.store("u1", [1, 2, 3, 4])
+    assert first in evicted
+    assert cache.stats()["entries"] == 1 and cache.lookup([1, 2, 3, 4]) == (second, 4)
+    assert template_key("u1", [1, 2, 3]) != template_key("u1", [4, 5, 6])
@@ -0,0 +1,39 @@
+import io
+import json
+from xiara.core.product_loader import iter_batches, iter_json_array, iter_product_file, load_all_products
+
+
+def test_iter_json_array_streams_items():
+    f = io.StringIO('[{"name": "boots", "price": 100}, {"name": "watch"} , 42]')
+    assert list(iter_json_array(f)) == [{"name": "boots", "price": 100}, {"name": "watch"}, 42]
+    assert list(iter_json_array(io.StringIO('{"name": "boots"}'))) == []
+
+
+def test_csv_rows_are_formatted_per_row(tmp_path):
+    path = tmp_path / "products.csv"
+    path.write_text("name,price,stock\nboots,100,5\nwatch,,\nbag,12.5,3\n", encoding="utf-8")
+    docs = list(iter_product_file(str(path), chunksize=2))
+    assert [d.page_content for d in docs] == [
+        "name: boots, price: 100, stock: 5", "name: watch, price: , stock: ", "name: bag, price: 12.5, stock: 3"]
+    assert docs[0].metadata == {"source": "products.csv", "name": "boots", "price": 100.0}
+    assert "price" not in docs[1].metadata
+
+
+def test_csv_rows_render_the_same_in_any_chunk(tmp_path):
+    path = tmp_path / "products.csv"
+    path.write_text("name,price\nboots,100\nwatch,\nbag,12.5\n", encoding="utf-8")
+    by_chunk = [[d.page_content for d in iter_product_file(str(path), chunksize=size)] for size in (1, 2, 3)]
+    assert by_chunk[0] == by_chunk[1] == by_chunk[2]
+
+
+def test_json_table_dumps_and_ndjson(tmp_path):
+    (tmp_path / "dump.json").write_text(
+        json.dumps([{"header": ["name", "id"], "rows": [["boots", "B1"], ["watch", "W1"]]}]), encoding="utf-8"
+    )
+    (tmp_path / "items.ndjson").write_text('{"name": "bag"}\n\n{"name": "phone"}\n', encoding="utf-8")
+    contents = sorted(d.page_content for d in load_all_products(str(tmp_path)))
+    assert contents == ["name: bag", "name: boots, id: B1", "name: phone", "name: watch, id: W1"]
+
+
+def test_iter_batches():
+    assert [len(b) for b in iter_batches(iter(range(5)), batch_size=2)] == [2, 2, 1]
@@ -0,0 +1,48 @@
+from types import SimpleNamespace
+
+from xiara.core.prompt_assembler import PromptAssembler, trim_product
+from xiara.core.token_budget import TokenCounter
+
+
+def words(text):
+    return len(text.split())
+
+
+def _doc(content, name=None):
+    return SimpleNamespace(page_content=content, metadata={"name": name} if name else {})
+
+
+def test_trim_product_keeps_key_fields_of_text_and_csv_products():
+    block = ("Product Name: TrekMate X100 Hiking Backpack\nCategory: Outdoor Gear\nSKU: TM-100\n"
+             "Price: $79\nDescription: A durable hiking backpack ideal for long treks.")
+    assert trim_product(block) == ("Product Name: TrekMate X100 Hiking Backpack, Price: $79, "
+                                   "Category: Outdoor Gear, Description: A durable hiking backpack ideal for long treks.")
+    row = "product_name: Sleek Shoes, product_id: G27341, description: A modern take, tailored for women, modified_description: A modern take"
+    assert trim_product(row, description_chars=10) == "product_name: Sleek Shoes, description: A modern…"
+    assert trim_product("just some words " * 30, description_chars=20) == "just some words just…"
+
+
+def test_products_come_before_history_and_duplicates_are_dropped():
+    counter = TokenCounter(words)
+    assembler = PromptAssembler(counter, max_tokens=30, max_products=4)
+    docs = [_doc("Name: Red boots, Price: 20", "Red boots"), _doc("Name: Red boots, Price: 20, more", "Red boots"),
+            _doc("Name: Blue boots, Price: 25", "Blue boots")]
+    messages = [SimpleNamespace(type="human", content="old " * 10), SimpleNamespace(type="ai", content="recent answer")]
+
+    prompt = assembler.assemble("You are Xiara.", "boots?", docs, messages)
+    assert [d.metadata["name"] for d in prompt.products] == ["Red boots", "Blue boots"]
+    assert prompt.duplicates == 1 and prompt.history_dropped == 1
+    assert "Assistant: recent answer" in prompt.text and "old old" not in prompt.text
+    assert prompt.tokens <= 30 and prompt.text.endswith("Question: boots?\nAnswer:")
+
+    # Everything counted once: the second identical prompt is served from the count cache
+    misses = counter.misses
+    assembler.assemble("You are Xiara.", "boots?", docs, messages)
+    assert counter.misses == misses
+
+
+def test_retrieval_depth_follows_the_remaining_budget():
+    assembler = PromptAssembler(words, max_tokens=100, max_products=4, initial_product_tokens=30)
+    assert assembler.retrieval_depth("You are Xiara.", "boots?") == 3
+    assert assembler.retrieval_depth("You are Xiara.", "word " * 90) == 1
+    assert PromptAssembler(words, max_tokens=1000, max_products=4).retrieval_depth("s", "q") == 4
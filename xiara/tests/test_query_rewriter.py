@@ -0,0 +1,36 @@
+import pytest
+
+from xiara.core.query_rewriter import QuestionRewriter, rewrite_follow_up
+
+LAST = "waterproof hiking boots under ₦20,000"
+
+
+def test_follow_ups_are_rewritten_from_the_last_query():
+    assert rewrite_follow_up("do you have it in black?", LAST) == "waterproof hiking boots under ₦20,000 in black"
+    assert rewrite_follow_up("any under ₦10,000?", LAST) == "waterproof hiking boots under ₦10,000"
+    assert rewrite_follow_up("compare the first two", LAST) is None
+
+
+@pytest.mark.parametrize("message", ["how much is it?", "does it come with a warranty", "thanks!", "is it?"])
+def test_questions_about_the_answer_and_small_talk_are_not_rewritten(message):
+    assert rewrite_follow_up(message, LAST) is None
+    assert QuestionRewriter().plan(message, True, LAST, names_product=False) == (None, "llm")
+
+
+def test_lookup_openings_are_still_follow_ups():
+    assert rewrite_follow_up("what about in brown", LAST) == "waterproof hiking boots under ₦20,000 in brown"
+    assert rewrite_follow_up("is there one in red?", LAST) == "waterproof hiking boots under ₦20,000 in red"
+
+
+def test_plan_takes_the_cheapest_sufficient_path():
+    rewriter = QuestionRewriter()
+    assert rewriter.plan("red sneakers", False, None, names_product=True) == ("red sneakers", "no_history")
+    assert rewriter.plan("red sneakers", True, LAST, names_product=True) == ("red sneakers", "self_contained")
+    assert rewriter.plan(LAST + ", but under 10k", True, LAST, names_product=False, resolved=True)[1] == "self_contained"
+    assert rewriter.plan("in size 42", True, LAST, names_product=False)[1] == "rewrite"
+    assert rewriter.plan("which is better?", True, LAST, names_product=False) == (None, "llm")
+    assert rewriter.plan("is it any good", True, None, names_product=False) == (None, "llm")
+
+    stats = rewriter.stats()
+    assert (stats["no_history"], stats["self_contained"], stats["rewrite"], stats["llm"]) == (1, 2, 1, 2)
+    assert stats["llm_rate"] == round(2 / 6, 4)
@@ -0,0 +1,46 @@
+from xiara.core.request_pipeline import PipelineStats, RequestContext, pipeline_stats
+
+
+class CountingEmbeddings:
+    def __init__(self):
+        self.calls = []
+
+    def embed_query(self, text):
+        self.calls.append(text)
+        return [float(len(text))]
+
+
+def test_features_are_computed_once_per_request():
+    ctx = RequestContext("Nivea lotion UNDER ₦5,000!", "u1")
+    assert ctx.lower == "nivea lotion under ₦5,000!"
+    assert ctx.normalized == "nivea lotion under ₦5000"
+    assert ctx.budget == (None, 5000.0)
+
+    embeddings = CountingEmbeddings()
+    assert ctx.embedding(embeddings) == ctx.embedding(embeddings)
+    assert ctx.embedding_for(ctx.query, embeddings) == [26.0]
+    ctx.embedding_for("resolved follow-up", embeddings)
+    assert embeddings.calls == [ctx.query, "resolved follow-up"]
+
+
+def test_rewritten_text_gets_its_own_features():
+    ctx = RequestContext("Nivea lotion UNDER ₦5,000!", "u1")
+    ctx.__dict__["budget"] = (None, 1.0)  # cached: the request's own text never parses again
+    assert ctx.budget_for(ctx.query) == (None, 1.0)
+    assert ctx.budget_for("nivea lotion between ₦2,000 and ₦4,000") == (2000.0, 4000.0)
+    assert ctx.normalized_for(ctx.query) is ctx.normalized
+    assert ctx.normalized_for("Nivea  Lotion?") == "nivea lotion"
+
+
+def test_stage_timings_accumulate_per_request_and_process_wide():
+    ctx = RequestContext("boots", "u1")
+    for _ in range(2):
+        with ctx.stage("test-cache"):
+            pass
+    assert set(ctx.timings_ms()) == {"test-cache"}
+    assert pipeline_stats.stats()["test-cache"]["count"] >= 2
+
+    stats = PipelineStats()
+    stats.record("generation", 0.5)
+    stats.record("generation", 1.5)
+    assert stats.stats() == {"generation": {"count": 2, "avg_ms": 1000.0, "max_ms": 1500.0}}
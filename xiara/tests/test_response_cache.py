@@ -0,0 +1,71 @@
+from types import SimpleNamespace
+
+from xiara.core.response_cache import ResponseCache, TTLCache, normalize_query, profile_fingerprint
+
+
+def test_normalize_query_and_profile_fingerprint():
+    assert normalize_query("  Running SHOES under ₦20,000!! ") == "running shoes under ₦20000"
+    assert normalize_query("phones under $99.50?") == "phones under $99.50"
+
+    profile = SimpleNamespace(liked_categories=["Shoes", "bags"], disliked_categories=[],
+                              preferred_price_range=None, purchase_intent="high", history=["a"])
+    same = SimpleNamespace(liked_categories=["bags", "shoes"], disliked_categories=[],
+                           preferred_price_range=None, purchase_intent="high", history=["b", "c"])
+    assert profile_fingerprint(profile) == profile_fingerprint(same)
+    assert profile_fingerprint(None) == "anon"
+
+
+def test_ttl_cache_expires_and_evicts(monkeypatch):
+    now = [100.0]
+    monkeypatch.setattr("xiara.core.response_cache.time.monotonic", lambda: now[0])
+    cache = TTLCache(max_entries=2, ttl=10)
+    cache.set("a", "1")
+    cache.set("b", "2")
+    assert cache.get("a") == "1"
+    cache.set("c", "3")  # evicts "b", the least recently used
+    assert cache.get("b") is None and cache.evictions == 1
+    now[0] += 11
+    assert cache.get("a") is None and cache.expirations == 1
+
+
+def test_two_tiers_and_invalidation(fake_redis):
+    redis = fake_redis
+    cache = ResponseCache(max_entries=8, ttl=60, redis_client=redis)
+    cache.invalidate("v1")
+    key = cache.key_for("Nivea lotion", None)
+    assert cache.get(key) is None
+    cache.set(key, "answer")
+
+    # Another worker with an empty local tier is served from Redis
+    other = ResponseCache(max_entries=8, ttl=60, redis_client=redis)
+    other.invalidate("v1")
+    assert other.get(other.key_for("nivea  lotion?", None)) == "answer"
+    assert other.get(key) == "answer"
+    assert other.stats()["redis_hits"] == 1 and other.stats()["local_hits"] == 1
+
+    # A new catalog version makes old answers unreachable
+    cache.invalidate("v2")
+    assert cache.get(key) is None
+    stats = cache.stats()
+    assert stats["misses"] == 2 and stats["namespace"] == "v2"
+    assert stats["hit_rate"] == 0.0
+
+
+def test_stats_count_every_lookup_across_threads():
+    import threading
+
+    cache = ResponseCache(max_entries=8, ttl=60)
+    cache.set("k", "answer")
+
+    def lookups():
+        for _ in range(2000):
+            cache.get("k")
+            cache.get("missing")
+
+    threads = [threading.Thread(target=lookups) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    stats = cache.stats()
+    assert stats["local_hits"] == 8000 and stats["misses"] == 8000 and stats["hit_rate"] == 0.5
@@ -0,0 +1,51 @@
+import numpy as np
+import pytest
+
+pytest.importorskip("faiss")
+
+from xiara.core.semantic_cache import SemanticCache
+
+
+def _vec(*values):
+    return np.array(values, dtype=np.float32)
+
+
+def test_near_duplicate_hits_within_threshold_and_segment():
+    cache = SemanticCache(threshold=0.9, max_entries=10)
+    cache.put("cheap nivea lotion", _vec(1.0, 0.1, 0.0), "seg-a", "answer")
+
+    assert cache.get("affordable nivea body lotion", _vec(1.0, 0.2, 0.0), "seg-a") == "answer"
+    assert cache.get("affordable nivea body lotion", _vec(1.0, 0.2, 0.0), "seg-b") is None
+    assert cache.get("phone case", _vec(0.0, 1.0, 0.0), "seg-a") is None
+
+    stats = cache.stats()
+    assert stats["hits"] == 1 and stats["misses"] == 2
+    assert cache.audit[-1]["matched"] == "cheap nivea lotion"
+
+
+def test_different_numbers_never_match():
+    cache = SemanticCache(threshold=0.5)
+    cache.put("nivea lotion under ₦5,000", _vec(1.0, 0.0), "s", "cheap answer")
+    assert cache.get("nivea lotion under ₦50,000", _vec(1.0, 0.0), "s") is None
+    assert cache.get("nivea lotion under 5000", _vec(1.0, 0.0), "s") == "cheap answer"
+    assert cache.stats()["number_mismatches"] == 1
+
+
+def test_size_cap_ttl_and_false_positive_report(monkeypatch):
+    now = [0.0]
+    monkeypatch.setattr("xiara.core.semantic_cache.time.monotonic", lambda: now[0])
+    cache = SemanticCache(threshold=0.9, max_entries=2, ttl=60)
+    cache.put("a", _vec(1.0, 0.0, 0.0), "s", "A")
+    cache.put("b", _vec(0.0, 1.0, 0.0), "s", "B")
+    cache.put("c", _vec(0.0, 0.0, 1.0), "s", "C")  # evicts "a"
+    assert cache.get("a again", _vec(1.0, 0.0, 0.0), "s") is None
+    assert cache.stats()["evictions"] == 1
+
+    assert cache.get("b again", _vec(0.0, 1.0, 0.0), "s") == "B"
+    assert cache.report_false_positive("b again")
+    assert cache.get("b again", _vec(0.0, 1.0, 0.0), "s") is None
+    assert cache.stats()["false_positive_rate"] == 1.0
+
+    now[0] += 61
+    assert cache.get("c again", _vec(0.0, 0.0, 1.0), "s") is None
+    assert cache.stats()["expirations"] == 1 and cache.stats()["entries"] == 0
@@ -0,0 +1,97 @@
+import asyncio
+from datetime import datetime
+
+from shared.storage.redis_client import RedisBatch
+from xiara.core.negotiation_handler import NegotiationState
+from xiara.core.session_store import SessionStore
+
+
+class Clock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_entries_expire_after_idle_ttl_and_reads_refresh_it():
+    clock = Clock()
+    store = SessionStore("t", ttl=10, clock=clock)
+    store["active"] = 1
+    store["idle"] = 2
+    for _ in range(3):
+        clock.now += 6
+        assert store.get("active") == 1
+    assert store.get("idle") is None
+    assert "idle" not in store
+    assert store.stats()["expirations"] == 1
+
+
+def test_lru_eviction_by_bytes_and_entries():
+    store = SessionStore("t", max_bytes=10, max_entries=3)
+    store["a"] = "xx"  # '"xx"' = 4 bytes
+    store["b"] = "yy"
+    store.get("a")  # b is now least recently used
+    store["c"] = "zz"  # 12 bytes > 10
+    assert "b" not in store and store.get("a") == "xx" and store.get("c") == "zz"
+    assert store.stats()["bytes"] == 8 and store.stats()["evictions"] == 1
+
+    store = SessionStore("t", max_entries=2)
+    for key in "abc":
+        store[key] = 0
+    assert len(store) == 2 and "a" not in store
+
+
+def test_resize_accounts_for_values_mutated_in_place():
+    store = SessionStore("t", sizeof=len, max_bytes=5)
+    store["a"] = []
+    store["b"] = [1]
+    store.get("a").extend(range(5))
+    store.resize("a")
+    # a now holds 5 of the 5 allowed: b (least recently used) is evicted
+    assert "b" not in store and store.stats()["bytes"] == 5
+
+
+def test_redis_mode_serializes_values_and_refreshes_the_ttl(fake_redis):
+    redis = fake_redis
+    store = SessionStore("negotiations", ttl=30, redis_client=redis,
+                         encode=NegotiationState.to_json, decode=NegotiationState.from_json)
+    state = NegotiationState(100.0, 85.0, 95.0, 1, datetime(2024, 1, 2, 3, 4), "p1")
+    store["u1"] = state
+    key = "xiara:session:negotiations:u1"
+    assert redis.ttls[key] == 30
+    redis.ttls[key] = 1
+    assert store["u1"] == state and redis.ttls[key] == 30
+    assert len(store) == 0  # nothing held in process
+    del store["u1"]
+    assert "u1" not in store
+
+
+def test_async_helpers_fall_back_to_the_sync_path():
+    store = SessionStore("t")
+
+    async def run():
+        await store.aset("u", 2)
+        value = await store.aget("u", 0)
+        await store.adelete("u")
+        return value, await store.aget("u", 0)
+
+    assert asyncio.run(run()) == (2, 0)
+
+
+def test_batched_reads_and_writes_share_a_pipeline(fake_redis):
+    redis = fake_redis
+    remote = SessionStore("last_query", ttl=30, redis_client=redis)
+    local = SessionStore("attempts")
+    local["u"] = 1
+
+    batch = RedisBatch(redis)
+    remote.batch_set(batch, "u", "boots under 20000")
+    assert "xiara:session:last_query:u" not in redis.values  # queued, not sent
+    batch.execute()
+
+    batch = RedisBatch(redis)
+    query, attempts = remote.batch_get(batch, "u"), local.batch_get(batch, "u", 0)
+    assert len(batch) == 1 and attempts.value == 1  # in-process reads resolve at once
+    batch.execute()
+    assert query.value == "boots under 20000"
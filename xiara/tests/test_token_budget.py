@@ -0,0 +1,70 @@
+import pytest
+
+from xiara.core.token_budget import TokenCounter, estimate_tokens, fold_point, window_start
+
+
+def test_counts_are_cached_per_text():
+    calls = []
+    counter = TokenCounter(lambda text: calls.append(text) or len(text.split()), max_entries=2)
+    assert counter("two words") == 2
+    assert counter("two words") == 2
+    assert calls == ["two words"] and counter.hits == 1
+    counter("a"), counter("b")
+    counter("two words")  # evicted by the LRU bound, counted again
+    assert calls.count("two words") == 2
+    assert counter.total(["a", "b c"]) == 3
+    assert estimate_tokens("") == 0 and estimate_tokens("abcdefgh") == 2
+
+
+def test_estimates_are_not_cached_until_the_tokenizer_counts():
+    tokenizer = {"loaded": False}
+    counter = TokenCounter(lambda text: len(text) if tokenizer["loaded"] else None)
+    assert counter("abcdefgh") == estimate_tokens("abcdefgh") == 2
+    tokenizer["loaded"] = True
+    assert counter("abcdefgh") == 8 and counter("abcdefgh") == 8
+    assert counter.hits == 1
+
+
+def test_window_keeps_newest_items_within_budget():
+    assert window_start([5, 5, 5, 5], budget=10) == 2
+    assert window_start([5, 5, 5, 5], budget=100) == 0
+    # The last items are kept even when they alone exceed the budget
+    assert window_start([5, 50, 50], budget=10, keep_last=2) == 1
+    assert window_start([], budget=10) == 0
+
+
+def test_fold_point_waits_for_enough_backlog():
+    assert fold_point([10, 10, 10, 10], keep_last=4, min_tokens=5) == 0
+    assert fold_point([10, 10, 10, 10, 10], keep_last=4, min_tokens=20) == 0
+    assert fold_point([10, 10, 10, 10, 10, 10], keep_last=4, min_tokens=20) == 2
+
+
+def test_budgeted_memory_folds_old_turns_off_the_request_path(monkeypatch):
+    pytest.importorskip("langchain")
+    from xiara.core import llm_config, llm_executor as executor_module, memory_manager
+
+    class FakeLLM:
+        def invoke(self, prompt):
+            return "shopper wants boots"
+
+    jobs = []
+    monkeypatch.setattr(memory_manager.token_counter, "_count", lambda text: len(text.split()))
+    monkeypatch.setattr(llm_config, "get_llm", lambda: FakeLLM())
+    monkeypatch.setattr(executor_module.llm_executor, "submit_when_idle", lambda fn, *args: not jobs.append((fn, args)))
+
+    memory = memory_manager.BudgetedConversationMemory(return_messages=True, output_key="answer",
+                                                       max_tokens=40, recent_messages=2)
+    for i in range(4):
+        memory.save_context({"question": f"question {i} " + "word " * 8}, {"answer": f"answer {i} " + "word " * 8})
+
+    # Loading never waits for the summary: the history is trimmed to the budget meanwhile
+    history = memory.load_memory_variables({})["chat_history"]
+    assert sum(len(m.content.split()) for m in history) <= 40
+    assert history[-1].content.startswith("answer 3")
+
+    fn, args = jobs[0]
+    fn(*args)
+    history = memory.load_memory_variables({})["chat_history"]
+    assert history[0].type == "system" and "shopper wants boots" in history[0].content
+    assert [m.content.split()[0] for m in history[1:]][-2:] == ["question", "answer"]
+    assert len(memory.chat_memory.messages) < 8
@@ -0,0 +1,105 @@
+import json
+
+import pytest
+
+pytest.importorskip("faiss")
+pytest.importorskip("langchain_community")
+pytest.importorskip("langchain_text_splitters")
+
+from langchain_core.embeddings import DeterministicFakeEmbedding
+
+from shared.config.settings import settings
+from xiara.core import vectorstore_loader as loader
+from xiara.core.embedding_cache import CachedEmbeddings
+from xiara.core.filtered_retriever import filtered_search
+
+
+@pytest.fixture
+def index_dir(tmp_path, monkeypatch):
+    data, index = tmp_path / "data", tmp_path / "index"
+    data.mkdir()
+    monkeypatch.setattr(loader, "DATA_PATH", str(data))
+    monkeypatch.setattr(loader, "VECTORSTORE_PATH", str(index))
+    monkeypatch.setattr(loader, "INDEX_FILE", str(index / "index.faiss"))
+    monkeypatch.setattr(loader, "LEGACY_PICKLE_FILE", str(index / "index.pkl"))
+    monkeypatch.setattr(settings, "XIARA_INDEX_TYPE", "flat")
+    monkeypatch.setattr(settings, "XIARA_INGEST_BATCH_SIZE", 1)
+    return data
+
+
+def write_items(path, names, broken=False):
+    lines = [json.dumps({"name": name, "price": 10 * len(name)}) for name in names]
+    if broken:
+        lines.insert(1, '{"name": "half-written')
+    path.write_text("\n".join(lines) + "\n", encoding="utf-8")
+
+
+def indexed_names(vectorstore):
+    return sorted(doc.metadata["name"] for doc in
+                  (vectorstore.docstore.search(i) for i in vectorstore.index_to_docstore_id.values()))
+
+
+def test_a_file_that_fails_partway_keeps_its_indexed_rows(index_dir):
+    items = index_dir / "items.jsonl"
+    write_items(items, ["boots", "watch", "bag", "phone"])
+    vectorstore = loader.rebuild_vectorstore(DeterministicFakeEmbedding(size=8))
+    assert indexed_names(vectorstore) == ["bag", "boots", "phone", "watch"]
+    store = loader.get_attribute_store()  # what the retriever holds
+
+    # Malformed after the first row, plus one new row: nothing is deleted, the new row is indexed
+    write_items(items, ["boots", "lamp", "watch", "bag", "phone"], broken=True)
+    assert loader.sync_vectorstore(vectorstore, str(index_dir)) == {"added": 0, "removed": 0}
+    assert indexed_names(vectorstore) == ["bag", "boots", "phone", "watch"]
+    assert len(loader.get_attribute_store()) == 4
+
+    # Once the file reads cleanly, real deletions and additions are applied
+    write_items(items, ["boots", "lamp", "phone"])
+    assert loader.sync_vectorstore(vectorstore, str(index_dir)) == {"added": 1, "removed": 2}
+    assert indexed_names(vectorstore) == ["boots", "lamp", "phone"]
+    assert loader.get_attribute_store() is store and len(store) == 3
+
+
+def test_hnsw_deletes_are_marked_until_a_rebuild_pays_off(index_dir, monkeypatch):
+    monkeypatch.setattr(settings, "XIARA_INDEX_TYPE", "hnsw")
+    monkeypatch.setattr(settings, "XIARA_HNSW_MAX_DELETED_FRACTION", 0.5)
+    items = index_dir / "items.jsonl"
+    write_items(items, ["boots", "watch", "bag", "phone"])
+    vectorstore = loader.rebuild_vectorstore(DeterministicFakeEmbedding(size=8))
+
+    # One deletion: the row stays in the saved graph, marked, and searches skip it
+    write_items(items, ["boots", "bag", "phone"])
+    assert loader.sync_vectorstore(vectorstore, str(index_dir)) == {"added": 0, "removed": 1}
+    assert vectorstore.index.ntotal == 4 and len(vectorstore.deleted_rows) == 1
+    assert sorted(doc.metadata["name"] for doc in filtered_search(vectorstore, None, "watch", k=4)) == \
+        ["bag", "boots", "phone"]
+
+    # Past the threshold the index is rebuilt without the deleted rows
+    write_items(items, ["boots"])
+    assert loader.sync_vectorstore(vectorstore, str(index_dir))["rebuilt"]
+    assert vectorstore.index.ntotal == 1 and len(vectorstore.deleted_rows) == 0
+
+
+def test_vectors_of_deleted_rows_are_compacted_out_of_the_embedding_cache(index_dir, tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "XIARA_EMBEDDING_CACHE_MAX_STALE", 0.5)
+    embeddings = CachedEmbeddings(DeterministicFakeEmbedding(size=8), str(tmp_path / "cache"))
+    items = index_dir / "items.jsonl"
+    write_items(items, ["boots", "watch", "bag", "phone"])
+    vectorstore = loader.rebuild_vectorstore(embeddings)
+
+    write_items(items, ["boots", "watch", "bag"])
+    loader.sync_vectorstore(vectorstore, str(index_dir))
+    assert len(embeddings.documents) == 4  # one stale vector is within the allowance
+
+    write_items(items, ["boots"])
+    loader.sync_vectorstore(vectorstore, str(index_dir))
+    assert len(embeddings.documents) == 1 and indexed_names(vectorstore) == ["boots"]
+
+
+def test_index_files_are_only_opened_under_the_index_lock(index_dir):
+    write_items(index_dir / "items.jsonl", ["boots"])
+    embeddings = DeterministicFakeEmbedding(size=8)
+    loader.rebuild_vectorstore(embeddings)
+    with pytest.raises(RuntimeError):
+        loader.load_vectorstore(embeddings)
+    with loader.locked_index():
+        assert loader.load_vectorstore(embeddings) is not None
@@ -0,0 +1,53 @@
+import pytest
+from xiara.core import warmup
+
+
+def test_require_llm_only_blocks_during_managed_warmup(monkeypatch):
+    monkeypatch.setitem(warmup._state, "started", False)
+    monkeypatch.setattr(warmup, "is_llm_loaded", lambda: False)
+    warmup.require_llm()  # scripts/tests load the model lazily on demand
+
+    monkeypatch.setitem(warmup._state, "started", True)
+    with pytest.raises(warmup.ServiceNotReady) as exc:
+        warmup.require_llm()
+    assert exc.value.retry_after > 0
+
+    monkeypatch.setattr(warmup, "is_llm_loaded", lambda: True)
+    warmup.require_llm()
+
+
+def test_warm_up_records_failures(monkeypatch):
+    monkeypatch.setattr(warmup, "_state", dict(warmup._state, llm="pending", index="disabled", error=None))
+    monkeypatch.setattr(warmup, "USE_RAG", False)
+    monkeypatch.setattr(warmup.settings, "XIARA_WARMUP_RETRIES", 0)
+
+    def broken():
+        raise RuntimeError("model file missing")
+
+    monkeypatch.setattr(warmup, "get_llm", broken)
+    warmup.warm_up()
+    assert warmup.status()["llm"] == "failed"
+    assert "model file missing" in warmup.status()["error"]
+    assert not warmup.is_ready() and warmup.has_failed()
+
+    monkeypatch.setattr(warmup, "get_llm", lambda: object())
+    warmup.warm_up()
+    assert warmup.is_ready()
+
+
+def test_failed_loads_are_retried_with_backoff(monkeypatch):
+    monkeypatch.setattr(warmup, "_state", dict(warmup._state, llm="pending", index="disabled", error=None))
+    monkeypatch.setattr(warmup, "USE_RAG", False)
+    monkeypatch.setattr(warmup.settings, "XIARA_WARMUP_RETRIES", 3)
+    monkeypatch.setattr(warmup.settings, "XIARA_WARMUP_RETRY_DELAY", 2)
+    failures, waits = [RuntimeError("inference service not up")] * 2, []
+
+    def flaky():
+        if failures:
+            raise failures.pop()
+        return object()
+
+    monkeypatch.setattr(warmup, "get_llm", flaky)
+    warmup.warm_up(sleep=waits.append)
+    assert waits == [2, 4] and warmup.is_ready()
+    assert warmup.status()["attempts"] == 3 and warmup.status()["error"] is None
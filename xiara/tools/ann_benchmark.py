@@ -0,0 +1,119 @@
+# xiara/tools/ann_benchmark.py
+"""
+Recall-vs-latency benchmark for the product index types.
+
+Builds the exact (flat), HNSW and IVF-PQ indexes from xiara.core.ann_index on
+a synthetic catalog of clustered, normalized vectors (the shape of MiniLM
+sentence embeddings) and reports, per configuration: build time, index size
+in memory, single-query latency (p50/p95) and recall@k against exact search.
+
+Usage:
+    python -m xiara.tools.ann_benchmark [--n 200000] [--dim 384] [--queries 500] [--k 4]
+"""
+import argparse
+import contextlib
+import time
+
+import numpy as np
+
+from shared.config.settings import settings
+from xiara.core.ann_index import build_index, configure_search
+
+CONFIGS = [
+    ("flat", {}),
+    ("hnsw", {"XIARA_HNSW_M": 16, "XIARA_HNSW_EF_SEARCH": 32}),
+    ("hnsw", {"XIARA_HNSW_M": 32, "XIARA_HNSW_EF_SEARCH": 64}),
+    ("hnsw", {"XIARA_HNSW_M": 32, "XIARA_HNSW_EF_SEARCH": 128}),
+    ("ivfpq", {"XIARA_IVF_NPROBE": 8}),
+    ("ivfpq", {"XIARA_IVF_NPROBE": 16}),
+    ("ivfpq", {"XIARA_IVF_NPROBE": 64}),
+]
+
+
+@contextlib.contextmanager
+def overrides(values: dict):
+    old = {key: getattr(settings, key) for key in values}
+    for key, value in values.items():
+        setattr(settings, key, value)
+    try:
+        yield
+    finally:
+        for key, value in old.items():
+            setattr(settings, key, value)
+
+
+def synthetic_catalog(n: int, dim: int, n_queries: int, seed: int = 0):
+    """Clustered unit vectors; queries are perturbed catalog items."""
+    rng = np.random.default_rng(seed)
+    centers = rng.standard_normal((max(1, n // 500), dim)).astype(np.float32)
+    labels = rng.integers(0, len(centers), n)
+    data = centers[labels] + 0.6 * rng.standard_normal((n, dim)).astype(np.float32)
+    data /= np.linalg.norm(data, axis=1, keepdims=True)
+    picks = rng.integers(0, n, n_queries)
+    queries = data[picks] + 0.2 * rng.standard_normal((n_queries, dim)).astype(np.float32)
+    queries /= np.linalg.norm(queries, axis=1, keepdims=True)
+    return data, queries.astype(np.float32)
+
+
+def run_config(kind, params, data, queries, truth, k, train_size):
+    import faiss
+
+    with overrides(params):
+        start = time.perf_counter()
+        if kind == "flat":
+            index = faiss.IndexFlatL2(data.shape[1])
+        else:
+            rng = np.random.default_rng(1)
+            sample = data[rng.choice(len(data), min(train_size, len(data)), replace=False)]
+            index = build_index(kind, data.shape[1], sample)
+        index.add(data)
+        build_seconds = time.perf_counter() - start
+        configure_search(index)
+
+        latencies = []
+        found = np.empty((len(queries), k), dtype=np.int64)
+        for i, q in enumerate(queries):
+            t = time.perf_counter()
+            _, ids = index.search(q[None, :], k)
+            latencies.append(time.perf_counter() - t)
+            found[i] = ids[0]
+
+    recall = np.mean([len(set(f) & set(t)) / k for f, t in zip(found, truth)])
+    label = kind + "".join(f" {key.replace('XIARA_', '').lower()}={v}" for key, v in params.items())
+    return {
+        "config": label,
+        "build_s": build_seconds,
+        "size_mb": faiss.serialize_index(index).nbytes / 1e6,
+        "p50_ms": np.percentile(latencies, 50) * 1000,
+        "p95_ms": np.percentile(latencies, 95) * 1000,
+        "recall": recall,
+    }
+
+
+def main():
+    import faiss
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--n", type=int, default=200_000, help="catalog chunks")
+    parser.add_argument("--dim", type=int, default=384)
+    parser.add_argument("--queries", type=int, default=500)
+    parser.add_argument("--k", type=int, default=4, help="retriever depth (LangChain default: 4)")
+    parser.add_argument("--threads", type=int, default=1, help="FAISS OpenMP threads (1 = per-request view)")
+    args = parser.parse_args()
+
+    faiss.omp_set_num_threads(args.threads)
+    data, queries = synthetic_catalog(args.n, args.dim, args.queries)
+    exact = faiss.IndexFlatL2(args.dim)
+    exact.add(data)
+    _, truth = exact.search(queries, args.k)
+
+    print(f"catalog={args.n} dim={args.dim} queries={args.queries} k={args.k}\n")
+    print(f"{'config':<40} {'build s':>8} {'size MB':>8} {'p50 ms':>8} {'p95 ms':>8} {f'recall@{args.k}':>9}")
+    for kind, params in CONFIGS:
+        r = run_config(kind, params, data, queries, truth, args.k, settings.XIARA_INDEX_TRAIN_SAMPLE)
+        print(f"{r['config']:<40} {r['build_s']:>8.2f} {r['size_mb']:>8.1f} "
+              f"{r['p50_ms']:>8.3f} {r['p95_ms']:>8.3f} {r['recall']:>9.3f}")
+
+
+if __name__ == "__main__":
+    main()
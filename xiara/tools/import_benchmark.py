@@ -0,0 +1,52 @@
+# xiara/tools/import_benchmark.py
+"""
+Import-time benchmark for Xiara.
+
+Measures, in fresh interpreters, how long it takes to import the app
+modules (what a pod pays before it can bind its port), and reports whether
+the heavy stacks (torch, transformers, llama_cpp, faiss) got pulled in.
+
+Usage:
+    python -m xiara.tools.import_benchmark [--runs 5] [--module xiara.main]
+"""
+import argparse
+import json
+import statistics
+import subprocess
+import sys
+
+HEAVY_MODULES = ["torch", "transformers", "sentence_transformers", "llama_cpp", "faiss"]
+
+PROBE = """
+import json, sys, time
+start = time.perf_counter()
+import {module}
+elapsed = time.perf_counter() - start
+print(json.dumps({{"seconds": elapsed, "heavy": [m for m in {heavy!r} if m in sys.modules]}}))
+"""
+
+
+def measure(module: str) -> dict:
+    code = PROBE.format(module=module, heavy=HEAVY_MODULES)
+    out = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, check=True)
+    return json.loads(out.stdout.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--module", action="append",
+                        help="module to import (repeatable); defaults to the Xiara entry points")
+    args = parser.parse_args()
+    modules = args.module or ["xiara.core.prompt_chain", "xiara.main"]
+
+    for module in modules:
+        results = [measure(module) for _ in range(args.runs)]
+        times = [r["seconds"] for r in results]
+        print(f"{module}: median {statistics.median(times) * 1000:.0f} ms, "
+              f"min {min(times) * 1000:.0f} ms over {args.runs} runs; "
+              f"heavy modules loaded: {results[-1]['heavy'] or 'none'}")
+
+
+if __name__ == "__main__":
+    main()
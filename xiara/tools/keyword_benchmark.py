@@ -0,0 +1,109 @@
+# xiara/tools/keyword_benchmark.py
+"""
+Per-query cost of the rule-based keyword checks.
+
+Times the ambiguity detector's vocabulary scans (product hints, brands,
+price/quality/generic terms, descriptors) and the negotiation intent scan
+two ways over a mix of shopping queries: the former substring scans
+(`any(term in query for term in ...)`, one pass over the query per term)
+and KeywordIndex (the query tokenized once, one dict lookup per word for
+all vocabularies). Also reports how many queries the two disagree on: substring
+scans match inside words ("top" in "laptop"), the index does not.
+Vocabularies are also grown 10x and 100x (synthetic terms) to show how
+each approach scales, and the session history scan is compared with the
+cached per-session flag.
+
+Usage:
+    python -m xiara.tools.keyword_benchmark [--queries 20000] [--vocabulary path.json] [--history 20]
+"""
+import argparse
+import random
+import time
+
+from xiara.core.keyword_matcher import KeywordIndex, load_vocabularies
+
+QUERIES = [
+    "I need waterproof hiking boots under ₦20,000",
+    "something nice",
+    "cheap laptop for school",
+    "Samsung phone with a good camera",
+    "what's the best moisturizer for dry skin",
+    "recommend some shoes",
+    "can you do a better price on this bag?",
+    "how much is the leather jacket",
+    "lightweight wireless headphones for the gym",
+    "show me anything affordable",
+    "top rated refrigerators",
+    "Let's negotiate, I'll pay less",
+]
+
+CHECKS = ["product_hints", "brands", "price_terms", "quality_terms", "generic_terms", "descriptors"]
+
+
+def substring_scan(vocab: dict, negotiation: dict, query: str) -> tuple:
+    query = query.lower()
+    hits = tuple(any(term in query for term in vocab[name]) for name in CHECKS)
+    intent = next((intent for intent, terms in negotiation.items() if any(t in query for t in terms)), None)
+    return hits + (intent,)
+
+
+def indexed_scan(index: KeywordIndex, intents: KeywordIndex, query: str) -> tuple:
+    names = index.labels(query)
+    return tuple(name in names for name in CHECKS) + (intents.first(query),)
+
+
+def timed(fn, queries) -> float:
+    start = time.perf_counter()
+    for query in queries:
+        fn(query)
+    return (time.perf_counter() - start) / len(queries) * 1e6
+
+
+def grown(vocabularies: dict, factor: int) -> dict:
+    """Each vocabulary with (factor - 1) synthetic variants per term, as for a large catalog."""
+    return {name: list(terms) + [f"{term}x{i}" for term in terms for i in range(1, factor)]
+            for name, terms in vocabularies.items()}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--queries", type=int, default=20000)
+    parser.add_argument("--vocabulary", default=None, help="vocabulary JSON (default: the configured one)")
+    parser.add_argument("--history", type=int, default=20, help="earlier messages in the session")
+    args = parser.parse_args()
+
+    vocabularies = load_vocabularies(args.vocabulary)
+    rng = random.Random(0)
+    queries = [rng.choice(QUERIES) for _ in range(args.queries)]
+
+    print(f"{'terms':>6} | {'substring scans':>15} | {'keyword index':>13} | speedup")
+    for factor in (1, 10, 100):
+        vocab = grown(vocabularies["ambiguity"], factor)
+        negotiation = grown(vocabularies["negotiation"], factor)
+        index = KeywordIndex({name: vocab[name] for name in CHECKS})
+        intents = KeywordIndex(negotiation)
+        n = max(100, args.queries // factor)
+        old = timed(lambda q: substring_scan(vocab, negotiation, q), queries[:n])
+        new = timed(lambda q: indexed_scan(index, intents, q), queries[:n])
+        terms = sum(len(vocab[name]) for name in CHECKS) + sum(len(t) for t in negotiation.values())
+        print(f"{terms:>6} | {old:>12.2f}us | {new:>10.2f}us | {old / new:>6.1f}x")
+
+    # Session product intent: every earlier human message scanned on every turn (before), against
+    # the cached flag plus the newest message (now)
+    hints = vocabularies["ambiguity"]["product_hints"]
+    hint_index = KeywordIndex({"product_hints": hints})
+    history = ["tell me about delivery times"] * args.history
+    old = timed(lambda q: any(any(h in m.lower() for h in hints) for m in history + [q]), queries[:2000])
+    new = timed(lambda q: bool(hint_index.labels(q)), queries[:2000])
+    print(f"session product intent ({args.history} earlier messages): {old:.2f}us -> {new:.2f}us per turn")
+
+    vocab, negotiation = vocabularies["ambiguity"], vocabularies["negotiation"]
+    index, intents = KeywordIndex({name: vocab[name] for name in CHECKS}), KeywordIndex(negotiation)
+    differ = [q for q in QUERIES if substring_scan(vocab, negotiation, q) != indexed_scan(index, intents, q)]
+    print(f"{len(differ)} of {len(QUERIES)} sample queries classified differently (word-boundary matching):")
+    for query in differ:
+        print(f"  {query!r}")
+
+
+if __name__ == "__main__":
+    main()
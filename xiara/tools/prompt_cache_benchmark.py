@@ -0,0 +1,101 @@
+# xiara/tools/prompt_cache_benchmark.py
+"""
+Prompt-evaluation benchmark for KV-cache reuse in the inference service.
+
+Replays a multi-turn shopping conversation (Xiara's system prompt, a
+growing history, a new question each turn) through the continuous-batching
+scheduler twice: once evaluating every prompt from scratch and once with
+the prefix cache (pinned system prefix + per-session snapshots). Reports,
+per turn, the prompt tokens, how many were reused from cache, and the time
+to first token, which is dominated by prompt evaluation.
+
+Usage:
+    python -m xiara.tools.prompt_cache_benchmark [--model $MODEL_PATH] [--turns 6] [--answer-tokens 48]
+"""
+import argparse
+import os
+import time
+
+from xiara.core.inference_server import BatchScheduler, LlamaBackend, Request, available_cores, plan_resources
+from xiara.core.prefix_cache import PrefixCache
+
+SYSTEM = (
+    "System: You are Xiara, a conversational and friendly AI shopping assistant for the Pasar marketplace.\n"
+    "Understand user intent and respond naturally in multi-turn conversations.\n"
+    "If query is ambiguous, ask for clarification.\n"
+    "If query is clear, respond with useful product recommendations.\n"
+    "Keep responses conversational, concise, and engaging.\n"
+)
+
+QUESTIONS = [
+    "I need waterproof hiking boots under ₦20,000",
+    "Do any of them come in size 44?",
+    "Which one is the lightest?",
+    "Is there a cheaper option from a local brand?",
+    "What about a matching backpack?",
+    "Can you compare the two backpacks on durability?",
+    "Which of these ships to Abuja fastest?",
+    "Summarize my options in one line each.",
+]
+
+
+def run(scheduler: BatchScheduler, turns: int, answer_tokens: int, pin: bool):
+    if pin:
+        scheduler.submit(Request(SYSTEM, max_tokens=0, pinned=True)).result()
+    history, rows = "", []
+    for question in QUESTIONS[:turns]:
+        prompt = f"{SYSTEM}{history}Human: {question}\nAI:"
+        before = scheduler.stats()
+        start = time.perf_counter()
+        first_token = []
+        # on_token runs on the scheduler thread as soon as the first piece is decoded
+        # (no stop strings: those would hold back the first pieces)
+        request = Request(prompt, max_tokens=answer_tokens, temperature=0, session="bench",
+                          on_token=lambda _: first_token or first_token.append(time.perf_counter()))
+        answer = scheduler.submit(request).result()
+        after = scheduler.stats()
+        rows.append({
+            "prompt_tokens": after["prompt_tokens"] - before["prompt_tokens"],
+            "reused": after["prompt_tokens_reused"] - before["prompt_tokens_reused"],
+            "ttft_ms": (first_token[0] - start) * 1000 if first_token else None,
+        })
+        history += f"Human: {question}\nAI: {answer.split('Human:')[0].strip()}\n"
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--model", default=os.getenv("MODEL_PATH"))
+    parser.add_argument("--turns", type=int, default=6)
+    parser.add_argument("--answer-tokens", type=int, default=48)
+    parser.add_argument("--kv-cache-mb", type=int, default=256)
+    args = parser.parse_args()
+    if not args.model:
+        parser.error("--model or MODEL_PATH is required")
+
+    threads, _ = plan_resources(available_cores())
+    backend = LlamaBackend(args.model, threads=threads, slots=1, cache_mb=args.kv_cache_mb, cache_entries=8)
+    results = {}
+    for label, cache in (("no reuse", None), ("reuse", PrefixCache(backend.cache_seq_ids, backend.cache_tokens))):
+        scheduler = BatchScheduler(backend, slots=1, seed=0, cache=cache)
+        scheduler.start()
+        try:
+            results[label] = run(scheduler, args.turns, args.answer_tokens, pin=cache is not None)
+        finally:
+            scheduler.stop()
+        for seq_id in backend.cache_seq_ids:
+            backend.release(seq_id)
+
+    print(f"{'turn':>4} {'prompt':>7} | {'no reuse ttft':>13} | {'reused':>6} {'reuse ttft':>10} {'speedup':>7}")
+    for turn, (plain, cached) in enumerate(zip(results["no reuse"], results["reuse"]), start=1):
+        speedup = plain["ttft_ms"] / cached["ttft_ms"] if plain["ttft_ms"] and cached["ttft_ms"] else float("nan")
+        print(f"{turn:>4} {plain['prompt_tokens']:>7} | {plain['ttft_ms'] or float('nan'):>11.1f}ms | "
+              f"{cached['reused']:>6} {cached['ttft_ms'] or float('nan'):>8.1f}ms {speedup:>6.1f}x")
+    for label, rows in results.items():
+        ttfts = [row["ttft_ms"] for row in rows if row["ttft_ms"]]
+        print(f"{label:>9}: mean time to first token {sum(ttfts) / max(1, len(ttfts)):.1f}ms over {len(ttfts)} turns")
+    backend.close()
+
+
+if __name__ == "__main__":
+    main()
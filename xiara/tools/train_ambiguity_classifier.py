@@ -0,0 +1,83 @@
+# xiara/tools/train_ambiguity_classifier.py
+"""
+Train the embedding-based ambiguity classifier from labeled queries.
+
+Reads JSON lines ({"query": ..., "ambiguous": true|false}), embeds the
+queries with the shared MiniLM model, fits the calibrated logistic
+regression of xiara.core.ambiguity_classifier and saves it. Before that,
+k-fold cross-validation reports accuracy, log loss and how many queries
+would still go to the LLM with the configured uncertainty band, and the
+per-query scoring latency is measured.
+
+Usage:
+    python -m xiara.tools.train_ambiguity_classifier [--data queries.jsonl] [--out model.npz] [--l2 1.0] [--folds 5]
+"""
+import argparse
+import json
+import time
+
+import numpy as np
+
+from shared.config.settings import settings
+from xiara.core.ambiguity_classifier import DEFAULT_MODEL_PATH, DEFAULT_TRAINING_PATH, AmbiguityClassifier
+from xiara.core.model_registry import DEFAULT_EMBEDDING_MODEL, get_embeddings
+
+
+def load_examples(path: str):
+    queries, labels = [], []
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            if line.strip():
+                example = json.loads(line)
+                queries.append(example["query"].strip().lower())
+                labels.append(1.0 if example["ambiguous"] else 0.0)
+    return queries, np.array(labels)
+
+
+def cross_validate(x, y, folds: int, l2: float, low: float, high: float) -> dict:
+    order = np.random.default_rng(0).permutation(len(x))
+    probabilities = np.empty(len(x))
+    for fold in np.array_split(order, folds):
+        train = np.setdiff1d(order, fold)
+        classifier = AmbiguityClassifier.fit(x[train], y[train], l2=l2)
+        probabilities[fold] = [classifier.predict_proba(v) for v in x[fold]]
+    clipped = np.clip(probabilities, 1e-6, 1 - 1e-6)
+    confident = (probabilities <= low) | (probabilities >= high)
+    return {
+        "accuracy": float(((probabilities >= 0.5) == y).mean()),
+        "log_loss": float(-(y * np.log(clipped) + (1 - y) * np.log(1 - clipped)).mean()),
+        "confident": float(confident.mean()),
+        "confident_accuracy": float(((probabilities >= high) == y)[confident].mean()) if confident.any() else 0.0,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--data", default=DEFAULT_TRAINING_PATH)
+    parser.add_argument("--out", default=settings.XIARA_AMBIGUITY_MODEL_PATH or DEFAULT_MODEL_PATH)
+    parser.add_argument("--l2", type=float, default=1.0)
+    parser.add_argument("--folds", type=int, default=5)
+    args = parser.parse_args()
+
+    queries, y = load_examples(args.data)
+    print(f"{len(queries)} labeled queries ({int(y.sum())} ambiguous), embedding with {DEFAULT_EMBEDDING_MODEL}")
+    x = np.array(get_embeddings().embed_documents(queries), dtype=np.float32)
+
+    low, high = settings.XIARA_AMBIGUITY_BAND_LOW, settings.XIARA_AMBIGUITY_BAND_HIGH
+    report = cross_validate(x, y, args.folds, args.l2, low, high)
+    print(f"{args.folds}-fold accuracy {report['accuracy']:.3f}, log loss {report['log_loss']:.3f}")
+    print(f"outside the band {low}..{high}: {report['confident']:.1%} of queries "
+          f"(accuracy {report['confident_accuracy']:.3f}); the rest go to the LLM")
+
+    classifier = AmbiguityClassifier.fit(x, y, l2=args.l2, embedding_model=DEFAULT_EMBEDDING_MODEL)
+    start = time.perf_counter()
+    for vector in x:
+        classifier.predict_proba(vector)
+    print(f"scoring: {(time.perf_counter() - start) / len(x) * 1e6:.1f}us per query (embedding excluded)")
+
+    classifier.save(args.out)
+    print(f"saved to {args.out}")
+
+
+if __name__ == "__main__":
+    main()